@@ -4,14 +4,15 @@ from django.contrib import admin
 # core/admin.py
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.utils import timezone
 from .models import *
 
 @admin.register(CustomUser)
 class CustomUserAdmin(UserAdmin):
     list_display = ['username', 'email', 'first_name', 'last_name', 'role', 'is_active']
-    list_filter = ['role', 'is_active']
+    list_filter = ['role', 'is_active', 'region']
     fieldsets = UserAdmin.fieldsets + (
-        ('Informations supplémentaires', {'fields': ('role', 'phone')}),
+        ('Informations supplémentaires', {'fields': ('role', 'phone', 'region')}),
     )
 
 @admin.register(Employeur)
@@ -26,8 +27,57 @@ class AssureAdmin(admin.ModelAdmin):
     list_filter = ['type_assure', 'est_actif']
     search_fields = ['nom', 'prenom', 'numero_cni']
 
+@admin.register(BaremeCotisation)
+class BaremeCotisationAdmin(admin.ModelAdmin):
+    list_display = ['code', 'libelle', 'secteur_activite', 'taux_salarial', 'taux_patronal', 'plafond', 'date_debut', 'date_fin']
+    list_filter = ['code', 'secteur_activite']
+
+@admin.register(ExerciceClos)
+class ExerciceClosAdmin(admin.ModelAdmin):
+    # Clôture par la commande `cloturer_exercice` (core/archives.py)
+    list_display = ['annee', 'date_cloture', 'clos_par', 'declarations_archivees', 'paiements_archives', 'declarations_ouvertes']
+    readonly_fields = ['annee', 'date_cloture', 'clos_par', 'declarations_archivees', 'lignes_archivees', 'paiements_archives', 'declarations_ouvertes']
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(BilanAnnuelEmployeur)
+class BilanAnnuelEmployeurAdmin(admin.ModelAdmin):
+    list_display = ['employeur', 'annee', 'nb_declarations', 'montant_declare', 'montant_paye']
+    list_filter = ['annee']
+    search_fields = ['employeur__raison_sociale', 'employeur__numero_immatriculation']
+    list_select_related = ['employeur']
+
+@admin.register(DoublonAssure)
+class DoublonAssureAdmin(admin.ModelAdmin):
+    # File remplie par la commande `doublons_assures` (core/doublons.py) ;
+    # la fusion elle-même reste manuelle
+    list_display = ['assure', 'doublon', 'score', 'statut', 'traite_par', 'date_traitement']
+    list_filter = ['statut']
+    search_fields = ['assure__nom', 'assure__numero_cni', 'doublon__nom', 'doublon__numero_cni']
+    list_select_related = ['assure', 'doublon', 'traite_par']
+    raw_id_fields = ['assure', 'doublon']
+    readonly_fields = ['score', 'created_at', 'traite_par', 'date_traitement']
+    ordering = ['statut', '-score']
+    actions = ['marquer_distincts', 'marquer_fusionnes']
+
+    def _traiter(self, request, queryset, statut):
+        nombre = queryset.update(statut=statut, traite_par=request.user, date_traitement=timezone.now())
+        self.message_user(request, f"{nombre} paire(s) traitée(s).")
+
+    @admin.action(description="Marquer comme personnes distinctes")
+    def marquer_distincts(self, request, queryset):
+        self._traiter(request, queryset, 'distincts')
+
+    @admin.action(description="Marquer comme fusionnés")
+    def marquer_fusionnes(self, request, queryset):
+        self._traiter(request, queryset, 'fusionne')
+
 admin.site.register(SecteurActivite)
 admin.site.register(Region)
 admin.site.register(Declaration)
 admin.site.register(Paiement)
-admin.site.register(ActionRecouvrement)
\ No newline at end of file
+admin.site.register(ActionRecouvrement)
+admin.site.register(KpiMensuel)
+admin.site.register(ArriereEmployeur)
+admin.site.register(Blob)
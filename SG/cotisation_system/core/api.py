@@ -0,0 +1,518 @@
+# core/api.py
+# API REST (Django REST Framework) pour les tablettes des agents de terrain,
+# montée sous /api/v1/.
+#
+# Chaque ressource offre la liste paginée par curseur, le détail, la création
+# et la modification partielle, plus un point d'entrée de lot :
+#   POST  /api/v1/<ressource>/lot/  [{...}, ...]              création en masse
+#   PATCH /api/v1/<ressource>/lot/  [{"id": ..., ...}, ...]   modification en masse
+# Un lot est traité dans une seule transaction ; les enregistrements invalides
+# sont renvoyés avec leur index et leurs erreurs sans bloquer les autres.
+# `?fields=a,b` restreint les champs renvoyés (et les jointures faites).
+# Un utilisateur ne voit et ne modifie que les lignes de son périmètre
+# (core.synchro.employeurs_visibles). Validation et rejet des dossiers et des
+# déclarations passent par la file de validation (core.validation), pas par
+# le champ `statut`.
+#
+# Les créations en lot passent par bulk_create : comme pour les imports, les
+# tables dérivées (KPI, arriérés, cotisations) sont recalculées une fois pour
+# le lot. Les modifications en lot enregistrent chaque objet (signaux).
+#
+# La synchronisation des appareils hors ligne (/api/v1/synchro/) est décrite
+# dans core/synchro.py.
+#
+# La recherche géographique (/api/v1/employeurs/proches/ et .../cadre/) et
+# l'ordre des tournées de visites (/api/v1/tournee/) sont décrits dans
+# core/geo.py.
+import math
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status, viewsets
+from rest_framework.decorators import action, api_view
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.routers import DefaultRouter
+
+from . import arrieres, cotisations, geo, kpi, synchro
+from .imports import COLONNES_COTISATIONS
+from .models import Assure, CustomUser, Declaration, Employeur, LigneDeclaration, Paiement
+from .sequences import numeroter
+from .serializers import (
+    AssureSerializer, DeclarationSerializer, EmployeurSerializer, LigneDeclarationSerializer, PaiementSerializer,
+    RelationPk,
+)
+
+TAILLE_LOT_MAX = 1000
+TAILLE_REQUETE = 500
+RAYON_MAX_KM = 100
+LIMITE_CARTE = 1000
+TOURNEE_JOURS_MAX = 7
+
+
+class PaginationCurseur(CursorPagination):
+    ordering = '-id'
+    page_size = 100
+    page_size_query_param = 'taille'
+    max_page_size = 1000
+
+
+def _cle(valeur):
+    return getattr(valeur, 'pk', valeur)
+
+
+def _entier(valeur):
+    try:
+        return int(valeur)
+    except (TypeError, ValueError):
+        return None
+
+
+def _reels(valeur, nombre, parametre):
+    # « a,b,... » -> nombre de flottants, ou ValidationError
+    try:
+        valeurs = [float(v) for v in str(valeur).split(',')]
+    except ValueError:
+        valeurs = []
+    if len(valeurs) != nombre or not all(math.isfinite(v) for v in valeurs):
+        raise ValidationError({parametre: [f"{nombre} nombre(s) séparé(s) par des virgules attendu(s)."]})
+    return valeurs
+
+
+class ModeleViewSet(viewsets.ModelViewSet):
+    """Ressource de l'API : sélection de champs, jointures à la demande et lots."""
+
+    pagination_class = PaginationCurseur
+    http_method_names = ['get', 'post', 'patch', 'head', 'options']
+    # Paramètres de requête acceptés comme filtres d'égalité
+    filtres = ()
+    # Combinaisons uniques à contrôler en plus de celles du modèle
+    unicite = ()
+    # Chemin vers l'employeur, pour restreindre au périmètre de l'utilisateur
+    employeur = 'employeur'
+
+    # --- Lecture ------------------------------------------------------------
+
+    def champs_demandes(self):
+        texte = self.request.query_params.get('fields', '')
+        return [c.strip() for c in texte.split(',') if c.strip()] or None
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method == 'GET':
+            kwargs.setdefault('champs', self.champs_demandes())
+        return super().get_serializer(*args, **kwargs)
+
+    def visibles(self):
+        """Lignes du périmètre de l'utilisateur (core.synchro.employeurs_visibles)."""
+        queryset = self.queryset.all()
+        employeurs = synchro.employeurs_visibles(self.request.user)
+        if employeurs is not None:
+            queryset = queryset.filter(**{f'{self.employeur}__in': employeurs.values('pk')})
+        return queryset
+
+    def get_queryset(self):
+        queryset = self.visibles()
+        for filtre in self.filtres:
+            valeur = self.request.query_params.get(filtre)
+            if valeur not in (None, ''):
+                queryset = queryset.filter(**{filtre: valeur})
+        champs = self.champs_demandes()
+        relations = {
+            relation for champ, relation in self.get_serializer_class().relations.items()
+            if champs is None or champ in champs
+        }
+        return queryset.select_related(*relations) if relations else queryset
+
+    # --- Écriture unitaire ----------------------------------------------------
+
+    def valeurs_creation(self):
+        """Champs fixés par le serveur à la création (auteur, ...)."""
+        return {}
+
+    def perform_create(self, serializer):
+        serializer.save(**self.valeurs_creation())
+
+    def preparer_lot(self, objets):
+        """Complète les objets avant bulk_create (numérotation, ...)."""
+
+    def rafraichir_lot(self, objets):
+        """Recalcule les tables dérivées après un bulk_create."""
+
+    # --- Lots ---------------------------------------------------------------------
+
+    @action(detail=False, methods=['post', 'patch'], url_path='lot')
+    def lot(self, request):
+        enregistrements = request.data
+        if not isinstance(enregistrements, list):
+            raise ValidationError("Le lot doit être une liste d'enregistrements.")
+        if len(enregistrements) > TAILLE_LOT_MAX:
+            raise ValidationError(f"Lot limité à {TAILLE_LOT_MAX} enregistrements.")
+        if request.method == 'PATCH':
+            return self.modifier_lot(enregistrements)
+        return self.creer_lot(enregistrements)
+
+    def _contexte_lot(self, enregistrements):
+        """Contexte des sérialiseurs du lot, avec toutes les clés étrangères chargées d'avance."""
+        classe = self.get_serializer_class()
+        relations = {}
+        for nom, champ in classe(context=self.get_serializer_context()).fields.items():
+            if not isinstance(champ, RelationPk) or champ.read_only:
+                continue
+            modele = champ.queryset.model
+            valeurs = set()
+            for enregistrement in enregistrements:
+                valeur = enregistrement.get(nom) if isinstance(enregistrement, dict) else None
+                try:
+                    valeurs.add(modele._meta.pk.to_python(valeur))
+                except Exception:
+                    pass  # Valeur invalide : l'erreur sera rapportée par le sérialiseur
+            valeurs.discard(None)
+            cache = relations.setdefault(modele, {})
+            valeurs = sorted(valeurs - cache.keys())
+            for debut in range(0, len(valeurs), TAILLE_REQUETE):
+                cache.update(champ.get_queryset().in_bulk(valeurs[debut:debut + TAILLE_REQUETE]))
+        return {**self.get_serializer_context(), 'lot': True, 'relations': relations}
+
+    def _controler_unicite(self, valides, erreurs, instances=None):
+        """Signale les doublons du lot et les valeurs déjà prises, en une requête par contrainte."""
+        modele = self.queryset.model
+        contraintes = [(f.name,) for f in modele._meta.fields if f.unique and not f.primary_key]
+        contraintes += [tuple(u) for u in modele._meta.unique_together] + list(self.unicite)
+        for champs in contraintes:
+            colonnes = [modele._meta.get_field(c).attname for c in champs]
+            cles = {}
+            for index, serializer in valides:
+                if index in erreurs:
+                    continue
+                donnees = serializer.validated_data
+                if not any(c in donnees for c in champs):
+                    continue
+                instance = instances.get(index) if instances else None
+                cle = tuple(
+                    _cle(donnees[c]) if c in donnees else getattr(instance, a, None)
+                    for c, a in zip(champs, colonnes)
+                )
+                if any(v in (None, '') for v in cle):
+                    continue
+                nom = champs[0] if len(champs) == 1 else 'non_field_errors'
+                if cle in cles:
+                    erreurs[index] = {nom: ["Valeur en double dans le lot."]}
+                else:
+                    cles[cle] = index
+            if not cles:
+                continue
+            liste = list(cles)
+            for debut in range(0, len(liste), TAILLE_REQUETE):
+                paquet = liste[debut:debut + TAILLE_REQUETE]
+                filtre = Q()
+                for cle in paquet:
+                    filtre |= Q(**dict(zip(colonnes, cle)))
+                for *cle, pk in modele.objects.filter(filtre).values_list(*colonnes, 'pk'):
+                    index = cles.get(tuple(cle))
+                    instance = instances.get(index) if instances else None
+                    if index is not None and (instance is None or instance.pk != pk):
+                        nom = champs[0] if len(champs) == 1 else 'non_field_errors'
+                        erreurs[index] = {nom: ["Cette valeur est déjà utilisée."]}
+
+    def creer_lot(self, enregistrements):
+        contexte = self._contexte_lot(enregistrements)
+        classe = self.get_serializer_class()
+        erreurs, valides = {}, []
+        for index, donnees in enumerate(enregistrements):
+            serializer = classe(data=donnees, context=contexte)
+            if serializer.is_valid():
+                valides.append((index, serializer))
+            else:
+                erreurs[index] = serializer.errors
+        self._controler_unicite(valides, erreurs)
+
+        modele = self.queryset.model
+        crees = [
+            (index, modele(**serializer.validated_data, **self.valeurs_creation()))
+            for index, serializer in valides if index not in erreurs
+        ]
+        objets = [objet for _, objet in crees]
+        try:
+            with transaction.atomic():
+                self.preparer_lot(objets)
+                if modele in synchro.PAR_MODELE:
+                    synchro.versionner(objets)
+                modele.objects.bulk_create(objets, batch_size=TAILLE_REQUETE)
+                self.rafraichir_lot(objets)
+        except IntegrityError:
+            # Écriture concurrente entre le contrôle et l'insertion : rien n'a été créé
+            return Response({'detail': "Conflit avec une écriture concurrente, renvoyer le lot."},
+                            status=status.HTTP_409_CONFLICT)
+        return Response(
+            {
+                'crees': [{'index': index, 'id': objet.pk} for index, objet in crees],
+                'erreurs': [{'index': index, 'erreurs': e} for index, e in sorted(erreurs.items())],
+            },
+            status=status.HTTP_201_CREATED if crees else status.HTTP_400_BAD_REQUEST,
+        )
+
+    def modifier_lot(self, enregistrements):
+        contexte = self._contexte_lot(enregistrements)
+        classe = self.get_serializer_class()
+        ids = [_entier(e.get('id')) if isinstance(e, dict) else None for e in enregistrements]
+        existants = self.visibles().in_bulk({i for i in ids if i is not None})
+        erreurs, valides, instances = {}, [], {}
+        for index, donnees in enumerate(enregistrements):
+            instance = existants.get(ids[index])
+            if instance is None:
+                erreurs[index] = {'id': ["Identifiant absent ou inconnu."]}
+                continue
+            serializer = classe(instance, data=donnees, partial=True, context=contexte)
+            if serializer.is_valid():
+                valides.append((index, serializer))
+                instances[index] = instance
+            else:
+                erreurs[index] = serializer.errors
+        self._controler_unicite(valides, erreurs, instances)
+
+        modifies = []
+        with transaction.atomic():
+            for index, serializer in valides:
+                if index in erreurs:
+                    continue
+                try:
+                    with transaction.atomic():
+                        serializer.save()
+                except IntegrityError as exc:
+                    erreurs[index] = {'non_field_errors': [str(exc)]}
+                else:
+                    modifies.append(index)
+            self.rafraichir_modifications([instances[i] for i in modifies])
+        return Response(
+            {
+                'modifies': [{'index': index, 'id': instances[index].pk} for index in modifies],
+                'erreurs': [{'index': index, 'erreurs': e} for index, e in sorted(erreurs.items())],
+            },
+            status=status.HTTP_200_OK if modifies else status.HTTP_400_BAD_REQUEST,
+        )
+
+    def rafraichir_modifications(self, objets):
+        """Après des modifications unitaires : les signaux suffisent en général."""
+
+
+class EmployeurViewSet(ModeleViewSet):
+    queryset = Employeur.objects.all()
+    serializer_class = EmployeurSerializer
+    filtres = ('statut', 'region', 'secteur_activite', 'agent')
+    employeur = 'pk'
+
+    def valeurs_creation(self):
+        return {'agent': self.request.user}
+
+    def preparer_lot(self, objets):
+        # Pas de matricule : il est attribué à la validation (core.validation)
+        for employeur in objets:
+            employeur.geohash = geo.encoder(employeur.latitude, employeur.longitude)
+
+    def rafraichir_lot(self, objets):
+        kpi.recalculer_cellules(
+            {(kpi.mois_de(e.date_creation), e.region_id) for e in objets},
+            kpi.METRIQUES_PAR_MODELE[Employeur],
+        )
+
+    # --- Carte (core/geo.py) ----------------------------------------------------------
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        arrieres_ = self.request.query_params.get('arrieres')
+        if arrieres_ == '1':
+            queryset = queryset.filter(arriere__montant_du__gt=0)
+        elif arrieres_ == '0':
+            queryset = queryset.exclude(arriere__montant_du__gt=0)
+        return queryset
+
+    @action(detail=False, url_path='proches')
+    def proches(self, request):
+        """Employeurs à moins de `rayon` km (5 par défaut) de `position` = lat,lon."""
+        latitude, longitude = _reels(request.query_params.get('position'), 2, 'position')
+        rayon = _reels(request.query_params.get('rayon', 5), 1, 'rayon')[0]
+        if not 0 < rayon <= RAYON_MAX_KM:
+            raise ValidationError({'rayon': [f"Rayon compris entre 0 et {RAYON_MAX_KM} km."]})
+        trouves = geo.dans_rayon(self.get_queryset(), latitude, longitude, rayon)
+        donnees = self.get_serializer([e for e, _ in trouves[:LIMITE_CARTE]], many=True).data
+        for ligne, (_, distance) in zip(donnees, trouves):
+            ligne['distance_km'] = round(distance, 3)
+        return Response({'resultats': donnees, 'tronque': len(trouves) > LIMITE_CARTE})
+
+    @action(detail=False, url_path='cadre')
+    def cadre(self, request):
+        """Employeurs situés dans `bbox` = ouest,sud,est,nord (filtres ?statut=, ?arrieres=1...)."""
+        ouest, sud, est, nord = _reels(request.query_params.get('bbox'), 4, 'bbox')
+        if sud > nord or ouest > est:
+            raise ValidationError({'bbox': ["Cadre attendu sous la forme ouest,sud,est,nord."]})
+        trouves = list(self.get_queryset().filter(geo.filtre_cadre(sud, ouest, nord, est)).order_by('pk')[:LIMITE_CARTE + 1])
+        donnees = self.get_serializer(trouves[:LIMITE_CARTE], many=True).data
+        return Response({'resultats': donnees, 'tronque': len(trouves) > LIMITE_CARTE})
+
+
+class AssureViewSet(ModeleViewSet):
+    queryset = Assure.objects.all()
+    serializer_class = AssureSerializer
+    filtres = ('employeur', 'type_assure', 'est_actif')
+
+    def preparer_lot(self, objets):
+        numeroter(objets, 'numero_assure', 'ASS')
+        # bulk_create n'appelle pas save() : clés de blocage des doublons (core.doublons)
+        for assure in objets:
+            assure.calculer_cles()
+
+    def rafraichir_lot(self, objets):
+        kpi.recalculer_cellules(
+            {(kpi.mois_de(a.date_affiliation), a.employeur.region_id if a.employeur else None) for a in objets},
+            kpi.METRIQUES_PAR_MODELE[Assure],
+        )
+
+
+class DeclarationViewSet(ModeleViewSet):
+    queryset = Declaration.objects.all()
+    serializer_class = DeclarationSerializer
+    filtres = ('employeur', 'periode', 'statut')
+
+    def valeurs_creation(self):
+        return {'created_by': self.request.user}
+
+    def rafraichir_lot(self, objets):
+        declarations = Declaration.objects.filter(pk__in=[d.pk for d in objets])
+        kpi.recalculer_declarations(declarations)
+        arrieres.recalculer_declarations(declarations)
+
+
+class LigneDeclarationViewSet(ModeleViewSet):
+    queryset = LigneDeclaration.objects.all()
+    serializer_class = LigneDeclarationSerializer
+    filtres = ('declaration', 'assure')
+    unicite = (('declaration', 'assure'),)
+    employeur = 'declaration__employeur'
+
+    def valeurs_creation(self):
+        # Provisoire : les cotisations sont calculées par le barème après l'écriture
+        return dict.fromkeys(COLONNES_COTISATIONS, Decimal('0'))
+
+    def _recalculer(self, declaration_ids):
+        # Cotisations par le barème, puis totaux, KPI et arriérés
+        cotisations.recalculer(Declaration.objects.filter(pk__in=set(declaration_ids)))
+
+    def perform_create(self, serializer):
+        ligne = serializer.save()
+        self._recalculer([ligne.declaration_id])
+
+    def perform_update(self, serializer):
+        ligne = serializer.save()
+        self._recalculer([ligne.declaration_id])
+
+    def rafraichir_lot(self, objets):
+        self._recalculer(l.declaration_id for l in objets)
+
+    def rafraichir_modifications(self, objets):
+        self._recalculer(l.declaration_id for l in objets)
+
+
+class PaiementViewSet(ModeleViewSet):
+    queryset = Paiement.objects.all()
+    serializer_class = PaiementSerializer
+    filtres = ('declaration', 'statut', 'mode_paiement')
+    employeur = 'declaration__employeur'
+
+    def valeurs_creation(self):
+        return {'enregistre_par': self.request.user}
+
+    def preparer_lot(self, objets):
+        numeroter(objets, 'reference', 'PAY')
+
+    def rafraichir_lot(self, objets):
+        declarations = Declaration.objects.filter(pk__in={p.declaration_id for p in objets})
+        kpi.recalculer_cellules(kpi.cellules_declarations(declarations), kpi.METRIQUES_PAR_MODELE[Paiement])
+        arrieres.recalculer_declarations(declarations)
+
+
+@api_view(['GET', 'POST'])
+def synchroniser(request):
+    """Synchronisation des appareils hors ligne (voir core/synchro.py)."""
+    if request.method == 'POST':
+        modifications = request.data.get('modifications') if isinstance(request.data, dict) else None
+        if not isinstance(modifications, list):
+            raise ValidationError("« modifications » doit être une liste.")
+        if len(modifications) > synchro.MODIFICATIONS_MAX:
+            raise ValidationError(f"Lot limité à {synchro.MODIFICATIONS_MAX} modifications.")
+        return Response(synchro.appliquer(request.user, modifications, request))
+
+    taille = _entier(request.query_params.get('taille', synchro.TAILLE_PAR_DEFAUT))
+    if taille is None:
+        raise ValidationError("« taille » doit être un entier.")
+    try:
+        return Response(synchro.changements(request.user, request.query_params.get('jeton'), taille, request))
+    except synchro.ErreurJeton as exc:
+        raise ValidationError(str(exc))
+
+
+def _visite(action_):
+    employeur = action_.employeur
+    return {
+        'id': action_.pk,
+        'employeur': employeur.pk,
+        'raison_sociale': employeur.raison_sociale,
+        'latitude': employeur.latitude,
+        'longitude': employeur.longitude,
+        'date_planification': action_.date_planification,
+    }
+
+
+@api_view(['GET', 'POST'])
+def tournee(request):
+    """Ordre conseillé des visites de contrôle planifiées (voir core/geo.py).
+
+    ?date=AAAA-MM-JJ (aujourd'hui par défaut), ?jours=1..7, ?agent= (un agent
+    ne planifie que ses propres visites), ?depart=lat,lon. En POST, les
+    visites sont replanifiées dans cet ordre sur leurs créneaux existants.
+    """
+    parametres = request.query_params.copy()
+    if isinstance(request.data, dict):
+        parametres.update(request.data)
+    try:
+        debut = date.fromisoformat(parametres.get('date')) if parametres.get('date') else timezone.localdate()
+    except (TypeError, ValueError):
+        raise ValidationError({'date': ["Date attendue au format AAAA-MM-JJ."]})
+    jours = _entier(parametres.get('jours', 1))
+    if jours is None or not 1 <= jours <= TOURNEE_JOURS_MAX:
+        raise ValidationError({'jours': [f"Nombre de jours compris entre 1 et {TOURNEE_JOURS_MAX}."]})
+    depart = tuple(_reels(parametres['depart'], 2, 'depart')) if parametres.get('depart') else None
+    agent = request.user
+    if request.user.role != 'agent' and parametres.get('agent'):
+        agent = CustomUser.objects.filter(pk=_entier(parametres['agent'])).first()
+        if agent is None:
+            raise ValidationError({'agent': ["Agent inconnu."]})
+
+    resultat = []
+    for decalage in range(jours):
+        jour = debut + timedelta(days=decalage)
+        proposee = geo.tournee(agent, jour, depart)
+        ligne = {
+            'date': jour,
+            'distance_km': proposee.distance,
+            'distance_initiale_km': proposee.distance_initiale,
+            'visites': [_visite(v) for v in proposee.visites],
+            'sans_position': [_visite(v) for v in proposee.sans_position],
+        }
+        if request.method == 'POST':
+            ligne['modifiees'] = geo.appliquer(proposee)
+            ligne['visites'] = [_visite(v) for v in proposee.visites]
+            ligne['sans_position'] = [_visite(v) for v in proposee.sans_position]
+        resultat.append(ligne)
+    return Response({'agent': agent.pk, 'jours': resultat})
+
+
+routeur = DefaultRouter()
+routeur.register('employeurs', EmployeurViewSet)
+routeur.register('assures', AssureViewSet)
+routeur.register('declarations', DeclarationViewSet)
+routeur.register('lignes-declaration', LigneDeclarationViewSet)
+routeur.register('paiements', PaiementViewSet)
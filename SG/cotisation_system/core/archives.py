@@ -0,0 +1,249 @@
+# core/archives.py
+# Clôture des exercices et archivage des périodes closes.
+#
+# LigneDeclaration prend une ligne par salarié, par employeur et par mois : les
+# tables actives ne gardent que les exercices en cours, pour que leurs index et
+# leurs pages utiles tiennent en mémoire. Clôturer un exercice (année civile
+# des périodes de déclaration) déplace ses déclarations définitives (rejetées,
+# ou validées et soldées, sans paiement en attente) avec leurs lignes et leurs
+# paiements dans les tables *Archive. Le déplacement se fait par paquets de
+# TAILLE_PAQUET déclarations, une transaction par paquet, en INSERT ... SELECT
+# puis DELETE : ni objets Python, ni signaux. Chaque paquet ajoute ses totaux
+# au bilan annuel de ses employeurs (BilanAnnuelEmployeur) et laisse des
+# pierres tombales pour les appareils synchronisés (core.synchro).
+#
+# Les déclarations encore ouvertes (brouillon, soumise, impayée, paiement en
+# attente) restent actives : arriérés et recouvrement continuent de les voir.
+# Relancer la clôture d'un exercice archive celles qui ont été soldées depuis.
+# Aucune nouvelle déclaration ne peut porter sur un exercice clos.
+#
+# Les requêtes qui demandent l'historique lisent les modèles *Historique (vues
+# SQL réunissant tables actives et archives) : listes et exports avec
+# ?historique=1, quittances d'une période close, KPI des mois clos (core.kpi).
+from collections import Counter
+from datetime import date
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Exists, F, Max, Min, OuterRef, Q, Sum
+from django.utils import timezone
+
+from . import arrieres, synchro
+from .models import (
+    BilanAnnuelEmployeur, Declaration, DeclarationArchive, ExerciceClos, LigneDeclaration, LigneDeclarationArchive,
+    Paiement, PaiementArchive,
+)
+from .sequences import nouvelle_version
+
+TAILLE_PAQUET = 200
+CLE_CACHE = 'archives:annee_close'
+
+
+class ErreurCloture(ValueError):
+    """Exercice qui ne peut pas (encore) être clôturé."""
+
+
+def _bornes(annee):
+    return date(annee, 1, 1), date(annee + 1, 1, 1)
+
+
+def annee_close():
+    """Dernier exercice clos (0 si aucun), gardé en cache.
+
+    Les exercices se clôturent dans l'ordre : toute période d'une année
+    inférieure ou égale est close.
+    """
+    annee = cache.get(CLE_CACHE)
+    if annee is None:
+        annee = ExerciceClos.objects.aggregate(annee=Max('annee'))['annee'] or 0
+        cache.set(CLE_CACHE, annee, None)
+    return annee
+
+
+def est_close(periode):
+    """Vrai si la période (date) appartient à un exercice clos."""
+    return periode.year <= annee_close()
+
+
+def archivables(annee):
+    """Déclarations définitives de l'exercice encore présentes dans les tables actives."""
+    debut, fin = _bornes(annee)
+    en_attente = Paiement.objects.filter(declaration=OuterRef('pk'), statut='initie')
+    return (
+        Declaration.objects.filter(periode__gte=debut, periode__lt=fin)
+        .annotate(paye=arrieres.paye_confirme())
+        .filter(Q(statut='rejete') | Q(statut='valide', montant_total_cotisations__lte=F('paye')))
+        .exclude(Exists(en_attente))
+    )
+
+
+def verifier(annee, aujourd_hui=None):
+    """Lève ErreurCloture si l'exercice ne peut pas être clôturé."""
+    aujourd_hui = aujourd_hui or timezone.localdate()
+    if annee >= aujourd_hui.year:
+        raise ErreurCloture(f"L'exercice {annee} n'est pas terminé.")
+    derniere = ExerciceClos.objects.aggregate(annee=Max('annee'))['annee'] or 0
+    if annee <= derniere:
+        return
+    # Exercice antérieur ayant des déclarations et pas encore clos
+    anterieure = Declaration.objects.filter(
+        periode__gte=date(derniere + 1, 1, 1) if derniere else date.min, periode__lt=_bornes(annee)[0],
+    ).aggregate(periode=Min('periode'))['periode']
+    if anterieure is not None:
+        raise ErreurCloture(f"Clôturer d'abord l'exercice {anterieure.year}.")
+
+
+def _colonnes(modele):
+    return ', '.join(connection.ops.quote_name(f.column) for f in modele._meta.concrete_fields)
+
+
+def _copier(source, archive, champ, ids):
+    # Les tables d'archive ont les colonnes de la table active, mêmes id compris
+    colonnes = _colonnes(archive)
+    sql = 'INSERT INTO {} ({}) SELECT {} FROM {} WHERE {} IN ({})'.format(
+        connection.ops.quote_name(archive._meta.db_table), colonnes, colonnes,
+        connection.ops.quote_name(source._meta.db_table),
+        connection.ops.quote_name(source._meta.get_field(champ).column),
+        ', '.join(['%s'] * len(ids)),
+    )
+    with connection.cursor() as curseur:
+        curseur.execute(sql, ids)
+        return curseur.rowcount
+
+
+def _supprimer(modele, champ, ids):
+    # DELETE direct : le collecteur de QuerySet.delete() chargerait chaque
+    # ligne et déclencherait les signaux (KPI, arriérés, fichiers) un par un
+    sql = 'DELETE FROM {} WHERE {} IN ({})'.format(
+        connection.ops.quote_name(modele._meta.db_table),
+        connection.ops.quote_name(modele._meta.get_field(champ).column),
+        ', '.join(['%s'] * len(ids)),
+    )
+    with connection.cursor() as curseur:
+        curseur.execute(sql, ids)
+        return curseur.rowcount
+
+
+def _totaux(ids):
+    """Totaux par employeur des déclarations `ids`, lus avant leur déplacement."""
+    totaux = {}
+
+    def ajouter(lignes, cle):
+        for ligne in lignes:
+            totaux.setdefault(ligne.pop(cle), {}).update(ligne)
+
+    ajouter(
+        Declaration.objects.filter(pk__in=ids).values('employeur_id').annotate(
+            nb_declarations=Count('pk'),
+            montant_declare=Sum('montant_total_cotisations', filter=Q(statut='valide')),
+        ).order_by(),
+        'employeur_id',
+    )
+    ajouter(
+        LigneDeclaration.objects.filter(declaration_id__in=ids).values('declaration__employeur_id')
+        .annotate(nb_lignes=Count('pk')).order_by(),
+        'declaration__employeur_id',
+    )
+    ajouter(
+        Paiement.objects.filter(declaration_id__in=ids, statut='confirme').values('declaration__employeur_id')
+        .annotate(nb_paiements=Count('pk'), montant_paye=Sum('montant')).order_by(),
+        'declaration__employeur_id',
+    )
+    return totaux
+
+
+def _cumuler_bilans(annee, totaux):
+    existants = {
+        b.employeur_id: b
+        for b in BilanAnnuelEmployeur.objects.filter(annee=annee, employeur_id__in=totaux)
+    }
+    champs = ('nb_declarations', 'nb_lignes', 'montant_declare', 'nb_paiements', 'montant_paye')
+    maintenant = timezone.now()
+    nouveaux = []
+    for employeur_id, valeurs in totaux.items():
+        bilan = existants.get(employeur_id)
+        if bilan is None:
+            bilan = BilanAnnuelEmployeur(employeur_id=employeur_id, annee=annee)
+            nouveaux.append(bilan)
+        for champ in champs:
+            ajout = valeurs.get(champ) or (Decimal('0') if champ.startswith('montant') else 0)
+            setattr(bilan, champ, getattr(bilan, champ) + ajout)
+        bilan.updated_at = maintenant
+    BilanAnnuelEmployeur.objects.bulk_update(existants.values(), [*champs, 'updated_at'], batch_size=500)
+    BilanAnnuelEmployeur.objects.bulk_create(nouveaux, batch_size=500)
+
+
+def _deplacer(exercice, ids):
+    """Archive un paquet de déclarations ; à appeler dans sa transaction."""
+    totaux = _totaux(ids)
+    paiements = list(Paiement.objects.filter(declaration_id__in=ids).values_list('pk', flat=True))
+
+    compte = Counter()
+    compte['declarations'] = _copier(Declaration, DeclarationArchive, 'id', ids)
+    compte['lignes'] = _copier(LigneDeclaration, LigneDeclarationArchive, 'declaration', ids)
+    compte['paiements'] = _copier(Paiement, PaiementArchive, 'declaration', ids)
+    _supprimer(Paiement, 'declaration', ids)
+    _supprimer(LigneDeclaration, 'declaration', ids)
+    _supprimer(Declaration, 'id', ids)
+
+    _cumuler_bilans(exercice.annee, totaux)
+    version = nouvelle_version()
+    synchro.enterrer_lot(Declaration, ids, version)
+    synchro.enterrer_lot(Paiement, paiements, version)
+    # Le solde des employeurs ne change pas, mais leurs totaux déclarés et payés si
+    arrieres.recalculer_employeurs(totaux)
+    ExerciceClos.objects.filter(pk=exercice.pk).update(
+        declarations_archivees=F('declarations_archivees') + compte['declarations'],
+        lignes_archivees=F('lignes_archivees') + compte['lignes'],
+        paiements_archives=F('paiements_archives') + compte['paiements'],
+    )
+    return compte
+
+
+def simuler(annee):
+    """Ce que la clôture archiverait, sans rien modifier."""
+    verifier(annee)
+    debut, fin = _bornes(annee)
+    declarations = archivables(annee).values('pk')
+    compte = Counter(
+        declarations=declarations.count(),
+        lignes=LigneDeclaration.objects.filter(declaration__in=declarations).count(),
+        paiements=Paiement.objects.filter(declaration__in=declarations).count(),
+    )
+    compte['ouvertes'] = Declaration.objects.filter(periode__gte=debut, periode__lt=fin).count() - compte['declarations']
+    return compte
+
+
+def cloturer(annee, utilisateur=None, taille=TAILLE_PAQUET):
+    """Clôture l'exercice `annee` (ou reprend sa clôture) ; renvoie un Counter.
+
+    L'exercice est marqué clos avant le premier paquet : aucune déclaration ne
+    peut plus y être créée pendant le déplacement. Un paquet interrompu est
+    annulé en entier ; relancer la clôture reprend où elle s'est arrêtée.
+    """
+    verifier(annee)
+    exercice, _ = ExerciceClos.objects.get_or_create(annee=annee, defaults={'clos_par': utilisateur})
+    cache.delete(CLE_CACHE)
+
+    compte = Counter()
+    dernier = 0
+    while True:
+        with transaction.atomic():
+            # Sélection refaite dans la transaction du paquet : une déclaration
+            # payée ou modifiée entre-temps est réévaluée
+            ids = list(
+                archivables(annee).filter(pk__gt=dernier).order_by('pk').values_list('pk', flat=True)[:taille]
+            )
+            if not ids:
+                break
+            compte.update(_deplacer(exercice, ids))
+        dernier = ids[-1]
+
+    debut, fin = _bornes(annee)
+    compte['ouvertes'] = Declaration.objects.filter(periode__gte=debut, periode__lt=fin).count()
+    ExerciceClos.objects.filter(pk=exercice.pk).update(
+        date_cloture=timezone.now(), clos_par=utilisateur or exercice.clos_par,
+        declarations_ouvertes=compte['ouvertes'],
+    )
+    return compte
@@ -0,0 +1,156 @@
+# core/arrieres.py
+# Calcul des arriérés de cotisations par employeur et maintenance de la table
+# ArriereEmployeur.
+#
+# Le montant dû d'un employeur est la somme de ses déclarations validées moins
+# les paiements confirmés rattachés à ces déclarations. Une déclaration est
+# impayée tant que ses paiements confirmés ne couvrent pas son montant. Tout
+# est calculé par une seule requête groupée par employeur, restreinte ou non à
+# une liste d'employeurs.
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Min, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ArriereEmployeur, Declaration, Paiement
+
+TAILLE_PAQUET = 500
+CHAMPS = ('montant_declare', 'montant_paye', 'montant_du', 'plus_ancienne_periode', 'nb_periodes_impayees')
+
+# Tranches d'ancienneté de la plus ancienne période impayée, en mois révolus
+TRANCHES = (
+    ('0-3', 'Moins de 3 mois', 0, 3),
+    ('3-6', '3 à 6 mois', 3, 6),
+    ('6-12', '6 à 12 mois', 6, 12),
+    ('12+', "Plus d'un an", 12, None),
+)
+
+
+def _zero():
+    return Value(Decimal('0'), output_field=DecimalField(max_digits=17, decimal_places=2))
+
+
+def paye_confirme(declaration='pk', modele=Paiement):
+    """Expression : total des paiements confirmés de la déclaration courante (OuterRef).
+
+    `declaration` est le champ de la requête englobante qui désigne la déclaration ;
+    `modele` vaut PaiementHistorique pour compter aussi les paiements archivés.
+    """
+    total = (
+        modele.objects.filter(declaration=OuterRef(declaration), statut='confirme')
+        .order_by()
+        .values('declaration')
+        .annotate(total=Sum('montant'))
+        .values('total')
+    )
+    return Coalesce(Subquery(total), _zero())
+
+
+def calculer(employeur_ids=None):
+    """Renvoie {employeur_id: {champ: valeur}} pour les employeurs débiteurs."""
+    declarations = Declaration.objects.filter(statut='valide')
+    if employeur_ids is not None:
+        declarations = declarations.filter(employeur_id__in=employeur_ids)
+    impayee = Q(montant_total_cotisations__gt=F('paye'))
+    lignes = (
+        declarations
+        .annotate(paye=paye_confirme())
+        .values('employeur_id')
+        .annotate(
+            montant_declare=Sum('montant_total_cotisations'),
+            montant_paye=Sum('paye'),
+            plus_ancienne_periode=Min('periode', filter=impayee),
+            nb_periodes_impayees=Count('pk', filter=impayee),
+        )
+        .filter(montant_declare__gt=F('montant_paye'))
+        .order_by()
+    )
+    resultat = {}
+    for ligne in lignes:
+        employeur_id = ligne.pop('employeur_id')
+        ligne['montant_du'] = ligne['montant_declare'] - ligne['montant_paye']
+        resultat[employeur_id] = ligne
+    return resultat
+
+
+def recalculer_employeurs(employeur_ids):
+    """Met à jour les lignes d'arriérés d'un ensemble d'employeurs.
+
+    Un seul employeur (cas des signaux) : mise à jour en place. Au-delà, les
+    lignes sont supprimées puis recréées par paquets.
+    """
+    employeur_ids = {e for e in employeur_ids if e is not None}
+    if len(employeur_ids) == 1:
+        soldes = calculer(employeur_ids)
+        with transaction.atomic():
+            ArriereEmployeur.objects.filter(employeur_id__in=employeur_ids - soldes.keys()).delete()
+            for employeur_id, valeurs in soldes.items():
+                ArriereEmployeur.objects.update_or_create(employeur_id=employeur_id, defaults=valeurs)
+        return
+    with transaction.atomic():
+        for paquet in _paquets(employeur_ids):
+            soldes = calculer(paquet)
+            ArriereEmployeur.objects.filter(employeur_id__in=paquet).delete()
+            ArriereEmployeur.objects.bulk_create(
+                [ArriereEmployeur(employeur_id=e, **valeurs) for e, valeurs in soldes.items()],
+                batch_size=500,
+            )
+
+
+def _paquets(ids, taille=TAILLE_PAQUET):
+    ids = sorted(ids)
+    for debut in range(0, len(ids), taille):
+        yield ids[debut:debut + taille]
+
+
+def recalculer_declarations(declarations):
+    """À appeler après une mise à jour en masse de déclarations (update, import)."""
+    recalculer_employeurs(set(declarations.order_by().values_list('employeur_id', flat=True).distinct()))
+
+
+def reconstruire():
+    """Reconstruit entièrement la table ; renvoie le nombre d'employeurs débiteurs."""
+    soldes = calculer()
+    with transaction.atomic():
+        ArriereEmployeur.objects.all().delete()
+        ArriereEmployeur.objects.bulk_create(
+            [ArriereEmployeur(employeur_id=e, **valeurs) for e, valeurs in soldes.items()],
+            batch_size=500,
+        )
+    return len(soldes)
+
+
+def verifier():
+    """Compare la table au calcul et renvoie [(employeur_id, champ, stocké, attendu)]."""
+    attendu = calculer()
+    stockes = {
+        a['employeur_id']: a
+        for a in ArriereEmployeur.objects.values('employeur_id', *CHAMPS)
+    }
+    ecarts = []
+    for employeur_id in sorted(attendu.keys() | stockes.keys()):
+        valeurs, ligne = attendu.get(employeur_id, {}), stockes.get(employeur_id, {})
+        for champ in CHAMPS:
+            if ligne.get(champ) != valeurs.get(champ):
+                ecarts.append((employeur_id, champ, ligne.get(champ), valeurs.get(champ)))
+    return ecarts
+
+
+def _mois_avant(mois, n):
+    total = mois.year * 12 + mois.month - 1 - n
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def filtre_tranche(code, aujourd_hui=None):
+    """Q sur plus_ancienne_periode pour une tranche d'ancienneté (None si code inconnu)."""
+    mois = (aujourd_hui or timezone.localdate()).replace(day=1)
+    for valeur, _, debut, fin in TRANCHES:
+        if valeur == code:
+            q = Q(plus_ancienne_periode__lte=_mois_avant(mois, debut))
+            if fin is not None:
+                q &= Q(plus_ancienne_periode__gt=_mois_avant(mois, fin))
+            return q
+    return None
@@ -0,0 +1,174 @@
+# core/campagnes.py
+# Campagne mensuelle de recouvrement : création automatique des actions
+# (relance, mise en demeure, visite) pour les employeurs défaillants.
+#
+# Pour une période P (le mois écoulé par défaut), est défaillant tout
+# employeur validé avant la fin de P qui n'a pas de déclaration validée pour
+# P, ou dont la plus ancienne période impayée (table ArriereEmployeur) est
+# antérieure ou égale à P. Tout est sélectionné par une seule requête
+# (sous-requêtes EXISTS), sans parcourir les employeurs en Python.
+#
+# L'action créée dépend des actions non annulées des FENETRE_MOIS derniers
+# mois : aucune -> relance, une relance -> mise en demeure, une mise en
+# demeure ou une visite -> visite. Chaque action porte sa période de campagne
+# (ActionRecouvrement.campagne, unique par employeur) : relancer la campagne
+# de P ne crée que les actions des employeurs devenus défaillants depuis.
+#
+# Les actions sont réparties à tour de rôle entre les agents actifs de la
+# région de l'employeur, les moins chargés d'abord (à défaut, l'agent qui a
+# enregistré l'employeur), puis insérées par bulk_create. Les visites sont
+# étalées sur les jours ouvrés suivants, VISITES_PAR_JOUR par agent.
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta
+from itertools import cycle
+
+from django.db import transaction
+from django.db.models import Case, Count, Exists, IntegerField, Max, OuterRef, Q, Subquery, Value, When
+from django.utils import timezone
+
+from . import synchro
+from .models import ActionRecouvrement, CustomUser, Declaration, Employeur
+
+FENETRE_MOIS = 6
+VISITES_PAR_JOUR = 8
+HEURE_DEBUT = time(8, 0)
+DUREE_VISITE = timedelta(minutes=45)
+TAILLE_LOT = 1000
+
+# Niveau d'escalade de chaque type d'action, et action suivante
+NIVEAUX = {'relance': 1, 'mise_demeure': 2, 'visite': 3}
+SUIVANTE = {0: 'relance', 1: 'mise_demeure', 2: 'visite', 3: 'visite'}
+
+
+def _decaler(mois, n):
+    """Premier jour du mois situé n mois après (ou avant) `mois`."""
+    total = mois.year * 12 + mois.month - 1 + n
+    return mois.replace(year=total // 12, month=total % 12 + 1, day=1)
+
+
+def periode_par_defaut(jour=None):
+    """Période de la campagne : le mois précédant `jour` (aujourd'hui par défaut)."""
+    return _decaler((jour or timezone.localdate()).replace(day=1), -1)
+
+
+def defaillants(periode):
+    """Employeurs défaillants pour `periode` et pas encore traités par sa campagne.
+
+    Une ligne (dict) par employeur : pk, region_id, agent_id, niveau
+    d'escalade atteint, déclaration manquante, arriéré.
+    """
+    fin = timezone.make_aware(datetime.combine(_decaler(periode, 1), time.min))
+    debut_fenetre = timezone.make_aware(datetime.combine(_decaler(periode, -FENETRE_MOIS + 1), time.min))
+    declaree = Declaration.objects.filter(employeur=OuterRef('pk'), periode=periode, statut='valide')
+    deja_traite = ActionRecouvrement.objects.filter(employeur=OuterRef('pk'), campagne=periode)
+    niveau = (
+        ActionRecouvrement.objects.filter(employeur=OuterRef('pk'), date_planification__gte=debut_fenetre)
+        .exclude(statut='annulee')
+        .order_by()
+        .values('employeur')
+        .annotate(niveau=Max(Case(
+            *(When(type_action=type_, then=Value(n)) for type_, n in NIVEAUX.items()),
+            default=Value(0), output_field=IntegerField(),
+        )))
+        .values('niveau')
+    )
+    en_arriere = Q(arriere__montant_du__gt=0, arriere__plus_ancienne_periode__lte=periode)
+    return (
+        Employeur.objects.filter(statut='valide')
+        .filter(Q(date_validation__lt=fin) | Q(date_validation=None, date_creation__lt=fin))
+        .annotate(declaree=Exists(declaree), niveau=Subquery(niveau))
+        .filter(Q(declaree=False) | en_arriere)
+        .exclude(Exists(deja_traite))
+        .order_by('region_id', 'pk')
+        .values(
+            'pk', 'region_id', 'agent_id', 'niveau', 'declaree',
+            'arriere__montant_du', 'arriere__nb_periodes_impayees', 'arriere__plus_ancienne_periode',
+        )
+    )
+
+
+def _agents_par_region():
+    """{region_id: [agent_id, ...]} : agents actifs, les moins chargés d'abord."""
+    agents = (
+        CustomUser.objects.filter(role='agent', is_active=True, region__isnull=False)
+        .annotate(charge=Count('actions_recouvrement', filter=Q(actions_recouvrement__statut__in=['planifiee', 'en_cours'])))
+        .order_by('region_id', 'charge', 'pk')
+        .values_list('region_id', 'pk')
+    )
+    resultat = defaultdict(list)
+    for region_id, agent_id in agents:
+        resultat[region_id].append(agent_id)
+    return resultat
+
+
+def _jour_ouvre(depart, n):
+    """n-ième jour ouvré (lundi à vendredi) à partir de `depart` inclus, n >= 0."""
+    jour = depart
+    while jour.weekday() >= 5:
+        jour += timedelta(days=1)
+    for _ in range(n):
+        jour += timedelta(days=1)
+        while jour.weekday() >= 5:
+            jour += timedelta(days=1)
+    return jour
+
+
+def _observations(ligne, periode):
+    motifs = []
+    if not ligne['declaree']:
+        motifs.append(f"déclaration de {periode:%m/%Y} non validée")
+    if (ligne['arriere__montant_du'] or 0) > 0 and ligne['arriere__plus_ancienne_periode'] <= periode:
+        motifs.append(
+            f"arriéré de {ligne['arriere__montant_du']:.0f} FCFA sur {ligne['arriere__nb_periodes_impayees']} "
+            f"période(s) depuis {ligne['arriere__plus_ancienne_periode']:%m/%Y}"
+        )
+    return f"Campagne de recouvrement {periode:%m/%Y} : {' ; '.join(motifs)}."
+
+
+def preparer(periode, debut=None):
+    """Actions (non enregistrées) de la campagne de `periode`, planifiées à partir de `debut`."""
+    debut = debut or timezone.now()
+    # Visites à partir du jour même, ou du lendemain si la journée est entamée
+    premier_jour = timezone.localdate(debut)
+    if timezone.localtime(debut).time() > HEURE_DEBUT:
+        premier_jour += timedelta(days=1)
+    agents = _agents_par_region()
+    tours = {region_id: cycle(ids) for region_id, ids in agents.items()}
+    visites = Counter()  # agent -> visites déjà planifiées par la campagne
+    actions = []
+    for ligne in defaillants(periode):
+        tour = tours.get(ligne['region_id'])
+        agent_id = next(tour) if tour else ligne['agent_id']
+        type_action = SUIVANTE[ligne['niveau'] or 0]
+        planification = debut
+        if type_action == 'visite':
+            jour, rang = divmod(visites[agent_id], VISITES_PAR_JOUR)
+            jour = _jour_ouvre(premier_jour, jour)
+            planification = timezone.make_aware(datetime.combine(jour, HEURE_DEBUT)) + rang * DUREE_VISITE
+            visites[agent_id] += 1
+        actions.append(ActionRecouvrement(
+            employeur_id=ligne['pk'],
+            type_action=type_action,
+            date_planification=planification,
+            observations=_observations(ligne, periode),
+            agent_id=agent_id,
+            campagne=periode,
+        ))
+    return actions
+
+
+def lancer(periode=None, debut=None, simuler=False):
+    """Crée les actions de la campagne ; renvoie le nombre d'actions par type.
+
+    Idempotente : les employeurs déjà traités pour la période sont exclus, et
+    la contrainte (employeur, campagne) écarte les doublons d'une exécution
+    concurrente.
+    """
+    periode = periode or periode_par_defaut()
+    actions = preparer(periode, debut)
+    if not simuler:
+        with transaction.atomic():
+            ActionRecouvrement.objects.bulk_create(
+                synchro.versionner(actions), batch_size=TAILLE_LOT, ignore_conflicts=True,
+            )
+    return Counter(a.type_action for a in actions)
@@ -0,0 +1,129 @@
+# core/concurrence.py
+# Exécution concurrente de requêtes indépendantes pour les vues asynchrones
+# (tableau de bord, KPI), servies seulement par le profil ASGI
+# (cotisation_system/urls_asgi.py).
+#
+# L'ORM asynchrone de Django (acount, aaggregate...) passe chaque requête par
+# sync_to_async(thread_sensitive=True) : toutes les requêtes d'une vue
+# s'exécutent sur un même thread, donc l'une après l'autre, même lancées par
+# asyncio.gather. Ici, chaque agrégat indépendant s'exécute dans un thread du
+# pool avec sa propre connexion (fermée ensuite), en lecture sur l'alias de
+# reporting (core/routage.py) : les agrégats avancent réellement en
+# parallèle, la vue attend le plus lent au lieu de leur somme.
+#
+# Chaque agrégat a un délai (CONCURRENCE_DELAI, en secondes) appliqué par la
+# base elle-même : gestionnaire de progression SQLite, statement_timeout en
+# PostgreSQL. Un agrégat trop lent ou en erreur est remplacé par sa valeur
+# par défaut et la vue reçoit la liste des résultats manquants pour signaler
+# une réponse partielle.
+#
+# Dans une transaction ouverte sur la base principale (tests), les agrégats
+# restent sur la connexion courante, sans délai, un par un. C'est aussi ce
+# que font les variantes synchrones des vues (executer_en_serie) : sous WSGI,
+# une connexion par agrégat, fermée aussitôt, annulerait les connexions
+# persistantes (CONN_MAX_AGE) sans rien paralléliser.
+import asyncio
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+from . import metriques
+from .routage import LECTURE, PRINCIPALE, lecture_seule
+
+logger = logging.getLogger(__name__)
+
+# Marge laissée à la base pour interrompre la requête avant l'abandon côté Python
+MARGE = 0.5
+
+
+class Resultats(dict):
+    """Résultats par nom ; `manquants` liste les agrégats remplacés par leur valeur par défaut."""
+
+    def __init__(self, valeurs, manquants=()):
+        super().__init__(valeurs)
+        self.manquants = list(manquants)
+
+
+def delai_par_defaut():
+    return getattr(settings, 'CONCURRENCE_DELAI', 5.0)
+
+
+def _poser_delai(connexion, delai):
+    if connexion.vendor == 'sqlite':
+        limite = time.monotonic() + delai
+        # Appelé toutes les 10 000 instructions de la machine virtuelle SQLite :
+        # une valeur vraie interrompt la requête (OperationalError « interrupted »)
+        connexion.connection.set_progress_handler(lambda: time.monotonic() > limite, 10000)
+    elif connexion.vendor == 'postgresql':
+        with connexion.cursor() as curseur:
+            curseur.execute('SET statement_timeout = %s', [int(delai * 1000)])
+
+
+def _retirer_delai(connexion):
+    # Connexion rendue au pool PostgreSQL : ne pas y laisser le délai
+    if connexion.vendor == 'postgresql' and connexion.connection is not None:
+        with connexion.cursor() as curseur:
+            curseur.execute('RESET statement_timeout')
+
+
+def _executer(fonction, delai):
+    # Dans un thread du pool : connexion propre au thread, fermée à la fin
+    # (rendue au pool en PostgreSQL), requêtes mesurées par le middleware.
+    alias = LECTURE if LECTURE in connections.settings else PRINCIPALE
+    connexion = connections[alias]
+    mesure = metriques.mesure_courante()
+    try:
+        with ExitStack() as pile:
+            if mesure is not None:
+                for autre in connections.all():
+                    pile.enter_context(autre.execute_wrapper(mesure))
+            connexion.ensure_connection()
+            _poser_delai(connexion, delai)
+            try:
+                with lecture_seule():
+                    return fonction()
+            finally:
+                _retirer_delai(connexion)
+    finally:
+        connections.close_all()
+
+
+def _en_transaction():
+    return connections[PRINCIPALE].in_atomic_block
+
+
+def executer_en_serie(taches):
+    """Exécute les tâches l'une après l'autre sur la connexion courante (vues synchrones, WSGI)."""
+    return Resultats({nom: fonction() for nom, (fonction, _) in taches.items()})
+
+
+async def executer(taches, delai=None):
+    """Exécute des fonctions synchrones indépendantes en parallèle.
+
+    `taches` : {nom: (fonction sans argument, valeur par défaut)}. Renvoie un
+    objet Resultats {nom: résultat}.
+    """
+    if await sync_to_async(_en_transaction)():
+        return await sync_to_async(executer_en_serie)(taches)
+
+    delai = delai or delai_par_defaut()
+    appels = [
+        asyncio.wait_for(sync_to_async(_executer, thread_sensitive=False)(fonction, delai), delai + MARGE)
+        for fonction, _ in taches.values()
+    ]
+    sorties = await asyncio.gather(*appels, return_exceptions=True)
+    valeurs, manquants = {}, []
+    for (nom, (_, defaut)), sortie in zip(taches.items(), sorties):
+        if isinstance(sortie, (DatabaseError, TimeoutError)):
+            logger.warning("Agrégat %s abandonné (%s) : réponse partielle", nom, sortie.__class__.__name__)
+            valeurs[nom] = defaut
+            manquants.append(nom)
+        elif isinstance(sortie, BaseException):
+            raise sortie
+        else:
+            valeurs[nom] = sortie
+    return Resultats(valeurs, manquants)
@@ -0,0 +1,171 @@
+# core/cotisations.py
+# Moteur de calcul des cotisations salariales et patronales à partir du
+# salaire déclaré et de la table BaremeCotisation.
+#
+# Le calcul est vectorisé avec NumPy sur des entiers : les salaires sont
+# convertis en centimes et les taux en millièmes de pour cent, si bien que
+# chaque produit est exact. L'arrondi (au centime, demi supérieur) n'est
+# appliqué qu'une fois, sur la somme des branches, comme le ferait un calcul
+# en Decimal ligne par ligne.
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+from django.db import connection, transaction
+from django.db.models import Q
+
+from . import arrieres, kpi
+from .imports import recalculer_totaux
+from .models import BaremeCotisation, Declaration, LigneDeclaration
+
+TAILLE_PAQUET = 50000
+ECHELLE_TAUX = 1000     # taux stocké en % avec 3 décimales
+DIVISEUR = 100 * ECHELLE_TAUX  # centimes x (% x 1000) -> centimes x 100000
+SANS_PLAFOND = -1
+
+
+def _centimes(montant):
+    return int((Decimal(montant) * 100).to_integral_value())
+
+
+def baremes_applicables(periode, secteur_ids):
+    """Renvoie {secteur_id: [(plafond en centimes, taux salarial, taux patronal), ...]}.
+
+    Pour chaque code, on retient la version en vigueur à la période : celle du
+    secteur si elle existe, sinon la version générale.
+    """
+    versions = BaremeCotisation.objects.filter(
+        Q(date_fin__isnull=True) | Q(date_fin__gte=periode),
+        date_debut__lte=periode,
+    ).filter(
+        Q(secteur_activite__isnull=True) | Q(secteur_activite_id__in=set(secteur_ids))
+    ).order_by('date_debut')
+
+    generales, par_secteur = {}, {}
+    for bareme in versions:
+        # Tri par date d'effet : la version la plus récente écrase les précédentes
+        if bareme.secteur_activite_id is None:
+            generales[bareme.code] = bareme
+        else:
+            par_secteur.setdefault(bareme.secteur_activite_id, {})[bareme.code] = bareme
+
+    resultat = {}
+    for secteur_id in set(secteur_ids):
+        baremes = dict(generales, **par_secteur.get(secteur_id, {}))
+        resultat[secteur_id] = [
+            (
+                _centimes(b.plafond) if b.plafond is not None else SANS_PLAFOND,
+                int(b.taux_salarial * ECHELLE_TAUX),
+                int(b.taux_patronal * ECHELLE_TAUX),
+            )
+            for b in baremes.values()
+        ]
+    return resultat
+
+
+def calculer(salaires, secteurs, baremes):
+    """Calcule les cotisations d'un lot de lignes.
+
+    `salaires` : tableau int64 des salaires en centimes ; `secteurs` : tableau
+    des secteurs de chaque ligne ; `baremes` : résultat de baremes_applicables().
+    Renvoie deux tableaux int64 (salariale, patronale) en centimes.
+    """
+    salaires = np.asarray(salaires, dtype=np.int64)
+    secteurs = np.asarray(secteurs, dtype=np.int64)
+    salariale = np.zeros_like(salaires)
+    patronale = np.zeros_like(salaires)
+
+    for secteur_id in np.unique(secteurs):
+        masque = secteurs == secteur_id
+        base = salaires[masque]
+        sal = np.zeros_like(base)
+        pat = np.zeros_like(base)
+        for plafond, taux_salarial, taux_patronal in baremes.get(int(secteur_id), ()):
+            assiette = base if plafond == SANS_PLAFOND else np.minimum(base, plafond)
+            sal += assiette * taux_salarial
+            pat += assiette * taux_patronal
+        salariale[masque] = sal
+        patronale[masque] = pat
+
+    # Arrondi au centime, demi supérieur (valeurs positives)
+    return (salariale + DIVISEUR // 2) // DIVISEUR, (patronale + DIVISEUR // 2) // DIVISEUR
+
+
+def _appliquer_periode(periode, lignes):
+    """Recalcule par paquets les lignes (queryset) d'une même période."""
+    modifiees = 0
+    dernier_id = 0
+    while True:
+        paquet = list(
+            lignes.filter(pk__gt=dernier_id).order_by('pk')
+            .values_list('pk', 'salaire_declare', 'declaration__employeur__secteur_activite_id')[:TAILLE_PAQUET]
+        )
+        if not paquet:
+            return modifiees
+        dernier_id = paquet[-1][0]
+
+        ids = [l[0] for l in paquet]
+        salaires = np.fromiter((_centimes(l[1]) for l in paquet), dtype=np.int64, count=len(paquet))
+        secteurs = np.fromiter((l[2] for l in paquet), dtype=np.int64, count=len(paquet))
+        salariale, patronale = calculer(salaires, secteurs, baremes_applicables(periode, set(secteurs.tolist())))
+
+        _ecrire(ids, salariale, patronale)
+        modifiees += len(ids)
+
+
+def _ecrire(ids, salariale, patronale):
+    # bulk_update() construit un CASE WHEN par ligne, très coûteux côté ORM
+    # sur des dizaines de milliers de lignes : un executemany paramétré suffit.
+    meta = LigneDeclaration._meta
+    champ = meta.get_field('cotisation_salariale')
+    adapter = connection.ops.adapt_decimalfield_value
+    sql = 'UPDATE {} SET {} = %s, {} = %s WHERE {} = %s'.format(
+        *(connection.ops.quote_name(n) for n in (
+            meta.db_table,
+            champ.column,
+            meta.get_field('cotisation_patronale').column,
+            meta.pk.column,
+        ))
+    )
+    parametres = [
+        (
+            adapter(Decimal(int(s)).scaleb(-2), champ.max_digits, champ.decimal_places),
+            adapter(Decimal(int(p)).scaleb(-2), champ.max_digits, champ.decimal_places),
+            pk,
+        )
+        for pk, s, p in zip(ids, salariale, patronale)
+    ]
+    with connection.cursor() as curseur:
+        curseur.executemany(sql, parametres)
+
+
+def recalculer(declarations):
+    """Recalcule les lignes d'un queryset de déclarations, période par période.
+
+    Met ensuite à jour montant_total_cotisations, les KPI et les arriérés concernés.
+    Renvoie le nombre de lignes recalculées.
+    """
+    total = 0
+    with transaction.atomic():
+        periodes = declarations.order_by().values_list('periode', flat=True).distinct()
+        for periode in periodes:
+            lignes = LigneDeclaration.objects.filter(
+                declaration__in=declarations.filter(periode=periode).values('pk'),
+            )
+            total += _appliquer_periode(periode, lignes)
+        recalculer_totaux(declarations)
+        kpi.recalculer_declarations(declarations)
+        arrieres.recalculer_declarations(declarations)
+    return total
+
+
+def recalculer_declaration(declaration):
+    return recalculer(Declaration.objects.filter(pk=declaration.pk))
+
+
+def recalculer_historique(depuis, jusqu_a=None, inclure_validees=False):
+    """Recalcule en masse toutes les déclarations des périodes [depuis, jusqu_a]."""
+    declarations = Declaration.objects.filter(periode__gte=depuis, periode__lte=jusqu_a or date.max)
+    if not inclure_validees:
+        declarations = declarations.exclude(statut='valide')
+    return recalculer(declarations)
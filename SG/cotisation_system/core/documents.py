@@ -0,0 +1,268 @@
+# core/documents.py
+# Documents PDF : quittances de paiement, attestations de régularité et
+# rapports mensuels régionaux.
+#
+# Les données de chaque document sont extraites ici, en quelques requêtes
+# groupées, sous forme de dictionnaires simples ; la mise en page (core.pdf)
+# n'accède pas à la base et tourne dans un pool de processus.
+#
+# Chaque PDF est rangé sur disque sous l'empreinte SHA-256 de ses données et
+# de la version du gabarit : un document dont les données n'ont pas changé
+# n'est jamais rendu deux fois, et une donnée modifiée (montant, statut...)
+# donne une autre empreinte, donc un nouveau rendu.
+import hashlib
+import json
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import pdf
+from .arrieres import paye_confirme
+from .exports import Tampon
+from .kpi import mois_suivant
+from .models import ArriereEmployeur, Declaration, KpiMensuel, Paiement, Region
+
+SEUIL_POOL = 20            # en deçà, rendu dans le processus courant
+DEBITEURS_RAPPORT = 25     # débiteurs listés dans le rapport mensuel
+VALIDITE_ATTESTATION = 3   # mois après la période attestée
+
+
+class Document:
+    """Document à produire : type de gabarit, nom de fichier et données."""
+
+    def __init__(self, type_, nom, donnees):
+        self.type = type_
+        self.nom = nom
+        self.donnees = donnees
+        contenu = json.dumps([type_, pdf.GABARIT, donnees], sort_keys=True, default=str)
+        self.empreinte = hashlib.sha256(contenu.encode()).hexdigest()
+
+    @property
+    def chemin(self):
+        return os.path.join(
+            settings.DOCUMENTS_DOSSIER, self.type, self.empreinte[:2], f"{self.empreinte}.pdf",
+        )
+
+    def en_cache(self):
+        return os.path.exists(self.chemin)
+
+
+def _texte(valeur):
+    # Données sérialisables et stables pour l'empreinte (Decimal, dates -> chaînes)
+    if valeur is None:
+        return None
+    if isinstance(valeur, Decimal):
+        return str(valeur.quantize(Decimal('0.01')))
+    if hasattr(valeur, 'isoformat'):
+        return valeur.isoformat()
+    return valeur
+
+
+# --- Génération --------------------------------------------------------------------
+
+def generer(documents, processus=None):
+    """Rend les documents absents du cache ; renvoie le nombre de PDF produits.
+
+    Au-delà de SEUIL_POOL documents, le rendu est réparti sur un pool de
+    `processus` processus (DOCUMENTS_PROCESSUS par défaut, un par cœur).
+    """
+    a_rendre = {}
+    for document in documents:
+        if not document.en_cache():
+            a_rendre.setdefault(document.chemin, document)  # Données identiques : un seul rendu
+    if not a_rendre:
+        return 0
+    processus = processus or settings.DOCUMENTS_PROCESSUS or os.cpu_count() or 1
+    if len(a_rendre) < SEUIL_POOL or processus == 1:
+        for chemin, document in a_rendre.items():
+            pdf.ecrire(document.type, document.donnees, chemin)
+        return len(a_rendre)
+
+    # spawn : les processus de travail n'héritent ni des connexions à la base
+    # ni des threads du serveur ; core.pdf n'a pas besoin de Django.
+    contexte = multiprocessing.get_context('spawn')
+    processus = min(processus, len(a_rendre))
+    paquet = max(1, len(a_rendre) // (processus * 4))
+    with ProcessPoolExecutor(max_workers=processus, mp_context=contexte) as pool:
+        for _ in pool.map(
+            pdf.ecrire,
+            [d.type for d in a_rendre.values()],
+            [d.donnees for d in a_rendre.values()],
+            list(a_rendre),
+            chunksize=paquet,
+        ):
+            pass
+    return len(a_rendre)
+
+
+def flux_zip(documents):
+    """Archive ZIP des documents (déjà générés), produite en flux.
+
+    Les PDF sont déjà compressés : ils sont stockés tels quels.
+    """
+    tampon = Tampon()
+    with zipfile.ZipFile(tampon, 'w', zipfile.ZIP_STORED) as archive:
+        for document in documents:
+            archive.write(document.chemin, document.nom)
+            yield tampon.vider()
+    yield tampon.vider()
+
+
+# --- Quittances --------------------------------------------------------------------
+
+def quittances(paiements):
+    """Quittances des paiements confirmés d'un queryset de Paiement (ou PaiementHistorique)."""
+    modes = dict(Paiement.MODE_PAIEMENT_CHOICES)
+    lignes = (
+        paiements.filter(statut='confirme')
+        .annotate(total_paye=paye_confirme('declaration', paiements.model))
+        .order_by('declaration__periode', 'reference')
+        .values(
+            'reference', 'montant', 'mode_paiement', 'date_paiement', 'date_reception', 'total_paye',
+            'declaration__periode', 'declaration__montant_total_cotisations',
+            'declaration__employeur__raison_sociale', 'declaration__employeur__numero_immatriculation',
+            'declaration__employeur__nif',
+        )
+    )
+    documents = []
+    for ligne in lignes.iterator(chunk_size=2000):
+        declare = ligne['declaration__montant_total_cotisations']
+        donnees = {
+            'reference': ligne['reference'],
+            'montant': _texte(ligne['montant']),
+            'mode_paiement': modes.get(ligne['mode_paiement'], ligne['mode_paiement']),
+            'date_paiement': _texte(ligne['date_paiement']),
+            'date_reception': _texte(timezone.localtime(ligne['date_reception']).date()),
+            'periode': _texte(ligne['declaration__periode']),
+            'raison_sociale': ligne['declaration__employeur__raison_sociale'],
+            'numero_immatriculation': ligne['declaration__employeur__numero_immatriculation'],
+            'nif': ligne['declaration__employeur__nif'],
+            'montant_declare': _texte(declare),
+            'total_paye': _texte(ligne['total_paye']),
+            'reste_du': _texte(max(declare - ligne['total_paye'], Decimal('0'))),
+        }
+        documents.append(Document('quittance', f"quittance_{ligne['reference']}.pdf", donnees))
+    return documents
+
+
+# --- Attestations de régularité ----------------------------------------------------
+
+def numero_attestation(matricule, periode):
+    return f"ATT{periode:%Y%m}-{matricule}"
+
+
+def attestations(periode, employeurs=None):
+    """Attestations de régularité à la période `periode` (premier jour du mois).
+
+    Un employeur validé est en règle s'il a une déclaration validée pour la
+    période et aucun arriéré (table ArriereEmployeur). `employeurs` restreint
+    à un queryset d'employeurs.
+    """
+    validite = periode
+    for _ in range(VALIDITE_ATTESTATION + 1):
+        validite = mois_suivant(validite)
+    validite -= timedelta(days=1)
+
+    declarations = Declaration.objects.filter(
+        statut='valide', periode=periode, employeur__statut='valide',
+    ).exclude(
+        employeur_id__in=ArriereEmployeur.objects.filter(montant_du__gt=0).values('employeur_id'),
+    )
+    if employeurs is not None:
+        declarations = declarations.filter(employeur__in=employeurs)
+    lignes = (
+        declarations
+        .annotate(paye=paye_confirme(), salaries=Count('lignes'))
+        .order_by('employeur__numero_immatriculation')
+        .values(
+            'montant_total_cotisations', 'paye', 'salaries',
+            'employeur__numero_immatriculation', 'employeur__raison_sociale', 'employeur__nif',
+            'employeur__rccm', 'employeur__region__nom', 'employeur__secteur_activite__nom',
+        )
+    )
+    documents = []
+    for ligne in lignes.iterator(chunk_size=2000):
+        matricule = ligne['employeur__numero_immatriculation']
+        donnees = {
+            'numero': numero_attestation(matricule, periode),
+            'periode': _texte(periode),
+            'validite': _texte(validite),
+            'raison_sociale': ligne['employeur__raison_sociale'],
+            'numero_immatriculation': matricule,
+            'nif': ligne['employeur__nif'],
+            'rccm': ligne['employeur__rccm'],
+            'region': ligne['employeur__region__nom'],
+            'secteur': ligne['employeur__secteur_activite__nom'],
+            'salaries': ligne['salaries'],
+            'montant_declare': _texte(ligne['montant_total_cotisations']),
+            'montant_paye': _texte(ligne['paye']),
+        }
+        documents.append(Document('attestation', f"attestation_{donnees['numero']}.pdf", donnees))
+    return documents
+
+
+# --- Rapports mensuels régionaux ----------------------------------------------------
+
+def _taux(numerateur, denominateur):
+    return _texte(Decimal(numerateur * 100 / denominateur) if denominateur else Decimal('0'))
+
+
+def rapports(mois, regions=None):
+    """Rapports mensuels (un par région) à partir des KPI et des arriérés."""
+    regions = Region.objects.order_by('nom') if regions is None else regions
+    zero = Value(Decimal('0'), output_field=DecimalField(max_digits=17, decimal_places=2))
+    kpis = {
+        ligne['region_id']: ligne
+        for ligne in KpiMensuel.objects.filter(region__isnull=False).values('region_id').annotate(
+            employeurs_actifs=Sum('nouveaux_employeurs', filter=Q(mois__lte=mois)),
+            **{m: Sum(m, filter=Q(mois=mois)) for m in (
+                'nouveaux_employeurs', 'nouveaux_assures', 'employeurs_ayant_declare',
+                'cotisations_declarees', 'cotisations_encaissees',
+            )},
+        ).order_by()
+    }
+    arrieres = dict(
+        ArriereEmployeur.objects.values('employeur__region_id')
+        .annotate(total=Coalesce(Sum('montant_du'), zero))
+        .order_by().values_list('employeur__region_id', 'total')
+    )
+    documents = []
+    for region in regions:
+        valeurs = {k: v or 0 for k, v in kpis.get(region.pk, {}).items()}
+        debiteurs = (
+            ArriereEmployeur.objects.filter(employeur__region=region)
+            .order_by('-montant_du', 'employeur_id')[:DEBITEURS_RAPPORT]
+            .values_list(
+                'employeur__numero_immatriculation', 'employeur__raison_sociale',
+                'nb_periodes_impayees', 'montant_du',
+            )
+        )
+        donnees = {
+            'region': region.nom,
+            'mois': _texte(mois),
+            'employeurs_actifs': valeurs.get('employeurs_actifs', 0),
+            'nouveaux_employeurs': valeurs.get('nouveaux_employeurs', 0),
+            'nouveaux_assures': valeurs.get('nouveaux_assures', 0),
+            'employeurs_ayant_declare': valeurs.get('employeurs_ayant_declare', 0),
+            'taux_conformite': _taux(valeurs.get('employeurs_ayant_declare', 0), valeurs.get('employeurs_actifs', 0)),
+            'cotisations_declarees': _texte(Decimal(valeurs.get('cotisations_declarees', 0))),
+            'cotisations_encaissees': _texte(Decimal(valeurs.get('cotisations_encaissees', 0))),
+            'taux_recouvrement': _taux(
+                valeurs.get('cotisations_encaissees', 0), valeurs.get('cotisations_declarees', 0),
+            ),
+            'arrieres': _texte(arrieres.get(region.pk, Decimal('0'))),
+            'debiteurs': [
+                {'matricule': m, 'raison_sociale': r, 'periodes': n, 'montant_du': _texte(d)}
+                for m, r, n, d in debiteurs
+            ],
+        }
+        documents.append(Document('rapport', f"rapport_{region.code}_{mois:%Y%m}.pdf", donnees))
+    return documents
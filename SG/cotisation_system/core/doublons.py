@@ -0,0 +1,151 @@
+# core/doublons.py
+# Détection des assurés enregistrés deux fois (CNI mal saisie, nom écrit
+# autrement, nom et prénom inversés...).
+#
+# Comparer chaque assuré à tous les autres est impossible sur un million de
+# fiches. Chaque assuré porte donc des clés de blocage (core.similarite),
+# tenues par Assure.save() et indexées, et seules les fiches d'un même bloc
+# sont comparées par similarité floue :
+#   - même clé phonétique du nom et même date de naissance ;
+#   - même clé phonétique du prénom et même date de naissance (nom mal écrit) ;
+#   - même téléphone normalisé.
+#
+# candidats() sert la vérification du formulaire AssureForm : une requête
+# servie par les trois index, quelques dizaines de fiches comparées.
+# rechercher() parcourt toute la table : pour chaque type de bloc, une
+# requête ne renvoie que les fiches des blocs d'au moins deux fiches (fonction
+# de fenêtre), les blocs sont répartis par paquets sur un pool de processus,
+# et les paires trouvées alimentent la file de fusion DoublonAssure.
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+
+from django.db.models import Count, F, Q, Window
+
+from . import similarite
+from .models import Assure, DoublonAssure
+
+MAX_BLOC = 50            # Blocs plus grands (téléphone partagé, nom très courant) : ignorés
+CANDIDATS_MAX = 50       # Fiches comparées au plus par la vérification du formulaire
+PAQUET_BLOCS = 2000      # Blocs par tâche du pool
+SEUIL_POOL = 5000        # En deçà (en blocs), comparaison dans le processus courant
+
+BLOCS = {
+    'nom': ('phonetique_nom', 'date_naissance'),
+    'prenom': ('phonetique_prenom', 'date_naissance'),
+    'telephone': ('telephone_normalise',),
+}
+# Colonnes d'une fiche, dans l'ordre de similarite.fiche()
+CHAMPS = (
+    'pk', 'nom', 'prenom', 'phonetique_nom', 'phonetique_prenom', 'date_naissance', 'numero_cni',
+    'telephone_normalise',
+)
+
+
+def _filtre_bloc(champs, valeurs):
+    # Clé vide (nom sans lettre, téléphone trop court) : pas de bloc
+    if not all(valeurs):
+        return None
+    return Q(**dict(zip(champs, valeurs)))
+
+
+def candidats(assure, limite=CANDIDATS_MAX):
+    """Assurés déjà enregistrés qui ressemblent à `assure`, meilleurs d'abord.
+
+    `assure` peut ne pas être enregistré (formulaire). Renvoie
+    [(valeurs de l'assuré trouvé, score)] au-dessus de similarite.SEUIL.
+    """
+    assure.calculer_cles()
+    filtre = Q()
+    for champs in BLOCS.values():
+        condition = _filtre_bloc(champs, [getattr(assure, c) for c in champs])
+        if condition is not None:
+            filtre |= condition
+    if not filtre:
+        return []
+    lignes = Assure.objects.filter(filtre)
+    if assure.pk:
+        lignes = lignes.exclude(pk=assure.pk)
+    reference = similarite.fiche(*(getattr(assure, c) for c in CHAMPS))
+    trouves = []
+    for ligne in lignes.values(*CHAMPS, 'numero_assure')[:limite]:
+        score = similarite.score(reference, similarite.fiche(*(ligne[c] for c in CHAMPS)))
+        if score is not None and score >= similarite.SEUIL:
+            trouves.append((ligne, score))
+    return sorted(trouves, key=lambda t: -t[1])
+
+
+def _blocs(champs, bilan):
+    """Blocs d'au moins deux fiches pour un type de clé (listes de fiches)."""
+    cles = [F(c) for c in champs]
+    lignes = (
+        Assure.objects.exclude(**{f'{c}__isnull': True for c in champs})
+        .exclude(**{c: '' for c in champs if c != 'date_naissance'})
+        .annotate(taille_bloc=Window(Count('pk'), partition_by=cles))
+        .filter(taille_bloc__gte=2)
+        .order_by(*champs, 'pk')
+        .values_list(*champs, 'taille_bloc', *CHAMPS)
+    )
+    n = len(champs) + 1
+    for _, groupe in groupby(lignes.iterator(chunk_size=5000), key=lambda ligne: ligne[:len(champs)]):
+        groupe = list(groupe)
+        if groupe[0][n - 1] > MAX_BLOC:
+            bilan['blocs_ignores'] += 1
+            continue
+        bilan['blocs'] += 1
+        bilan['fiches'] += len(groupe)
+        yield [similarite.fiche(*ligne[n:]) for ligne in groupe]
+
+
+def _paquets(blocs, taille):
+    paquet = []
+    for bloc in blocs:
+        paquet.append(bloc)
+        if len(paquet) == taille:
+            yield paquet
+            paquet = []
+    if paquet:
+        yield paquet
+
+
+def rechercher(processus=None, paquet=PAQUET_BLOCS):
+    """Compare les fiches de chaque bloc ; renvoie ({(pk1, pk2): score}, bilan).
+
+    Au-delà de SEUIL_POOL blocs, la comparaison est répartie sur `processus`
+    processus (un par cœur par défaut).
+    """
+    bilan = Counter()
+    paires = {}
+    processus = processus or os.cpu_count() or 1
+    for champs in BLOCS.values():
+        paquets = list(_paquets(_blocs(champs, bilan), paquet))
+        if len(paquets) * paquet < SEUIL_POOL or processus == 1:
+            resultats = map(similarite.comparer_blocs, paquets)
+        else:
+            # spawn : les processus de travail n'héritent pas de la connexion
+            # à la base ; core.similarite n'a pas besoin de Django.
+            pool = ProcessPoolExecutor(
+                max_workers=min(processus, len(paquets)), mp_context=multiprocessing.get_context('spawn'),
+            )
+            with pool:
+                resultats = list(pool.map(similarite.comparer_blocs, paquets))
+        for trouvees in resultats:
+            for pk1, pk2, score in trouvees:
+                paires[(pk1, pk2)] = max(score, paires.get((pk1, pk2), 0))
+    bilan['paires'] = len(paires)
+    return paires, bilan
+
+
+def mettre_en_file(paires):
+    """Ajoute les paires à la file de fusion ; renvoie le nombre de paires nouvelles.
+
+    Une paire déjà en file (y compris jugée « personnes distinctes ») n'est pas modifiée.
+    """
+    avant = DoublonAssure.objects.count()
+    DoublonAssure.objects.bulk_create(
+        [DoublonAssure(assure_id=pk1, doublon_id=pk2, score=score) for (pk1, pk2), score in paires.items()],
+        batch_size=1000, ignore_conflicts=True,
+    )
+    return DoublonAssure.objects.count() - avant
@@ -0,0 +1,250 @@
+# core/exports.py
+# Exports CSV / XLSX en flux des listes (déclarations, paiements, assurés).
+#
+# Les lignes sont lues par values_list(...).iterator(chunk_size=...) et
+# envoyées au fil de l'eau dans une StreamingHttpResponse : la mémoire reste
+# bornée par un paquet de lignes, quelle que soit la taille de l'export, et
+# le premier octet part avant la fin de la lecture.
+#
+# CSV : format Excel français (UTF-8 avec BOM, séparateur « ; », virgule
+# décimale), relisible par core.imports.
+# XLSX : les parties fixes du classeur (styles, workbook...) sont produites
+# par openpyxl en mode write-only ; la feuille elle-même est écrite ligne à
+# ligne dans une archive ZIP produite en flux (zipfile accepte une sortie
+# non positionnable).
+import csv
+import io
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import Assure, Declaration, Paiement
+
+TAILLE_PAQUET = 2000
+FEUILLE = 'xl/worksheets/sheet1.xml'
+
+
+class Colonne:
+    """Colonne d'export : entête, champs lus par values_list et mise en forme.
+
+    `valeur` reçoit les valeurs des `champs` (dans l'ordre) et renvoie la
+    cellule ; par défaut, la valeur du premier champ.
+    """
+
+    def __init__(self, entete, *champs, valeur=None):
+        self.entete = entete
+        self.champs = champs
+        self.valeur = valeur or (lambda v: v)
+
+
+def libelles(choix):
+    """Mise en forme d'un champ à choix par son libellé."""
+    correspondance = dict(choix)
+    return lambda v: correspondance.get(v, v)
+
+
+def nom_complet(prenom, nom, identifiant=None):
+    return f"{prenom} {nom}".strip() or identifiant or ''
+
+
+def _lignes(queryset, colonnes):
+    champs = [c for colonne in colonnes for c in colonne.champs]
+    positions, debut = [], 0
+    for colonne in colonnes:
+        positions.append((colonne.valeur, debut, debut + len(colonne.champs)))
+        debut += len(colonne.champs)
+    for brut in queryset.values_list(*champs).iterator(chunk_size=TAILLE_PAQUET):
+        yield [valeur(*brut[a:b]) for valeur, a, b in positions]
+
+
+def _local(valeur):
+    if isinstance(valeur, datetime) and timezone.is_aware(valeur):
+        return timezone.localtime(valeur).replace(tzinfo=None)
+    return valeur
+
+
+# --- CSV ---------------------------------------------------------------------------
+
+def _texte_csv(valeur):
+    valeur = _local(valeur)
+    if valeur is None:
+        return ''
+    if isinstance(valeur, bool):
+        return 'oui' if valeur else 'non'
+    if isinstance(valeur, datetime):
+        return valeur.strftime('%d/%m/%Y %H:%M')
+    if isinstance(valeur, date):
+        return valeur.strftime('%d/%m/%Y')
+    if isinstance(valeur, (Decimal, float)):
+        return str(valeur).replace('.', ',')
+    return valeur
+
+
+class Tampon:
+    """Sortie en écriture seule dont on retire le contenu au fur et à mesure."""
+
+    def __init__(self):
+        self.morceaux = []
+
+    def write(self, donnees):
+        self.morceaux.append(donnees)
+        return len(donnees)
+
+    def flush(self):
+        pass
+
+    def vider(self):
+        # Chaînes (csv) ou octets (zipfile)
+        contenu = self.morceaux[0][:0].join(self.morceaux) if self.morceaux else ''
+        self.morceaux = []
+        return contenu
+
+
+def flux_csv(queryset, colonnes):
+    tampon = Tampon()
+    ecrivain = csv.writer(tampon, delimiter=';')
+    ecrivain.writerow([c.entete for c in colonnes])
+    yield '\ufeff' + tampon.vider()  # BOM : Excel reconnaît l'UTF-8
+    n = 0
+    for ligne in _lignes(queryset, colonnes):
+        ecrivain.writerow([_texte_csv(v) for v in ligne])
+        n += 1
+        if n % 500 == 0:
+            yield tampon.vider()
+    yield tampon.vider()
+
+
+# --- XLSX --------------------------------------------------------------------------
+
+def _squelette_xlsx(titre):
+    """Classeur openpyxl vide d'une feuille, et numéros de style des dates."""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+
+    classeur = Workbook(write_only=True)
+    feuille = classeur.create_sheet(titre[:31])
+    styles = {}
+    for type_, format_ in ((date, 'DD/MM/YYYY'), (datetime, 'DD/MM/YYYY HH:MM')):
+        cellule = WriteOnlyCell(feuille, value=None)
+        cellule.number_format = format_
+        styles[type_] = cellule.style_id
+    sortie = io.BytesIO()
+    classeur.save(sortie)
+    sortie.seek(0)
+    return zipfile.ZipFile(sortie), styles
+
+
+def _cellule_xlsx(valeur, styles):
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+    from openpyxl.utils.datetime import to_excel
+
+    valeur = _local(valeur)
+    if valeur is None or valeur == '':
+        return '<c/>'
+    if isinstance(valeur, bool):
+        return f'<c t="b"><v>{int(valeur)}</v></c>'
+    if isinstance(valeur, (int, float, Decimal)):
+        return f'<c t="n"><v>{valeur}</v></c>'
+    if isinstance(valeur, datetime):
+        return f'<c s="{styles[datetime]}"><v>{to_excel(valeur)}</v></c>'
+    if isinstance(valeur, date):
+        return f'<c s="{styles[date]}"><v>{to_excel(valeur)}</v></c>'
+    texte = escape(ILLEGAL_CHARACTERS_RE.sub('', str(valeur)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texte}</t></is></c>'
+
+
+def flux_xlsx(queryset, colonnes, titre):
+    squelette, styles = _squelette_xlsx(titre)
+    tampon = Tampon()
+    with zipfile.ZipFile(tampon, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for partie in squelette.infolist():
+            if partie.filename != FEUILLE:
+                archive.writestr(partie.filename, squelette.read(partie))
+        yield tampon.vider()
+
+        with archive.open(FEUILLE, 'w', force_zip64=True) as feuille:
+            entetes = ''.join(_cellule_xlsx(c.entete, styles) for c in colonnes)
+            feuille.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                f'<sheetData><row>{entetes}</row>'
+            ).encode())
+            n = 0
+            for ligne in _lignes(queryset, colonnes):
+                feuille.write(('<row>' + ''.join(_cellule_xlsx(v, styles) for v in ligne) + '</row>').encode())
+                n += 1
+                if n % 500 == 0:
+                    yield tampon.vider()
+            feuille.write(b'</sheetData></worksheet>')
+    yield tampon.vider()
+
+
+# --- Colonnes des listes exportées ---------------------------------------------------
+
+COLONNES_DECLARATION = [
+    Colonne("Référence", 'pk', valeur=lambda pk: f"DEC{pk:06d}"),
+    Colonne("Employeur", 'employeur__raison_sociale'),
+    Colonne("Matricule", 'employeur__numero_immatriculation'),
+    Colonne("Période", 'periode', valeur=lambda p: p.strftime('%m/%Y')),
+    Colonne("Montant total", 'montant_total_cotisations'),
+    Colonne("Statut", 'statut', valeur=libelles(Declaration.STATUT_CHOICES)),
+    Colonne("Date soumission", 'date_soumission'),
+    Colonne("Créée par", 'created_by__first_name', 'created_by__last_name', 'created_by__username', valeur=nom_complet),
+    Colonne("Créée le", 'created_at'),
+]
+
+COLONNES_PAIEMENT = [
+    Colonne("Référence", 'reference'),
+    Colonne("Employeur", 'declaration__employeur__raison_sociale'),
+    Colonne("Matricule", 'declaration__employeur__numero_immatriculation'),
+    Colonne("Période", 'declaration__periode', valeur=lambda p: p.strftime('%m/%Y')),
+    Colonne("Montant", 'montant'),
+    Colonne("Mode", 'mode_paiement', valeur=libelles(Paiement.MODE_PAIEMENT_CHOICES)),
+    Colonne("Date paiement", 'date_paiement'),
+    Colonne("Date réception", 'date_reception'),
+    Colonne("Statut", 'statut', valeur=libelles(Paiement.STATUT_PAIEMENT_CHOICES)),
+    Colonne(
+        "Enregistré par", 'enregistre_par__first_name', 'enregistre_par__last_name', 'enregistre_par__username',
+        valeur=nom_complet,
+    ),
+]
+
+COLONNES_ASSURE = [
+    Colonne("N° assuré", 'numero_assure'),
+    Colonne("Nom", 'nom'),
+    Colonne("Prénom", 'prenom'),
+    Colonne("N° CNI", 'numero_cni'),
+    Colonne("Date naissance", 'date_naissance'),
+    Colonne("Type", 'type_assure', valeur=libelles(Assure.TYPE_ASSURE_CHOICES)),
+    Colonne("Téléphone", 'telephone'),
+    Colonne("Employeur", 'employeur__raison_sociale'),
+    Colonne("Matricule employeur", 'employeur__numero_immatriculation'),
+    Colonne("Date affiliation", 'date_affiliation'),
+    Colonne("Actif", 'est_actif'),
+]
+
+
+# --- Réponse -----------------------------------------------------------------------
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def reponse_export(queryset, colonnes, nom, format_='csv'):
+    """StreamingHttpResponse d'un export CSV (par défaut) ou XLSX."""
+    if format_ not in FORMATS:
+        format_ = 'csv'
+    if format_ == 'xlsx':
+        contenu = flux_xlsx(queryset, colonnes, nom)
+    else:
+        contenu = flux_csv(queryset, colonnes)
+    reponse = StreamingHttpResponse(contenu, content_type=FORMATS[format_])
+    horodatage = timezone.localtime().strftime('%Y%m%d_%H%M')
+    reponse['Content-Disposition'] = f'attachment; filename="{nom}_{horodatage}.{format_}"'
+    return reponse
@@ -1,6 +1,7 @@
 # core/forms.py (mise à jour)
 from django import forms
 from .models import *
+from . import archives, doublons
 from django.contrib.auth.forms import UserCreationForm
 
 from crispy_forms.helper import FormHelper
@@ -14,9 +15,11 @@ class CustomUserCreationForm(UserCreationForm):
 class EmployeurForm(forms.ModelForm):
     pieces_justificatives = forms.FileField(
         required=False,
-        widget=forms.ClearableFileInput(attrs={'multiple': False}),
+        widget=forms.ClearableFileInput(attrs={'multiple': False, 'data-televersement': 'televersements'}),
         label="Pièces justificatives"
     )
+    # Identifiants des envois par morceaux terminés (voir core/televersements.py)
+    televersements = forms.CharField(required=False, widget=forms.HiddenInput)
     
     class Meta:
         model = Employeur
@@ -51,6 +54,32 @@ class AssureForm(forms.ModelForm):
             
         }
 
+    ignorer_doublons = forms.BooleanField(
+        required=False, widget=forms.HiddenInput, label="Enregistrer malgré les doublons signalés",
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('ignorer_doublons') or self.errors:
+            return cleaned_data
+        assure = Assure(
+            pk=self.instance.pk,
+            **{c: cleaned_data.get(c) for c in ('nom', 'prenom', 'date_naissance', 'numero_cni', 'telephone')},
+        )
+        trouves = doublons.candidats(assure)
+        if trouves:
+            # La case devient visible : cochée, elle confirme l'enregistrement
+            self.fields['ignorer_doublons'].widget = forms.CheckboxInput()
+            raise forms.ValidationError([
+                "Cet assuré ressemble à des assurés déjà enregistrés :",
+                *(
+                    f"{a['numero_assure']} {a['prenom']} {a['nom']}, né(e) le {a['date_naissance']:%d/%m/%Y}, "
+                    f"CNI {a['numero_cni']} (ressemblance {score:.0%})"
+                    for a, score in trouves
+                ),
+            ])
+        return cleaned_data
+
 class DeclarationForm(forms.ModelForm):
     class Meta:
         model = Declaration
@@ -64,6 +93,12 @@ class DeclarationForm(forms.ModelForm):
             
         }
 
+    def clean_periode(self):
+        periode = self.cleaned_data['periode']
+        if periode and archives.est_close(periode):
+            raise forms.ValidationError(f"L'exercice {periode.year} est clos : il n'accepte plus de déclaration.")
+        return periode
+
 class PaiementForm(forms.ModelForm):
     class Meta:
         model = Paiement
@@ -74,6 +109,48 @@ class PaiementForm(forms.ModelForm):
             'declaration': forms.Select(attrs={'class': 'form-select'}),
             'statut': forms.Select(attrs={'class': 'form-select'}),
             'enregistre_par': forms.Select(attrs={'class': 'form-select'}),
+            'preuve_paiement': forms.ClearableFileInput(attrs={'data-televersement': 'preuve_televersement'}),
         }
+
+    preuve_televersement = forms.CharField(required=False, widget=forms.HiddenInput)
         
         
+
+class ActionRecouvrementForm(forms.ModelForm):
+    class Meta:
+        model = ActionRecouvrement
+        fields = ['employeur', 'type_action', 'date_planification', 'observations']
+        widgets = {
+            'employeur': forms.Select(attrs={'class': 'form-select'}),
+            'type_action': forms.Select(attrs={'class': 'form-select'}),
+            'date_planification': forms.DateTimeInput(attrs={'type': 'datetime-local'}),
+            'observations': forms.Textarea(attrs={'rows': 3}),
+        }
+
+class ActionRecouvrementUpdateForm(forms.ModelForm):
+    class Meta:
+        model = ActionRecouvrement
+        fields = ['statut', 'date_execution', 'montant_recouvre', 'observations']
+        widgets = {
+            'statut': forms.Select(attrs={'class': 'form-select'}),
+            'date_execution': forms.DateTimeInput(attrs={'type': 'datetime-local'}),
+            'observations': forms.Textarea(attrs={'rows': 3}),
+        }
+
+class ImportLignesForm(forms.Form):
+    fichier = forms.FileField(label="Fichier de paie (CSV ou XLSX)")
+    remplacer = forms.BooleanField(required=False, initial=True, label="Remplacer les lignes existantes")
+
+class RapprochementForm(forms.Form):
+    fichier = forms.FileField(label="Relevé bancaire ou mobile money (CSV ou XLSX)")
+    mode_defaut = forms.ChoiceField(
+        choices=Paiement.MODE_PAIEMENT_CHOICES, initial='virement', label="Mode de paiement par défaut",
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    tolerance_montant = forms.DecimalField(
+        min_value=0, max_digits=12, decimal_places=2, initial=0, label="Tolérance sur le montant (FCFA)",
+    )
+    tolerance_jours = forms.IntegerField(
+        min_value=0, max_value=60, initial=5, label="Tolérance sur la date (jours)",
+    )
+    simulation = forms.BooleanField(required=False, label="Simulation (ne rien enregistrer)")
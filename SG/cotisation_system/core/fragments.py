@@ -0,0 +1,47 @@
+# core/fragments.py
+# Cache des lignes des pages de liste (balise {% cache %} des gabarits).
+#
+# Chaque ligne est rangée sous (modèle, pk, version) : la version (voir
+# core.synchro) change à chaque écriture de la ligne, y compris en masse, donc
+# une ligne modifiée n'est jamais resservie. Une ligne affiche aussi des
+# données d'objets liés (raison sociale de l'employeur, nom de l'auteur...) :
+# la clé comprend donc la « génération » de ces modèles, incrémentée par
+# signal (core.signals) à chaque enregistrement ou suppression.
+import time
+
+from django.core.cache import cache
+
+PREFIXE = 'fragments:generation'
+
+
+def _cle(modele):
+    return f'{PREFIXE}:{modele._meta.label_lower}'
+
+
+def _initiale():
+    # Une génération perdue (éviction, redémarrage du cache) ne doit pas
+    # reprendre une ancienne valeur : on repart de l'horloge.
+    return time.time_ns() // 1000
+
+
+def generations(*modeles):
+    """Générations courantes des modèles, en une chaîne à placer dans la clé des fragments."""
+    cles = [_cle(m) for m in modeles]
+    if not cles:
+        return ''
+    valeurs = cache.get_many(cles)
+    manquantes = [c for c in cles if c not in valeurs]
+    if manquantes:
+        for cle in manquantes:
+            cache.add(cle, _initiale(), None)
+        valeurs.update(cache.get_many(manquantes))
+    return '.'.join(str(valeurs.get(c, 0)) for c in cles)
+
+
+def invalider(modele):
+    """Périme toutes les lignes en cache qui affichent des données de `modele`."""
+    try:
+        cache.incr(_cle(modele))
+    except ValueError:
+        # Génération jamais lue ou évincée
+        cache.set(_cle(modele), _initiale(), None)
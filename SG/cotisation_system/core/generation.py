@@ -0,0 +1,360 @@
+# core/generation.py
+# Génération d'un jeu de données volumineux et déterministe (tests de charge,
+# benchmarks de core/tests.py, commande `generer_donnees`).
+#
+# Même graine, mêmes paramètres et même mois de fin sur une base vide donnent
+# les mêmes données. Tout est inséré par bulk_create, par paquets : les
+# signaux ne sont pas déclenchés, KpiMensuel et ArriereEmployeur sont donc
+# reconstruits à la fin ; l'index de recherche suit via ses déclencheurs SQL.
+import random
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import arrieres, geo, kpi, sequences, synchro
+from .models import (
+    ActionRecouvrement, Assure, CustomUser, Declaration, Employeur, LigneDeclaration, Paiement, Region,
+    SecteurActivite,
+)
+
+PAQUET = 2000
+PREFIXE = 'GEN'  # Préfixe des NIF, RCCM et CNI générés
+
+TAUX_SALARIAL = Decimal('0.042')
+TAUX_PATRONAL = Decimal('0.084')
+CENTIME = Decimal('0.01')
+
+# (nom, code, latitude, longitude) du centre de chaque région
+REGIONS = (
+    ('Centre', 'CE', 3.87, 11.52),
+    ('Littoral', 'LT', 4.05, 9.70),
+    ('Ouest', 'OU', 5.48, 10.42),
+    ('Nord', 'NO', 9.30, 13.40),
+    ('Adamaoua', 'AD', 7.32, 13.58),
+    ('Est', 'ES', 4.58, 13.68),
+    ('Sud', 'SU', 2.92, 11.15),
+    ('Nord-Ouest', 'NW', 5.96, 10.15),
+    ('Sud-Ouest', 'SW', 4.15, 9.24),
+    ('Extrême-Nord', 'EN', 10.59, 14.32),
+)
+SECTEURS = (
+    ('COM', 'Commerce'),
+    ('BTP', 'Bâtiment et travaux publics'),
+    ('IND', 'Industrie'),
+    ('AGR', 'Agriculture'),
+    ('TRA', 'Transport'),
+    ('SER', 'Services'),
+    ('SAN', 'Santé'),
+    ('EDU', 'Éducation'),
+)
+NOMS = (
+    'Mballa', 'Nguema', 'Fotso', 'Tchoupo', 'Ndongo', 'Abena', 'Kamga', 'Essomba', 'Bello', 'Moussa',
+    'Ngo Bassa', 'Atangana', 'Djoum', 'Owona', 'Manga', 'Simo', 'Hamadou', 'Etoundi', 'Noah', 'Biya',
+)
+PRENOMS = (
+    'Jean', 'Marie', 'Paul', 'Aïcha', 'Pierre', 'Hélène', 'André', 'Fatou', 'Joseph', 'Clémence',
+    'Ibrahim', 'Estelle', 'Emmanuel', 'Brigitte', 'Samuel', 'Amina', 'François', 'Régine', 'Daniel', 'Zénabou',
+)
+ACTIVITES = ('Société', 'Établissements', 'Groupe', 'Entreprise', 'Cabinet', 'Boulangerie', 'Transports', 'Clinique')
+
+STATUTS_EMPLOYEUR = (('valide', 70), ('dossier_soumis', 10), ('en_cours', 8), ('prospecte', 8), ('rejete', 4))
+MODES_PAIEMENT = ('virement', 'cheque', 'mobile', 'guichet')
+
+
+def _decaler(mois, n):
+    total = mois.year * 12 + mois.month - 1 + n
+    return mois.replace(year=total // 12, month=total % 12 + 1, day=1)
+
+
+def _horodate(rng, jour, jours_max=27):
+    moment = datetime.combine(jour + timedelta(days=rng.randint(0, jours_max)), time(rng.randint(7, 18), rng.randint(0, 59)))
+    return timezone.make_aware(moment)
+
+
+def _tirer(rng, poids):
+    return rng.choices([v for v, _ in poids], [p for _, p in poids])[0]
+
+
+@contextmanager
+def _dates_imposees(*modeles):
+    """Désactive auto_now_add le temps de l'insertion, pour dater les lignes dans le passé."""
+    champs = [f for m in modeles for f in m._meta.concrete_fields if getattr(f, 'auto_now_add', False)]
+    for champ in champs:
+        champ.auto_now_add = False
+    try:
+        yield
+    finally:
+        for champ in champs:
+            champ.auto_now_add = True
+
+
+def _numeroter(objets, champ, prefixe, date_de):
+    """Numéros métier réservés dans le compteur du mois de chaque objet."""
+    par_mois = defaultdict(list)
+    for objet in objets:
+        par_mois[date_de(objet).strftime('%Y%m')].append(objet)
+    for mois, groupe in sorted(par_mois.items()):
+        for objet, numero in zip(groupe, sequences.numeros(prefixe, len(groupe), mois)):
+            setattr(objet, champ, numero)
+
+
+def deja_genere():
+    return Employeur.objects.filter(nif__startswith=PREFIXE).exists()
+
+
+def _referentiel():
+    regions = []
+    for nom, code, latitude, longitude in REGIONS:
+        region, _ = Region.objects.get_or_create(code=code, defaults={'nom': nom})
+        regions.append((region, latitude, longitude))
+    secteurs = [SecteurActivite.objects.get_or_create(code=code, defaults={'nom': nom})[0] for code, nom in SECTEURS]
+    utilisateurs = {}
+    for role, nombre in (('agent', 10), ('superviseur', 2), ('validation', 2), ('admin', 1)):
+        for i in range(1, nombre + 1):
+            utilisateur, cree = CustomUser.objects.get_or_create(
+                username=f'gen_{role}{i:02d}', defaults={'role': role, 'first_name': role.capitalize(), 'last_name': f'{i:02d}'},
+            )
+            if cree:
+                utilisateur.set_unusable_password()
+                utilisateur.save(update_fields=['password'])
+            utilisateurs.setdefault(role, []).append(utilisateur)
+    return regions, secteurs, utilisateurs
+
+
+def _plafond(fin):
+    # Rien n'est daté après la fin du mois `fin`, ni dans le futur
+    return min(timezone.now(), timezone.make_aware(datetime.combine(_decaler(fin, 1), time.min)) - timedelta(seconds=1))
+
+
+def _employeurs(rng, nombre, debuts, fin, regions, secteurs, utilisateurs, paquet):
+    """Renvoie [(pk, mois de validation ou None)] dans l'ordre de création."""
+    resultat = []
+    plafond = _plafond(fin)
+    for debut in range(0, nombre, paquet):
+        objets = []
+        for i in range(debut, min(debut + paquet, nombre)):
+            region, latitude, longitude = rng.choice(regions)
+            cree = min(_horodate(rng, rng.choice(debuts)), plafond)
+            statut = _tirer(rng, STATUTS_EMPLOYEUR)
+            nom = rng.choice(NOMS)
+            employeur = Employeur(
+                raison_sociale=f"{rng.choice(ACTIVITES)} {nom} {i + 1}",
+                nif=f"{PREFIXE}-NIF-{i + 1:07d}",
+                rccm=f"{PREFIXE}-RC-{i + 1:07d}",
+                secteur_activite=rng.choice(secteurs),
+                region=region,
+                adresse=f"BP {rng.randint(100, 9999)}, {region.nom}",
+                latitude=Decimal(f"{latitude + rng.uniform(-0.6, 0.6):.6f}"),
+                longitude=Decimal(f"{longitude + rng.uniform(-0.6, 0.6):.6f}"),
+                contact_nom=f"{rng.choice(PRENOMS)} {nom}",
+                contact_email=f"contact{i + 1}@exemple.cm",
+                contact_telephone=f"6{rng.randint(50000000, 99999999)}",
+                statut=statut,
+                date_creation=cree,
+                agent=rng.choice(utilisateurs['agent']),
+            )
+            employeur.geohash = geo.encoder(employeur.latitude, employeur.longitude)
+            if statut == 'valide':
+                employeur.date_validation = min(cree + timedelta(days=rng.randint(1, 45)), plafond)
+                employeur.validated_by = rng.choice(utilisateurs['validation'])
+            elif statut == 'rejete':
+                employeur.motif_rejet = "Pièces justificatives incomplètes"
+            objets.append(employeur)
+        _numeroter([e for e in objets if e.statut == 'valide'], 'numero_immatriculation', 'EMP', lambda e: e.date_validation)
+        with transaction.atomic(), _dates_imposees(Employeur):
+            Employeur.objects.bulk_create(synchro.versionner(objets))
+        resultat += [(e.pk, kpi.mois_de(e.date_validation) if e.date_validation else None) for e in objets]
+    return resultat
+
+
+def _assures(rng, nombre, valides, fin, paquet):
+    """Crée les assurés ; renvoie {employeur_id: [assure_id, ...]}."""
+    salaries = defaultdict(list)
+    if not valides:
+        return salaries
+    # Quelques grands employeurs, beaucoup de petits
+    poids = [min(rng.paretovariate(1.1), 500) for _ in valides]
+    rattachements = sorted(rng.choices(range(len(valides)), poids, k=nombre))
+    plafond = _plafond(fin)
+    for debut in range(0, nombre, paquet):
+        objets = []
+        for i in range(debut, min(debut + paquet, nombre)):
+            employeur_id, mois_validation = valides[rattachements[i]]
+            independant = rng.random() < 0.05
+            affiliation = min(_horodate(rng, mois_validation, jours_max=(fin - mois_validation).days + 27), plafond)
+            objets.append(Assure(
+                nom=rng.choice(NOMS),
+                prenom=rng.choice(PRENOMS),
+                date_naissance=affiliation.date().replace(year=affiliation.year - rng.randint(19, 60), day=1),
+                lieu_naissance=rng.choice(REGIONS)[0],
+                numero_cni=f"{PREFIXE}{i + 1:09d}",
+                adresse=f"Quartier {rng.randint(1, 60)}",
+                telephone=f"6{rng.randint(50000000, 99999999)}",
+                type_assure=rng.choice(('independant', 'volontaire')) if independant else 'salarie',
+                employeur_id=None if independant else employeur_id,
+                date_affiliation=affiliation,
+            ))
+        _numeroter(objets, 'numero_assure', 'ASS', lambda a: a.date_affiliation)
+        for assure in objets:
+            assure.calculer_cles()
+        with transaction.atomic(), _dates_imposees(Assure):
+            Assure.objects.bulk_create(synchro.versionner(objets))
+        for assure in objets:
+            if assure.employeur_id:
+                salaries[assure.employeur_id].append(assure.pk)
+    return salaries
+
+
+def _statut_declaration(rng, periode, fin):
+    if periode == fin:
+        return _tirer(rng, (('brouillon', 60), ('soumis', 40)))
+    if periode == _decaler(fin, -1):
+        return _tirer(rng, (('brouillon', 10), ('soumis', 50), ('valide', 40)))
+    return _tirer(rng, (('valide', 90), ('soumis', 5), ('rejete', 5)))
+
+
+def _paiements(rng, declaration, utilisateurs, aujourd_hui):
+    tirage = rng.random()
+    if tirage >= 0.90:
+        return []  # Impayé : alimente les arriérés
+    montant, statut = declaration.montant_total_cotisations, 'confirme'
+    if 0.72 <= tirage < 0.82:
+        montant = (montant * Decimal(rng.randint(30, 90)) / 100).quantize(CENTIME)
+    elif 0.82 <= tirage < 0.87:
+        statut = 'initie'
+    elif tirage >= 0.87:
+        statut = 'rejete'
+    date_paiement = min(_decaler(declaration.periode, 1) + timedelta(days=rng.randint(0, 40)), aujourd_hui)
+    return [Paiement(
+        declaration=declaration,
+        montant=montant,
+        mode_paiement=rng.choice(MODES_PAIEMENT),
+        date_paiement=date_paiement,
+        date_reception=_horodate(rng, date_paiement, jours_max=3),
+        statut=statut,
+        enregistre_par=rng.choice(utilisateurs['agent']),
+    )]
+
+
+def _actions(rng, employeur_id, fin, utilisateurs):
+    actions = []
+    for _ in range(rng.randint(1, 3)):
+        statut = rng.choice(('planifiee', 'en_cours', 'terminee', 'terminee', 'annulee'))
+        planifiee = _horodate(rng, _decaler(fin, -rng.randint(0, 6)))
+        actions.append(ActionRecouvrement(
+            employeur_id=employeur_id,
+            type_action=rng.choice(('relance', 'relance', 'mise_demeure', 'visite', 'autre')),
+            statut=statut,
+            date_planification=planifiee,
+            date_execution=planifiee + timedelta(days=rng.randint(0, 10)) if statut == 'terminee' else None,
+            montant_recouvre=Decimal(rng.randint(0, 500) * 1000) if statut == 'terminee' else Decimal('0'),
+            observations="Relance générée automatiquement",
+            agent=rng.choice(utilisateurs['agent']),
+            created_at=planifiee,
+        ))
+    return actions
+
+
+def _declarations(rng, valides, salaries, periodes, fin, lignes_max, utilisateurs, paquet, compteurs):
+    aujourd_hui = timezone.localdate()
+    # Paquets d'employeurs d'environ `paquet` déclarations chacun
+    par_paquet = max(1, paquet // len(periodes))
+    for debut in range(0, len(valides), par_paquet):
+        declarations, lignes, debiteurs = [], [], set()
+        for employeur_id, mois_validation in valides[debut:debut + par_paquet]:
+            equipe = salaries.get(employeur_id, [])[:lignes_max]
+            if not equipe:
+                continue
+            for periode in periodes:
+                if periode < mois_validation or rng.random() < 0.08:
+                    continue
+                statut = _statut_declaration(rng, periode, fin)
+                detail = []
+                for assure_id in equipe:
+                    salaire = Decimal(rng.randint(50, 800) * 1000)
+                    detail.append(LigneDeclaration(
+                        assure_id=assure_id,
+                        salaire_declare=salaire,
+                        cotisation_salariale=(salaire * TAUX_SALARIAL).quantize(CENTIME),
+                        cotisation_patronale=(salaire * TAUX_PATRONAL).quantize(CENTIME),
+                    ))
+                declaration = Declaration(
+                    employeur_id=employeur_id,
+                    periode=periode,
+                    date_soumission=None if statut == 'brouillon' else _horodate(rng, _decaler(periode, 1), 9),
+                    montant_total_cotisations=sum(l.cotisation_salariale + l.cotisation_patronale for l in detail),
+                    statut=statut,
+                    created_by=rng.choice(utilisateurs['agent']),
+                    created_at=_horodate(rng, _decaler(periode, 1), 9),
+                )
+                declarations.append(declaration)
+                lignes.append(detail)
+
+        with transaction.atomic(), _dates_imposees(Declaration, Paiement, ActionRecouvrement):
+            Declaration.objects.bulk_create(synchro.versionner(declarations), batch_size=500)
+            for declaration, detail in zip(declarations, lignes):
+                for ligne in detail:
+                    ligne.declaration_id = declaration.pk
+            LigneDeclaration.objects.bulk_create([l for detail in lignes for l in detail], batch_size=1000)
+
+            paiements = []
+            for declaration in declarations:
+                if declaration.statut != 'valide':
+                    continue
+                recus = _paiements(rng, declaration, utilisateurs, aujourd_hui)
+                if not any(p.statut == 'confirme' and p.montant == declaration.montant_total_cotisations for p in recus):
+                    debiteurs.add(declaration.employeur_id)
+                paiements += recus
+            _numeroter(paiements, 'reference', 'PAY', lambda p: p.date_paiement)
+            Paiement.objects.bulk_create(synchro.versionner(paiements), batch_size=1000)
+
+            actions = []
+            for employeur_id in sorted(debiteurs):
+                if rng.random() < 0.6:
+                    actions += _actions(rng, employeur_id, fin, utilisateurs)
+            ActionRecouvrement.objects.bulk_create(synchro.versionner(actions), batch_size=1000)
+
+        compteurs['declarations'] += len(declarations)
+        compteurs['lignes'] += sum(len(detail) for detail in lignes)
+        compteurs['paiements'] += len(paiements)
+        compteurs['actions'] += len(actions)
+
+
+def generer(employeurs=1000, assures=20000, mois=24, lignes=5, graine=1, fin=None, paquet=PAQUET, journal=None):
+    """Remplit la base ; renvoie le nombre de lignes créées par table.
+
+    `mois` déclarations mensuelles au plus par employeur validé, jusqu'au
+    mois `fin` (mois courant par défaut), chacune portant au plus `lignes`
+    salariés. `journal(message)` reçoit l'avancement.
+    """
+    journal = journal or (lambda message: None)
+    rng = random.Random(graine)
+    fin = (fin or timezone.localdate()).replace(day=1)
+    periodes = [_decaler(fin, -k) for k in range(mois - 1, -1, -1)]
+    # Employeurs créés jusqu'à un an avant la première période
+    debuts = [_decaler(periodes[0], -k) for k in range(12, 0, -1)] + periodes
+
+    with transaction.atomic():
+        regions, secteurs, utilisateurs = _referentiel()
+    compteurs = defaultdict(int)
+
+    journal(f"Employeurs ({employeurs})...")
+    crees = _employeurs(rng, employeurs, debuts, fin, regions, secteurs, utilisateurs, paquet)
+    valides = [(pk, mois_validation) for pk, mois_validation in crees if mois_validation]
+    compteurs['employeurs'] = len(crees)
+
+    journal(f"Assurés ({assures})...")
+    salaries = _assures(rng, assures, valides, fin, paquet)
+    compteurs['assures'] = assures if valides else 0
+
+    journal(f"Déclarations, paiements et actions de recouvrement ({mois} mois)...")
+    _declarations(rng, valides, salaries, periodes, fin, lignes, utilisateurs, paquet, compteurs)
+
+    journal("Reconstruction des KPI mensuels et des arriérés...")
+    kpi.reconstruire()
+    arrieres.reconstruire()
+    return dict(compteurs)
@@ -0,0 +1,247 @@
+# core/geo.py
+# Index spatial des employeurs (geohash) et ordre des tournées de visites.
+#
+# Chaque employeur géolocalisé porte le geohash de sa position (colonne
+# indexée, tenue à jour par Employeur.save et par les créations en masse).
+# Une recherche par cadre ou par rayon devient quelques intervalles de
+# geohash (un par cellule couvrant le cadre), servis par l'index, plus un
+# filtre exact sur latitude / longitude : seules les distances des
+# candidats sont calculées en Python.
+#
+# Les tournées sont ordonnées par l'heuristique du plus proche voisin, puis
+# améliorées par 2-opt ; pour les quelques dizaines de visites d'une journée,
+# cela prend une fraction de milliseconde.
+import math
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISION = 9          # cellule d'environ 5 m
+CELLULES_MAX = 16      # intervalles de geohash par recherche
+RAYON_TERRE = 6371.0088
+KM_PAR_DEGRE = math.pi * RAYON_TERRE / 180
+
+
+# --- Geohash -----------------------------------------------------------------------
+
+def encoder(latitude, longitude, precision=PRECISION):
+    """Geohash d'une position ('' si elle est inconnue)."""
+    if latitude is None or longitude is None:
+        return ''
+    latitude, longitude = float(latitude), float(longitude)
+    lat_min, lat_max, lon_min, lon_max = -90.0, 90.0, -180.0, 180.0
+    code, bits, valeur, longitude_bit = [], 0, 0, True
+    while len(code) < precision:
+        if longitude_bit:
+            milieu = (lon_min + lon_max) / 2
+            if longitude >= milieu:
+                valeur, lon_min = valeur * 2 + 1, milieu
+            else:
+                valeur, lon_max = valeur * 2, milieu
+        else:
+            milieu = (lat_min + lat_max) / 2
+            if latitude >= milieu:
+                valeur, lat_min = valeur * 2 + 1, milieu
+            else:
+                valeur, lat_max = valeur * 2, milieu
+        longitude_bit = not longitude_bit
+        bits += 1
+        if bits == 5:
+            code.append(BASE32[valeur])
+            bits = valeur = 0
+    return ''.join(code)
+
+
+def _taille_cellule(precision):
+    """(hauteur, largeur) en degrés d'une cellule de geohash."""
+    bits = 5 * precision
+    return 180 / 2 ** (bits // 2), 360 / 2 ** (bits - bits // 2)
+
+
+def cellules(sud, ouest, nord, est):
+    """Geohash des cellules couvrant le cadre, à la précision la plus fine
+    qui en donne au plus CELLULES_MAX."""
+    sud, nord = max(sud, -90.0), min(nord, 90.0)
+    ouest, est = max(ouest, -180.0), min(est, 180.0)
+    for precision in range(PRECISION, 0, -1):
+        hauteur, largeur = _taille_cellule(precision)
+        lignes = range(math.floor((sud + 90) / hauteur), math.floor((nord + 90) / hauteur) + 1)
+        colonnes = range(math.floor((ouest + 180) / largeur), math.floor((est + 180) / largeur) + 1)
+        if len(lignes) * len(colonnes) <= CELLULES_MAX:
+            break
+    return sorted({
+        encoder(-90 + (i + 0.5) * hauteur, -180 + (j + 0.5) * largeur, precision)
+        for i in lignes for j in colonnes
+    })
+
+
+def filtre_cadre(sud, ouest, nord, est):
+    """Q des employeurs situés dans le cadre (bornes comprises)."""
+    # geohash__startswith produirait un LIKE ... ESCAPE que SQLite ne sert pas
+    # par l'index : on le remplace par l'intervalle [préfixe, préfixe + '{'[
+    # ('{' suit 'z' dans l'ordre des caractères).
+    cellule = Q()
+    for prefixe in cellules(sud, ouest, nord, est):
+        cellule |= Q(geohash__gte=prefixe, geohash__lt=prefixe + '{')
+    return cellule & Q(
+        latitude__gte=_decimal(sud), latitude__lte=_decimal(nord),
+        longitude__gte=_decimal(ouest), longitude__lte=_decimal(est),
+    )
+
+
+def _decimal(valeur):
+    return Decimal(f"{valeur:.6f}")
+
+
+# --- Distances ---------------------------------------------------------------------
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Distance à vol d'oiseau (haversine), en kilomètres."""
+    lat1, lon1, lat2, lon2 = (math.radians(float(v)) for v in (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RAYON_TERRE * math.asin(min(1.0, math.sqrt(a)))
+
+
+def cadre_rayon(latitude, longitude, rayon_km):
+    """(sud, ouest, nord, est) du carré circonscrit au cercle."""
+    latitude, longitude = float(latitude), float(longitude)
+    dlat = rayon_km / KM_PAR_DEGRE
+    cosinus = math.cos(math.radians(latitude))
+    dlon = 180.0 if cosinus < 1e-6 else min(180.0, rayon_km / (KM_PAR_DEGRE * cosinus))
+    return latitude - dlat, longitude - dlon, latitude + dlat, longitude + dlon
+
+
+def dans_rayon(queryset, latitude, longitude, rayon_km):
+    """Employeurs du queryset à moins de `rayon_km` : [(employeur, distance)], du plus proche au plus loin."""
+    candidats = queryset.filter(filtre_cadre(*cadre_rayon(latitude, longitude, rayon_km)))
+    resultat = []
+    for employeur in candidats:
+        distance = distance_km(latitude, longitude, employeur.latitude, employeur.longitude)
+        if distance <= rayon_km:
+            resultat.append((employeur, distance))
+    resultat.sort(key=lambda e: (e[1], e[0].pk))
+    return resultat
+
+
+# --- Tournées ----------------------------------------------------------------------
+
+def _longueur(ordre, distances, depart):
+    total = distances[depart][ordre[0]] if depart is not None and ordre else 0.0
+    return total + sum(distances[a][b] for a, b in zip(ordre, ordre[1:]))
+
+
+def ordonner(points, depart=None):
+    """Ordre de visite des points [(lat, lon), ...] : indices dans l'ordre.
+
+    Chemin ouvert (sans retour) partant de `depart` (lat, lon) s'il est
+    donné, sinon du premier point. Plus proche voisin, puis 2-opt jusqu'à
+    ce qu'aucune inversion de segment ne raccourcisse le chemin.
+    """
+    n = len(points)
+    if n < 3 and depart is None:
+        return list(range(n))
+    tous = list(points) + ([depart] if depart is not None else [])
+    distances = [[distance_km(*a, *b) for b in tous] for a in tous]
+    origine = n if depart is not None else None
+
+    # Plus proche voisin
+    restants = set(range(n))
+    courant = origine if origine is not None else 0
+    ordre = [] if origine is not None else [0]
+    restants.discard(courant)
+    while restants:
+        suivant = min(restants, key=lambda j: (distances[courant][j], j))
+        ordre.append(suivant)
+        restants.remove(suivant)
+        courant = suivant
+
+    # 2-opt : inverser ordre[i..j] si cela raccourcit le chemin. Le premier
+    # point est fixe quand il n'y a pas de départ imposé.
+    chemin = ([origine] if origine is not None else []) + ordre
+    ameliore = True
+    while ameliore:
+        ameliore = False
+        for i in range(1, len(chemin) - 1):
+            for j in range(i + 1, len(chemin)):
+                a, b = chemin[i - 1], chemin[i]
+                c = chemin[j]
+                d = chemin[j + 1] if j + 1 < len(chemin) else None
+                avant = distances[a][b] + (distances[c][d] if d is not None else 0)
+                apres = distances[a][c] + (distances[b][d] if d is not None else 0)
+                if apres < avant - 1e-9:
+                    chemin[i:j + 1] = reversed(chemin[i:j + 1])
+                    ameliore = True
+    return chemin[1:] if origine is not None else chemin
+
+
+def _bornes_jour(jour):
+    debut = timezone.make_aware(datetime.combine(jour, time.min))
+    return debut, debut + timedelta(days=1)
+
+
+def visites_du_jour(agent, jour):
+    """Visites de contrôle planifiées d'un agent pour un jour (date locale)."""
+    from .models import ActionRecouvrement
+
+    debut, fin = _bornes_jour(jour)
+    return (
+        ActionRecouvrement.objects.filter(
+            agent=agent, type_action='visite', statut='planifiee',
+            date_planification__gte=debut, date_planification__lt=fin,
+        )
+        .select_related('employeur')
+        .order_by('date_planification', 'pk')
+    )
+
+
+class Tournee:
+    """Visites d'une journée dans l'ordre proposé, et distance parcourue."""
+
+    def __init__(self, jour, visites, sans_position, distance, distance_initiale):
+        self.jour = jour
+        self.visites = visites                  # ordre proposé
+        self.sans_position = sans_position      # employeurs non géolocalisés, en fin de tournée
+        self.distance = distance                # km, départ compris
+        self.distance_initiale = distance_initiale  # km, dans l'ordre planifié
+
+
+def tournee(agent, jour, depart=None):
+    """Propose l'ordre des visites planifiées d'un agent pour `jour`."""
+    visites = list(visites_du_jour(agent, jour))
+    placees = [v for v in visites if v.employeur.latitude is not None and v.employeur.longitude is not None]
+    sans_position = [v for v in visites if v not in placees]
+    points = [(v.employeur.latitude, v.employeur.longitude) for v in placees]
+    ordre = ordonner(points, depart)
+
+    tous = points + ([depart] if depart is not None else [])
+    distances = [[distance_km(*a, *b) for b in tous] for a in tous]
+    origine = len(points) if depart is not None else None
+    return Tournee(
+        jour,
+        [placees[i] for i in ordre],
+        sans_position,
+        round(_longueur(ordre, distances, origine), 2),
+        round(_longueur(list(range(len(points))), distances, origine), 2),
+    )
+
+
+def appliquer(tournee_):
+    """Replanifie les visites dans l'ordre de la tournée.
+
+    Les créneaux horaires déjà planifiés sont conservés et redistribués dans
+    le nouvel ordre ; chaque visite est enregistrée (versions, signaux).
+    """
+    visites = tournee_.visites + tournee_.sans_position
+    creneaux = sorted(v.date_planification for v in visites)
+    modifiees = 0
+    with transaction.atomic():
+        for visite, creneau in zip(visites, creneaux):
+            if visite.date_planification != creneau:
+                visite.date_planification = creneau
+                visite.save(update_fields=['date_planification'])
+                modifiees += 1
+    return modifiees
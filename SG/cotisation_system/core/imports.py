@@ -0,0 +1,312 @@
+# core/imports.py
+# Import en flux de fichiers tabulaires (CSV / XLSX).
+#
+# Les fichiers sont lus ligne à ligne (csv en flux, openpyxl en mode
+# read_only) et traités par paquets : une requête de résolution par paquet,
+# puis un bulk_create. La mémoire reste bornée par la taille d'un paquet,
+# quel que soit le nombre de lignes.
+import csv
+import io
+import unicodedata
+from datetime import date, datetime
+from functools import lru_cache
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from . import arrieres, kpi
+from .models import Assure, Declaration, LigneDeclaration
+from .sequences import nouvelle_version
+
+TAILLE_PAQUET = 2000
+MONTANT_MAX = Decimal('9999999999.99')  # max_digits=12, decimal_places=2
+
+
+class ErreurFichier(Exception):
+    """Fichier illisible ou colonnes obligatoires absentes."""
+
+
+def normaliser_entete(valeur):
+    # 'Numéro CNI ' -> 'numero_cni'
+    texte = unicodedata.normalize('NFKD', str(valeur or '')).encode('ascii', 'ignore').decode()
+    return '_'.join(texte.strip().lower().replace('°', '').split())
+
+
+def _encodage(fichier):
+    # Les CSV exportés par Excel en français sont souvent en cp1252
+    debut = fichier.read(65536)
+    fichier.seek(0)
+    try:
+        debut.decode('utf-8')
+    except UnicodeDecodeError as exc:
+        if exc.start < len(debut) - 3:
+            return 'cp1252'
+    return 'utf-8-sig'
+
+
+def _lignes_csv(fichier):
+    fichier = getattr(fichier, 'file', fichier)
+    flux = io.TextIOWrapper(fichier, encoding=_encodage(fichier), newline='')
+    echantillon = flux.read(4096)
+    flux.seek(0)
+    try:
+        dialecte = csv.Sniffer().sniff(echantillon, delimiters=';,\t')
+    except csv.Error:
+        dialecte = csv.excel
+    try:
+        yield from csv.reader(flux, dialecte)
+    finally:
+        flux.detach()
+
+
+def _lignes_xlsx(fichier):
+    import openpyxl
+
+    classeur = openpyxl.load_workbook(fichier, read_only=True, data_only=True)
+    try:
+        yield from classeur.active.iter_rows(values_only=True)
+    finally:
+        classeur.close()
+
+
+def ouvrir_tableau(fichier, nom=None, obligatoires=(), une_parmi=()):
+    """Lit et vérifie l'entête ; renvoie (entêtes normalisées, lignes comme lire_tableau).
+
+    `fichier` est un fichier binaire ouvert (UploadedFile, fichier disque...).
+    Le format est déduit de l'extension de `nom`. Les colonnes `obligatoires`
+    et au moins une des colonnes `une_parmi` doivent figurer dans l'entête.
+    """
+    nom = (nom or getattr(fichier, 'name', '') or '').lower()
+    if hasattr(fichier, 'seek'):
+        fichier.seek(0)
+    if nom.endswith(('.xlsx', '.xlsm')):
+        lignes = _lignes_xlsx(fichier)
+    elif nom.endswith(('.csv', '.txt')):
+        lignes = _lignes_csv(fichier)
+    else:
+        raise ErreurFichier("Format non pris en charge (CSV ou XLSX attendu).")
+
+    try:
+        entetes = [normaliser_entete(v) for v in next(lignes)]
+    except StopIteration:
+        raise ErreurFichier("Le fichier est vide.")
+    except (UnicodeDecodeError, ValueError) as exc:
+        raise ErreurFichier(f"Fichier illisible : {exc}")
+
+    manquantes = [c for c in obligatoires if c not in entetes]
+    if une_parmi and not set(une_parmi) & set(entetes):
+        manquantes.append(' ou '.join(une_parmi))
+    if manquantes:
+        raise ErreurFichier(f"Colonnes manquantes : {', '.join(manquantes)}")
+
+    return entetes, _valeurs(entetes, lignes)
+
+
+def _valeurs(entetes, lignes):
+    for numero, valeurs in enumerate(lignes, start=2):
+        if not any(v not in (None, '') for v in valeurs):
+            continue
+        # Ligne courte : les dernières colonnes manquent au dictionnaire
+        yield numero, dict(zip(entetes, valeurs))
+
+
+def lire_tableau(fichier, nom=None, obligatoires=(), une_parmi=()):
+    """Itère sur (numéro de ligne, {entête normalisée: valeur}) sans charger le fichier.
+
+    L'entête est lue et vérifiée dès l'appel (voir ouvrir_tableau).
+    """
+    return ouvrir_tableau(fichier, nom, obligatoires, une_parmi)[1]
+
+
+def par_paquets(iterable, taille=TAILLE_PAQUET):
+    iterateur = iter(iterable)
+    while paquet := list(islice(iterateur, taille)):
+        yield paquet
+
+
+def lire_montant(valeur):
+    """Convertit '1 234,50', '1234.5' ou un nombre Excel en Decimal à 2 décimales."""
+    if valeur is None or valeur == '':
+        raise ValueError("montant manquant")
+    if isinstance(valeur, (int, float, Decimal)):
+        montant = Decimal(str(valeur))
+    else:
+        texte = str(valeur).replace('\xa0', '').replace(' ', '')
+        if ',' in texte and '.' in texte:
+            texte = texte.replace('.', '') if texte.rfind(',') > texte.rfind('.') else texte.replace(',', '')
+        texte = texte.replace(',', '.')
+        try:
+            montant = Decimal(texte)
+        except InvalidOperation:
+            raise ValueError(f"montant invalide : {valeur!r}")
+    montant = montant.quantize(Decimal('0.01'))
+    if montant < 0:
+        raise ValueError("montant négatif")
+    if montant > MONTANT_MAX:
+        raise ValueError("montant trop élevé")
+    return montant
+
+
+FORMATS_DATE = ('%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y', '%d/%m/%y', '%d.%m.%Y')
+
+
+def lire_date(valeur):
+    """Convertit '31/01/2025', '2025-01-31' ou une date Excel en date."""
+    if isinstance(valeur, datetime):
+        return valeur.date()
+    if isinstance(valeur, date):
+        return valeur
+    texte = str(valeur or '').strip()
+    if not texte:
+        raise ValueError("date manquante")
+    date_lue = _date_texte(texte.split()[0])  # '31/01/2025 00:00:00'
+    if date_lue is None:
+        raise ValueError(f"date invalide : {valeur!r}")
+    return date_lue
+
+
+@lru_cache(maxsize=4096)
+def _date_texte(texte):
+    # Un relevé ne contient que quelques dizaines de dates distinctes
+    for format_date in FORMATS_DATE:
+        try:
+            return datetime.strptime(texte, format_date).date()
+        except ValueError:
+            continue
+    return None
+
+
+def lire_texte(valeur):
+    if valeur is None:
+        return ''
+    if isinstance(valeur, float) and valeur.is_integer():
+        valeur = int(valeur)
+    return str(valeur).strip()
+
+
+class ResultatImport:
+    def __init__(self):
+        self.lignes_lues = 0
+        self.lignes_importees = 0
+        self.erreurs = []  # [(numéro de ligne, message)]
+        self.montant_total = Decimal('0')
+
+    def erreur(self, numero, message):
+        self.erreurs.append((numero, message))
+
+    @property
+    def lignes_rejetees(self):
+        return len(self.erreurs)
+
+
+COLONNES_COTISATIONS = ('cotisation_salariale', 'cotisation_patronale')
+
+
+def recalculer_totaux(declarations):
+    """Recalcule montant_total_cotisations d'un queryset de déclarations.
+
+    Un seul UPDATE ... SET = (SELECT SUM ...) corrélé, quel que soit le nombre
+    de déclarations.
+    """
+    total = (
+        LigneDeclaration.objects.filter(declaration=OuterRef('pk'))
+        .order_by()
+        .values('declaration')
+        .annotate(total=Sum(F('cotisation_salariale') + F('cotisation_patronale')))
+        .values('total')
+    )
+    zero = Value(Decimal('0'), output_field=DecimalField(max_digits=15, decimal_places=2))
+    nouveau = Coalesce(Subquery(total), zero)
+    with transaction.atomic():
+        # Seules les déclarations dont le total change prennent une nouvelle
+        # version de synchronisation (core.synchro)
+        Declaration.objects.filter(pk__in=declarations.values('pk')).exclude(
+            montant_total_cotisations=nouveau,
+        ).update(montant_total_cotisations=nouveau, version=nouvelle_version())
+
+
+def recalculer_total(declaration):
+    declarations = Declaration.objects.filter(pk=declaration.pk)
+    recalculer_totaux(declarations)
+    declaration.refresh_from_db(fields=['montant_total_cotisations'])
+    # update() ne déclenche pas les signaux : mise à jour explicite des KPI et arriérés
+    kpi.recalculer_declarations(declarations)
+    arrieres.recalculer_declarations(declarations)
+
+
+def importer_lignes_declaration(declaration, fichier, nom=None, remplacer=True):
+    """Importe un fichier de paie dans les lignes d'une déclaration.
+
+    Chaque ligne identifie l'assuré par `numero_assure` ou `numero_cni` et
+    fournit `salaire_declare`. Sans colonnes `cotisation_salariale` et
+    `cotisation_patronale`, les cotisations sont calculées par le barème
+    (core.cotisations). Les lignes valides sont insérées, les autres sont
+    rapportées dans `ResultatImport.erreurs` avec leur numéro de ligne.
+    """
+    from .cotisations import recalculer_declaration
+    resultat = ResultatImport()
+    deja_vus = set()
+
+    with transaction.atomic():
+        if remplacer:
+            declaration.lignes.all().delete()
+        else:
+            deja_vus.update(declaration.lignes.values_list('assure_id', flat=True))
+
+        entetes, lignes = ouvrir_tableau(
+            fichier, nom, obligatoires=('salaire_declare',), une_parmi=('numero_assure', 'numero_cni'),
+        )
+        # Décidé sur l'entête, pour tout le fichier : sans colonnes de
+        # cotisations, elles sont calculées par le barème après insertion
+        a_calculer = not all(c in entetes for c in COLONNES_COTISATIONS)
+        colonnes = ('salaire_declare',) if a_calculer else ('salaire_declare',) + COLONNES_COTISATIONS
+        for paquet in par_paquets(lignes):
+            resultat.lignes_lues += len(paquet)
+            numeros = {lire_texte(v.get('numero_assure')) for _, v in paquet} - {''}
+            cnis = {lire_texte(v.get('numero_cni')) for _, v in paquet} - {''}
+
+            # Une seule requête de résolution pour tout le paquet
+            par_numero, par_cni = {}, {}
+            for pk, numero, cni in Assure.objects.filter(
+                Q(numero_assure__in=numeros) | Q(numero_cni__in=cnis)
+            ).values_list('pk', 'numero_assure', 'numero_cni'):
+                par_numero[numero] = pk
+                par_cni[cni] = pk
+
+            a_creer = []
+            for numero_ligne, valeurs in paquet:
+                numero = lire_texte(valeurs.get('numero_assure'))
+                cni = lire_texte(valeurs.get('numero_cni'))
+                if not numero and not cni:
+                    resultat.erreur(numero_ligne, "numero_assure ou numero_cni requis")
+                    continue
+                assure_id = par_numero.get(numero) or par_cni.get(cni)
+                if assure_id is None:
+                    resultat.erreur(numero_ligne, f"assuré introuvable ({numero or cni})")
+                    continue
+                if assure_id in deja_vus:
+                    resultat.erreur(numero_ligne, f"assuré déjà déclaré ({numero or cni})")
+                    continue
+                try:
+                    montants = dict.fromkeys(COLONNES_COTISATIONS, Decimal('0'))
+                    for colonne in colonnes:
+                        montants[colonne] = lire_montant(valeurs.get(colonne))
+                except ValueError as exc:
+                    resultat.erreur(numero_ligne, f"{colonne} : {exc}")
+                    continue
+                deja_vus.add(assure_id)
+                a_creer.append(LigneDeclaration(declaration=declaration, assure_id=assure_id, **montants))
+
+            LigneDeclaration.objects.bulk_create(a_creer, batch_size=500)
+            resultat.lignes_importees += len(a_creer)
+
+        if a_calculer:
+            recalculer_declaration(declaration)
+            declaration.refresh_from_db(fields=['montant_total_cotisations'])
+        else:
+            recalculer_total(declaration)
+    resultat.montant_total = declaration.montant_total_cotisations
+    return resultat
@@ -0,0 +1,298 @@
+# core/kpi.py
+# Maintenance de la table KpiMensuel (une ligne par mois et par région).
+#
+# Les mêmes agrégats groupés servent à reconstruire toute la table et à
+# recalculer une seule cellule (mois, région) : pour une cellule, on les
+# restreint simplement à un intervalle de dates et à une région. Les filtres
+# utilisent des intervalles [début, fin[ pour rester servis par les index.
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DateField, Max, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .archives import annee_close
+from .models import Assure, Declaration, DeclarationHistorique, Employeur, KpiMensuel, Paiement, PaiementHistorique
+
+METRIQUES = (
+    'nouveaux_employeurs',
+    'nouveaux_assures',
+    'employeurs_ayant_declare',
+    'cotisations_declarees',
+    'cotisations_encaissees',
+)
+
+# Métriques touchées par chaque modèle source
+METRIQUES_PAR_MODELE = {
+    Employeur: ('nouveaux_employeurs',),
+    Assure: ('nouveaux_assures',),
+    Declaration: ('employeurs_ayant_declare', 'cotisations_declarees'),
+    Paiement: ('cotisations_encaissees',),
+}
+
+
+def mois_de(valeur):
+    """Premier jour du mois d'une date ou d'un datetime (dans le fuseau courant)."""
+    if isinstance(valeur, datetime):
+        if timezone.is_aware(valeur):
+            valeur = timezone.localtime(valeur)
+        valeur = valeur.date()
+    return valeur.replace(day=1)
+
+
+def mois_suivant(mois):
+    return date(mois.year + 1, 1, 1) if mois.month == 12 else date(mois.year, mois.month + 1, 1)
+
+
+def _debut_datetime(jour):
+    return timezone.make_aware(datetime.combine(jour, time.min))
+
+
+# Chemin vers l'axe de ventilation depuis chaque modèle source
+AXES = {
+    'region': {
+        Employeur: 'region_id',
+        Assure: 'employeur__region_id',
+        Declaration: 'employeur__region_id',
+        Paiement: 'declaration__employeur__region_id',
+    },
+    'secteur': {
+        Employeur: 'secteur_activite_id',
+        Assure: 'employeur__secteur_activite_id',
+        Declaration: 'employeur__secteur_activite_id',
+        Paiement: 'declaration__employeur__secteur_activite_id',
+    },
+}
+
+
+def _filtre_cellule(champ_date, champ_region, mois, region_id, horodate):
+    """Q restreignant un agrégat à la cellule (mois, region_id)."""
+    fin = mois_suivant(mois)
+    if horodate:
+        debut, fin = _debut_datetime(mois), _debut_datetime(fin)
+    else:
+        debut = mois
+    q = Q(**{f'{champ_date}__gte': debut, f'{champ_date}__lt': fin})
+    if region_id is None:
+        return q & Q(**{f'{champ_region}__isnull': True})
+    return q & Q(**{champ_region: region_id})
+
+
+def _grouper(queryset, champ_date, champ_axe, horodate, cellule, depuis, **agregats):
+    if cellule is not None:
+        queryset = queryset.filter(_filtre_cellule(champ_date, champ_axe, *cellule, horodate))
+    if depuis is not None:
+        queryset = queryset.filter(**{f'{champ_date}__gte': _debut_datetime(depuis) if horodate else depuis})
+    groupes = ['kpi_mois', champ_axe] if champ_axe else ['kpi_mois']
+    lignes = (
+        queryset
+        .annotate(kpi_mois=TruncMonth(champ_date, output_field=DateField()))
+        .values(*groupes)
+        .annotate(**agregats)
+        .order_by()
+    )
+    for ligne in lignes:
+        cle = (ligne.pop('kpi_mois'), ligne.pop(champ_axe) if champ_axe else None)
+        yield cle, ligne
+
+
+def _historique(cellule, depuis):
+    # Mois d'un exercice clos : déclarations et paiements lus à travers les
+    # archives (core.archives), les tables actives n'en gardent qu'une partie
+    annee = annee_close()
+    if not annee:
+        return False
+    if cellule is not None:
+        return cellule[0].year <= annee
+    return depuis is None or depuis.year <= annee
+
+
+def calculer(metriques=METRIQUES, cellule=None, axe='region', depuis=None):
+    """Calcule les métriques demandées, groupées par (mois, valeur de l'axe).
+
+    Une requête par modèle source concerné, quel que soit le nombre de mois.
+    `axe` vaut 'region', 'secteur' ou None (totaux par mois uniquement) ;
+    `depuis` ignore les mois antérieurs. Avec `cellule=(mois, region_id)`, le
+    calcul est restreint à cette cellule (axe 'region').
+    """
+    chemins = AXES[axe] if axe else {}
+    resultats = {}
+    declarations, paiements = Declaration.objects, Paiement.objects
+    if _historique(cellule, depuis):
+        declarations, paiements = DeclarationHistorique.objects, PaiementHistorique.objects
+
+    def ajouter(modele, queryset, champ_date, horodate, **agregats):
+        source = _grouper(queryset, champ_date, chemins.get(modele), horodate, cellule, depuis, **agregats)
+        for cle, valeurs in source:
+            resultats.setdefault(cle, {}).update(valeurs)
+
+    if 'nouveaux_employeurs' in metriques:
+        ajouter(
+            Employeur, Employeur.objects.filter(statut='valide'), 'date_creation', True,
+            nouveaux_employeurs=Count('id'),
+        )
+    if 'nouveaux_assures' in metriques:
+        ajouter(
+            Assure, Assure.objects.all(), 'date_affiliation', True,
+            nouveaux_assures=Count('id'),
+        )
+    if {'employeurs_ayant_declare', 'cotisations_declarees'} & set(metriques):
+        ajouter(
+            Declaration, declarations.filter(statut='valide'), 'periode', False,
+            employeurs_ayant_declare=Count('employeur', distinct=True),
+            cotisations_declarees=Sum('montant_total_cotisations'),
+        )
+    if 'cotisations_encaissees' in metriques:
+        ajouter(
+            Paiement, paiements.filter(statut='confirme'), 'declaration__periode', False,
+            cotisations_encaissees=Sum('montant'),
+        )
+    return resultats
+
+
+def _valeurs_par_defaut(metriques):
+    return {m: Decimal('0') if m.startswith('cotisations') else 0 for m in metriques}
+
+
+def recalculer_cellule(mois, region_id, metriques=METRIQUES):
+    """Recalcule les métriques d'une cellule et met à jour (ou crée) sa ligne."""
+    mois = mois_de(mois)
+    valeurs = _valeurs_par_defaut(metriques)
+    valeurs.update(calculer(metriques, cellule=(mois, region_id)).get((mois, region_id), {}))
+    valeurs = {m: v if v is not None else 0 for m, v in valeurs.items()}
+    KpiMensuel.objects.update_or_create(mois=mois, region_id=region_id, defaults=valeurs)
+
+
+def recalculer_cellules(cellules, metriques=METRIQUES):
+    """Recalcule un ensemble de cellules {(mois, region_id), ...}."""
+    with transaction.atomic():
+        for mois, region_id in set(cellules):
+            recalculer_cellule(mois, region_id, metriques)
+
+
+def cellules_declarations(declarations):
+    """Cellules (mois, région) couvertes par un queryset de déclarations."""
+    return {
+        (mois_de(periode), region_id)
+        for periode, region_id in declarations.order_by()
+        .values_list('periode', 'employeur__region_id').distinct()
+    }
+
+
+def recalculer_declarations(declarations):
+    """Recalcule les cellules touchées par un queryset de déclarations.
+
+    À appeler après une mise à jour en masse (update, bulk_update) qui ne
+    déclenche pas les signaux.
+    """
+    recalculer_cellules(
+        cellules_declarations(declarations),
+        METRIQUES_PAR_MODELE[Declaration] + METRIQUES_PAR_MODELE[Paiement],
+    )
+
+
+def _lignes_attendues():
+    attendu = {}
+    for (mois, region_id), valeurs in calculer().items():
+        ligne = _valeurs_par_defaut(METRIQUES)
+        ligne.update({m: v for m, v in valeurs.items() if v is not None})
+        attendu[(mois, region_id)] = ligne
+    return attendu
+
+
+def reconstruire():
+    """Reconstruit entièrement la table à partir des tables sources."""
+    attendu = _lignes_attendues()
+    with transaction.atomic():
+        KpiMensuel.objects.all().delete()
+        KpiMensuel.objects.bulk_create(
+            [KpiMensuel(mois=mois, region_id=region_id, **valeurs)
+             for (mois, region_id), valeurs in attendu.items()],
+            batch_size=500,
+        )
+    return len(attendu)
+
+
+def verifier():
+    """Compare la table aux tables sources et renvoie la liste des écarts."""
+    attendu = _lignes_attendues()
+    ecarts = []
+    stockees = {
+        (k.mois, k.region_id): k
+        for k in KpiMensuel.objects.all()
+    }
+    for cle in attendu.keys() | stockees.keys():
+        valeurs = attendu.get(cle, _valeurs_par_defaut(METRIQUES))
+        ligne = stockees.get(cle)
+        for metrique in METRIQUES:
+            stocke = getattr(ligne, metrique) if ligne else 0
+            if stocke != valeurs[metrique]:
+                ecarts.append((cle[0], cle[1], metrique, stocke, valeurs[metrique]))
+    return sorted(ecarts, key=lambda e: (e[0], e[1] or 0, e[2]))
+
+
+def synthese(mois):
+    """Totaux toutes régions pour un mois, plus le nombre d'employeurs actifs.
+
+    Les employeurs actifs sont la somme des nouveaux employeurs validés sur
+    tous les mois, ce qui revient au nombre d'employeurs validés.
+    """
+    totaux = KpiMensuel.objects.aggregate(
+        employeurs_actifs=Sum('nouveaux_employeurs'),
+        **{m: Sum(m, filter=Q(mois=mois)) for m in METRIQUES},
+    )
+    return {k: v or 0 for k, v in totaux.items()}
+
+
+def derniere_modification():
+    """Date de la dernière écriture répercutée dans KpiMensuel (None si vide)."""
+    return KpiMensuel.objects.aggregate(derniere=Max('updated_at'))['derniere']
+
+
+def _employeurs_valides_avant(debut, axe):
+    chemin = AXES[axe][Employeur] if axe else None
+    qs = Employeur.objects.filter(statut='valide', date_creation__lt=_debut_datetime(debut)).order_by()
+    if chemin is None:
+        return {None: qs.count()}
+    return dict(qs.values(chemin).annotate(n=Count('id')).values_list(chemin, 'n'))
+
+
+def series(nb_mois, axe=None, jusqu_a=None):
+    """Séries mensuelles d'extension, de conformité et de recouvrement.
+
+    Renvoie {valeur de l'axe: {'mois': [...], métrique: [...], 'taux_*': [...]}}.
+    Le taux de conformité d'un mois rapporte les employeurs ayant déclaré au
+    nombre d'employeurs validés à la fin de ce mois.
+    """
+    fin = mois_de(jusqu_a or timezone.now())
+    mois = [fin]
+    while len(mois) < nb_mois:
+        mois.insert(0, (mois[0] - timedelta(days=1)).replace(day=1))
+
+    donnees = calculer(axe=axe, depuis=mois[0])
+    actifs = _employeurs_valides_avant(mois[0], axe)
+    cles = {cle for _, cle in donnees} | set(actifs)
+
+    resultat = {}
+    for cle in cles:
+        serie = {m: [] for m in METRIQUES}
+        serie.update(mois=mois, employeurs_actifs=[], taux_conformite=[], taux_recouvrement=[])
+        cumul = actifs.get(cle, 0)
+        for m in mois:
+            valeurs = _valeurs_par_defaut(METRIQUES)
+            valeurs.update({k: v for k, v in donnees.get((m, cle), {}).items() if v is not None})
+            cumul += valeurs['nouveaux_employeurs']
+            for metrique in METRIQUES:
+                serie[metrique].append(valeurs[metrique])
+            serie['employeurs_actifs'].append(cumul)
+            serie['taux_conformite'].append(
+                round(valeurs['employeurs_ayant_declare'] / cumul * 100, 2) if cumul else 0
+            )
+            declarees = valeurs['cotisations_declarees']
+            serie['taux_recouvrement'].append(
+                round(float(valeurs['cotisations_encaissees'] / declarees * 100), 2) if declarees else 0
+            )
+        resultat[cle] = serie
+    return resultat
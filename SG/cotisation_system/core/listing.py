@@ -0,0 +1,192 @@
+# core/listing.py
+# Moteur commun des pages de liste : filtres côté serveur et pagination par clé
+# (keyset / seek). Chaque page coûte une seule requête SQL, quelle que soit sa
+# position dans la table : on ne fait ni COUNT(*) ni OFFSET.
+import base64
+import json
+from datetime import date
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+PAR_PAGE = 50
+PAR_PAGE_MAX = 200
+
+
+def _encoder_curseur(valeurs):
+    brut = json.dumps(valeurs, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(brut).decode().rstrip('=')
+
+
+def _decoder_curseur(curseur):
+    try:
+        brut = base64.urlsafe_b64decode(curseur + '=' * (-len(curseur) % 4))
+        valeur, pk = json.loads(brut)
+        return valeur, int(pk)
+    except (ValueError, TypeError):
+        return None
+
+
+def bornes_mois(valeur):
+    """Convertit 'AAAA-MM' en (premier jour du mois, premier jour du mois suivant)."""
+    try:
+        annee, mois = (int(v) for v in valeur.split('-')[:2])
+        debut = date(annee, mois, 1)
+    except (ValueError, TypeError):
+        return None
+    suivant = date(annee + 1, 1, 1) if mois == 12 else date(annee, mois + 1, 1)
+    return debut, suivant
+
+
+class Filtre:
+    """Filtre de liste lu dans request.GET.
+
+    `lookup` est le chemin ORM filtré, ou une fonction valeur -> Q (None si
+    la valeur est invalide). Avec `mois=True`, la valeur attendue est
+    'AAAA-MM' et le filtre devient un intervalle [début, fin[ qui reste
+    utilisable par un index (contrairement à __month / __year).
+    """
+
+    def __init__(self, param, lookup, mois=False, booleen=False):
+        self.param = param
+        self.lookup = lookup
+        self.mois = mois
+        self.booleen = booleen
+
+    def appliquer(self, queryset, valeur):
+        if callable(self.lookup):
+            condition = self.lookup(valeur)
+            return queryset if condition is None else queryset.filter(condition)
+        if self.mois:
+            bornes = bornes_mois(valeur)
+            if bornes is None:
+                return queryset
+            return queryset.filter(**{
+                f'{self.lookup}__gte': bornes[0],
+                f'{self.lookup}__lt': bornes[1],
+            })
+        if self.booleen:
+            valeur = valeur in ('1', 'true', 'oui', 'actif')
+        try:
+            return queryset.filter(**{self.lookup: valeur})
+        except (ValueError, ValidationError):
+            # Valeur mal formée dans l'URL : on ignore le filtre
+            return queryset
+
+
+class Page:
+    def __init__(self, object_list, suivant=None, precedent=None):
+        self.object_list = object_list
+        self.curseur_suivant = suivant
+        self.curseur_precedent = precedent
+
+    @property
+    def has_next(self):
+        return self.curseur_suivant is not None
+
+    @property
+    def has_previous(self):
+        return self.curseur_precedent is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """Pagination décroissante (ou croissante) sur (cle, pk).
+
+    Le couple (cle, pk) est unique, donc l'ordre est total et stable même
+    quand plusieurs lignes partagent la même date. La page suivante est
+    obtenue par `(cle, pk) < (derniere_cle, dernier_pk)`, ce que l'index
+    composite sur (-cle, -id) sert directement.
+    """
+
+    def __init__(self, queryset, cle, par_page=PAR_PAGE, croissant=False):
+        self.queryset = queryset
+        self.cle = cle
+        self.par_page = par_page
+        self.croissant = croissant
+        self.champ = queryset.model._meta.get_field(cle)
+
+    def _valeur(self, obj):
+        if getattr(obj, self.cle) is None:
+            return None
+        return self.champ.value_to_string(obj)
+
+    def _apres(self, qs, valeur, pk, croissant):
+        # (cle, pk) strictement après la borne dans l'ordre demandé
+        op = 'gt' if croissant else 'lt'
+        qs = qs.filter(Q(**{f'{self.cle}__{op}': valeur}) | Q(**{self.cle: valeur, f'pk__{op}': pk}))
+        return self._trier(qs, croissant)
+
+    def _trier(self, qs, croissant):
+        return qs.order_by(self.cle, 'pk') if croissant else qs.order_by(f'-{self.cle}', '-pk')
+
+    def _borne(self, curseur):
+        decode = _decoder_curseur(curseur) if curseur else None
+        if decode is None:
+            return None
+        try:
+            return self.champ.to_python(decode[0]), decode[1]
+        except ValidationError:
+            return None
+
+    def page(self, apres=None, avant=None):
+        qs = self.queryset
+        borne_apres = self._borne(apres)
+        borne_avant = self._borne(avant) if borne_apres is None else None
+
+        if borne_apres:
+            qs = self._apres(qs, *borne_apres, self.croissant)
+        elif borne_avant:
+            # Page précédente : parcours en sens inverse, remis dans l'ordre ensuite
+            qs = self._apres(qs, *borne_avant, not self.croissant)
+        else:
+            qs = self._trier(qs, self.croissant)
+
+        # Une ligne de plus que demandé pour savoir s'il existe une page au-delà
+        lignes = list(qs[:self.par_page + 1])
+        encore = len(lignes) > self.par_page
+        lignes = lignes[:self.par_page]
+
+        if borne_avant:
+            lignes.reverse()
+            a_suivant, a_precedent = True, encore
+        else:
+            a_suivant, a_precedent = encore, borne_apres is not None
+
+        if not lignes:
+            return Page(lignes)
+        premier, dernier = lignes[0], lignes[-1]
+        suivant = _encoder_curseur([self._valeur(dernier), dernier.pk]) if a_suivant else None
+        precedent = _encoder_curseur([self._valeur(premier), premier.pk]) if a_precedent else None
+        return Page(lignes, suivant, precedent)
+
+
+def filtrer(request, queryset, filtres=()):
+    """Applique les filtres présents dans request.GET ; renvoie (queryset, filtres actifs)."""
+    actifs = {}
+    for filtre in filtres:
+        valeur = request.GET.get(filtre.param, '').strip()
+        if valeur:
+            queryset = filtre.appliquer(queryset, valeur)
+            actifs[filtre.param] = valeur
+    return queryset, actifs
+
+
+def paginer(request, queryset, cle, filtres=(), croissant=False):
+    """Applique les filtres présents dans request.GET puis renvoie (page, filtres actifs)."""
+    queryset, actifs = filtrer(request, queryset, filtres)
+
+    try:
+        par_page = min(int(request.GET.get('par_page', PAR_PAGE)), PAR_PAGE_MAX)
+    except ValueError:
+        par_page = PAR_PAGE
+    par_page = max(par_page, 1)
+
+    paginator = KeysetPaginator(queryset, cle, par_page, croissant)
+    page = paginator.page(apres=request.GET.get('apres'), avant=request.GET.get('avant'))
+    return page, actifs
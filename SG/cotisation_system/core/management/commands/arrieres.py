@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import arrieres
+
+
+class Command(BaseCommand):
+    help = "Reconstruit ou vérifie la table des arriérés par employeur (ArriereEmployeur)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verifier', action='store_true',
+            help="Compare la table aux déclarations et paiements sans la modifier.",
+        )
+
+    def handle(self, *args, **options):
+        if options['verifier']:
+            ecarts = arrieres.verifier()
+            for employeur_id, champ, stocke, attendu in ecarts:
+                self.stdout.write(f"employeur={employeur_id} {champ}: {stocke} au lieu de {attendu}")
+            if ecarts:
+                raise CommandError(f"{len(ecarts)} écart(s) détecté(s). Relancer sans --verifier pour reconstruire.")
+            self.stdout.write(self.style.SUCCESS("Arriérés à jour."))
+            return
+
+        n = arrieres.reconstruire()
+        self.stdout.write(self.style.SUCCESS(f"{n} employeur(s) en arriéré."))
@@ -0,0 +1,50 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core import campagnes
+from core.listing import bornes_mois
+
+
+class Command(BaseCommand):
+    help = (
+        "Crée les actions de recouvrement (relance, mise en demeure, visite) des employeurs "
+        "défaillants pour une période. Lancée chaque nuit par django-crontab (CRONJOBS) ; "
+        "une nouvelle exécution ne traite que les employeurs devenus défaillants depuis."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--periode', help="Période au format AAAA-MM (mois écoulé par défaut).")
+        parser.add_argument(
+            '--date', help="Date de planification des actions, AAAA-MM-JJ (maintenant par défaut).",
+        )
+        parser.add_argument(
+            '--simuler', action='store_true',
+            help="Compte les actions à créer sans les enregistrer.",
+        )
+
+    def handle(self, *args, **options):
+        periode = None
+        if options['periode']:
+            bornes = bornes_mois(options['periode'])
+            if bornes is None:
+                raise CommandError(f"Période invalide : {options['periode']!r} (attendu AAAA-MM).")
+            periode = bornes[0]
+        debut = None
+        if options['date']:
+            try:
+                debut = timezone.make_aware(datetime.fromisoformat(options['date']))
+            except ValueError:
+                raise CommandError(f"Date invalide : {options['date']!r} (attendu AAAA-MM-JJ).")
+
+        periode = periode or campagnes.periode_par_defaut()
+        chrono = time.perf_counter()
+        nombres = campagnes.lancer(periode, debut, simuler=options['simuler'])
+        detail = ', '.join(f"{n} {type_}" for type_, n in sorted(nombres.items())) or 'aucune'
+        verbe = "à créer" if options['simuler'] else "créée(s)"
+        self.stdout.write(self.style.SUCCESS(
+            f"Campagne {periode:%m/%Y} : {sum(nombres.values())} action(s) {verbe} ({detail}) "
+            f"en {time.perf_counter() - chrono:.1f} s."
+        ))
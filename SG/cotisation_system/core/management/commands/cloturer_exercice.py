@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import archives
+from core.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Clôture un exercice (année des périodes de déclaration) : ses déclarations définitives, "
+        "leurs lignes et leurs paiements passent dans les tables d'archive, par paquets, et un "
+        "bilan annuel par employeur est tenu. Relancer la commande archive les déclarations "
+        "soldées depuis la dernière clôture."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('annee', type=int, help="Exercice à clôturer (AAAA).")
+        parser.add_argument(
+            '--taille', type=int, default=archives.TAILLE_PAQUET,
+            help="Déclarations déplacées par transaction.",
+        )
+        parser.add_argument('--utilisateur', help="Nom d'utilisateur enregistré comme auteur de la clôture.")
+        parser.add_argument(
+            '--simuler', action='store_true',
+            help="Compte ce qui serait archivé sans rien déplacer.",
+        )
+
+    def handle(self, *args, **options):
+        annee = options['annee']
+        utilisateur = None
+        if options['utilisateur']:
+            utilisateur = CustomUser.objects.filter(username=options['utilisateur']).first()
+            if utilisateur is None:
+                raise CommandError(f"Utilisateur inconnu : {options['utilisateur']!r}.")
+        if options['taille'] < 1:
+            raise CommandError("--taille doit être positif.")
+
+        chrono = time.perf_counter()
+        try:
+            if options['simuler']:
+                compte = archives.simuler(annee)
+            else:
+                compte = archives.cloturer(annee, utilisateur, options['taille'])
+        except archives.ErreurCloture as exc:
+            raise CommandError(str(exc))
+        verbe = "à archiver" if options['simuler'] else "archivée(s)"
+        self.stdout.write(self.style.SUCCESS(
+            f"Exercice {annee} : {compte['declarations']} déclaration(s) {verbe}, "
+            f"{compte['lignes']} ligne(s), {compte['paiements']} paiement(s) ; "
+            f"{compte['ouvertes']} déclaration(s) restée(s) ouverte(s), "
+            f"en {time.perf_counter() - chrono:.1f} s."
+        ))
@@ -0,0 +1,130 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+
+from core.models import CustomUser
+
+# (nom d'URL, paramètres) : la ventilation par région ajoute un agrégat parallèle
+VUES = (('dashboard', ''), ('kpi_data', 'mois=12&ventilation=region'))
+
+
+def _centile(durees, rang):
+    durees = sorted(durees)
+    return durees[min(len(durees) - 1, int(len(durees) * rang / 100))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare la latence (p50/p99) du tableau de bord et des KPI sous charge concurrente, "
+        "servis par le gestionnaire WSGI (vues synchrones, un thread par requête) et par le "
+        "gestionnaire ASGI (vues asynchrones du profil serveur_asgi, agrégats en parallèle). "
+        "Mesure en processus, sur la base configurée : "
+        "la remplir d'abord (generer_donnees)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requetes', type=int, default=200, help="Requêtes par vue et par gestionnaire.")
+        parser.add_argument('--concurrence', type=int, default=16, help="Requêtes simultanées.")
+        parser.add_argument('--utilisateur', help="Nom d'utilisateur connecté (premier administrateur actif par défaut).")
+
+    def handle(self, *args, **options):
+        utilisateurs = CustomUser.objects.filter(is_active=True)
+        if options['utilisateur']:
+            utilisateur = utilisateurs.filter(username=options['utilisateur']).first()
+        else:
+            utilisateur = utilisateurs.filter(role='admin').order_by('pk').first()
+        if utilisateur is None:
+            raise CommandError("Aucun utilisateur pour ouvrir la session de mesure.")
+
+        session = SessionStore()
+        session[SESSION_KEY] = str(utilisateur.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = utilisateur.get_session_auth_hash()
+        session.create()
+        cookie = f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+        hote = next((h for h in settings.ALLOWED_HOSTS if h != '*' and not h.startswith('.')), 'localhost')
+        try:
+            self.stdout.write(
+                f"{'vue':<12}{'serveur':>9}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>9}"
+            )
+            for vue, parametres in VUES:
+                chemin = reverse(vue)
+                for serveur, mesurer, urls in (
+                    ('wsgi', self.charge_wsgi, 'cotisation_system.urls'),
+                    # Vues asynchrones, comme sous le profil serveur_asgi
+                    ('asgi', self.charge_asgi, 'cotisation_system.urls_asgi'),
+                ):
+                    with override_settings(ROOT_URLCONF=urls):
+                        mesurer(chemin, parametres, hote, cookie, 2, 2)  # Échauffement (gabarits, connexions)
+                        debut = time.perf_counter()
+                        durees = mesurer(chemin, parametres, hote, cookie, options['requetes'], options['concurrence'])
+                        debit = len(durees) / (time.perf_counter() - debut)
+                    self.stdout.write(
+                        f"{vue:<12}{serveur:>9}{_centile(durees, 50):>10.1f}{_centile(durees, 99):>10.1f}{debit:>9.0f}"
+                    )
+        finally:
+            session.delete()
+
+    def charge_wsgi(self, chemin, parametres, hote, cookie, nombre, concurrence):
+        gestionnaire = WSGIHandler()
+        environ = RequestFactory(HTTP_HOST=hote, HTTP_COOKIE=cookie).get(chemin, QueryDict(parametres)).environ
+
+        def appel(_):
+            statuts = []
+            debut = time.perf_counter()
+            corps = gestionnaire(dict(environ), lambda statut, entetes, *exc: statuts.append(statut))
+            try:
+                b''.join(corps)
+            finally:
+                corps.close()
+            if not statuts[0].startswith('200'):
+                raise CommandError(f"WSGI {chemin} : HTTP {statuts[0]}")
+            return (time.perf_counter() - debut) * 1000
+
+        with ThreadPoolExecutor(concurrence) as pool:
+            return list(pool.map(appel, range(nombre)))
+
+    def charge_asgi(self, chemin, parametres, hote, cookie, nombre, concurrence):
+        gestionnaire = ASGIHandler()
+        portee = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': chemin, 'raw_path': chemin.encode(), 'query_string': parametres.encode(),
+            'root_path': '', 'client': ('127.0.0.1', 0), 'server': (hote, 80),
+            'headers': [(b'host', hote.encode()), (b'cookie', cookie.encode())],
+        }
+
+        async def appel(limite):
+            messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+            statuts = []
+
+            async def recevoir():
+                if messages:
+                    return messages.pop()
+                await asyncio.Event().wait()  # Le client ne se déconnecte pas
+
+            async def envoyer(message):
+                if message['type'] == 'http.response.start':
+                    statuts.append(message['status'])
+
+            async with limite:
+                debut = time.perf_counter()
+                await gestionnaire(dict(portee), recevoir, envoyer)
+                if statuts[0] != 200:
+                    raise CommandError(f"ASGI {chemin} : HTTP {statuts[0]}")
+                return (time.perf_counter() - debut) * 1000
+
+        async def charge():
+            limite = asyncio.Semaphore(concurrence)
+            return await asyncio.gather(*(appel(limite) for _ in range(nombre)))
+
+        return asyncio.run(charge())
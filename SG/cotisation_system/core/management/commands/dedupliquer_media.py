@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from core import stockage
+
+
+class Command(BaseCommand):
+    help = (
+        "Range les pièces justificatives et preuves de paiement existantes dans "
+        "le stockage dédupliqué (un fichier par contenu) et affiche l'espace gagné."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--simulation', action='store_true',
+            help="Calcule le gain sans rien déplacer ni modifier.",
+        )
+        parser.add_argument(
+            '--recompter', action='store_true',
+            help="Recalcule seulement les compteurs de références et supprime les blobs inutilisés.",
+        )
+
+    def handle(self, *args, **options):
+        if options['recompter']:
+            corriges, supprimes = stockage.recompter()
+            self.stdout.write(self.style.SUCCESS(
+                f"{corriges} compteur(s) corrigé(s), {supprimes} blob(s) inutilisé(s) supprimé(s)."
+            ))
+            return
+
+        bilan = stockage.dedupliquer(simulation=options['simulation'])
+        for nom in bilan.manquants:
+            self.stdout.write(self.style.WARNING(f"Fichier introuvable : {nom}"))
+        self.stdout.write(
+            f"{bilan.fichiers} fichier(s) lu(s), {bilan.nouveaux} contenu(s) distinct(s) nouveau(x), "
+            f"{bilan.lignes} ligne(s) {'à repointer' if options['simulation'] else 'repointée(s)'}."
+        )
+        self.stdout.write(
+            f"Avant : {filesizeformat(bilan.octets_avant)} ({bilan.octets_avant} octets) ; "
+            f"après : {filesizeformat(bilan.octets_apres)} ({bilan.octets_apres} octets)."
+        )
+        if bilan.orphelins:
+            self.stdout.write(self.style.WARNING(
+                f"{len(bilan.orphelins)} fichier(s) non référencé(s) laissé(s) en place "
+                f"({filesizeformat(bilan.octets_orphelins)})."
+            ))
+        message = f"Espace {'récupérable' if options['simulation'] else 'récupéré'} : " \
+                  f"{filesizeformat(bilan.octets_economises)} ({bilan.octets_economises} octets)."
+        self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import doublons
+
+
+class Command(BaseCommand):
+    help = (
+        "Recherche les assurés probablement enregistrés deux fois : les fiches sont regroupées par "
+        "clés de blocage (phonétique du nom ou du prénom et date de naissance, téléphone), comparées "
+        "par similarité floue dans chaque bloc, et les paires trouvées alimentent la file de fusion "
+        "(admin, Doublons d'assurés)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processus', type=int, default=None,
+            help="Processus de comparaison (un par cœur par défaut).",
+        )
+        parser.add_argument(
+            '--paquet', type=int, default=doublons.PAQUET_BLOCS,
+            help="Blocs comparés par tâche.",
+        )
+        parser.add_argument(
+            '--simuler', action='store_true',
+            help="Affiche les paires trouvées sans remplir la file.",
+        )
+
+    def handle(self, *args, **options):
+        if options['paquet'] < 1 or (options['processus'] is not None and options['processus'] < 1):
+            raise CommandError("--processus et --paquet doivent être positifs.")
+
+        chrono = time.perf_counter()
+        paires, bilan = doublons.rechercher(options['processus'], options['paquet'])
+        if options['simuler']:
+            for (pk1, pk2), score in sorted(paires.items(), key=lambda p: -p[1])[:50]:
+                self.stdout.write(f"{pk1:>10} {pk2:>10} {score:>6.1%}")
+            nouvelles = "non enregistrées"
+        else:
+            nouvelles = f"{doublons.mettre_en_file(paires)} nouvelle(s) en file"
+        self.stdout.write(self.style.SUCCESS(
+            f"{bilan['blocs']} bloc(s), {bilan['fiches']} fiche(s) comparée(s), "
+            f"{bilan['blocs_ignores']} bloc(s) trop grand(s) ignoré(s) : "
+            f"{bilan['paires']} paire(s) probable(s), {nouvelles}, "
+            f"en {time.perf_counter() - chrono:.1f} s."
+        ))
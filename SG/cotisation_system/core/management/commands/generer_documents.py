@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import documents
+from core.listing import bornes_mois
+from core.models import Paiement
+
+TYPES = ('attestations', 'quittances', 'rapports')
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère en parallèle les PDF d'un mois (attestations de régularité, quittances, "
+        "rapports régionaux). Les documents dont les données n'ont pas changé sont repris du cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--type', dest='types', action='append', choices=TYPES,
+            help="Documents à générer, option répétable (tous par défaut).",
+        )
+        parser.add_argument('--mois', required=True, help="Période au format AAAA-MM.")
+        parser.add_argument(
+            '--processus', type=int, default=None,
+            help="Nombre de processus de rendu (DOCUMENTS_PROCESSUS, ou un par cœur).",
+        )
+
+    def handle(self, *args, **options):
+        bornes = bornes_mois(options['mois'])
+        if bornes is None:
+            raise CommandError(f"Mois invalide : {options['mois']!r} (attendu AAAA-MM).")
+        mois = bornes[0]
+
+        for type_ in options['types'] or TYPES:
+            debut = time.perf_counter()
+            if type_ == 'attestations':
+                liste = documents.attestations(mois)
+            elif type_ == 'quittances':
+                liste = documents.quittances(Paiement.objects.filter(declaration__periode=mois))
+            else:
+                liste = documents.rapports(mois)
+            generes = documents.generer(liste, processus=options['processus'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{type_} {mois:%m/%Y} : {len(liste)} document(s), {generes} généré(s), "
+                f"{len(liste) - generes} repris du cache ({time.perf_counter() - debut:.1f} s)."
+            ))
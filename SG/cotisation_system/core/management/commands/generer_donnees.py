@@ -0,0 +1,50 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import generation
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère un jeu de données volumineux et reproductible (employeurs, assurés, "
+        "déclarations, paiements, actions de recouvrement) pour les tests de charge."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employeurs', type=int, default=50000)
+        parser.add_argument('--assures', type=int, default=1000000)
+        parser.add_argument('--mois', type=int, default=24, help="Nombre de périodes déclarées.")
+        parser.add_argument('--lignes', type=int, default=5, help="Salariés déclarés au plus par déclaration.")
+        parser.add_argument('--graine', type=int, default=1)
+        parser.add_argument(
+            '--fin', help="Dernière période (AAAA-MM), mois courant par défaut. À fixer pour reproduire un jeu à l'identique.",
+        )
+        parser.add_argument('--paquet', type=int, default=generation.PAQUET, help="Lignes insérées par requête.")
+
+    def handle(self, *args, **options):
+        if generation.deja_genere():
+            raise CommandError("La base contient déjà des données générées.")
+        if min(options['employeurs'], options['mois'], options['lignes'], options['paquet']) < 1 or options['assures'] < 0:
+            raise CommandError("Les volumes doivent être positifs.")
+        fin = None
+        if options['fin']:
+            try:
+                fin = datetime.strptime(options['fin'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError("--fin doit être au format AAAA-MM.")
+
+        debut = datetime.now()
+        compteurs = generation.generer(
+            employeurs=options['employeurs'],
+            assures=options['assures'],
+            mois=options['mois'],
+            lignes=options['lignes'],
+            graine=options['graine'],
+            fin=fin,
+            paquet=options['paquet'],
+            journal=self.stdout.write,
+        )
+        for table, nombre in compteurs.items():
+            self.stdout.write(f"  {table} : {nombre}")
+        self.stdout.write(self.style.SUCCESS(f"Données générées en {datetime.now() - debut}."))
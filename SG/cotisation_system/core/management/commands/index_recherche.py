@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core import recherche
+
+
+class Command(BaseCommand):
+    help = "Crée ou reconstruit l'index de recherche des employeurs et des assurés."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help="Base de données cible.")
+
+    def handle(self, *args, **options):
+        n = recherche.installer(options['database'], reconstruire=True)
+        if n:
+            self.stdout.write(self.style.SUCCESS(f"{n} index de recherche reconstruit(s)."))
+        else:
+            self.stdout.write(self.style.WARNING("Moteur sans index de recherche : recherche par icontains."))
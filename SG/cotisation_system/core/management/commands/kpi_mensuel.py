@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import kpi
+
+
+class Command(BaseCommand):
+    help = "Reconstruit ou vérifie la table des KPI mensuels (KpiMensuel)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verifier', action='store_true',
+            help="Compare la table aux données sources sans la modifier.",
+        )
+
+    def handle(self, *args, **options):
+        if options['verifier']:
+            ecarts = kpi.verifier()
+            for mois, region_id, metrique, stocke, attendu in ecarts:
+                self.stdout.write(f"{mois:%m/%Y} région={region_id} {metrique}: {stocke} au lieu de {attendu}")
+            if ecarts:
+                raise CommandError(f"{len(ecarts)} écart(s) détecté(s). Relancer sans --verifier pour reconstruire.")
+            self.stdout.write(self.style.SUCCESS("KPI mensuels à jour."))
+            return
+
+        n = kpi.reconstruire()
+        self.stdout.write(self.style.SUCCESS(f"{n} ligne(s) KPI reconstruite(s)."))
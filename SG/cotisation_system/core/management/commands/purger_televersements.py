@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import televersements
+from core.models import Televersement
+
+
+class Command(BaseCommand):
+    help = "Supprime les envois par morceaux abandonnés ou jamais rattachés."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--heures', type=int, default=48,
+            help="Âge minimal (depuis la dernière activité) des envois à supprimer.",
+        )
+
+    def handle(self, *args, **options):
+        limite = timezone.now() - timedelta(hours=options['heures'])
+        anciens = Televersement.objects.filter(updated_at__lt=limite).exclude(statut='attache')
+        n = 0
+        for televersement in anciens.iterator():
+            televersements.supprimer(televersement)
+            n += 1
+        Televersement.objects.filter(updated_at__lt=limite, statut='attache').delete()
+        self.stdout.write(self.style.SUCCESS(f"{n} envoi(s) abandonné(s) supprimé(s)."))
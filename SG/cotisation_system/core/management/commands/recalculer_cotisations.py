@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import cotisations
+from core.listing import bornes_mois
+from core.models import Declaration
+
+
+class Command(BaseCommand):
+    help = "Recalcule les cotisations des lignes de déclaration selon le barème en vigueur."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--periode', help="Mois à recalculer (AAAA-MM).")
+        parser.add_argument('--depuis', help="Premier mois d'un recalcul historique (AAAA-MM).")
+        parser.add_argument('--jusqu-a', dest='jusqu_a', help="Dernier mois du recalcul historique (AAAA-MM).")
+        parser.add_argument('--declaration', type=int, help="Identifiant d'une seule déclaration.")
+        parser.add_argument(
+            '--inclure-validees', action='store_true',
+            help="Recalcule aussi les déclarations déjà validées.",
+        )
+
+    def _mois(self, valeur, option):
+        bornes = bornes_mois(valeur) if valeur else None
+        if valeur and bornes is None:
+            raise CommandError(f"{option} : format AAAA-MM attendu.")
+        return bornes[0] if bornes else None
+
+    def handle(self, *args, **options):
+        if options['declaration']:
+            try:
+                declaration = Declaration.objects.get(pk=options['declaration'])
+            except Declaration.DoesNotExist:
+                raise CommandError("Déclaration introuvable.")
+            n = cotisations.recalculer_declaration(declaration)
+        else:
+            periode = self._mois(options['periode'], '--periode')
+            depuis = periode or self._mois(options['depuis'], '--depuis')
+            if depuis is None:
+                raise CommandError("Indiquer --periode, --depuis ou --declaration.")
+            jusqu_a = periode or self._mois(options['jusqu_a'], '--jusqu-a')
+            n = cotisations.recalculer_historique(depuis, jusqu_a, options['inclure_validees'])
+        self.stdout.write(self.style.SUCCESS(f"{n} ligne(s) recalculée(s)."))
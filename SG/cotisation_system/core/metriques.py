@@ -0,0 +1,274 @@
+# core/metriques.py
+# Instrumentation des requêtes HTTP et export au format texte Prometheus.
+#
+# Le middleware mesure, par vue (nom d'URL résolu) : la durée de la requête
+# (histogramme), le nombre et la durée des requêtes SQL (via
+# connection.execute_wrapper), la taille de la réponse et le temps de rendu
+# des gabarits (backend GabaritsChronometres). Une requête plus lente que
+# METRIQUES_SEUIL_LENT est journalisée avec ses requêtes SQL les plus
+# lentes (logger `core.metriques`).
+#
+# Coût par requête : quelques appels à perf_counter et une mise à jour de
+# compteurs sous verrou ; le texte SQL n'est conservé que pour les
+# METRIQUES_SQL_JOURNALISEES requêtes les plus lentes. Les compteurs sont
+# propres à chaque processus : avec plusieurs workers, Prometheus doit
+# interroger chacun (ou les agréger côté collecte).
+import heapq
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+# Bornes des histogrammes
+DUREES = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+NOMBRES_SQL = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+TAILLES = (1024, 10240, 102400, 1048576, 10485760)
+
+NON_RESOLUE = '<non résolue>'
+
+_mesure_courante = ContextVar('mesure_courante', default=None)
+
+
+class Histogramme:
+
+    def __init__(self, bornes):
+        self.bornes = bornes
+        self.compteurs = [0] * (len(bornes) + 1)
+        self.somme = 0
+        self.nombre = 0
+
+    def observer(self, valeur):
+        self.compteurs[bisect_left(self.bornes, valeur)] += 1
+        self.somme += valeur
+        self.nombre += 1
+
+
+class Registre:
+    """Compteurs et histogrammes par vue, partagés par les threads du processus."""
+
+    def __init__(self):
+        self.verrou = threading.Lock()
+        self.vider()
+
+    def vider(self):
+        with self.verrou:
+            self.requetes = defaultdict(int)  # {(vue, méthode, statut): n}
+            self.durees = defaultdict(lambda: Histogramme(DUREES))
+            self.sql_nombres = defaultdict(lambda: Histogramme(NOMBRES_SQL))
+            self.sql_secondes = defaultdict(float)
+            self.tailles = defaultdict(lambda: Histogramme(TAILLES))
+            self.gabarits_secondes = defaultdict(float)
+            self.lentes = defaultdict(int)
+
+    def enregistrer(self, mesure, vue, methode, statut, taille):
+        with self.verrou:
+            self.requetes[vue, methode, statut] += 1
+            self.durees[vue].observer(mesure.duree)
+            self.sql_nombres[vue].observer(mesure.sql_nombre)
+            self.sql_secondes[vue] += mesure.sql_secondes
+            self.gabarits_secondes[vue] += mesure.gabarits_secondes
+            if taille is not None:
+                self.tailles[vue].observer(taille)
+            if mesure.duree >= seuil_lent():
+                self.lentes[vue] += 1
+
+    def exporter(self):
+        """Texte d'exposition Prometheus (version 0.0.4)."""
+        with self.verrou:
+            lignes = []
+            _compteur(
+                lignes, 'sgc_http_requetes_total', "Requêtes HTTP traitées.",
+                {(('vue', v), ('methode', m), ('statut', s)): n for (v, m, s), n in self.requetes.items()},
+            )
+            _histogramme(lignes, 'sgc_http_duree_secondes', "Durée des requêtes HTTP.", self.durees)
+            _histogramme(lignes, 'sgc_sql_requetes_par_requete', "Requêtes SQL par requête HTTP.", self.sql_nombres)
+            _compteur(lignes, 'sgc_sql_secondes_total', "Temps passé dans les requêtes SQL.", _par_vue(self.sql_secondes))
+            _histogramme(lignes, 'sgc_http_reponse_octets', "Taille des réponses (hors flux).", self.tailles)
+            _compteur(lignes, 'sgc_gabarits_secondes_total', "Temps de rendu des gabarits.", _par_vue(self.gabarits_secondes))
+            _compteur(lignes, 'sgc_http_requetes_lentes_total', "Requêtes au-delà du seuil de lenteur.", _par_vue(self.lentes))
+        return '\n'.join(lignes) + '\n'
+
+
+registre = Registre()
+
+
+def seuil_lent():
+    return getattr(settings, 'METRIQUES_SEUIL_LENT', 1.0)
+
+
+# --- Format texte Prometheus ---------------------------------------------------
+
+def _echapper(valeur):
+    return str(valeur).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquettes(paires):
+    return '{' + ','.join(f'{cle}="{_echapper(valeur)}"' for cle, valeur in paires) + '}' if paires else ''
+
+
+def _nombre(valeur):
+    return repr(float(valeur)) if isinstance(valeur, float) else str(valeur)
+
+
+def _par_vue(valeurs):
+    return {(('vue', vue),): valeur for vue, valeur in valeurs.items()}
+
+
+def _compteur(lignes, nom, aide, valeurs):
+    lignes += [f'# HELP {nom} {aide}', f'# TYPE {nom} counter']
+    for paires, valeur in sorted(valeurs.items()):
+        lignes.append(f'{nom}{_etiquettes(paires)} {_nombre(valeur)}')
+
+
+def _histogramme(lignes, nom, aide, histogrammes):
+    lignes += [f'# HELP {nom} {aide}', f'# TYPE {nom} histogram']
+    for vue, h in sorted(histogrammes.items()):
+        cumul = 0
+        for borne, n in zip(h.bornes + ('+Inf',), h.compteurs):
+            cumul += n
+            lignes.append(f'{nom}_bucket{_etiquettes((("vue", vue), ("le", borne)))} {cumul}')
+        lignes.append(f'{nom}_sum{_etiquettes((("vue", vue),))} {_nombre(float(h.somme))}')
+        lignes.append(f'{nom}_count{_etiquettes((("vue", vue),))} {h.nombre}')
+
+
+# --- Mesure d'une requête --------------------------------------------------------
+
+class Mesure:
+
+    def __init__(self):
+        self.debut = time.perf_counter()
+        self.duree = 0.0
+        self.sql_nombre = 0
+        self.sql_secondes = 0.0
+        self.gabarits_secondes = 0.0
+        self.gabarits_en_cours = 0
+        self.sql_lentes = []  # tas des (durée, n°, sql) les plus lentes
+        self.sql_gardees = getattr(settings, 'METRIQUES_SQL_JOURNALISEES', 10)
+
+    def __call__(self, execute, sql, params, many, context):
+        # Enveloppe d'exécution installée sur chaque connexion (execute_wrapper)
+        debut = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duree = time.perf_counter() - debut
+            self.sql_nombre += 1
+            self.sql_secondes += duree
+            if len(self.sql_lentes) < self.sql_gardees:
+                heapq.heappush(self.sql_lentes, (duree, self.sql_nombre, sql))
+            elif self.sql_gardees and duree > self.sql_lentes[0][0]:
+                heapq.heapreplace(self.sql_lentes, (duree, self.sql_nombre, sql))
+
+
+class MetriquesMiddleware:
+    # Utilisable sous WSGI comme sous ASGI (vues asynchrones du tableau de bord)
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        mesure = Mesure()
+        jeton = _mesure_courante.set(mesure)
+        try:
+            with ExitStack() as pile:
+                for connexion in connections.all():
+                    pile.enter_context(connexion.execute_wrapper(mesure))
+                response = self.get_response(request)
+        finally:
+            _mesure_courante.reset(jeton)
+        self.enregistrer(request, response, mesure)
+        return response
+
+    async def __acall__(self, request):
+        mesure = Mesure()
+        jeton = _mesure_courante.set(mesure)
+        try:
+            with ExitStack() as pile:
+                # Sous ASGI, l'ORM s'exécute dans le thread synchrone de la
+                # requête (sync_to_async) : ce sont ses connexions qu'on enveloppe.
+                for enveloppe in await sync_to_async(_enveloppes)(mesure):
+                    pile.enter_context(enveloppe)
+                response = await self.get_response(request)
+        finally:
+            _mesure_courante.reset(jeton)
+        self.enregistrer(request, response, mesure)
+        return response
+
+    def enregistrer(self, request, response, mesure):
+        mesure.duree = time.perf_counter() - mesure.debut
+        correspondance = getattr(request, 'resolver_match', None)
+        vue = correspondance.view_name if correspondance and correspondance.view_name else NON_RESOLUE
+        taille = None if response.streaming else len(response.content)
+        registre.enregistrer(mesure, vue, request.method, response.status_code, taille)
+        if mesure.duree >= seuil_lent():
+            _journaliser(request, vue, response, mesure)
+
+
+def _enveloppes(mesure):
+    return [connexion.execute_wrapper(mesure) for connexion in connections.all()]
+
+
+def mesure_courante():
+    """Mesure de la requête HTTP en cours (None hors requête)."""
+    return _mesure_courante.get()
+
+
+def _journaliser(request, vue, response, mesure):
+    requetes = '\n'.join(
+        f"  [{n}] {duree * 1000:.1f} ms : {sql}" for duree, n, sql in sorted(mesure.sql_lentes, reverse=True)
+    )
+    logger.warning(
+        "Requête lente %s %s (vue %s, HTTP %s) : %.0f ms, dont SQL %.0f ms (%d requêtes) et gabarits %.0f ms\n%s",
+        request.method, request.get_full_path(), vue, response.status_code, mesure.duree * 1000,
+        mesure.sql_secondes * 1000, mesure.sql_nombre, mesure.gabarits_secondes * 1000, requetes,
+    )
+
+
+# --- Temps de rendu des gabarits --------------------------------------------------
+
+class GabaritChronometre:
+
+    def __init__(self, gabarit):
+        self.gabarit = gabarit
+
+    def __getattr__(self, nom):
+        return getattr(self.gabarit, nom)
+
+    def render(self, context=None, request=None):
+        mesure = _mesure_courante.get()
+        if mesure is None or mesure.gabarits_en_cours:
+            # Gabarit rendu à l'intérieur d'un autre (crispy, ...) : déjà compté
+            return self.gabarit.render(context, request)
+        mesure.gabarits_en_cours += 1
+        debut = time.perf_counter()
+        try:
+            return self.gabarit.render(context, request)
+        finally:
+            mesure.gabarits_secondes += time.perf_counter() - debut
+            mesure.gabarits_en_cours -= 1
+
+
+class GabaritsChronometres(DjangoTemplates):
+    """Backend DjangoTemplates qui chronomètre le rendu des gabarits de premier niveau."""
+
+    def from_string(self, template_code):
+        return GabaritChronometre(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return GabaritChronometre(super().get_template(template_name))
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='assure',
+            index=models.Index(fields=['-date_affiliation', '-id'], name='assure_liste_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='declaration',
+            index=models.Index(fields=['-created_at', '-id'], name='declaration_liste_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='declaration',
+            index=models.Index(fields=['periode', 'statut'], name='declaration_periode_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employeur',
+            index=models.Index(fields=['-date_creation', '-id'], name='employeur_liste_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paiement',
+            index=models.Index(fields=['-date_reception', '-id'], name='paiement_liste_idx'),
+        ),
+    ]
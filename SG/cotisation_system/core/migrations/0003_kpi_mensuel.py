@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_index_listes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KpiMensuel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mois', models.DateField()),
+                ('nouveaux_employeurs', models.PositiveIntegerField(default=0)),
+                ('nouveaux_assures', models.PositiveIntegerField(default=0)),
+                ('employeurs_ayant_declare', models.PositiveIntegerField(default=0)),
+                ('cotisations_declarees', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('cotisations_encaissees', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('region', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='kpi_mensuels', to='core.region')),
+            ],
+            options={
+                'unique_together': {('mois', 'region')},
+            },
+        ),
+    ]
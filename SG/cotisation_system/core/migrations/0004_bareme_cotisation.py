@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:05
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_kpi_mensuel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BaremeCotisation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=30)),
+                ('libelle', models.CharField(max_length=100)),
+                ('taux_salarial', models.DecimalField(decimal_places=3, default=0, max_digits=6, validators=[django.core.validators.MinValueValidator(0)])),
+                ('taux_patronal', models.DecimalField(decimal_places=3, default=0, max_digits=6, validators=[django.core.validators.MinValueValidator(0)])),
+                ('plafond', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True, validators=[django.core.validators.MinValueValidator(0)])),
+                ('date_debut', models.DateField()),
+                ('date_fin', models.DateField(blank=True, null=True)),
+                ('secteur_activite', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='baremes', to='core.secteuractivite')),
+            ],
+            options={
+                'ordering': ['code', 'date_debut'],
+                'unique_together': {('code', 'secteur_activite', 'date_debut')},
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:09
+
+from django.db import migrations, models
+
+
+def vider_numeros_vides(apps, schema_editor):
+    # '' ne peut exister qu'une fois sous contrainte unique : les employeurs
+    # non immatriculés ont désormais un numéro NULL
+    Employeur = apps.get_model('core', 'Employeur')
+    Employeur.objects.filter(numero_immatriculation='').update(numero_immatriculation=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_bareme_cotisation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='employeur',
+            name='numero_immatriculation',
+            field=models.CharField(blank=True, max_length=20, null=True, unique=True),
+        ),
+        migrations.RunPython(vider_numeros_vides, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='Compteur',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefixe', models.CharField(max_length=10)),
+                ('mois', models.CharField(max_length=6)),
+                ('valeur', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('prefixe', 'mois')},
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_compteur'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArriereEmployeur',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('montant_declare', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('montant_paye', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('montant_du', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('plus_ancienne_periode', models.DateField()),
+                ('nb_periodes_impayees', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('employeur', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='arriere', to='core.employeur')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-montant_du', '-id'], name='arriere_montant_idx'), models.Index(fields=['plus_ancienne_periode', 'id'], name='arriere_anciennete_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:25
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_arriere_employeur'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Televersement',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('nom', models.CharField(max_length=255)),
+                ('taille', models.PositiveBigIntegerField()),
+                ('recu', models.PositiveBigIntegerField(default=0)),
+                ('sha256_attendu', models.CharField(blank=True, max_length=64)),
+                ('sha256', models.CharField(blank=True, max_length=64)),
+                ('statut', models.CharField(choices=[('en_cours', 'En Cours'), ('termine', 'Terminé'), ('corrompu', 'Corrompu'), ('attache', 'Attaché')], default='en_cours', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('utilisateur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='televersements', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
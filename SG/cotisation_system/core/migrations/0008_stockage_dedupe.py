@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:29
+
+import core.stockage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_televersement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('empreinte', models.CharField(max_length=64, unique=True)),
+                ('chemin', models.CharField(max_length=255, unique=True)),
+                ('taille', models.PositiveBigIntegerField()),
+                ('references', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='paiement',
+            name='preuve_paiement',
+            field=models.FileField(blank=True, null=True, storage=core.stockage.stockage_dedupe, upload_to='preuves_paiement/%Y/%m/'),
+        ),
+        migrations.AlterField(
+            model_name='piecejustificative',
+            name='fichier',
+            field=models.FileField(storage=core.stockage.stockage_dedupe, upload_to='pieces_justificatives/%Y/%m/'),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_stockage_dedupe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Suppression',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField()),
+                ('ressource', models.CharField(max_length=30)),
+                ('objet_id', models.PositiveBigIntegerField()),
+                ('date_suppression', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='actionrecouvrement',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='assure',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='region',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='utilisateurs', to='core.region'),
+        ),
+        migrations.AddField(
+            model_name='declaration',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='employeur',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='paiement',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='actionrecouvrement',
+            index=models.Index(fields=['version', 'id'], name='action_version_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assure',
+            index=models.Index(fields=['version', 'id'], name='assure_version_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='declaration',
+            index=models.Index(fields=['version', 'id'], name='declaration_version_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employeur',
+            index=models.Index(fields=['version', 'id'], name='employeur_version_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paiement',
+            index=models.Index(fields=['version', 'id'], name='paiement_version_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='suppression',
+            index=models.Index(fields=['version', 'id'], name='suppression_version_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='suppression',
+            index=models.Index(fields=['ressource', 'objet_id'], name='suppression_objet_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-18 21:14
+
+from django.db import migrations, models
+
+
+def calculer_geohash(apps, schema_editor):
+    from core.geo import encoder
+
+    Employeur = apps.get_model('core', 'Employeur')
+    employeurs = Employeur.objects.exclude(latitude=None).exclude(longitude=None).only('latitude', 'longitude')
+    paquet = []
+    for employeur in employeurs.iterator(chunk_size=2000):
+        employeur.geohash = encoder(employeur.latitude, employeur.longitude)
+        paquet.append(employeur)
+        if len(paquet) == 2000:
+            Employeur.objects.bulk_update(paquet, ['geohash'])
+            paquet = []
+    Employeur.objects.bulk_update(paquet, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_synchronisation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employeur',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='employeur',
+            index=models.Index(fields=['geohash'], name='employeur_geohash_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='actionrecouvrement',
+            index=models.Index(fields=['agent', 'date_planification'], name='action_agent_date_idx'),
+        ),
+        migrations.RunPython(calculer_geohash, migrations.RunPython.noop),
+    ]
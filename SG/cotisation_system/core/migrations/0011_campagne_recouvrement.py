@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-18 21:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_geohash_employeur'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='actionrecouvrement',
+            name='campagne',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='actionrecouvrement',
+            constraint=models.UniqueConstraint(fields=('employeur', 'campagne'), name='action_campagne_unique'),
+        ),
+    ]
@@ -0,0 +1,180 @@
+# Generated by Django 5.2.5 on 2026-10-18 21:44
+
+import core.stockage
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Vues de lecture de l'historique : tables actives UNION ALL archives, avec
+# une colonne `archivee`. Les filtres sur les vues sont répercutés dans chaque
+# branche et restent servis par les index des deux tables.
+VUES = {
+    'core_declaration_historique': (
+        'core_declaration', 'core_declarationarchive',
+        'id, employeur_id, periode, date_soumission, montant_total_cotisations, statut, created_by_id, '
+        'created_at, version',
+    ),
+    'core_lignedeclaration_historique': (
+        'core_lignedeclaration', 'core_lignedeclarationarchive',
+        'id, declaration_id, assure_id, salaire_declare, cotisation_salariale, cotisation_patronale',
+    ),
+    'core_paiement_historique': (
+        'core_paiement', 'core_paiementarchive',
+        'id, reference, declaration_id, montant, mode_paiement, date_paiement, date_reception, statut, '
+        'preuve_paiement, enregistre_par_id, version',
+    ),
+}
+
+
+def creer_vue(nom, active, archive, colonnes):
+    return migrations.RunSQL(
+        f'CREATE VIEW {nom} AS '
+        f'SELECT {colonnes}, FALSE AS archivee FROM {active} '
+        f'UNION ALL SELECT {colonnes}, TRUE AS archivee FROM {archive}',
+        f'DROP VIEW {nom}',
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_campagne_recouvrement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeclarationHistorique',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periode', models.DateField()),
+                ('date_soumission', models.DateTimeField(blank=True, null=True)),
+                ('montant_total_cotisations', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('statut', models.CharField(choices=[('brouillon', 'Brouillon'), ('soumis', 'Soumis'), ('valide', 'Validé'), ('rejete', 'Rejeté')], max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('version', models.PositiveBigIntegerField()),
+                ('archivee', models.BooleanField()),
+            ],
+            options={
+                'db_table': 'core_declaration_historique',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='LigneDeclarationHistorique',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('salaire_declare', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('cotisation_salariale', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('cotisation_patronale', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('archivee', models.BooleanField()),
+            ],
+            options={
+                'db_table': 'core_lignedeclaration_historique',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='PaiementHistorique',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference', models.CharField(max_length=50)),
+                ('montant', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('mode_paiement', models.CharField(choices=[('virement', 'Virement Bancaire'), ('cheque', 'Chèque'), ('mobile', 'Paiement Mobile'), ('guichet', 'Guichet')], max_length=20)),
+                ('date_paiement', models.DateField()),
+                ('date_reception', models.DateTimeField()),
+                ('statut', models.CharField(choices=[('initie', 'Initié'), ('confirme', 'Confirmé'), ('rejete', 'Rejeté')], max_length=20)),
+                ('preuve_paiement', models.FileField(blank=True, null=True, storage=core.stockage.stockage_dedupe, upload_to='preuves_paiement/%Y/%m/')),
+                ('version', models.PositiveBigIntegerField()),
+                ('archivee', models.BooleanField()),
+            ],
+            options={
+                'db_table': 'core_paiement_historique',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='DeclarationArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('periode', models.DateField()),
+                ('date_soumission', models.DateTimeField(blank=True, null=True)),
+                ('montant_total_cotisations', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('statut', models.CharField(choices=[('brouillon', 'Brouillon'), ('soumis', 'Soumis'), ('valide', 'Validé'), ('rejete', 'Rejeté')], max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('employeur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='declarations_archivees', to='core.employeur')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ExerciceClos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('annee', models.PositiveIntegerField(unique=True)),
+                ('date_cloture', models.DateTimeField(default=django.utils.timezone.now)),
+                ('declarations_archivees', models.PositiveIntegerField(default=0)),
+                ('lignes_archivees', models.PositiveBigIntegerField(default=0)),
+                ('paiements_archives', models.PositiveIntegerField(default=0)),
+                ('declarations_ouvertes', models.PositiveIntegerField(default=0)),
+                ('clos_par', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-annee'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LigneDeclarationArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('salaire_declare', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('cotisation_salariale', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('cotisation_patronale', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('assure', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.assure')),
+                ('declaration', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lignes', to='core.declarationarchive')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PaiementArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('reference', models.CharField(max_length=50, unique=True)),
+                ('montant', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('mode_paiement', models.CharField(choices=[('virement', 'Virement Bancaire'), ('cheque', 'Chèque'), ('mobile', 'Paiement Mobile'), ('guichet', 'Guichet')], max_length=20)),
+                ('date_paiement', models.DateField()),
+                ('date_reception', models.DateTimeField()),
+                ('statut', models.CharField(choices=[('initie', 'Initié'), ('confirme', 'Confirmé'), ('rejete', 'Rejeté')], max_length=20)),
+                ('preuve_paiement', models.FileField(blank=True, null=True, storage=core.stockage.stockage_dedupe, upload_to='preuves_paiement/%Y/%m/')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('declaration', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='paiements', to='core.declarationarchive')),
+                ('enregistre_par', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BilanAnnuelEmployeur',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('annee', models.PositiveIntegerField()),
+                ('nb_declarations', models.PositiveIntegerField(default=0)),
+                ('nb_lignes', models.PositiveBigIntegerField(default=0)),
+                ('montant_declare', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('nb_paiements', models.PositiveIntegerField(default=0)),
+                ('montant_paye', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('employeur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bilans_annuels', to='core.employeur')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['annee'], name='bilan_annee_idx')],
+                'unique_together': {('employeur', 'annee')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='declarationarchive',
+            index=models.Index(fields=['periode', 'statut'], name='declaration_archive_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='declarationarchive',
+            unique_together={('employeur', 'periode')},
+        ),
+    ] + [creer_vue(nom, *definition) for nom, definition in VUES.items()]
@@ -0,0 +1,93 @@
+# Generated by Django 5.2.5 on 2026-10-18 21:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def calculer_cles(apps, schema_editor):
+    from core.similarite import cles
+
+    Assure = apps.get_model('core', 'Assure')
+    assures = Assure.objects.only('nom', 'prenom', 'telephone')
+    paquet = []
+    for assure in assures.iterator(chunk_size=2000):
+        assure.phonetique_nom, assure.phonetique_prenom, assure.telephone_normalise = cles(
+            assure.nom, assure.prenom, assure.telephone,
+        )
+        paquet.append(assure)
+        if len(paquet) == 2000:
+            Assure.objects.bulk_update(paquet, ['phonetique_nom', 'phonetique_prenom', 'telephone_normalise'])
+            paquet = []
+    Assure.objects.bulk_update(paquet, ['phonetique_nom', 'phonetique_prenom', 'telephone_normalise'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_archives_exercices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoublonAssure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('statut', models.CharField(choices=[('a_traiter', 'À Traiter'), ('distincts', 'Personnes Distinctes'), ('fusionne', 'Fusionné')], default='a_traiter', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('date_traitement', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='assure',
+            name='phonetique_nom',
+            field=models.CharField(blank=True, editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='assure',
+            name='phonetique_prenom',
+            field=models.CharField(blank=True, editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='assure',
+            name='telephone_normalise',
+            field=models.CharField(blank=True, editable=False, max_length=15),
+        ),
+        migrations.RunPython(calculer_cles, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='assure',
+            index=models.Index(fields=['phonetique_nom', 'date_naissance'], name='assure_bloc_nom_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assure',
+            index=models.Index(fields=['phonetique_prenom', 'date_naissance'], name='assure_bloc_prenom_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assure',
+            index=models.Index(fields=['telephone_normalise'], name='assure_bloc_telephone_idx'),
+        ),
+        migrations.AddField(
+            model_name='doublonassure',
+            name='assure',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='doublons', to='core.assure'),
+        ),
+        migrations.AddField(
+            model_name='doublonassure',
+            name='doublon',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.assure'),
+        ),
+        migrations.AddField(
+            model_name='doublonassure',
+            name='traite_par',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='doublonassure',
+            index=models.Index(fields=['statut', '-score'], name='doublon_file_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='doublonassure',
+            unique_together={('assure', 'doublon')},
+        ),
+    ]
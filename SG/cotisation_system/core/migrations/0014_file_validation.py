@@ -0,0 +1,80 @@
+# Generated by Django 5.2.5 on 2026-10-18 22:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from importlib import import_module
+
+# SQLite reconstruit core_declaration pour y ajouter des clés étrangères : les
+# vues d'historique qui la lisent (0012) sont supprimées le temps de l'opération.
+historique = import_module('core.migrations.0012_archives_exercices')
+recreer_vues = [historique.creer_vue(nom, *definition) for nom, definition in historique.VUES.items()]
+supprimer_vues = [migrations.RunSQL(vue.reverse_sql, vue.sql) for vue in reversed(recreer_vues)]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_doublons_assures'),
+    ]
+
+    operations = supprimer_vues + [
+        migrations.AddField(
+            model_name='declaration',
+            name='bail_expire',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='declaration',
+            name='date_validation',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='declaration',
+            name='motif_rejet',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='declaration',
+            name='reserve_par',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='declaration',
+            name='validated_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='declarations_validees', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='declarationarchive',
+            name='date_validation',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='declarationarchive',
+            name='motif_rejet',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='declarationarchive',
+            name='validated_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='employeur',
+            name='bail_expire',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='employeur',
+            name='reserve_par',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='declaration',
+            index=models.Index(fields=['statut', 'date_soumission'], name='declaration_file_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employeur',
+            index=models.Index(fields=['statut', 'date_creation'], name='employeur_file_idx'),
+        ),
+    ] + recreer_vues
@@ -1,11 +1,13 @@
 
 # Create your models here.
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 import uuid
 
+from .stockage import stockage_dedupe
+
 class CustomUser(AbstractUser):
     ROLE_CHOICES = (
         ('agent', 'Agent de Terrain'),
@@ -13,12 +15,53 @@ class CustomUser(AbstractUser):
         ('validation', 'Agent de Validation'),
         ('admin', 'Administrateur'),
     )
+    # Rôles qui valident ou rejettent dossiers, déclarations et paiements
+    ROLES_VALIDATION = ('admin', 'superviseur', 'validation')
     
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='agent')
     phone = models.CharField(max_length=20, blank=True)
+    # Région d'affectation : périmètre de synchronisation des agents (core.synchro)
+    region = models.ForeignKey('Region', on_delete=models.SET_NULL, null=True, blank=True, related_name='utilisateurs')
     is_active = models.BooleanField(default=True)
     date_joined = models.DateTimeField(default=timezone.now)
 
+class Blob(models.Model):
+    # Contenu stocké une seule fois sous son SHA-256 (voir core/stockage.py).
+    # `references` compte les lignes dont un FileField pointe vers `chemin`.
+    empreinte = models.CharField(max_length=64, unique=True)
+    chemin = models.CharField(max_length=255, unique=True)
+    taille = models.PositiveBigIntegerField()
+    references = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.chemin} ({self.references} réf.)"
+
+class Compteur(models.Model):
+    # Dernier numéro attribué par préfixe et par mois (voir core/sequences.py)
+    prefixe = models.CharField(max_length=10)
+    mois = models.CharField(max_length=6)  # AAAAMM
+    valeur = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['prefixe', 'mois']
+
+    def __str__(self):
+        return f"{self.prefixe}{self.mois} : {self.valeur}"
+
+class Synchronise:
+    # Modèle suivi par la synchronisation hors ligne (core/synchro.py) : chaque
+    # enregistrement prend une nouvelle version, dans la transaction de l'écriture.
+    # Les bulk_create et update() doivent passer par synchro.versionner / marquer.
+
+    def save(self, *args, **kwargs):
+        from .sequences import nouvelle_version
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        with transaction.atomic():
+            self.version = nouvelle_version()
+            super().save(*args, **kwargs)
+
 class SecteurActivite(models.Model):
     code = models.CharField(max_length=10, unique=True)
     nom = models.CharField(max_length=100)
@@ -34,7 +77,7 @@ class Region(models.Model):
     def __str__(self):
         return self.nom
 
-class Employeur(models.Model):
+class Employeur(Synchronise, models.Model):
     STATUT_CHOICES = (
         ('prospecte', 'Prospecté'),
         ('dossier_soumis', 'Dossier Soumis'),
@@ -43,7 +86,7 @@ class Employeur(models.Model):
         ('rejete', 'Rejeté'),
     )
     
-    numero_immatriculation = models.CharField(max_length=20, unique=True, blank=True)
+    numero_immatriculation = models.CharField(max_length=20, unique=True, null=True, blank=True)  # attribué à la validation
     raison_sociale = models.CharField(max_length=200)
     nif = models.CharField(max_length=50, unique=True)
     rccm = models.CharField(max_length=50, unique=True)
@@ -52,6 +95,7 @@ class Employeur(models.Model):
     adresse = models.TextField()
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, editable=False)  # Index spatial (core.geo), tenu par save()
     contact_nom = models.CharField(max_length=100)
     contact_email = models.EmailField()
     contact_telephone = models.CharField(max_length=20)
@@ -61,22 +105,40 @@ class Employeur(models.Model):
     date_validation = models.DateTimeField(null=True, blank=True)
     agent = models.ForeignKey(CustomUser, on_delete=models.PROTECT, related_name='employeurs_crees')
     validated_by = models.ForeignKey(CustomUser, on_delete=models.PROTECT, null=True, blank=True, related_name='employeurs_valides')
+    # Réservation par un agent de validation jusqu'à bail_expire (core.validation)
+    reserve_par = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+')
+    bail_expire = models.DateTimeField(null=True, blank=True, editable=False)
+    version = models.PositiveBigIntegerField(default=0)  # Séquence de synchronisation (core.synchro)
+
+    class Meta:
+        indexes = [
+            # Clé de tri de employeur_list (pagination par clé)
+            models.Index(fields=['-date_creation', '-id'], name='employeur_liste_idx'),
+            models.Index(fields=['statut', 'date_creation'], name='employeur_file_idx'),
+            models.Index(fields=['version', 'id'], name='employeur_version_idx'),
+            models.Index(fields=['geohash'], name='employeur_geohash_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.numero_immatriculation and self.statut == 'valide':
-            self.numero_immatriculation = f"EMP{timezone.now().strftime('%Y%m')}{self.id:06d}"
+            from .sequences import prochain_numero
+            self.numero_immatriculation = prochain_numero('EMP')
+        from .geo import encoder
+        self.geohash = encoder(self.latitude, self.longitude)
+        if kwargs.get('update_fields') is not None and {'latitude', 'longitude'} & set(kwargs['update_fields']):
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'geohash'}
         super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"{self.numero_immatriculation} - {self.raison_sociale}"
+        return f"{self.numero_immatriculation or 'Non immatriculé'} - {self.raison_sociale}"
 
 class PieceJustificative(models.Model):
     employeur = models.ForeignKey(Employeur, on_delete=models.CASCADE, related_name='pieces_justificatives')
     nom = models.CharField(max_length=100)
-    fichier = models.FileField(upload_to='pieces_justificatives/%Y/%m/')
+    fichier = models.FileField(upload_to='pieces_justificatives/%Y/%m/', storage=stockage_dedupe)
     date_upload = models.DateTimeField(auto_now_add=True)
 
-class Assure(models.Model):
+class Assure(Synchronise, models.Model):
     TYPE_ASSURE_CHOICES = (
         ('salarie', 'Salarié'),
         ('independant', 'Indépendant'),
@@ -96,16 +158,41 @@ class Assure(models.Model):
     employeur = models.ForeignKey(Employeur, on_delete=models.CASCADE, null=True, blank=True, related_name='salaries')
     date_affiliation = models.DateTimeField(auto_now_add=True)
     est_actif = models.BooleanField(default=True)
+    version = models.PositiveBigIntegerField(default=0)  # Séquence de synchronisation (core.synchro)
+    # Clés de blocage de la détection des doublons (core.doublons), tenues par save()
+    phonetique_nom = models.CharField(max_length=10, blank=True, editable=False)
+    phonetique_prenom = models.CharField(max_length=10, blank=True, editable=False)
+    telephone_normalise = models.CharField(max_length=15, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-date_affiliation', '-id'], name='assure_liste_idx'),
+            models.Index(fields=['version', 'id'], name='assure_version_idx'),
+            models.Index(fields=['phonetique_nom', 'date_naissance'], name='assure_bloc_nom_idx'),
+            models.Index(fields=['phonetique_prenom', 'date_naissance'], name='assure_bloc_prenom_idx'),
+            models.Index(fields=['telephone_normalise'], name='assure_bloc_telephone_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.numero_assure:
-            self.numero_assure = f"ASS{timezone.now().strftime('%Y%m')}{self.id:06d}"
+            from .sequences import prochain_numero
+            self.numero_assure = prochain_numero('ASS')
+        self.calculer_cles()
+        if kwargs.get('update_fields') is not None and {'nom', 'prenom', 'telephone'} & set(kwargs['update_fields']):
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'phonetique_nom', 'phonetique_prenom', 'telephone_normalise'}
         super().save(*args, **kwargs)
 
+    def calculer_cles(self):
+        """Clés de blocage ; à appeler avant un bulk_create ou bulk_update."""
+        from .similarite import cles
+        self.phonetique_nom, self.phonetique_prenom, self.telephone_normalise = cles(
+            self.nom, self.prenom, self.telephone,
+        )
+
     def __str__(self):
         return f"{self.numero_assure} - {self.prenom} {self.nom}"
 
-class Declaration(models.Model):
+class Declaration(Synchronise, models.Model):
     STATUT_CHOICES = (
         ('brouillon', 'Brouillon'),
         ('soumis', 'Soumis'),
@@ -120,9 +207,22 @@ class Declaration(models.Model):
     statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='brouillon')
     created_by = models.ForeignKey(CustomUser, on_delete=models.PROTECT)
     created_at = models.DateTimeField(auto_now_add=True)
+    validated_by = models.ForeignKey(CustomUser, on_delete=models.PROTECT, null=True, blank=True, related_name='declarations_validees')
+    date_validation = models.DateTimeField(null=True, blank=True)
+    motif_rejet = models.TextField(blank=True)
+    # Réservation par un agent de validation jusqu'à bail_expire (core.validation)
+    reserve_par = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+')
+    bail_expire = models.DateTimeField(null=True, blank=True, editable=False)
+    version = models.PositiveBigIntegerField(default=0)  # Séquence de synchronisation (core.synchro)
 
     class Meta:
         unique_together = ['employeur', 'periode']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='declaration_liste_idx'),
+            models.Index(fields=['periode', 'statut'], name='declaration_periode_idx'),
+            models.Index(fields=['version', 'id'], name='declaration_version_idx'),
+            models.Index(fields=['statut', 'date_soumission'], name='declaration_file_idx'),
+        ]
 
 class LigneDeclaration(models.Model):
     declaration = models.ForeignKey(Declaration, on_delete=models.CASCADE, related_name='lignes')
@@ -131,7 +231,28 @@ class LigneDeclaration(models.Model):
     cotisation_salariale = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(0)])
     cotisation_patronale = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(0)])
 
-class Paiement(models.Model):
+class BaremeCotisation(models.Model):
+    # Taux d'une branche de cotisation (retraite, risques professionnels...),
+    # versionné par date d'effet. Une ligne rattachée à un secteur remplace,
+    # pour ce secteur, la ligne générale de même code.
+    code = models.CharField(max_length=30)
+    libelle = models.CharField(max_length=100)
+    taux_salarial = models.DecimalField(max_digits=6, decimal_places=3, default=0, validators=[MinValueValidator(0)])  # en %
+    taux_patronal = models.DecimalField(max_digits=6, decimal_places=3, default=0, validators=[MinValueValidator(0)])  # en %
+    plafond = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, validators=[MinValueValidator(0)])  # assiette mensuelle max
+    secteur_activite = models.ForeignKey(SecteurActivite, on_delete=models.CASCADE, null=True, blank=True, related_name='baremes')
+    date_debut = models.DateField()
+    date_fin = models.DateField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ['code', 'secteur_activite', 'date_debut']
+        ordering = ['code', 'date_debut']
+
+    def __str__(self):
+        secteur = f" ({self.secteur_activite.code})" if self.secteur_activite_id else ""
+        return f"{self.libelle}{secteur} depuis le {self.date_debut:%d/%m/%Y}"
+
+class Paiement(Synchronise, models.Model):
     MODE_PAIEMENT_CHOICES = (
         ('virement', 'Virement Bancaire'),
         ('cheque', 'Chèque'),
@@ -152,6 +273,310 @@ class Paiement(models.Model):
     date_paiement = models.DateField()
     date_reception = models.DateTimeField(auto_now_add=True)
     statut = models.CharField(max_length=20, choices=STATUT_PAIEMENT_CHOICES, default='initie')
-    preuve_paiement = models.FileField(upload_to='preuves_paiement/%Y/%m/', null=True, blank=True)
+    preuve_paiement = models.FileField(upload_to='preuves_paiement/%Y/%m/', storage=stockage_dedupe, null=True, blank=True)
     enregistre_par = models.ForeignKey(CustomUser, on_delete=models.PROTECT)
+    version = models.PositiveBigIntegerField(default=0)  # Séquence de synchronisation (core.synchro)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-date_reception', '-id'], name='paiement_liste_idx'),
+            models.Index(fields=['version', 'id'], name='paiement_version_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self.reference:
+            from .sequences import prochain_numero
+            self.reference = prochain_numero('PAY')
+        super().save(*args, **kwargs)
+
+class ActionRecouvrement(Synchronise, models.Model):
+    TYPE_ACTION_CHOICES = (
+        ('relance', 'Relance'),
+        ('mise_demeure', 'Mise en Demeure'),
+        ('visite', 'Visite de Contrôle'),
+        ('autre', 'Autre Action'),
+    )
+
+    STATUT_CHOICES = (
+        ('planifiee', 'Planifiée'),
+        ('en_cours', 'En Cours'),
+        ('terminee', 'Terminée'),
+        ('annulee', 'Annulée'),
+    )
+
+    employeur = models.ForeignKey(Employeur, on_delete=models.CASCADE, related_name='actions_recouvrement')
+    type_action = models.CharField(max_length=20, choices=TYPE_ACTION_CHOICES)
+    statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='planifiee')
+    date_planification = models.DateTimeField()
+    date_execution = models.DateTimeField(null=True, blank=True)
+    montant_recouvre = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    observations = models.TextField(blank=True)
+    agent = models.ForeignKey(CustomUser, on_delete=models.PROTECT, related_name='actions_recouvrement')
+    created_at = models.DateTimeField(auto_now_add=True)
+    version = models.PositiveBigIntegerField(default=0)  # Séquence de synchronisation (core.synchro)
+    # Période de la campagne de recouvrement qui a créé l'action (core.campagnes), None si saisie à la main
+    campagne = models.DateField(null=True, blank=True, editable=False)
+
+    class Meta:
+        constraints = [
+            # Une action par employeur et par campagne : relancer la campagne ne crée rien de plus
+            models.UniqueConstraint(fields=['employeur', 'campagne'], name='action_campagne_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['version', 'id'], name='action_version_idx'),
+            # Visites d'un agent sur une journée (core.geo.visites_du_jour)
+            models.Index(fields=['agent', 'date_planification'], name='action_agent_date_idx'),
+        ]
+
+
+class KpiMensuel(models.Model):
+    # Instantané des KPI par mois et par région, maintenu par core.kpi
+    # (signaux + commande `kpi_mensuel`). region est vide pour les assurés
+    # sans employeur.
+    mois = models.DateField()  # Premier jour du mois
+    region = models.ForeignKey(Region, on_delete=models.CASCADE, null=True, blank=True, related_name='kpi_mensuels')
+    nouveaux_employeurs = models.PositiveIntegerField(default=0)
+    nouveaux_assures = models.PositiveIntegerField(default=0)
+    employeurs_ayant_declare = models.PositiveIntegerField(default=0)
+    cotisations_declarees = models.DecimalField(max_digits=17, decimal_places=2, default=0)
+    cotisations_encaissees = models.DecimalField(max_digits=17, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['mois', 'region']
+
+    def __str__(self):
+        return f"{self.mois:%m/%Y} - {self.region or 'Sans région'}"
+
+
+class ArriereEmployeur(models.Model):
+    # Solde débiteur par employeur, maintenu par core.arrieres (signaux +
+    # commande `arrieres`). Seuls les employeurs ayant un montant dû positif
+    # ont une ligne.
+    employeur = models.OneToOneField(Employeur, on_delete=models.CASCADE, related_name='arriere')
+    montant_declare = models.DecimalField(max_digits=17, decimal_places=2, default=0)
+    montant_paye = models.DecimalField(max_digits=17, decimal_places=2, default=0)
+    montant_du = models.DecimalField(max_digits=17, decimal_places=2, default=0)
+    plus_ancienne_periode = models.DateField()  # Plus ancienne déclaration validée non soldée
+    nb_periodes_impayees = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-montant_du', '-id'], name='arriere_montant_idx'),
+            models.Index(fields=['plus_ancienne_periode', 'id'], name='arriere_anciennete_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.employeur} - {self.montant_du} FCFA"
+
+
+class Televersement(models.Model):
+    # Envoi de fichier par morceaux, reprenable (voir core/televersements.py).
+    # Le fichier partiel est écrit dans TELEVERSEMENT_DOSSIER puis déplacé
+    # vers le champ FileField cible une fois complet.
+    STATUT_CHOICES = (
+        ('en_cours', 'En Cours'),
+        ('termine', 'Terminé'),
+        ('corrompu', 'Corrompu'),
+        ('attache', 'Attaché'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    utilisateur = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='televersements')
+    nom = models.CharField(max_length=255)
+    taille = models.PositiveBigIntegerField()
+    recu = models.PositiveBigIntegerField(default=0)  # Dernier offset acquitté
+    sha256_attendu = models.CharField(max_length=64, blank=True)
+    sha256 = models.CharField(max_length=64, blank=True)  # Calculé à la fin de l'envoi
+    statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='en_cours')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.nom} ({self.recu}/{self.taille})"
+
+
+class Suppression(models.Model):
+    # Pierre tombale d'une ligne synchronisée supprimée (voir core/synchro.py) :
+    # les appareils hors ligne la retirent à la synchronisation suivante.
+    version = models.PositiveBigIntegerField()
+    ressource = models.CharField(max_length=30)
+    objet_id = models.PositiveBigIntegerField()
+    date_suppression = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['version', 'id'], name='suppression_version_idx'),
+            models.Index(fields=['ressource', 'objet_id'], name='suppression_objet_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.ressource} {self.objet_id} (v{self.version})"
+
+
+# --- Exercices clos (core/archives.py) ---------------------------------------------
+# La clôture d'un exercice déplace ses déclarations définitives, leurs lignes et
+# leurs paiements dans les tables *Archive (mêmes colonnes, mêmes id), et tient
+# un bilan par employeur et par année. Les modèles *Historique lisent des vues
+# SQL (migration 0012) qui réunissent tables actives et archives : toute
+# colonne ajoutée à Declaration, LigneDeclaration ou Paiement doit l'être aussi
+# à l'archive et à la vue.
+
+class ExerciceClos(models.Model):
+    annee = models.PositiveIntegerField(unique=True)
+    date_cloture = models.DateTimeField(default=timezone.now)  # Dernier passage de la clôture
+    clos_par = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    declarations_archivees = models.PositiveIntegerField(default=0)
+    lignes_archivees = models.PositiveBigIntegerField(default=0)
+    paiements_archives = models.PositiveIntegerField(default=0)
+    # Déclarations de l'exercice restées actives (non soldées, en attente) au dernier passage
+    declarations_ouvertes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-annee']
+
+    def __str__(self):
+        return f"Exercice {self.annee}"
+
+
+class BilanAnnuelEmployeur(models.Model):
+    # Totaux d'un employeur sur les déclarations archivées d'un exercice clos
+    employeur = models.ForeignKey(Employeur, on_delete=models.CASCADE, related_name='bilans_annuels')
+    annee = models.PositiveIntegerField()
+    nb_declarations = models.PositiveIntegerField(default=0)
+    nb_lignes = models.PositiveBigIntegerField(default=0)
+    montant_declare = models.DecimalField(max_digits=17, decimal_places=2, default=0)  # Déclarations validées
+    nb_paiements = models.PositiveIntegerField(default=0)
+    montant_paye = models.DecimalField(max_digits=17, decimal_places=2, default=0)  # Paiements confirmés
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['employeur', 'annee']
+        indexes = [
+            models.Index(fields=['annee'], name='bilan_annee_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.employeur} - {self.annee}"
+
+
+class DeclarationArchive(models.Model):
+    id = models.BigIntegerField(primary_key=True)  # id d'origine
+    employeur = models.ForeignKey(Employeur, on_delete=models.CASCADE, related_name='declarations_archivees')
+    periode = models.DateField()
+    date_soumission = models.DateTimeField(null=True, blank=True)
+    montant_total_cotisations = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    statut = models.CharField(max_length=20, choices=Declaration.STATUT_CHOICES)
+    created_by = models.ForeignKey(CustomUser, on_delete=models.PROTECT, related_name='+')
+    created_at = models.DateTimeField()
+    validated_by = models.ForeignKey(CustomUser, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
+    date_validation = models.DateTimeField(null=True, blank=True)
+    motif_rejet = models.TextField(blank=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['employeur', 'periode']
+        indexes = [
+            models.Index(fields=['periode', 'statut'], name='declaration_archive_idx'),
+        ]
 
+
+class LigneDeclarationArchive(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    declaration = models.ForeignKey(DeclarationArchive, on_delete=models.CASCADE, related_name='lignes')
+    assure = models.ForeignKey(Assure, on_delete=models.PROTECT, related_name='+')
+    salaire_declare = models.DecimalField(max_digits=12, decimal_places=2)
+    cotisation_salariale = models.DecimalField(max_digits=12, decimal_places=2)
+    cotisation_patronale = models.DecimalField(max_digits=12, decimal_places=2)
+
+
+class PaiementArchive(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    reference = models.CharField(max_length=50, unique=True)
+    declaration = models.ForeignKey(DeclarationArchive, on_delete=models.PROTECT, related_name='paiements')
+    montant = models.DecimalField(max_digits=15, decimal_places=2)
+    mode_paiement = models.CharField(max_length=20, choices=Paiement.MODE_PAIEMENT_CHOICES)
+    date_paiement = models.DateField()
+    date_reception = models.DateTimeField()
+    statut = models.CharField(max_length=20, choices=Paiement.STATUT_PAIEMENT_CHOICES)
+    preuve_paiement = models.FileField(upload_to='preuves_paiement/%Y/%m/', storage=stockage_dedupe, null=True, blank=True)
+    enregistre_par = models.ForeignKey(CustomUser, on_delete=models.PROTECT, related_name='+')
+    version = models.PositiveBigIntegerField(default=0)
+
+
+class DeclarationHistorique(models.Model):
+    # Vue core_declaration_historique : Declaration UNION ALL DeclarationArchive (lecture seule)
+    employeur = models.ForeignKey(Employeur, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    periode = models.DateField()
+    date_soumission = models.DateTimeField(null=True, blank=True)
+    montant_total_cotisations = models.DecimalField(max_digits=15, decimal_places=2)
+    statut = models.CharField(max_length=20, choices=Declaration.STATUT_CHOICES)
+    created_by = models.ForeignKey(CustomUser, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    created_at = models.DateTimeField()
+    version = models.PositiveBigIntegerField()
+    archivee = models.BooleanField()
+
+    class Meta:
+        managed = False
+        db_table = 'core_declaration_historique'
+
+
+class LigneDeclarationHistorique(models.Model):
+    # Vue core_lignedeclaration_historique
+    declaration = models.ForeignKey(DeclarationHistorique, on_delete=models.DO_NOTHING, db_constraint=False, related_name='lignes')
+    assure = models.ForeignKey(Assure, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    salaire_declare = models.DecimalField(max_digits=12, decimal_places=2)
+    cotisation_salariale = models.DecimalField(max_digits=12, decimal_places=2)
+    cotisation_patronale = models.DecimalField(max_digits=12, decimal_places=2)
+    archivee = models.BooleanField()
+
+    class Meta:
+        managed = False
+        db_table = 'core_lignedeclaration_historique'
+
+
+class PaiementHistorique(models.Model):
+    # Vue core_paiement_historique
+    reference = models.CharField(max_length=50)
+    declaration = models.ForeignKey(DeclarationHistorique, on_delete=models.DO_NOTHING, db_constraint=False, related_name='paiements')
+    montant = models.DecimalField(max_digits=15, decimal_places=2)
+    mode_paiement = models.CharField(max_length=20, choices=Paiement.MODE_PAIEMENT_CHOICES)
+    date_paiement = models.DateField()
+    date_reception = models.DateTimeField()
+    statut = models.CharField(max_length=20, choices=Paiement.STATUT_PAIEMENT_CHOICES)
+    preuve_paiement = models.FileField(upload_to='preuves_paiement/%Y/%m/', storage=stockage_dedupe, null=True, blank=True)
+    enregistre_par = models.ForeignKey(CustomUser, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    version = models.PositiveBigIntegerField()
+    archivee = models.BooleanField()
+
+    class Meta:
+        managed = False
+        db_table = 'core_paiement_historique'
+
+
+class DoublonAssure(models.Model):
+    # File de fusion : paire d'assurés probablement identiques, trouvée par la
+    # commande `doublons_assures` (core.doublons). `assure` a le plus petit id.
+    STATUT_CHOICES = (
+        ('a_traiter', 'À Traiter'),
+        ('distincts', 'Personnes Distinctes'),
+        ('fusionne', 'Fusionné'),
+    )
+
+    assure = models.ForeignKey(Assure, on_delete=models.CASCADE, related_name='doublons')
+    doublon = models.ForeignKey(Assure, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='a_traiter')
+    created_at = models.DateTimeField(auto_now_add=True)
+    traite_par = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    date_traitement = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ['assure', 'doublon']
+        indexes = [
+            models.Index(fields=['statut', '-score'], name='doublon_file_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.assure} / {self.doublon} ({self.score:.0%})"
@@ -0,0 +1,245 @@
+# core/pdf.py
+# Mise en page PDF (reportlab) des quittances, attestations de régularité et
+# rapports mensuels régionaux.
+#
+# Ce module n'utilise ni Django ni la base : il reçoit des données déjà
+# extraites par core.documents (dictionnaires de chaînes et de nombres) et
+# peut donc être exécuté dans les processus de travail du pool.
+import io
+import os
+import tempfile
+from datetime import date
+from decimal import Decimal
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.pdfgen import canvas
+
+# À incrémenter à chaque changement de mise en page : invalide le cache disque
+GABARIT = 1
+
+ORGANISME = "Système de Gestion des Cotisations"
+LARGEUR, HAUTEUR = A4
+MARGE = 20 * mm
+BLEU = colors.HexColor('#0d6efd')
+GRIS = colors.HexColor('#6c757d')
+
+MOIS = (
+    'janvier', 'février', 'mars', 'avril', 'mai', 'juin',
+    'juillet', 'août', 'septembre', 'octobre', 'novembre', 'décembre',
+)
+
+
+# --- Mise en forme -----------------------------------------------------------------
+
+def montant(valeur):
+    """« 1 234 567,50 FCFA »"""
+    texte = f"{Decimal(valeur):,.2f}".replace(',', ' ').replace('.', ',')
+    return f"{texte} FCFA"
+
+
+def pourcent(valeur):
+    return f"{valeur.replace('.', ',')} %"
+
+
+def jour(valeur):
+    return date.fromisoformat(valeur).strftime('%d/%m/%Y') if valeur else '-'
+
+
+def mois_lettres(valeur):
+    mois = date.fromisoformat(valeur)
+    return f"{MOIS[mois.month - 1]} {mois.year}"
+
+
+def _entete(c, titre, numero):
+    c.setFillColor(BLEU)
+    c.rect(0, HAUTEUR - 32 * mm, LARGEUR, 32 * mm, stroke=0, fill=1)
+    c.setFillColor(colors.white)
+    c.setFont('Helvetica-Bold', 11)
+    c.drawString(MARGE, HAUTEUR - 12 * mm, ORGANISME)
+    c.setFont('Helvetica-Bold', 18)
+    c.drawString(MARGE, HAUTEUR - 24 * mm, titre)
+    c.setFont('Helvetica', 10)
+    c.drawRightString(LARGEUR - MARGE, HAUTEUR - 24 * mm, f"N° {numero}")
+    c.setFillColor(colors.black)
+    return HAUTEUR - 45 * mm
+
+
+def _pied(c, texte):
+    c.setFont('Helvetica', 8)
+    c.setFillColor(GRIS)
+    c.drawString(MARGE, 12 * mm, texte)
+    c.drawRightString(LARGEUR - MARGE, 12 * mm, f"Page {c.getPageNumber()}")
+    c.setFillColor(colors.black)
+
+
+def _champs(c, y, lignes, colonne=55 * mm):
+    """Paires libellé / valeur ; renvoie l'ordonnée suivante."""
+    for libelle, valeur in lignes:
+        c.setFont('Helvetica', 10)
+        c.setFillColor(GRIS)
+        c.drawString(MARGE, y, libelle)
+        c.setFillColor(colors.black)
+        c.setFont('Helvetica-Bold', 10)
+        c.drawString(MARGE + colonne, y, str(valeur))
+        y -= 7 * mm
+    return y
+
+
+def _paragraphe(c, y, texte, taille=10, largeur=LARGEUR - 2 * MARGE):
+    c.setFont('Helvetica', taille)
+    ligne = ''
+    for mot in texte.split():
+        essai = f"{ligne} {mot}".strip()
+        if c.stringWidth(essai, 'Helvetica', taille) > largeur:
+            c.drawString(MARGE, y, ligne)
+            y -= taille * 0.5 * mm
+            ligne = mot
+        else:
+            ligne = essai
+    if ligne:
+        c.drawString(MARGE, y, ligne)
+        y -= taille * 0.5 * mm
+    return y
+
+
+# --- Documents ---------------------------------------------------------------------
+
+def quittance(c, d):
+    y = _entete(c, "Quittance de paiement", d['reference'])
+    y = _paragraphe(c, y, (
+        f"Nous accusons réception du paiement ci-dessous, effectué par {d['raison_sociale']} "
+        f"au titre des cotisations sociales de la période de {mois_lettres(d['periode'])}."
+    ))
+    y -= 6 * mm
+    y = _champs(c, y, (
+        ("Employeur", d['raison_sociale']),
+        ("N° d'immatriculation", d['numero_immatriculation'] or '-'),
+        ("NIF", d['nif']),
+        ("Période", mois_lettres(d['periode'])),
+        ("Référence du paiement", d['reference']),
+        ("Mode de paiement", d['mode_paiement']),
+        ("Date de paiement", jour(d['date_paiement'])),
+    ))
+    y -= 4 * mm
+    c.setStrokeColor(BLEU)
+    c.roundRect(MARGE, y - 14 * mm, LARGEUR - 2 * MARGE, 18 * mm, 3 * mm)
+    c.setFont('Helvetica', 10)
+    c.drawString(MARGE + 5 * mm, y - 4 * mm, "Montant reçu")
+    c.setFont('Helvetica-Bold', 16)
+    c.drawRightString(LARGEUR - MARGE - 5 * mm, y - 6 * mm, montant(d['montant']))
+    y -= 24 * mm
+    y = _champs(c, y, (
+        ("Cotisations déclarées", montant(d['montant_declare'])),
+        ("Total payé sur la période", montant(d['total_paye'])),
+        ("Reste dû sur la période", montant(d['reste_du'])),
+    ))
+    _pied(c, f"Quittance {d['reference']} - paiement confirmé, reçu le {jour(d['date_reception'])}.")
+
+
+def attestation(c, d):
+    y = _entete(c, "Attestation de régularité", d['numero'])
+    y = _paragraphe(c, y, (
+        f"Il est attesté que l'employeur {d['raison_sociale']}, immatriculé sous le numéro "
+        f"{d['numero_immatriculation']}, est à jour de ses déclarations et de ses cotisations "
+        f"sociales à la période de {mois_lettres(d['periode'])} incluse."
+    ), taille=11)
+    y -= 8 * mm
+    y = _champs(c, y, (
+        ("Raison sociale", d['raison_sociale']),
+        ("N° d'immatriculation", d['numero_immatriculation']),
+        ("NIF", d['nif']),
+        ("RCCM", d['rccm']),
+        ("Région", d['region']),
+        ("Secteur d'activité", d['secteur']),
+        ("Salariés déclarés", d['salaries']),
+        ("Cotisations de la période", montant(d['montant_declare'])),
+        ("Payé sur la période", montant(d['montant_paye'])),
+    ))
+    y -= 6 * mm
+    _paragraphe(c, y, (
+        "La présente attestation est délivrée pour servir et valoir ce que de droit. Elle est "
+        f"valable jusqu'au {jour(d['validite'])}."
+    ))
+    _pied(c, f"Attestation {d['numero']} - situation arrêtée à la période de {mois_lettres(d['periode'])}.")
+
+
+def rapport(c, d):
+    y = _entete(c, "Rapport mensuel", f"{d['region']} - {mois_lettres(d['mois'])}")
+    y = _champs(c, y, (
+        ("Région", d['region']),
+        ("Mois", mois_lettres(d['mois'])),
+        ("Employeurs actifs", d['employeurs_actifs']),
+        ("Nouveaux employeurs", d['nouveaux_employeurs']),
+        ("Nouveaux assurés", d['nouveaux_assures']),
+        ("Employeurs ayant déclaré", d['employeurs_ayant_declare']),
+        ("Taux de conformité", pourcent(d['taux_conformite'])),
+        ("Cotisations déclarées", montant(d['cotisations_declarees'])),
+        ("Cotisations encaissées", montant(d['cotisations_encaissees'])),
+        ("Taux de recouvrement", pourcent(d['taux_recouvrement'])),
+        ("Arriérés cumulés", montant(d['arrieres'])),
+    ), colonne=65 * mm)
+
+    y -= 6 * mm
+    c.setFont('Helvetica-Bold', 12)
+    c.drawString(MARGE, y, "Principaux débiteurs")
+    y -= 8 * mm
+    colonnes = (MARGE, MARGE + 30 * mm, LARGEUR - MARGE - 35 * mm, LARGEUR - MARGE)
+    c.setFont('Helvetica-Bold', 9)
+    c.setFillColor(GRIS)
+    c.drawString(colonnes[0], y, "Matricule")
+    c.drawString(colonnes[1], y, "Raison sociale")
+    c.drawRightString(colonnes[2], y, "Périodes impayées")
+    c.drawRightString(colonnes[3], y, "Montant dû")
+    c.setFillColor(colors.black)
+    y -= 6 * mm
+    c.setFont('Helvetica', 9)
+    for debiteur in d['debiteurs']:
+        if y < 25 * mm:
+            _pied(c, f"Rapport mensuel {d['region']} - {mois_lettres(d['mois'])}.")
+            c.showPage()
+            y = HAUTEUR - MARGE
+            c.setFont('Helvetica', 9)
+        c.drawString(colonnes[0], y, debiteur['matricule'] or '-')
+        c.drawString(colonnes[1], y, debiteur['raison_sociale'][:60])
+        c.drawRightString(colonnes[2], y, str(debiteur['periodes']))
+        c.drawRightString(colonnes[3], y, montant(debiteur['montant_du']))
+        y -= 5 * mm
+    if not d['debiteurs']:
+        c.drawString(colonnes[0], y, "Aucun arriéré dans la région.")
+    _pied(c, f"Rapport mensuel {d['region']} - {mois_lettres(d['mois'])}.")
+
+
+GABARITS = {
+    'quittance': quittance,
+    'attestation': attestation,
+    'rapport': rapport,
+}
+
+
+def rendre(type_, donnees):
+    """Contenu PDF (octets) d'un document."""
+    sortie = io.BytesIO()
+    c = canvas.Canvas(sortie, pagesize=A4, invariant=1, pageCompression=1)
+    c.setTitle(f"{type_.capitalize()} {donnees.get('numero') or donnees.get('reference') or ''}".strip())
+    c.setAuthor(ORGANISME)
+    GABARITS[type_](c, donnees)
+    c.showPage()
+    c.save()
+    return sortie.getvalue()
+
+
+def ecrire(type_, donnees, chemin):
+    """Rend un document dans `chemin` (écriture atomique) ; point d'entrée du pool."""
+    contenu = rendre(type_, donnees)
+    os.makedirs(os.path.dirname(chemin), exist_ok=True)
+    descripteur, temporaire = tempfile.mkstemp(dir=os.path.dirname(chemin), suffix='.tmp')
+    try:
+        with os.fdopen(descripteur, 'wb') as fichier:
+            fichier.write(contenu)
+        os.replace(temporaire, chemin)
+    finally:
+        if os.path.exists(temporaire):
+            os.remove(temporaire)
+    return chemin
@@ -0,0 +1,344 @@
+# core/rapprochement.py
+# Rapprochement d'un relevé bancaire ou mobile money avec les déclarations et
+# les paiements.
+#
+# Le relevé est lu en flux (core.imports.lire_tableau) et réduit à une liste
+# d'opérations compactes. Les références, NIF et matricules qu'il contient
+# servent ensuite à charger, en quelques requêtes par paquets, les employeurs,
+# déclarations ouvertes et paiements concernés dans des dictionnaires : le
+# rapprochement de chaque ligne ne fait plus aucune requête. Les paiements
+# sont enfin créés (bulk_create) ou confirmés (update) en masse.
+import re
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Q
+
+from . import arrieres, kpi
+from .imports import lire_date, lire_montant, lire_tableau, lire_texte, par_paquets
+from .models import Declaration, Employeur, Paiement
+from .sequences import nouvelle_version, numeroter
+from .synchro import versionner
+
+TAILLE_REQUETE = 500
+
+# PAY + AAAAMM + séquence (core.sequences), ou PAY + horodatage AAAAMMJJHHMMSS
+# des références antérieures aux compteurs ; jamais un préfixe d'un nombre plus long
+MOTIF_PAIEMENT = re.compile(r'PAY\d{12}(?:\d{2})?(?!\d)')
+MOTIF_DECLARATION = re.compile(r'DEC0*(\d+)')
+MOTIF_IDENTIFIANT = re.compile(r'[A-Z0-9][A-Z0-9/-]{3,}')
+
+# Entêtes acceptées pour chaque information du relevé
+COLONNES = {
+    'date': ('date', 'date_operation', 'date_valeur'),
+    'montant': ('montant', 'credit'),
+    'reference': ('reference', 'ref'),
+    'libelle': ('libelle', 'motif', 'description'),
+    'nif': ('nif',),
+    'matricule': ('matricule', 'numero_immatriculation'),
+    'mode': ('mode', 'mode_paiement'),
+}
+
+
+class Operation:
+    __slots__ = ('numero', 'date', 'montant', 'mode', 'refs_paiement', 'refs_declaration', 'identifiants')
+
+    def __init__(self, numero, date_operation, montant, mode, textes, identifiants):
+        texte = ' '.join(textes).upper()
+        self.numero = numero
+        self.date = date_operation
+        self.montant = montant
+        self.mode = mode
+        self.refs_paiement = MOTIF_PAIEMENT.findall(texte)
+        self.refs_declaration = [int(n) for n in MOTIF_DECLARATION.findall(texte)]
+        self.identifiants = {i.upper() for i in identifiants if i} | set(MOTIF_IDENTIFIANT.findall(texte))
+
+
+class DeclarationOuverte:
+    __slots__ = ('pk', 'employeur_id', 'periode', 'reste')
+
+    def __init__(self, pk, employeur_id, periode, reste):
+        self.pk = pk
+        self.employeur_id = employeur_id
+        self.periode = periode
+        self.reste = reste
+
+
+class PaiementConnu:
+    __slots__ = ('pk', 'reference', 'declaration_id', 'employeur_id', 'montant', 'date', 'statut')
+
+    def __init__(self, pk, reference, declaration_id, employeur_id, montant, date_paiement, statut):
+        self.pk = pk
+        self.reference = reference
+        self.declaration_id = declaration_id
+        self.employeur_id = employeur_id
+        self.montant = montant
+        self.date = date_paiement
+        self.statut = statut
+
+
+class ResultatRapprochement:
+    def __init__(self):
+        self.lignes_lues = 0
+        self.crees = 0
+        self.confirmes = 0
+        self.deja_rapproches = 0
+        self.montant_rapproche = Decimal('0')
+        self.ambigues = []  # [(numéro de ligne, motif)]
+        self.non_rapprochees = []
+
+    @property
+    def rapproches(self):
+        return self.crees + self.confirmes + self.deja_rapproches
+
+
+def _valeur(valeurs, cle):
+    for colonne in COLONNES[cle]:
+        if valeurs.get(colonne) not in (None, ''):
+            return valeurs[colonne]
+    return None
+
+
+def lire_releve(fichier, nom, resultat, modes_valides):
+    """Lit le relevé et renvoie la liste des opérations ; les lignes illisibles vont dans le résultat."""
+    operations = []
+    lignes = lire_tableau(fichier, nom, une_parmi=COLONNES['montant'])
+    for numero, valeurs in lignes:
+        resultat.lignes_lues += 1
+        try:
+            montant = lire_montant(_valeur(valeurs, 'montant'))
+            date_operation = lire_date(_valeur(valeurs, 'date'))
+        except ValueError as exc:
+            resultat.non_rapprochees.append((numero, str(exc)))
+            continue
+        if not montant:
+            resultat.non_rapprochees.append((numero, "montant nul"))
+            continue
+        mode = lire_texte(_valeur(valeurs, 'mode')).lower()
+        operations.append(Operation(
+            numero, date_operation, montant, mode if mode in modes_valides else None,
+            [lire_texte(_valeur(valeurs, 'reference')), lire_texte(_valeur(valeurs, 'libelle'))],
+            [lire_texte(_valeur(valeurs, 'nif')), lire_texte(_valeur(valeurs, 'matricule'))],
+        ))
+    return operations
+
+
+class Index:
+    """Dictionnaires construits une fois par relevé."""
+
+    def __init__(self, operations):
+        refs_paiement = {r for o in operations for r in o.refs_paiement}
+        refs_declaration = {r for o in operations for r in o.refs_declaration}
+        identifiants = {i for o in operations for i in o.identifiants}
+
+        # Employeurs reconnus par NIF ou matricule
+        self.employeurs = {}
+        for paquet in par_paquets(identifiants, TAILLE_REQUETE):
+            for pk, nif, matricule in Employeur.objects.filter(
+                Q(nif__in=paquet) | Q(numero_immatriculation__in=paquet)
+            ).values_list('pk', 'nif', 'numero_immatriculation'):
+                for cle in (nif, matricule):
+                    if cle and cle.upper() in identifiants:
+                        self.employeurs.setdefault(cle.upper(), set()).add(pk)
+
+        employeur_ids = {pk for pks in self.employeurs.values() for pk in pks}
+        declaration_ids = set(refs_declaration)
+        for paquet in par_paquets(refs_declaration, TAILLE_REQUETE):
+            employeur_ids.update(Declaration.objects.filter(pk__in=paquet).values_list('employeur_id', flat=True))
+
+        # Paiements : par référence citée, et en attente pour les employeurs concernés
+        self.paiements = {}
+        self.en_attente = {}
+        colonnes = ('pk', 'reference', 'declaration_id', 'declaration__employeur_id', 'montant', 'date_paiement', 'statut')
+        requetes = [Q(reference__in=p) for p in par_paquets(refs_paiement, TAILLE_REQUETE)]
+        requetes += [
+            Q(statut='initie', declaration__employeur_id__in=p)
+            for p in par_paquets(employeur_ids, TAILLE_REQUETE)
+        ]
+        for condition in requetes:
+            for ligne in Paiement.objects.filter(condition).values_list(*colonnes):
+                if ligne[0] in self.paiements:
+                    continue
+                paiement = PaiementConnu(*ligne)
+                self.paiements[paiement.pk] = paiement
+                if paiement.statut == 'initie':
+                    self.en_attente.setdefault(paiement.employeur_id, []).append(paiement)
+        self.par_reference = {p.reference.upper(): p for p in self.paiements.values()}
+        declaration_ids.update(p.declaration_id for p in self.paiements.values())
+
+        # Déclarations validées non soldées, triées de la plus ancienne à la plus récente
+        self.declarations = {}
+        self.ouvertes = {}
+        requetes = [Q(employeur_id__in=p) for p in par_paquets(employeur_ids, TAILLE_REQUETE)]
+        requetes += [Q(pk__in=p) for p in par_paquets(declaration_ids, TAILLE_REQUETE)]
+        for condition in requetes:
+            lignes = (
+                Declaration.objects.filter(condition, statut='valide')
+                .annotate(paye=arrieres.paye_confirme())
+                .annotate(reste=F('montant_total_cotisations') - F('paye'))
+                .filter(reste__gt=0)
+                .order_by('periode')
+                .values_list('pk', 'employeur_id', 'periode', 'reste')
+            )
+            for ligne in lignes:
+                if ligne[0] not in self.declarations:
+                    declaration = DeclarationOuverte(*ligne)
+                    self.declarations[declaration.pk] = declaration
+                    self.ouvertes.setdefault(declaration.employeur_id, []).append(declaration)
+        for liste in self.ouvertes.values():
+            liste.sort(key=lambda d: d.periode)
+
+
+class Rapprocheur:
+    def __init__(self, index, resultat, tolerance_montant, tolerance_jours):
+        self.index = index
+        self.resultat = resultat
+        self.tolerance = tolerance_montant
+        self.jours = timedelta(days=tolerance_jours)
+        self.a_creer = []  # [(opération, déclaration)]
+        self.a_confirmer = []  # [paiement]
+
+    def _egal(self, a, b):
+        return abs(a - b) <= self.tolerance
+
+    def _confirmer(self, operation, paiement):
+        paiement.statut = 'confirme'
+        declaration = self.index.declarations.get(paiement.declaration_id)
+        if declaration is not None:
+            declaration.reste -= paiement.montant
+        self.a_confirmer.append(paiement)
+        self.resultat.confirmes += 1
+        self.resultat.montant_rapproche += operation.montant
+
+    def _creer(self, operation, declaration):
+        declaration.reste -= operation.montant
+        self.a_creer.append((operation, declaration))
+        self.resultat.crees += 1
+        self.resultat.montant_rapproche += operation.montant
+
+    def _ambigue(self, operation, motif):
+        self.resultat.ambigues.append((operation.numero, motif))
+
+    def _non_rapprochee(self, operation, motif):
+        self.resultat.non_rapprochees.append((operation.numero, motif))
+
+    def rapprocher(self, operation):
+        index = self.index
+
+        # 1. Référence d'un paiement existant
+        for reference in operation.refs_paiement:
+            paiement = index.par_reference.get(reference)
+            if paiement is None:
+                continue
+            if paiement.statut == 'confirme':
+                self.resultat.deja_rapproches += 1
+            elif paiement.statut == 'rejete':
+                self._ambigue(operation, f"{reference} : paiement rejeté")
+            elif self._egal(paiement.montant, operation.montant):
+                self._confirmer(operation, paiement)
+            else:
+                self._ambigue(operation, f"{reference} : montant attendu {paiement.montant}")
+            return
+
+        # 2. Référence de déclaration (DEC000123)
+        for declaration_id in operation.refs_declaration:
+            declaration = index.declarations.get(declaration_id)
+            if declaration is None:
+                continue
+            if operation.montant <= declaration.reste + self.tolerance:
+                self._creer(operation, declaration)
+            else:
+                self._ambigue(operation, f"DEC{declaration_id:06d} : reste dû {declaration.reste}")
+            return
+
+        # 3. Employeur reconnu par NIF ou matricule
+        employeurs = set()
+        for identifiant in operation.identifiants:
+            employeurs |= index.employeurs.get(identifiant, set())
+        if not employeurs:
+            if operation.refs_declaration:
+                return self._non_rapprochee(operation, "déclaration soldée, non validée ou inconnue")
+            return self._non_rapprochee(operation, "aucune référence, NIF ou matricule reconnu")
+        if len(employeurs) > 1:
+            return self._ambigue(operation, "plusieurs employeurs correspondent")
+        employeur_id = employeurs.pop()
+
+        attente = [
+            p for p in index.en_attente.get(employeur_id, ())
+            if p.statut == 'initie' and self._egal(p.montant, operation.montant)
+            and abs(p.date - operation.date) <= self.jours
+        ]
+        if len(attente) == 1:
+            return self._confirmer(operation, attente[0])
+        if len(attente) > 1:
+            return self._ambigue(operation, f"{len(attente)} paiements en attente de même montant")
+
+        ouvertes = [d for d in index.ouvertes.get(employeur_id, ()) if d.reste > 0]
+        if not ouvertes:
+            return self._non_rapprochee(operation, "aucune déclaration ouverte pour cet employeur")
+        candidates = [d for d in ouvertes if self._egal(d.reste, operation.montant)]
+        if len(candidates) == 1:
+            return self._creer(operation, candidates[0])
+        if candidates:
+            return self._ambigue(operation, f"{len(candidates)} déclarations ouvertes de même montant")
+        return self._ambigue(operation, "montant différent du reste dû de chaque déclaration ouverte")
+
+
+def _enregistrer(rapprocheur, utilisateur, mode_defaut):
+    paiements = [
+        Paiement(
+            declaration_id=declaration.pk,
+            montant=operation.montant,
+            mode_paiement=operation.mode or mode_defaut,
+            date_paiement=operation.date,
+            statut='confirme',
+            enregistre_par=utilisateur,
+        )
+        for operation, declaration in rapprocheur.a_creer
+    ]
+    version = nouvelle_version()
+    Paiement.objects.bulk_create(
+        numeroter(versionner(paiements, version), 'reference', 'PAY'), batch_size=TAILLE_REQUETE,
+    )
+    for paquet in par_paquets([p.pk for p in rapprocheur.a_confirmer], TAILLE_REQUETE):
+        Paiement.objects.filter(pk__in=paquet, statut='initie').update(statut='confirme', version=version)
+
+    # bulk_create et update() ne déclenchent pas les signaux : versions de
+    # synchronisation ci-dessus, KPI et arriérés
+    # sont recalculés une fois pour l'ensemble des déclarations touchées
+    touchees = {d.pk for _, d in rapprocheur.a_creer} | {p.declaration_id for p in rapprocheur.a_confirmer}
+    cellules, employeurs = set(), set()
+    for paquet in par_paquets(touchees, TAILLE_REQUETE):
+        declarations = Declaration.objects.filter(pk__in=paquet)
+        cellules |= kpi.cellules_declarations(declarations)
+        employeurs.update(declarations.values_list('employeur_id', flat=True))
+    kpi.recalculer_cellules(cellules, kpi.METRIQUES_PAR_MODELE[Paiement])
+    arrieres.recalculer_employeurs(employeurs)
+
+
+def rapprocher_releve(fichier, nom, utilisateur, mode_defaut='virement',
+                      tolerance_montant=Decimal('0'), tolerance_jours=5, simulation=False):
+    """Rapproche un relevé (CSV/XLSX) et renvoie un ResultatRapprochement.
+
+    Colonnes : `date` et `montant` obligatoires ; `reference`, `libelle`,
+    `nif`, `matricule` et `mode` facultatives. Chaque ligne est rapprochée,
+    dans l'ordre, d'un paiement cité par sa référence (PAY...), d'une
+    déclaration citée (DEC...), puis d'un paiement en attente ou d'une
+    déclaration ouverte de l'employeur reconnu par NIF ou matricule. Avec
+    `simulation=True`, rien n'est enregistré.
+    """
+    resultat = ResultatRapprochement()
+    modes = {m for m, _ in Paiement.MODE_PAIEMENT_CHOICES}
+    operations = lire_releve(fichier, nom, resultat, modes)
+
+    with transaction.atomic():
+        rapprocheur = Rapprocheur(Index(operations), resultat, tolerance_montant, tolerance_jours)
+        for operation in operations:
+            rapprocheur.rapprocher(operation)
+        if not simulation:
+            _enregistrer(rapprocheur, utilisateur, mode_defaut)
+
+    resultat.ambigues.sort()
+    resultat.non_rapprochees.sort()
+    return resultat
@@ -0,0 +1,184 @@
+# core/recherche.py
+# Recherche plein texte et saisie semi-automatique sur les employeurs et les
+# assurés.
+#
+# SQLite : une table virtuelle FTS5 par modèle (contenu externe, tokenizer
+# unicode61 sans diacritiques, index de préfixes), alimentée par des
+# déclencheurs SQL. Les déclencheurs suivent aussi les bulk_create et
+# update(), que les signaux Django ne voient pas.
+# PostgreSQL : un index GIN trigramme sur le texte replié (unaccent + lower).
+# Autres moteurs : repli sur des icontains, sans index.
+#
+# SQLite recrée une table lors de certaines migrations (AlterField, ...), ce
+# qui supprime ses déclencheurs : installer() est donc rappelé après chaque
+# `migrate` et reconstruit l'index s'il manquait quelque chose.
+import re
+import unicodedata
+
+from django.db import connections
+from django.db.models import Q
+
+from .models import Assure, Employeur
+
+LIMITE = 10
+LIMITE_MAX = 50
+LONGUEUR_MIN = 2
+# Un préfixe court peut correspondre à des centaines de milliers de lignes :
+# le classement (bm25, similarité) n'est calculé que sur les premiers candidats.
+CANDIDATS = 500
+
+# Colonnes indexées par modèle
+CHAMPS = {
+    Employeur: ('raison_sociale', 'nif', 'rccm', 'numero_immatriculation'),
+    Assure: ('nom', 'prenom', 'numero_cni', 'numero_assure'),
+}
+
+
+def plier(texte):
+    """'Société Générale' -> 'societe generale'."""
+    texte = unicodedata.normalize('NFKD', str(texte or ''))
+    return ''.join(c for c in texte if not unicodedata.combining(c)).lower()
+
+
+def termes(texte):
+    return re.findall(r'\w+', plier(texte))
+
+
+def _table(modele):
+    return modele._meta.db_table
+
+
+def _fts(modele):
+    return f'{_table(modele)}_fts'
+
+
+# --- SQLite / FTS5 ---------------------------------------------------------
+
+def _ddl_sqlite(modele):
+    table, fts = _table(modele), _fts(modele)
+    colonnes = ', '.join(CHAMPS[modele])
+    nouveaux = ', '.join(f'new.{c}' for c in CHAMPS[modele])
+    anciens = ', '.join(f'old.{c}' for c in CHAMPS[modele])
+    suppression = f"INSERT INTO {fts}({fts}, rowid, {colonnes}) VALUES ('delete', old.id, {anciens});"
+    insertion = f"INSERT INTO {fts}(rowid, {colonnes}) VALUES (new.id, {nouveaux});"
+    return {
+        fts: (
+            f"CREATE VIRTUAL TABLE {fts} USING fts5({colonnes}, content='{table}', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2', prefix='2 3 4')"
+        ),
+        f'{fts}_ai': f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN {insertion} END",
+        f'{fts}_ad': f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN {suppression} END",
+        f'{fts}_au': f"CREATE TRIGGER {fts}_au AFTER UPDATE ON {table} BEGIN {suppression} {insertion} END",
+    }
+
+
+def _installer_sqlite(curseur, reconstruire):
+    curseur.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+    existants = {nom for (nom,) in curseur.fetchall()}
+    installes = 0
+    for modele in CHAMPS:
+        ddl = _ddl_sqlite(modele)
+        manquants = [nom for nom in ddl if nom not in existants]
+        for nom in manquants:
+            curseur.execute(ddl[nom])
+        if manquants or reconstruire:
+            fts = _fts(modele)
+            curseur.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+            curseur.execute(f"INSERT INTO {fts}({fts}) VALUES ('optimize')")
+            installes += 1
+    return installes
+
+
+def _requete_fts(mots):
+    # Chaque terme est cité (aucun opérateur FTS5 possible) et cherché en préfixe
+    return ' '.join(f'"{m}"*' for m in mots)
+
+
+def _chercher_sqlite(curseur, modele, mots, limite):
+    fts = _fts(modele)
+    curseur.execute(
+        f"SELECT rowid FROM (SELECT rowid, rank FROM {fts} WHERE {fts} MATCH %s LIMIT %s) "
+        f"ORDER BY rank LIMIT %s",
+        [_requete_fts(mots), CANDIDATS, limite],
+    )
+    return [pk for (pk,) in curseur.fetchall()]
+
+
+# --- PostgreSQL / pg_trgm --------------------------------------------------
+
+def _expression_pg(modele):
+    # coalesce/|| plutôt que concat_ws, qui n'est pas IMMUTABLE
+    return "sgc_plier(" + " || ' ' || ".join(f"coalesce({c}, '')" for c in CHAMPS[modele]) + ")"
+
+
+def _installer_pg(curseur, reconstruire):
+    curseur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    curseur.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+    curseur.execute(
+        "CREATE OR REPLACE FUNCTION sgc_plier(text) RETURNS text LANGUAGE sql IMMUTABLE PARALLEL SAFE "
+        "AS $$ SELECT lower(public.unaccent('public.unaccent'::regdictionary, $1)) $$"
+    )
+    for modele in CHAMPS:
+        index = f'{_table(modele)}_recherche_trgm'
+        curseur.execute(
+            f"CREATE INDEX IF NOT EXISTS {index} ON {_table(modele)} "
+            f"USING gin ({_expression_pg(modele)} gin_trgm_ops)"
+        )
+        if reconstruire:
+            curseur.execute(f"REINDEX INDEX {index}")
+    return len(CHAMPS)
+
+
+def _chercher_pg(curseur, modele, mots, limite):
+    expression = _expression_pg(modele)
+    conditions = ' AND '.join([f"{expression} LIKE %s"] * len(mots))
+    curseur.execute(
+        f"SELECT id FROM (SELECT id, {expression} AS texte FROM {_table(modele)} WHERE {conditions} LIMIT %s) c "
+        f"ORDER BY similarity(texte, %s) DESC LIMIT %s",
+        [f'%{m}%' for m in mots] + [CANDIDATS, ' '.join(mots), limite],
+    )
+    return [pk for (pk,) in curseur.fetchall()]
+
+
+# --- Interface ---------------------------------------------------------------
+
+def installer(using='default', reconstruire=False):
+    """Crée l'index et ses déclencheurs s'ils manquent ; renvoie le nombre d'index (re)construits."""
+    connexion = connections[using]
+    with connexion.cursor() as curseur:
+        if connexion.vendor == 'sqlite':
+            return _installer_sqlite(curseur, reconstruire)
+        if connexion.vendor == 'postgresql':
+            return _installer_pg(curseur, reconstruire)
+    return 0
+
+
+def _ids(modele, mots, limite, using):
+    connexion = connections[using]
+    if connexion.vendor == 'sqlite':
+        with connexion.cursor() as curseur:
+            return _chercher_sqlite(curseur, modele, mots, limite)
+    if connexion.vendor == 'postgresql':
+        with connexion.cursor() as curseur:
+            return _chercher_pg(curseur, modele, mots, limite)
+    filtre = Q()
+    for mot in mots:
+        filtre &= Q(*(Q(**{f'{c}__icontains': mot}) for c in CHAMPS[modele]), _connector=Q.OR)
+    return list(modele.objects.using(using).filter(filtre).values_list('pk', flat=True)[:limite])
+
+
+def chercher(modele, texte, limite=LIMITE, queryset=None, using='default'):
+    """Renvoie les objets de `modele` correspondant à `texte`, les plus pertinents d'abord.
+
+    Chaque mot saisi est cherché en préfixe (recherche en cours de frappe),
+    sans tenir compte des accents ni de la casse ; tous les mots doivent
+    correspondre. `queryset` permet de préciser select_related()/only().
+    """
+    mots = termes(texte)
+    if not mots or len(''.join(mots)) < LONGUEUR_MIN:
+        return []
+    ids = _ids(modele, mots, limite, using)
+    if queryset is None:
+        queryset = modele.objects.all()
+    objets = queryset.using(using).in_bulk(ids)
+    return [objets[pk] for pk in ids if pk in objets]
@@ -0,0 +1,89 @@
+# core/routage.py
+# Routage des requêtes SQL entre la base principale et l'alias de lecture.
+#
+# Les écritures vont toujours à la base principale (`default`). Les vues de
+# reporting (tableau de bord, KPI, rapports, exports), marquées par le
+# décorateur `reporting`, lisent sur l'alias LECTURE : une réplique en
+# PostgreSQL, le même fichier ouvert en lecture seule en SQLite (voir
+# DATABASES dans settings.py). Leurs longs agrégats ne retiennent alors
+# aucun verrou de la base principale et ne bloquent pas la saisie.
+#
+# Dans une transaction ouverte sur la base principale, les lectures y
+# restent : elles doivent voir les écritures non encore validées.
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.db import connections
+
+PRINCIPALE = 'default'
+LECTURE = 'lecture'
+
+_lecture = contextvars.ContextVar('sgc_lecture', default=False)
+
+
+@contextmanager
+def lecture_seule():
+    """Envoie les lectures du bloc à l'alias LECTURE."""
+    jeton = _lecture.set(True)
+    try:
+        yield
+    finally:
+        _lecture.reset(jeton)
+
+
+def _flux_en_lecture(contenu):
+    # Le contenu d'une réponse en flux est produit après le retour de la vue :
+    # chaque morceau est calculé en lecture seule. Le drapeau est posé puis
+    # retiré autour de chaque morceau, jamais au travers d'un yield (sous
+    # ASGI, deux morceaux ne sont pas forcément produits dans le même contexte).
+    iterateur = iter(contenu)
+    while True:
+        with lecture_seule():
+            try:
+                morceau = next(iterateur)
+            except StopIteration:
+                return
+        yield morceau
+
+
+def reporting(vue):
+    """Décorateur des vues de reporting : leurs lectures vont à l'alias LECTURE."""
+    if iscoroutinefunction(vue):
+        @wraps(vue)
+        async def enveloppe_async(request, *args, **kwargs):
+            # Le contexte (donc le drapeau) suit les appels sync_to_async de la vue
+            with lecture_seule():
+                return await vue(request, *args, **kwargs)
+        return enveloppe_async
+
+    @wraps(vue)
+    def enveloppe(request, *args, **kwargs):
+        with lecture_seule():
+            reponse = vue(request, *args, **kwargs)
+        if reponse.streaming:
+            reponse.streaming_content = _flux_en_lecture(reponse.streaming_content)
+        return reponse
+    return enveloppe
+
+
+class RouteurBases:
+    """DATABASE_ROUTERS : lectures de reporting sur LECTURE, tout le reste sur la base principale."""
+
+    def db_for_read(self, model, **hints):
+        if not _lecture.get() or LECTURE not in connections.settings:
+            return None
+        if connections[PRINCIPALE].in_atomic_block:
+            return None
+        return LECTURE
+
+    def db_for_write(self, model, **hints):
+        return PRINCIPALE
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Les deux alias désignent les mêmes données
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRINCIPALE
@@ -0,0 +1,103 @@
+# core/sequences.py
+# Attribution des numéros métier (matricules employeurs, numéros d'assurés,
+# références de paiement) à partir de la table Compteur.
+#
+# Un numéro a la forme PREFIXE + AAAAMM + séquence sur 6 chiffres, par ex.
+# ASS202509000042. Les numéros sont réservés par blocs : une transaction
+# courte incrémente le compteur de n d'un seul UPDATE, ce qui verrouille la
+# ligne (PostgreSQL) ou la base (SQLite) jusqu'au commit. Deux écrivains
+# concurrents obtiennent donc toujours des blocs disjoints.
+import re
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Assure, Compteur, Employeur, Paiement
+
+LARGEUR = 6
+
+# Champs déjà numérotés par préfixe : au premier usage d'un mois, le compteur
+# repart du plus grand numéro existant pour ne jamais réattribuer un numéro
+# saisi ou importé auparavant.
+SOURCES = {
+    'ASS': (Assure, 'numero_assure'),
+    'EMP': (Employeur, 'numero_immatriculation'),
+    'PAY': (Paiement, 'reference'),
+}
+
+
+def mois_courant():
+    return timezone.localdate().strftime('%Y%m')
+
+
+def formater(prefixe, mois, valeur):
+    return f"{prefixe}{mois}{valeur:0{LARGEUR}d}"
+
+
+def _amorce(prefixe, mois):
+    source = SOURCES.get(prefixe)
+    if source is None:
+        return 0
+    modele, champ = source
+    debut = f"{prefixe}{mois}"
+    motif = re.compile(rf'^{re.escape(debut)}(\d+)$')
+    plus_grand = 0
+    for numero in modele.objects.filter(**{f'{champ}__startswith': debut}).values_list(champ, flat=True).iterator():
+        trouve = motif.match(numero)
+        if trouve:
+            plus_grand = max(plus_grand, int(trouve.group(1)))
+    return plus_grand
+
+
+def allouer(prefixe, n=1, mois=None):
+    """Réserve n numéros consécutifs et renvoie le range des valeurs obtenues."""
+    if n < 1:
+        return range(0)
+    mois = mois or mois_courant()
+    with transaction.atomic():
+        if not Compteur.objects.filter(prefixe=prefixe, mois=mois).update(valeur=F('valeur') + n):
+            try:
+                with transaction.atomic():
+                    Compteur.objects.create(prefixe=prefixe, mois=mois, valeur=_amorce(prefixe, mois) + n)
+            except IntegrityError:
+                # Un autre écrivain a créé le compteur entre-temps
+                Compteur.objects.filter(prefixe=prefixe, mois=mois).update(valeur=F('valeur') + n)
+        fin = Compteur.objects.filter(prefixe=prefixe, mois=mois).values_list('valeur', flat=True).get()
+    return range(fin - n + 1, fin + 1)
+
+
+def numeros(prefixe, n, mois=None):
+    """Réserve n numéros formatés en un seul aller-retour (imports en masse)."""
+    mois = mois or mois_courant()
+    return [formater(prefixe, mois, v) for v in allouer(prefixe, n, mois)]
+
+
+def prochain_numero(prefixe):
+    return numeros(prefixe, 1)[0]
+
+
+# Versions de synchronisation (core.synchro) : une seule séquence, hors mois.
+# Réservée dans la transaction de l'écriture, elle reste verrouillée jusqu'au
+# commit : les versions deviennent visibles dans l'ordre où elles sont prises.
+PREFIXE_VERSION = 'SYNC'
+MOIS_VERSION = '000000'
+
+
+def nouvelle_version():
+    return allouer(PREFIXE_VERSION, 1, MOIS_VERSION)[0]
+
+
+def version_courante():
+    """Dernière version attribuée (validée) : jeton de synchronisation."""
+    return Compteur.objects.filter(
+        prefixe=PREFIXE_VERSION, mois=MOIS_VERSION,
+    ).values_list('valeur', flat=True).first() or 0
+
+
+def numeroter(objets, champ, prefixe):
+    """Attribue un numéro aux objets dont `champ` est vide, avant un bulk_create."""
+    a_numeroter = [o for o in objets if not getattr(o, champ)]
+    for objet, numero in zip(a_numeroter, numeros(prefixe, len(a_numeroter))):
+        setattr(objet, champ, numero)
+    return objets
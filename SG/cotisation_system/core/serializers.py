@@ -0,0 +1,196 @@
+# core/serializers.py
+# Sérialiseurs de l'API REST (voir core/api.py).
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
+
+from . import archives
+from .models import ActionRecouvrement, Assure, CustomUser, Declaration, Employeur, LigneDeclaration, Paiement
+
+
+class RelationPk(serializers.PrimaryKeyRelatedField):
+    """Clé étrangère résolue dans le cache du lot (context['relations']) s'il existe.
+
+    Une requête par relation pour tout un lot, au lieu d'une par enregistrement.
+    """
+
+    def to_internal_value(self, data):
+        cache = self.context.get('relations', {}).get(self.queryset.model)
+        if cache is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            objet = cache.get(self.queryset.model._meta.pk.to_python(data))
+        except (TypeError, ValueError, DjangoValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if objet is None:
+            self.fail('does_not_exist', pk_value=data)
+        return objet
+
+
+class SerializerSgc(serializers.ModelSerializer):
+    serializer_related_field = RelationPk
+
+    # {champ exposé : relation à joindre (select_related) pour le produire}
+    relations = {}
+    # Statuts de décision : ni fixés ni quittés par l'API, sauf par `roles_decision`
+    statuts_reserves = ()
+    roles_decision = ()
+    message_decision = ''
+
+    def __init__(self, *args, champs=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if champs:
+            # Sélection de champs (?fields=)
+            for nom in set(self.fields) - set(champs):
+                self.fields.pop(nom)
+
+    def get_fields(self):
+        champs = super().get_fields()
+        if self.context.get('lot'):
+            # En lot, l'unicité est vérifiée pour tout le lot à la fois (core.api)
+            for champ in champs.values():
+                champ.validators = [v for v in champ.validators if not isinstance(v, UniqueValidator)]
+        return champs
+
+    def get_validators(self):
+        if self.context.get('lot'):
+            return []
+        return super().get_validators()
+
+    def validate_statut(self, valeur):
+        actuel = self.instance.statut if self.instance is not None else None
+        if valeur == actuel or not {valeur, actuel} & set(self.statuts_reserves):
+            return valeur
+        request = self.context.get('request')
+        utilisateur = self.context.get('utilisateur') or getattr(request, 'user', None)
+        if getattr(utilisateur, 'role', None) not in self.roles_decision:
+            raise serializers.ValidationError(self.message_decision)
+        return valeur
+
+
+class EmployeurSerializer(SerializerSgc):
+    secteur_activite_nom = serializers.CharField(source='secteur_activite.nom', read_only=True)
+    region_nom = serializers.CharField(source='region.nom', read_only=True)
+
+    relations = {'secteur_activite_nom': 'secteur_activite', 'region_nom': 'region'}
+    # Validation et rejet par la file de validation (core.validation), qui numérote
+    statuts_reserves = ('valide', 'rejete')
+    message_decision = "Validation et rejet passent par la file de validation."
+
+    class Meta:
+        model = Employeur
+        fields = [
+            'id', 'numero_immatriculation', 'raison_sociale', 'nif', 'rccm', 'secteur_activite',
+            'secteur_activite_nom', 'region', 'region_nom', 'adresse', 'latitude', 'longitude',
+            'contact_nom', 'contact_email', 'contact_telephone', 'statut', 'motif_rejet',
+            'date_creation', 'date_validation', 'agent', 'version',
+        ]
+        read_only_fields = [
+            'numero_immatriculation', 'motif_rejet', 'date_creation', 'date_validation', 'agent', 'version',
+        ]
+
+
+class AssureSerializer(SerializerSgc):
+    employeur_raison_sociale = serializers.CharField(source='employeur.raison_sociale', read_only=True, default=None)
+
+    relations = {'employeur_raison_sociale': 'employeur'}
+
+    class Meta:
+        model = Assure
+        fields = [
+            'id', 'numero_assure', 'nom', 'prenom', 'date_naissance', 'lieu_naissance', 'numero_cni',
+            'adresse', 'telephone', 'email', 'type_assure', 'employeur', 'employeur_raison_sociale',
+            'date_affiliation', 'est_actif', 'version',
+        ]
+        read_only_fields = ['date_affiliation', 'version']
+
+
+class DeclarationSerializer(SerializerSgc):
+    employeur_raison_sociale = serializers.CharField(source='employeur.raison_sociale', read_only=True)
+
+    relations = {'employeur_raison_sociale': 'employeur'}
+    statuts_reserves = ('valide', 'rejete')
+    message_decision = "Validation et rejet passent par la file de validation."
+
+    class Meta:
+        model = Declaration
+        fields = [
+            'id', 'employeur', 'employeur_raison_sociale', 'periode', 'date_soumission',
+            'montant_total_cotisations', 'statut', 'motif_rejet', 'date_validation', 'created_by', 'created_at',
+            'version',
+        ]
+        read_only_fields = [
+            'montant_total_cotisations', 'motif_rejet', 'date_validation', 'created_by', 'created_at', 'version',
+        ]
+
+    def validate_periode(self, valeur):
+        valeur = valeur.replace(day=1)
+        inchangee = self.instance is not None and self.instance.periode == valeur
+        if not inchangee and archives.est_close(valeur):
+            raise serializers.ValidationError(f"L'exercice {valeur.year} est clos : il n'accepte plus de déclaration.")
+        return valeur
+
+    def validate(self, attrs):
+        if self.instance is not None and self.instance.statut == 'valide':
+            raise serializers.ValidationError("Une déclaration validée ne peut plus être modifiée.")
+        return attrs
+
+
+class LigneDeclarationSerializer(SerializerSgc):
+    numero_assure = serializers.CharField(source='assure.numero_assure', read_only=True)
+
+    relations = {'numero_assure': 'assure'}
+
+    class Meta:
+        model = LigneDeclaration
+        fields = [
+            'id', 'declaration', 'assure', 'numero_assure', 'salaire_declare',
+            'cotisation_salariale', 'cotisation_patronale',
+        ]
+        # Cotisations calculées par le barème (core.cotisations)
+        read_only_fields = ['cotisation_salariale', 'cotisation_patronale']
+
+    def validate(self, attrs):
+        declaration = attrs.get('declaration') or self.instance.declaration
+        if self.instance is not None and declaration != self.instance.declaration:
+            raise serializers.ValidationError("Une ligne ne peut pas changer de déclaration.")
+        if declaration.statut == 'valide':
+            raise serializers.ValidationError("Une déclaration validée ne peut plus être modifiée.")
+        assure = attrs.get('assure') or self.instance.assure
+        if not self.context.get('lot'):
+            doublons = LigneDeclaration.objects.filter(declaration=declaration, assure=assure)
+            if self.instance is not None:
+                doublons = doublons.exclude(pk=self.instance.pk)
+            if doublons.exists():
+                raise serializers.ValidationError("Assuré déjà déclaré sur cette déclaration.")
+        return attrs
+
+
+class PaiementSerializer(SerializerSgc):
+    employeur = serializers.IntegerField(source='declaration.employeur_id', read_only=True)
+
+    relations = {'employeur': 'declaration'}
+    statuts_reserves = ('confirme', 'rejete')
+    roles_decision = CustomUser.ROLES_VALIDATION
+    message_decision = "Seuls les agents de validation confirment ou rejettent un paiement."
+
+    class Meta:
+        model = Paiement
+        fields = [
+            'id', 'reference', 'declaration', 'employeur', 'montant', 'mode_paiement', 'date_paiement',
+            'date_reception', 'statut', 'preuve_paiement', 'enregistre_par', 'version',
+        ]
+        read_only_fields = ['reference', 'date_reception', 'preuve_paiement', 'enregistre_par', 'version']
+
+
+class ActionRecouvrementSerializer(SerializerSgc):
+
+    class Meta:
+        model = ActionRecouvrement
+        fields = [
+            'id', 'employeur', 'type_action', 'statut', 'date_planification', 'date_execution',
+            'montant_recouvre', 'observations', 'agent', 'created_at', 'version', 'campagne',
+        ]
+        read_only_fields = ['agent', 'created_at', 'version', 'campagne']
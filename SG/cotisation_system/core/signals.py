@@ -0,0 +1,173 @@
+# core/signals.py
+# Maintien incrémental de KpiMensuel : chaque écriture sur une table source
+# recalcule uniquement les cellules (mois, région) qu'elle touche, avant et
+# après modification. Les opérations en masse (bulk_create, update) ne
+# déclenchent pas ces signaux : elles doivent appeler core.kpi elles-mêmes,
+# ou la commande `kpi_mensuel` doit être relancée.
+# Même principe pour ArriereEmployeur (core.arrieres, commande `arrieres`).
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import arrieres, fragments, kpi, synchro
+from .models import (
+    ActionRecouvrement, Assure, CustomUser, Declaration, Employeur, Paiement, PieceJustificative, Region,
+    SecteurActivite,
+)
+from .stockage import est_blob
+
+
+def _region_employeur(employeur_id):
+    if employeur_id is None:
+        return None
+    return Employeur.objects.filter(pk=employeur_id).values_list('region_id', flat=True).first()
+
+
+def _cellules(instance):
+    if isinstance(instance, Employeur):
+        if instance.date_creation is None:
+            return set()
+        return {(kpi.mois_de(instance.date_creation), instance.region_id)}
+    if isinstance(instance, Assure):
+        if instance.date_affiliation is None:
+            return set()
+        return {(kpi.mois_de(instance.date_affiliation), _region_employeur(instance.employeur_id))}
+    if isinstance(instance, Declaration):
+        return {(kpi.mois_de(instance.periode), _region_employeur(instance.employeur_id))}
+    if isinstance(instance, Paiement):
+        source = (
+            Declaration.objects.filter(pk=instance.declaration_id)
+            .values_list('periode', 'employeur__region_id').first()
+        )
+        return {(kpi.mois_de(source[0]), source[1])} if source else set()
+    return set()
+
+
+def _mois_rattaches(employeur):
+    # Mois de toutes les lignes dont la région dépend de cet employeur
+    mois = {kpi.mois_de(p) for p in employeur.declarations.values_list('periode', flat=True).distinct()}
+    mois |= {kpi.mois_de(d) for d in employeur.salaries.values_list('date_affiliation', flat=True)}
+    return mois
+
+
+@receiver(pre_save, sender=Employeur)
+@receiver(pre_save, sender=Assure)
+@receiver(pre_save, sender=Declaration)
+@receiver(pre_save, sender=Paiement)
+def kpi_avant_enregistrement(sender, instance, **kwargs):
+    ancien = sender.objects.filter(pk=instance.pk).first() if instance.pk else None
+    instance._kpi_ancien = ancien
+    instance._kpi_cellules = _cellules(ancien) if ancien else set()
+
+
+@receiver(post_save, sender=Employeur)
+@receiver(post_save, sender=Assure)
+@receiver(post_save, sender=Declaration)
+@receiver(post_save, sender=Paiement)
+def kpi_apres_enregistrement(sender, instance, **kwargs):
+    cellules = getattr(instance, '_kpi_cellules', set()) | _cellules(instance)
+    kpi.recalculer_cellules(cellules, kpi.METRIQUES_PAR_MODELE[sender])
+
+    ancien = getattr(instance, '_kpi_ancien', None)
+    if sender is Employeur and ancien and ancien.region_id != instance.region_id:
+        # Changement de région : les assurés et déclarations de l'employeur changent de cellule
+        regions = (ancien.region_id, instance.region_id)
+        kpi.recalculer_cellules({(m, r) for m in _mois_rattaches(instance) for r in regions})
+
+
+@receiver(pre_delete, sender=Employeur)
+@receiver(pre_delete, sender=Assure)
+@receiver(pre_delete, sender=Declaration)
+@receiver(pre_delete, sender=Paiement)
+def kpi_avant_suppression(sender, instance, **kwargs):
+    instance._kpi_cellules = _cellules(instance)
+
+
+@receiver(post_delete, sender=Employeur)
+@receiver(post_delete, sender=Assure)
+@receiver(post_delete, sender=Declaration)
+@receiver(post_delete, sender=Paiement)
+def kpi_apres_suppression(sender, instance, **kwargs):
+    kpi.recalculer_cellules(getattr(instance, '_kpi_cellules', set()), kpi.METRIQUES_PAR_MODELE[sender])
+
+
+def _employeurs_paiement(instance):
+    ids = {instance.declaration_id, getattr(getattr(instance, '_kpi_ancien', None), 'declaration_id', None)}
+    return set(Declaration.objects.filter(pk__in=ids - {None}).values_list('employeur_id', flat=True))
+
+
+@receiver(post_save, sender=Declaration)
+@receiver(post_delete, sender=Declaration)
+def arrieres_declaration(sender, instance, **kwargs):
+    ancien = getattr(instance, '_kpi_ancien', None)
+    arrieres.recalculer_employeurs({instance.employeur_id, ancien.employeur_id if ancien else None})
+
+
+@receiver(post_save, sender=Paiement)
+@receiver(post_delete, sender=Paiement)
+def arrieres_paiement(sender, instance, **kwargs):
+    arrieres.recalculer_employeurs(_employeurs_paiement(instance))
+
+
+# Synchronisation hors ligne (core.synchro) : une pierre tombale par ligne
+# supprimée, y compris en cascade ou par queryset.delete().
+@receiver(post_delete, sender=Employeur)
+@receiver(post_delete, sender=Assure)
+@receiver(post_delete, sender=Declaration)
+@receiver(post_delete, sender=Paiement)
+@receiver(post_delete, sender=ActionRecouvrement)
+def synchro_apres_suppression(sender, instance, **kwargs):
+    synchro.enterrer(instance)
+
+
+# Fichiers dédupliqués (core.stockage) : chaque remplacement ou suppression
+# d'un fichier libère une référence sur son blob. Les fichiers d'avant la
+# déduplication (commande `dedupliquer_media`) restent en place, comme avant.
+FICHIERS = {PieceJustificative: 'fichier', Paiement: 'preuve_paiement'}
+
+
+@receiver(pre_save, sender=PieceJustificative)
+@receiver(pre_save, sender=Paiement)
+def fichier_avant_enregistrement(sender, instance, **kwargs):
+    champ = FICHIERS[sender]
+    instance._fichier_ancien = (
+        sender.objects.filter(pk=instance.pk).values_list(champ, flat=True).first() if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=PieceJustificative)
+@receiver(post_save, sender=Paiement)
+def fichier_apres_enregistrement(sender, instance, **kwargs):
+    ancien = getattr(instance, '_fichier_ancien', None)
+    champ = getattr(instance, FICHIERS[sender])
+    if est_blob(ancien) and ancien != champ.name:
+        champ.storage.delete(ancien)
+
+
+@receiver(post_delete, sender=PieceJustificative)
+@receiver(post_delete, sender=Paiement)
+def fichier_apres_suppression(sender, instance, **kwargs):
+    champ = getattr(instance, FICHIERS[sender])
+    if est_blob(champ.name):
+        champ.storage.delete(champ.name)
+
+
+# Lignes des listes en cache (core.fragments) : toute écriture sur un modèle
+# affiché dans une ligne périme les lignes qui le citent.
+@receiver(post_save, sender=Employeur)
+@receiver(post_save, sender=Assure)
+@receiver(post_save, sender=Declaration)
+@receiver(post_save, sender=Paiement)
+@receiver(post_save, sender=CustomUser)
+@receiver(post_save, sender=SecteurActivite)
+@receiver(post_save, sender=Region)
+@receiver(post_delete, sender=Employeur)
+@receiver(post_delete, sender=Assure)
+@receiver(post_delete, sender=Declaration)
+@receiver(post_delete, sender=Paiement)
+@receiver(post_delete, sender=CustomUser)
+@receiver(post_delete, sender=SecteurActivite)
+@receiver(post_delete, sender=Region)
+def fragments_invalider(sender, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return  # Connexion d'un utilisateur : rien d'affiché ne change
+    fragments.invalider(sender)
@@ -0,0 +1,198 @@
+# core/similarite.py
+# Clés de blocage et similarité floue des assurés (voir core/doublons.py).
+#
+# Module sans Django, comme core.pdf : il tourne aussi dans les processus de
+# travail de la commande `doublons_assures`.
+#
+# Clé phonétique : variante française du Soundex. Le nom est mis en
+# majuscules sans accents, les graphies équivalentes sont ramenées à une
+# seule (PH -> F, OU + voyelle -> W, DJ -> J, C doux -> S...), puis on garde
+# la première lettre suivie des codes des consonnes, sans voyelles ni
+# répétitions. « Ouédraogo » et « Wedraogo », « Diallo » et « Dialo », ou
+# « Koné » et « Coné » ont la même clé.
+import re
+import unicodedata
+from datetime import date
+from functools import lru_cache
+
+LONGUEUR_CLE = 6
+CHIFFRES_TELEPHONE = 8     # Numéro national : les 8 derniers chiffres
+SEUIL = 0.85               # Score global à partir duquel deux fiches sont signalées
+SEUIL_NOMS = 0.8           # Similarité minimale du nom comme du prénom
+PHONETIQUE = 0.95          # Similarité de deux noms de même clé phonétique
+
+# Poids des critères dans le score global (somme 1)
+POIDS = {'noms': 0.5, 'naissance': 0.25, 'cni': 0.15, 'telephone': 0.1}
+
+# Graphies ramenées à une seule, dans l'ordre
+GRAPHIES = (
+    ('TCH', 'CH'), ('SCH', 'CH'), ('SH', 'CH'), ('DJ', 'J'), ('DZ', 'J'),
+    ('PH', 'F'), ('TH', 'T'), ('KH', 'K'), ('GH', 'G'), ('CK', 'K'), ('QU', 'K'), ('Q', 'K'),
+    ('GN', 'NI'), ('EAU', 'O'), ('AU', 'O'), ('AI', 'E'), ('EI', 'E'), ('Y', 'I'), ('W', 'OU'),
+)
+# Première lettre de la clé : lettres de même son confondues
+PREMIERE = {'C': 'K', 'Z': 'S', 'E': 'A', 'I': 'A', 'O': 'A', 'U': 'A'}
+CODES = {
+    **dict.fromkeys('BP', '1'), **dict.fromkeys('CKG', '2'), **dict.fromkeys('DT', '3'), 'L': '4',
+    **dict.fromkeys('MN', '5'), 'R': '6', 'J': '7', **dict.fromkeys('SXZ', '8'), **dict.fromkeys('FV', '9'),
+}
+
+
+def normaliser(texte):
+    """Majuscules sans accents ; tout ce qui n'est pas une lettre devient une espace simple."""
+    texte = unicodedata.normalize('NFKD', texte or '')
+    texte = ''.join(c for c in texte if not unicodedata.combining(c)).upper()
+    return ' '.join(''.join(c if 'A' <= c <= 'Z' else ' ' for c in texte).split())
+
+
+def phonetique(texte):
+    """Clé phonétique d'un nom ('' pour un nom vide)."""
+    mot = normaliser(texte).replace(' ', '')
+    for graphie, remplacement in GRAPHIES:
+        mot = mot.replace(graphie, remplacement)
+    # OU devant une voyelle se prononce W (Ouattara, Ouédraogo) ; C et G
+    # doux ; H muet
+    mot = re.sub(r'OU(?=[AEIO])', 'W', mot)
+    mot = re.sub(r'C(?=[EI])', 'S', mot)
+    mot = re.sub(r'G(?=[EI])', 'J', mot).replace('H', '')
+    # Finales muettes
+    while len(mot) > 2 and mot[-1] in 'ESTXD':
+        mot = mot[:-1]
+    if not mot:
+        return ''
+    cle, precedent = PREMIERE.get(mot[0], mot[0]), CODES.get(mot[0])
+    for c in mot[1:]:
+        code = CODES.get(c)
+        if code is not None and code != precedent:
+            cle += code
+        precedent = code
+    return cle[:LONGUEUR_CLE]
+
+
+def telephone(texte):
+    """Chiffres significatifs d'un numéro ('' s'il est trop court pour servir de clé)."""
+    chiffres = ''.join(c for c in texte or '' if c.isdigit())
+    return chiffres[-CHIFFRES_TELEPHONE:] if len(chiffres) >= CHIFFRES_TELEPHONE else ''
+
+
+def cles(nom, prenom, numero):
+    """(phonétique du nom, phonétique du prénom, téléphone normalisé)."""
+    return phonetique(nom), phonetique(prenom), telephone(numero)
+
+
+def jaro_winkler(a, b):
+    """Similarité de Jaro-Winkler entre deux chaînes, de 0 à 1."""
+    if a == b:
+        return 1.0 if a else 0.0
+    if not a or not b:
+        return 0.0
+    portee = max(max(len(a), len(b)) // 2 - 1, 0)
+    pris_a, pris_b = [False] * len(a), [False] * len(b)
+    communs = 0
+    for i, c in enumerate(a):
+        for j in range(max(0, i - portee), min(len(b), i + portee + 1)):
+            if not pris_b[j] and b[j] == c:
+                pris_a[i] = pris_b[j] = True
+                communs += 1
+                break
+    if not communs:
+        return 0.0
+    transpositions, j = 0, 0
+    for i, c in enumerate(a):
+        if pris_a[i]:
+            while not pris_b[j]:
+                j += 1
+            transpositions += c != b[j]
+            j += 1
+    jaro = (communs / len(a) + communs / len(b) + (communs - transpositions / 2) / communs) / 3
+    prefixe = 0
+    for x, y in zip(a[:4], b[:4]):
+        if x != y:
+            break
+        prefixe += 1
+    return jaro + prefixe * 0.1 * (1 - jaro)
+
+
+def levenshtein(a, b):
+    """Nombre minimal d'insertions, suppressions et substitutions de a vers b."""
+    precedente = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        courante = [i]
+        for j, y in enumerate(b, 1):
+            courante.append(min(precedente[j] + 1, courante[j - 1] + 1, precedente[j - 1] + (x != y)))
+        precedente = courante
+    return precedente[-1]
+
+
+@lru_cache(maxsize=1 << 16)
+def _ressemblance(texte_a, texte_b, cle_a, cle_b):
+    # En cache : les noms courants reviennent dans tous les blocs. Même
+    # prononciation : quasi identiques, quelle que soit l'orthographe
+    return max(jaro_winkler(texte_a, texte_b), PHONETIQUE if cle_a and cle_a == cle_b else 0.0)
+
+
+def _cni(a, b):
+    # Une faute de frappe coûte 1/len : les numéros voisins mais distincts
+    # (même préfixe, séquence proche) restent loin, contrairement à Jaro-Winkler
+    if not a or not b:
+        return 0.0
+    return 1 - levenshtein(a, b) / max(len(a), len(b))
+
+
+def _naissance(a, b):
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    if isinstance(a, str):
+        a, b = date.fromisoformat(a), date.fromisoformat(b)
+    # Jour et mois inversés, ou une seule composante mal saisie
+    if (a.year, a.month, a.day) == (b.year, b.day, b.month):
+        return 0.8
+    return 0.5 if sum((a.year == b.year, a.month == b.month, a.day == b.day)) == 2 else 0.0
+
+
+def score(a, b):
+    """Score de ressemblance de deux fiches, de 0 à 1 ; None si les noms diffèrent trop.
+
+    Une fiche est le tuple rendu par fiche().
+    """
+    _, nom_a, prenom_a, cle_nom_a, cle_prenom_a, naissance_a, cni_a, tel_a = a
+    _, nom_b, prenom_b, cle_nom_b, cle_prenom_b, naissance_b, cni_b, tel_b = b
+    noms = None
+    for parties in (
+        ((nom_a, nom_b, cle_nom_a, cle_nom_b), (prenom_a, prenom_b, cle_prenom_a, cle_prenom_b)),
+        # Nom et prénom saisis l'un pour l'autre
+        ((nom_a, prenom_b, cle_nom_a, cle_prenom_b), (prenom_a, nom_b, cle_prenom_a, cle_nom_b)),
+    ):
+        similarites = [_ressemblance(*partie) for partie in parties]
+        if min(similarites) >= SEUIL_NOMS:
+            noms = max(noms or 0, sum(similarites) / 2)
+    if noms is None:
+        return None
+    return (
+        POIDS['noms'] * noms
+        + POIDS['naissance'] * _naissance(naissance_a, naissance_b)
+        + POIDS['cni'] * _cni(cni_a, cni_b)
+        + POIDS['telephone'] * (tel_a == tel_b and bool(tel_a))
+    )
+
+
+def fiche(pk, nom, prenom, cle_nom, cle_prenom, naissance, cni, tel):
+    """Tuple comparé par score(), à partir des colonnes de l'assuré."""
+    return (
+        pk, normaliser(nom), normaliser(prenom), cle_nom, cle_prenom, naissance,
+        normaliser(cni).replace(' ', ''), tel,
+    )
+
+
+def comparer_blocs(blocs):
+    """Paires (pk1, pk2, score) au-dessus du SEUIL, comparées bloc par bloc (pk1 < pk2)."""
+    paires = []
+    for bloc in blocs:
+        for i, a in enumerate(bloc):
+            for b in bloc[i + 1:]:
+                s = score(a, b)
+                if s is not None and s >= SEUIL:
+                    paires.append((min(a[0], b[0]), max(a[0], b[0]), round(s, 3)))
+    return paires
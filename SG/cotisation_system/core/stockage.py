@@ -0,0 +1,227 @@
+# core/stockage.py
+# Stockage des fichiers adressé par contenu, avec déduplication.
+#
+# Chaque fichier est haché (SHA-256) pendant son écriture dans un fichier
+# temporaire, puis rangé sous blobs/ab/cd/<empreinte><extension>. Un contenu
+# déjà présent n'est pas réécrit : la ligne reçoit simplement le même chemin.
+# La table Blob compte les références ; le fichier n'est supprimé du disque
+# que lorsque la dernière ligne qui le cite disparaît (voir core/signals.py).
+import hashlib
+import os
+import shutil
+import tempfile
+from collections import Counter
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import Count, F
+
+DOSSIER = 'blobs'
+BLOC = 64 * 1024
+
+
+def chemin_blob(empreinte, extension=''):
+    return f"{DOSSIER}/{empreinte[:2]}/{empreinte[2:4]}/{empreinte}{extension}"
+
+
+def est_blob(nom):
+    return bool(nom) and nom.startswith(DOSSIER + '/')
+
+
+def empreinte_fichier(chemin):
+    """(sha256 hexadécimal, taille) d'un fichier disque, lu par blocs."""
+    hachage = hashlib.sha256()
+    taille = 0
+    with open(chemin, 'rb') as fichier:
+        while bloc := fichier.read(BLOC):
+            hachage.update(bloc)
+            taille += len(bloc)
+    return hachage.hexdigest(), taille
+
+
+class StockageDedupe(FileSystemStorage):
+
+    def get_available_name(self, name, max_length=None):
+        # Le nom définitif est l'empreinte, déterminée dans _save()
+        return name
+
+    def _save(self, name, content):
+        dossier_temporaire = self.path(f'{DOSSIER}/tmp')
+        os.makedirs(dossier_temporaire, exist_ok=True)
+        descripteur, temporaire = tempfile.mkstemp(dir=dossier_temporaire)
+        hachage = hashlib.sha256()
+        taille = 0
+        try:
+            with os.fdopen(descripteur, 'wb') as sortie:
+                for bloc in content.chunks(BLOC):
+                    sortie.write(bloc)
+                    hachage.update(bloc)
+                    taille += len(bloc)
+            return self.ajouter(temporaire, hachage.hexdigest(), taille, os.path.splitext(name)[1])
+        finally:
+            if os.path.exists(temporaire):
+                os.remove(temporaire)
+
+    def ajouter(self, source, empreinte, taille, extension='', conserver=False):
+        """Range le fichier disque `source` comme blob et y ajoute une référence.
+
+        `source` est déplacé si le contenu est nouveau, supprimé sinon ; avec
+        `conserver`, il est copié et laissé en place. Renvoie le chemin du
+        blob, à enregistrer dans le FileField.
+        """
+        from .models import Blob
+
+        extension = extension.lower()[:10]
+        with transaction.atomic():
+            blob, _ = Blob.objects.select_for_update().get_or_create(
+                empreinte=empreinte,
+                defaults={'chemin': chemin_blob(empreinte, extension), 'taille': taille},
+            )
+            destination = self.path(blob.chemin)
+            if not os.path.exists(destination):
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                if conserver:
+                    _copier(source, destination)
+                else:
+                    os.replace(source, destination)
+            elif not conserver:
+                os.remove(source)
+            Blob.objects.filter(pk=blob.pk).update(references=F('references') + 1)
+        return blob.chemin
+
+    def delete(self, name):
+        """Retire une référence ; le fichier n'est effacé qu'à la dernière."""
+        if not est_blob(name):
+            return super().delete(name)
+        from .models import Blob
+
+        with transaction.atomic():
+            Blob.objects.filter(chemin=name, references__gt=0).update(references=F('references') - 1)
+            supprimes, _ = Blob.objects.filter(chemin=name, references=0).delete()
+            if supprimes:
+                transaction.on_commit(lambda: FileSystemStorage.delete(self, name))
+
+
+def stockage_dedupe():
+    return StockageDedupe()
+
+
+def _copier(source, destination):
+    # Lien physique si possible (aucune copie), sinon copie via un temporaire
+    try:
+        os.link(source, destination)
+    except OSError:
+        temporaire = destination + '.tmp'
+        shutil.copyfile(source, temporaire)
+        os.replace(temporaire, destination)
+
+
+# --- Migration des fichiers existants ----------------------------------------
+
+def _champs():
+    from .models import Paiement, PaiementArchive, PieceJustificative
+    # Les paiements archivés (core.archives) gardent leur preuve
+    return ((PieceJustificative, 'fichier'), (Paiement, 'preuve_paiement'), (PaiementArchive, 'preuve_paiement'))
+
+
+class Bilan:
+    def __init__(self):
+        self.fichiers = 0         # fichiers existants lus
+        self.lignes = 0           # lignes repointées vers un blob
+        self.nouveaux = 0         # contenus absents du stockage jusque-là
+        self.octets_avant = 0
+        self.octets_apres = 0     # octets ajoutés au stockage des blobs
+        self.manquants = []       # noms référencés mais absents du disque
+        self.orphelins = []       # fichiers présents mais référencés par aucune ligne
+        self.octets_orphelins = 0
+
+    @property
+    def octets_economises(self):
+        return self.octets_avant - self.octets_apres
+
+
+def dedupliquer(simulation=False):
+    """Range les fichiers existants dans le stockage dédupliqué.
+
+    Chaque fichier référencé hors de blobs/ est haché ; son contenu est
+    rangé une seule fois, les lignes qui le citent sont repointées vers le
+    blob, puis l'ancien fichier est supprimé. Un fichier n'est effacé
+    qu'après validation de la transaction qui repointe ses lignes : une
+    interruption laisse au pire un fichier orphelin, jamais une ligne cassée.
+    Les fichiers référencés par aucune ligne sont signalés, pas supprimés.
+    Renvoie un Bilan.
+    """
+    from .models import Blob
+
+    stockage = stockage_dedupe()
+    bilan = Bilan()
+    vues = set()
+    references = set()
+    for modele, champ in _champs():
+        anciens = (
+            modele.objects.exclude(**{f'{champ}__isnull': True}).exclude(**{champ: ''})
+            .exclude(**{f'{champ}__startswith': DOSSIER + '/'})
+            .order_by().values_list(champ, flat=True).distinct()
+        )
+        for nom in list(anciens):
+            references.add(nom)
+            chemin = stockage.path(nom)
+            if not os.path.isfile(chemin):
+                bilan.manquants.append(nom)
+                continue
+            empreinte, taille = empreinte_fichier(chemin)
+            bilan.fichiers += 1
+            bilan.octets_avant += taille
+            if empreinte not in vues and not Blob.objects.filter(empreinte=empreinte).exists():
+                bilan.nouveaux += 1
+                bilan.octets_apres += taille
+            vues.add(empreinte)
+            if simulation:
+                bilan.lignes += modele.objects.filter(**{champ: nom}).count()
+                continue
+            with transaction.atomic():
+                blob = stockage.ajouter(chemin, empreinte, taille, os.path.splitext(nom)[1], conserver=True)
+                bilan.lignes += modele.objects.filter(**{champ: nom}).update(**{champ: blob})
+            os.remove(chemin)
+    if not simulation:
+        recompter()
+
+    for modele, champ in _champs():
+        dossier = stockage.path(modele._meta.get_field(champ).upload_to.split('/')[0])
+        for racine, _, fichiers in os.walk(dossier):
+            for f in fichiers:
+                chemin = os.path.join(racine, f)
+                nom = os.path.relpath(chemin, stockage.location).replace(os.sep, '/')
+                if nom not in references:
+                    bilan.orphelins.append(nom)
+                    bilan.octets_orphelins += os.path.getsize(chemin)
+    return bilan
+
+
+def recompter():
+    """Recalcule `references` d'après les lignes et supprime les blobs inutilisés.
+
+    Renvoie (blobs corrigés, blobs supprimés).
+    """
+    from .models import Blob
+
+    comptes = Counter()
+    for modele, champ in _champs():
+        lignes = (
+            modele.objects.filter(**{f'{champ}__startswith': DOSSIER + '/'})
+            .order_by().values(champ).annotate(n=Count('pk')).values_list(champ, 'n')
+        )
+        for nom, n in lignes:
+            comptes[nom] += n
+    corriges = supprimes = 0
+    stockage = stockage_dedupe()
+    for pk, chemin, references in Blob.objects.values_list('pk', 'chemin', 'references').iterator():
+        attendu = comptes.get(chemin, 0)
+        if attendu == 0:
+            Blob.objects.filter(pk=pk).delete()
+            FileSystemStorage.delete(stockage, chemin)
+            supprimes += 1
+        elif references != attendu:
+            Blob.objects.filter(pk=pk).update(references=attendu)
+            corriges += 1
+    return corriges, supprimes
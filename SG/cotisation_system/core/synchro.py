@@ -0,0 +1,304 @@
+# core/synchro.py
+# Synchronisation différentielle des appareils hors ligne (agents de terrain).
+#
+# Chaque écriture sur une table synchronisée prend une version dans une
+# séquence unique (core.sequences.nouvelle_version) ; une suppression laisse
+# une pierre tombale (Suppression) versionnée de la même façon. Le jeton
+# rendu au client est la dernière version attribuée : à la synchronisation
+# suivante, seules les lignes de version supérieure sont renvoyées, dans le
+# périmètre de l'utilisateur.
+#
+#   GET  /api/v1/synchro/?jeton=...   changements depuis le jeton, par lots
+#   POST /api/v1/synchro/             modifications faites hors ligne
+#
+# Les lots renvoyés sont compacts (noms de colonnes une fois, puis des listes
+# de valeurs). Tant que `complet` est faux, le client rappelle avec le jeton
+# reçu ; une fois complet, il conserve ce jeton pour la prochaine fois.
+#
+# Les save() sont versionnés par le modèle (models.Synchronise) et les
+# suppressions par signal (core.signals) ; les écritures en masse appellent
+# versionner() ou marquer() elles-mêmes, comme pour les KPI.
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from .models import ActionRecouvrement, Assure, Declaration, Employeur, Paiement, Region, SecteurActivite, Suppression
+from .sequences import nouvelle_version, version_courante
+from .serializers import (
+    ActionRecouvrementSerializer, AssureSerializer, DeclarationSerializer, EmployeurSerializer, PaiementSerializer,
+)
+
+TAILLE_PAR_DEFAUT = 500
+TAILLE_MAX = 5000
+MODIFICATIONS_MAX = 1000
+
+
+class ErreurJeton(ValueError):
+    """Jeton de synchronisation illisible."""
+
+
+class Ressource:
+    """Table synchronisée : sérialiseur, chemin vers l'employeur (périmètre) et champ auteur."""
+
+    def __init__(self, nom, modele, serializer, employeur, auteur=None):
+        self.nom = nom
+        self.modele = modele
+        self.serializer = serializer
+        self.employeur = employeur
+        self.auteur = auteur
+        # Champs propres au modèle, sans les libellés joints de l'API
+        self.champs = [c for c in serializer.Meta.fields if c not in serializer.relations]
+
+    def lignes(self, utilisateur):
+        employeurs = employeurs_visibles(utilisateur)
+        if employeurs is None:
+            return self.modele.objects.all()
+        return self.modele.objects.filter(**{f'{self.employeur}__in': employeurs.values('pk')})
+
+
+RESSOURCES = {
+    r.nom: r for r in (
+        Ressource('employeurs', Employeur, EmployeurSerializer, 'pk', auteur='agent'),
+        Ressource('assures', Assure, AssureSerializer, 'employeur'),
+        Ressource('declarations', Declaration, DeclarationSerializer, 'employeur', auteur='created_by'),
+        Ressource('paiements', Paiement, PaiementSerializer, 'declaration__employeur', auteur='enregistre_par'),
+        Ressource('actions', ActionRecouvrement, ActionRecouvrementSerializer, 'employeur', auteur='agent'),
+    )
+}
+PAR_MODELE = {r.modele: r for r in RESSOURCES.values()}
+ETAPES = list(RESSOURCES) + ['suppressions']
+
+
+def employeurs_visibles(utilisateur):
+    """Employeurs du périmètre de l'utilisateur, ou None s'il voit tout.
+
+    Un agent voit sa région, les employeurs qu'il a prospectés et ceux dont
+    il a une action de recouvrement ; les autres rôles voient leur région
+    s'ils en ont une.
+    """
+    if utilisateur.role == 'agent':
+        filtre = Q(agent=utilisateur) | Q(
+            pk__in=ActionRecouvrement.objects.filter(agent=utilisateur).values('employeur_id'),
+        )
+        if utilisateur.region_id:
+            filtre |= Q(region_id=utilisateur.region_id)
+        return Employeur.objects.filter(filtre)
+    if utilisateur.region_id:
+        return Employeur.objects.filter(region_id=utilisateur.region_id)
+    return None
+
+
+# --- Écritures en masse ------------------------------------------------------------
+
+def versionner(objets, version=None):
+    """Donne une même version (nouvelle par défaut) à des objets avant un bulk_create.
+
+    À appeler dans la transaction de l'insertion.
+    """
+    version = version or nouvelle_version()
+    for objet in objets:
+        objet.version = version
+    return objets
+
+
+def marquer(queryset):
+    """Donne une nouvelle version aux lignes d'un queryset modifiées par update()."""
+    with transaction.atomic():
+        return queryset.update(version=nouvelle_version())
+
+
+def enterrer(instance):
+    """Pierre tombale d'un objet synchronisé supprimé (signal post_delete)."""
+    Suppression.objects.create(
+        version=nouvelle_version(), ressource=PAR_MODELE[type(instance)].nom, objet_id=instance.pk,
+    )
+
+
+def enterrer_lot(modele, ids, version=None):
+    """Pierres tombales d'objets supprimés en masse, sans signal (archivage)."""
+    version = version or nouvelle_version()
+    Suppression.objects.bulk_create(
+        [Suppression(version=version, ressource=PAR_MODELE[modele].nom, objet_id=pk) for pk in ids],
+        batch_size=500,
+    )
+
+
+# --- Lecture des changements -------------------------------------------------------
+
+class Position:
+    """Avancement d'une synchronisation.
+
+    Jeton terminé : « version ». En cours de lots :
+    « depuis.fin.étape.version.id » : lignes de version dans ]depuis, fin],
+    déjà envoyées jusqu'à (version, id) de l'étape.
+    """
+
+    def __init__(self, depuis, fin, etape=0, version=-1, pk=0):
+        self.depuis = depuis
+        self.fin = fin
+        self.etape = etape
+        self.version = version
+        self.pk = pk
+
+    @classmethod
+    def lire(cls, jeton):
+        if jeton in (None, ''):
+            return cls(-1, version_courante())
+        try:
+            valeurs = [int(v) for v in str(jeton).split('.')]
+        except ValueError:
+            raise ErreurJeton(f"Jeton invalide : {jeton!r}")
+        if len(valeurs) == 1 and valeurs[0] >= 0:
+            return cls(valeurs[0], version_courante())
+        if len(valeurs) == 5 and 0 <= valeurs[2] < len(ETAPES):
+            return cls(*valeurs)
+        raise ErreurJeton(f"Jeton invalide : {jeton!r}")
+
+    def jeton(self):
+        return '.'.join(str(v) for v in (self.depuis, self.fin, self.etape, self.version, self.pk))
+
+
+def _tranche(queryset, position, taille):
+    return (
+        queryset.filter(version__gt=position.depuis, version__lte=position.fin)
+        .filter(Q(version__gt=position.version) | Q(version=position.version, pk__gt=position.pk))
+        .order_by('version', 'pk')[:taille]
+    )
+
+
+def changements(utilisateur, jeton=None, taille=TAILLE_PAR_DEFAUT, request=None):
+    """Lot suivant des changements visibles par l'utilisateur depuis `jeton`.
+
+    Sans jeton, renvoie tout le périmètre, plus les tables de référence.
+    """
+    position = Position.lire(jeton)
+    reste = max(1, min(taille, TAILLE_MAX))
+    reponse = {'ressources': {}, 'suppressions': {}}
+    if jeton in (None, ''):
+        reponse['references'] = {
+            'regions': list(Region.objects.order_by('pk').values('id', 'nom', 'code')),
+            'secteurs': list(SecteurActivite.objects.order_by('pk').values('id', 'code', 'nom')),
+        }
+
+    while position.etape < len(ETAPES) and reste:
+        nom = ETAPES[position.etape]
+        if nom == 'suppressions':
+            # Rien à retirer lors d'une première synchronisation
+            queryset = Suppression.objects.none() if position.depuis < 0 else Suppression.objects.all()
+            lignes = list(_tranche(queryset, position, reste).values_list('version', 'id', 'ressource', 'objet_id'))
+            for _, _, ressource, objet_id in lignes:
+                reponse['suppressions'].setdefault(ressource, []).append(objet_id)
+            cles = [ligne[:2] for ligne in lignes]
+        else:
+            ressource = RESSOURCES[nom]
+            objets = list(_tranche(ressource.lignes(utilisateur), position, reste))
+            if objets:
+                donnees = ressource.serializer(
+                    objets, many=True, champs=ressource.champs, context={'request': request},
+                ).data
+                reponse['ressources'][nom] = {
+                    'colonnes': ressource.champs,
+                    'lignes': [[ligne[c] for c in ressource.champs] for ligne in donnees],
+                }
+            cles = [(o.version, o.pk) for o in objets]
+
+        if len(cles) == reste:
+            # Lot plein : on reprendra après la dernière ligne envoyée
+            position.version, position.pk = cles[-1]
+            reste = 0
+        else:
+            reste -= len(cles)
+            position.etape += 1
+            position.version, position.pk = -1, 0
+
+    complet = position.etape >= len(ETAPES)
+    reponse['complet'] = complet
+    reponse['jeton'] = str(position.fin) if complet else position.jeton()
+    return reponse
+
+
+# --- Modifications hors ligne ------------------------------------------------------
+
+class HorsPerimetre(Exception):
+    pass
+
+
+def _entier(valeur):
+    try:
+        return int(valeur)
+    except (TypeError, ValueError):
+        return None
+
+
+def appliquer(utilisateur, modifications, request=None):
+    """Applique des modifications faites hors ligne, dans une seule transaction.
+
+    Chaque modification est {"ressource", "donnees"} pour une création, plus
+    "id" et "version" (version connue de l'appareil) pour une mise à jour, et
+    éventuellement "cle" (identifiant local, renvoyé tel quel). Une mise à jour
+    faite sur une version dépassée est un conflit : elle n'est pas appliquée et
+    la ligne du serveur est renvoyée pour que l'appareil tranche. Les autres
+    modifications du lot sont appliquées malgré les erreurs et les conflits.
+    """
+    resultat = {'appliquees': [], 'conflits': [], 'erreurs': []}
+    contexte = {'request': request, 'utilisateur': utilisateur}
+
+    def erreur(index, modification, erreurs):
+        resultat['erreurs'].append({'index': index, 'cle': modification.get('cle'), 'erreurs': erreurs})
+
+    with transaction.atomic():
+        for index, modification in enumerate(modifications):
+            if not isinstance(modification, dict):
+                resultat['erreurs'].append({'index': index, 'cle': None, 'erreurs': {
+                    'non_field_errors': ["Modification invalide."]}})
+                continue
+            ressource = RESSOURCES.get(modification.get('ressource'))
+            if ressource is None:
+                erreur(index, modification, {'ressource': ["Ressource inconnue."]})
+                continue
+            donnees = modification.get('donnees')
+            if not isinstance(donnees, dict):
+                erreur(index, modification, {'donnees': ["Objet attendu."]})
+                continue
+
+            valeurs = {}
+            if modification.get('id') is None:
+                serializer = ressource.serializer(data=donnees, context=contexte)
+                if ressource.auteur:
+                    valeurs[ressource.auteur] = utilisateur
+            else:
+                pk = _entier(modification['id'])
+                instance = ressource.lignes(utilisateur).filter(pk=pk).first() if pk is not None else None
+                if instance is None:
+                    if Suppression.objects.filter(ressource=ressource.nom, objet_id=pk).exists():
+                        resultat['conflits'].append({
+                            'index': index, 'cle': modification.get('cle'), 'id': pk, 'motif': 'supprime',
+                        })
+                    else:
+                        erreur(index, modification, {'id': ["Identifiant inconnu ou hors périmètre."]})
+                    continue
+                if modification.get('version') != instance.version:
+                    resultat['conflits'].append({
+                        'index': index, 'cle': modification.get('cle'), 'id': pk, 'motif': 'modifie',
+                        'serveur': ressource.serializer(instance, champs=ressource.champs, context=contexte).data,
+                    })
+                    continue
+                serializer = ressource.serializer(instance, data=donnees, partial=True, context=contexte)
+
+            if not serializer.is_valid():
+                erreur(index, modification, serializer.errors)
+                continue
+            try:
+                with transaction.atomic():
+                    objet = serializer.save(**valeurs)
+                    if not ressource.lignes(utilisateur).filter(pk=objet.pk).exists():
+                        raise HorsPerimetre
+            except HorsPerimetre:
+                erreur(index, modification, {'non_field_errors': ["Hors du périmètre de l'utilisateur."]})
+                continue
+            except IntegrityError as exc:
+                erreur(index, modification, {'non_field_errors': [str(exc)]})
+                continue
+            resultat['appliquees'].append({
+                'index': index, 'cle': modification.get('cle'), 'id': objet.pk, 'version': objet.version,
+            })
+    return resultat
@@ -0,0 +1,209 @@
+# core/televersements.py
+# Envoi de fichiers par morceaux, reprenable après coupure.
+#
+# Le client crée un Televersement (nom, taille), puis envoie des morceaux
+# successifs avec l'offset attendu. Chaque morceau est écrit directement sur
+# disque par blocs de 64 Ko, sans jamais charger le fichier en mémoire. Après
+# une coupure, le client relit `recu` et reprend à cet offset.
+#
+# L'empreinte SHA-256 est calculée au fil de l'eau : l'état du hachage est
+# gardé en mémoire par processus et reconstruit en relisant le fichier
+# partiel si le morceau suivant arrive sur un autre processus.
+import hashlib
+import os
+import threading
+import time
+import uuid
+from functools import partial
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+
+from .models import Televersement
+
+BLOC = 64 * 1024
+VERROU_EXPIRE = 300  # secondes : verrou laissé par un processus interrompu
+
+_hachages = {}  # {id: (offset, hachage)}
+_hachages_verrou = threading.Lock()
+
+
+class ErreurTeleversement(Exception):
+    """Morceau refusé : `recu` donne l'offset à partir duquel reprendre."""
+
+    def __init__(self, message, recu=None, statut=400):
+        super().__init__(message)
+        self.recu = recu
+        self.statut = statut
+
+
+def dossier():
+    chemin = settings.TELEVERSEMENT_DOSSIER
+    os.makedirs(chemin, exist_ok=True)
+    return chemin
+
+
+def chemin_partiel(televersement):
+    return os.path.join(dossier(), f'{televersement.pk}.part')
+
+
+def creer(utilisateur, nom, taille, sha256_attendu=''):
+    if taille <= 0:
+        raise ErreurTeleversement("Taille invalide.")
+    if taille > settings.TELEVERSEMENT_TAILLE_MAX:
+        raise ErreurTeleversement("Fichier trop volumineux.", statut=413)
+    televersement = Televersement.objects.create(
+        utilisateur=utilisateur,
+        nom=os.path.basename(nom)[:255] or 'fichier',
+        taille=taille,
+        sha256_attendu=(sha256_attendu or '').lower(),
+    )
+    open(chemin_partiel(televersement), 'wb').close()
+    return televersement
+
+
+class _Verrou:
+    """Verrou inter-processus par fichier (création exclusive), portable."""
+
+    def __init__(self, televersement):
+        self.chemin = chemin_partiel(televersement) + '.lock'
+
+    def __enter__(self):
+        try:
+            os.close(os.open(self.chemin, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            if time.time() - os.path.getmtime(self.chemin) < VERROU_EXPIRE:
+                raise ErreurTeleversement("Un morceau est déjà en cours d'envoi.", statut=409)
+            os.utime(self.chemin)
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            os.remove(self.chemin)
+        except FileNotFoundError:
+            pass
+
+
+def _hachage(televersement, chemin):
+    with _hachages_verrou:
+        etat = _hachages.get(televersement.pk)
+    if etat is not None and etat[0] == televersement.recu:
+        return etat[1]
+    # Autre processus ou redémarrage : on relit la partie déjà acquittée
+    hachage = hashlib.sha256()
+    restant = televersement.recu
+    with open(chemin, 'rb') as fichier:
+        while restant:
+            bloc = fichier.read(min(BLOC, restant))
+            if not bloc:
+                break
+            hachage.update(bloc)
+            restant -= len(bloc)
+    return hachage
+
+
+def ecrire_morceau(televersement, offset, flux, longueur, sha256_morceau=''):
+    """Écrit `longueur` octets lus dans `flux` à l'offset donné.
+
+    Sans empreinte de morceau, les octets reçus avant une coupure sont
+    conservés. Avec `sha256_morceau`, le morceau n'est acquitté que s'il est
+    complet et intact. Renvoie le Televersement mis à jour.
+    """
+    if televersement.statut != 'en_cours':
+        raise ErreurTeleversement("Envoi déjà terminé.", televersement.recu, 409)
+    if offset != televersement.recu:
+        raise ErreurTeleversement("Offset inattendu.", televersement.recu, 409)
+    if longueur <= 0 or longueur > settings.TELEVERSEMENT_MORCEAU_MAX:
+        raise ErreurTeleversement("Taille de morceau invalide.", televersement.recu, 413)
+    if offset + longueur > televersement.taille:
+        raise ErreurTeleversement("Le morceau dépasse la taille annoncée.", televersement.recu)
+
+    chemin = chemin_partiel(televersement)
+    with _Verrou(televersement):
+        televersement.refresh_from_db(fields=['recu', 'statut'])
+        if offset != televersement.recu:
+            raise ErreurTeleversement("Offset inattendu.", televersement.recu, 409)
+
+        hachage = _hachage(televersement, chemin).copy()
+        hachage_morceau = hashlib.sha256()
+        ecrits = 0
+        with open(chemin, 'r+b') as fichier:
+            fichier.seek(offset)
+            try:
+                while ecrits < longueur:
+                    bloc = flux.read(min(BLOC, longueur - ecrits))
+                    if not bloc:
+                        break
+                    fichier.write(bloc)
+                    hachage.update(bloc)
+                    hachage_morceau.update(bloc)
+                    ecrits += len(bloc)
+            except OSError:
+                pass  # Connexion coupée : on garde ce qui a été reçu
+            if sha256_morceau and (ecrits != longueur or hachage_morceau.hexdigest() != sha256_morceau.lower()):
+                fichier.truncate(offset)
+                raise ErreurTeleversement("Morceau incomplet ou altéré.", offset)
+            fichier.truncate(offset + ecrits)
+
+        televersement.recu = offset + ecrits
+        if televersement.recu == televersement.taille:
+            televersement.sha256 = hachage.hexdigest()
+            attendu = televersement.sha256_attendu
+            televersement.statut = 'corrompu' if attendu and attendu != televersement.sha256 else 'termine'
+        televersement.save(update_fields=['recu', 'sha256', 'statut', 'updated_at'])
+
+        with _hachages_verrou:
+            if televersement.statut == 'en_cours':
+                _hachages[televersement.pk] = (televersement.recu, hachage)
+            else:
+                _hachages.pop(televersement.pk, None)
+    return televersement
+
+
+def recuperer(ids, utilisateur):
+    """Televersements terminés de l'utilisateur, dans l'ordre des ids ; lève ErreurTeleversement sinon."""
+    try:
+        ids = [uuid.UUID(i.strip()) for i in ids if i.strip()]
+    except ValueError:
+        raise ErreurTeleversement("Identifiant d'envoi invalide.")
+    trouves = Televersement.objects.filter(utilisateur=utilisateur).in_bulk(ids)
+    resultat = []
+    for i in ids:
+        televersement = trouves.get(i)
+        if televersement is None:
+            raise ErreurTeleversement("Envoi introuvable.")
+        if televersement.statut != 'termine':
+            raise ErreurTeleversement(f"Envoi de {televersement.nom} incomplet ou déjà utilisé.")
+        resultat.append(televersement)
+    return resultat
+
+
+def attacher(televersement, champ):
+    """Copie le fichier reçu dans le FileField `champ` (sans enregistrer l'instance).
+
+    À appeler dans la transaction qui enregistre l'instance : le fichier
+    partiel n'est supprimé qu'après validation, et l'envoi reste réutilisable
+    (statut 'termine') si l'enregistrement échoue.
+    """
+    chemin = chemin_partiel(televersement)
+    with open(chemin, 'rb') as fichier:
+        champ.save(televersement.nom, File(fichier), save=False)
+    televersement.statut = 'attache'
+    televersement.save(update_fields=['statut', 'updated_at'])
+    transaction.on_commit(partial(_retirer, chemin))
+
+
+def _retirer(chemin):
+    try:
+        os.remove(chemin)
+    except FileNotFoundError:
+        pass
+
+
+def supprimer(televersement):
+    for chemin in (chemin_partiel(televersement), chemin_partiel(televersement) + '.lock'):
+        _retirer(chemin)
+    with _hachages_verrou:
+        _hachages.pop(televersement.pk, None)
+    televersement.delete()
@@ -1,3 +1,1590 @@
-from django.test import TestCase
+import hashlib
+import json
+import logging
+import math
+import os
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection, connections
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+from django.test import AsyncClient, TestCase, override_settings, tag
+from django.urls import URLResolver, resolve, reverse
+from django.utils import timezone
+
+from . import (
+    archives, arrieres, campagnes, cotisations, documents, doublons, fragments, generation, geo, kpi, metriques,
+    recherche, routage, sequences, stockage, synchro, televersements, urls, validation,
+)
+from .imports import importer_lignes_declaration, lire_date, lire_montant, lire_tableau, lire_texte, recalculer_total
+from .models import (
+    ActionRecouvrement, ArriereEmployeur, Assure, BaremeCotisation, BilanAnnuelEmployeur, Blob, Compteur, CustomUser,
+    Declaration, DeclarationArchive, Employeur, ExerciceClos, LigneDeclaration, LigneDeclarationArchive, Paiement,
+    PaiementArchive, PieceJustificative, Region, SecteurActivite, Suppression, Televersement,
+)
+from .rapprochement import rapprocher_releve
+
+# Benchmarks des vues : chaque URL de core/urls.py est appelée via le client de
+# test sur un jeu généré par core.generation. Pour chaque vue on mesure le
+# nombre de requêtes SQL, le temps SQL, la durée totale et le pic mémoire.
+#
+# Le test échoue si une vue dépasse son budget de requêtes
+# (benchmarks/budgets.json, tenu à la main). Les durées et la mémoire
+# dépendent de la machine : elles ne sont comparées à la référence enregistrée
+# (benchmarks/reference.json) que sur demande.
+#
+#   python manage.py test core --tag benchmark          # seulement les benchmarks
+#   python manage.py test core --exclude-tag benchmark  # tout sauf les benchmarks
+#   SGC_BENCH_COMPARER=1 python manage.py test core     # compare aussi à la référence
+#   SGC_BENCH_REFERENCE=1 python manage.py test core    # réécrit la référence
+#   SGC_BENCH_ECHELLE=10 python manage.py test core     # jeu de données 10 fois plus gros
+#
+# La référence n'est comparée qu'à échelle égale, et n'a de sens que sur la
+# machine où elle a été enregistrée. Le tableau des mesures est journalisé
+# (niveau INFO) par le logger core.benchmarks.
+
+logger = logging.getLogger('core.benchmarks')
+
+DOSSIER = Path(__file__).resolve().parent / 'benchmarks'
+BUDGETS = DOSSIER / 'budgets.json'
+REFERENCE = DOSSIER / 'reference.json'
+
+ECHELLE = int(os.environ.get('SGC_BENCH_ECHELLE', '1'))
+ENREGISTRER = os.environ.get('SGC_BENCH_REFERENCE') == '1'
+COMPARER = os.environ.get('SGC_BENCH_COMPARER') == '1'
+REPETITIONS = 3
+
+# Régression : mesure > référence * (1 + SEUIL) + marge absolue (bruit de mesure)
+SEUIL = 0.5
+MARGES = {'sql_ms': 10, 'duree_ms': 25, 'memoire_ko': 512}
+
+# URL nommées non mesurées, avec la raison
+IGNOREES = {
+    'logout': "termine la session du client de test",
+    'api_jeton': "authentification par mot de passe (POST)",
+    **{f'api-v1:{ressource}-lot': "écriture en masse" for ressource in (
+        'employeur', 'assure', 'declaration', 'lignedeclaration', 'paiement',
+    )},
+
+
+}
+
+
+def scenarios(donnees):
+    """{nom d'URL: (méthode, kwargs, paramètres)} pour chaque vue mesurée."""
+    return {
+        'login': ('get', {}, {}),
+        'dashboard': ('get', {}, {}),
+        'employeur_list': ('get', {}, {}),
+        'employeur_create': ('get', {}, {}),
+        'employeur_detail': ('get', {'pk': donnees['employeur']}, {}),
+        'employeur_update': ('get', {'pk': donnees['employeur']}, {}),
+        'employeur_attestation': ('get', {'pk': donnees['en_regle'][0]}, {'periode': donnees['en_regle'][1]}),
+        'validation_file': ('get', {}, {}),
+        'assure_list': ('get', {}, {}),
+        'assure_create': ('get', {}, {}),
+        'assure_export': ('get', {}, {'format': 'csv'}),
+        'declaration_list': ('get', {}, {}),
+        'declaration_create': ('get', {}, {}),
+        'declaration_export': ('get', {}, {'format': 'csv'}),
+        'declaration_import': ('get', {'pk': donnees['declaration']}, {}),
+        'paiement_list': ('get', {}, {}),
+        'paiement_create': ('get', {}, {}),
+        'paiement_rapprochement': ('get', {}, {}),
+        'paiement_export': ('get', {}, {'format': 'xlsx'}),
+        'paiement_quittance': ('get', {'pk': donnees['paiement_confirme'][0]}, {}),
+        'quittances_zip': ('get', {}, {'periode': donnees['paiement_confirme'][1], 'region': donnees['region']}),
+        'action_recouvrement_list': ('get', {}, {}),
+        'employeurs_arrieres': ('get', {}, {'tri': 'montant'}),
+        'action_recouvrement_create': ('get', {}, {}),
+        'action_recouvrement_detail': ('get', {'pk': donnees['action']}, {}),
+        'action_recouvrement_update': ('get', {'pk': donnees['action']}, {}),
+        'rapports': ('get', {}, {}),
+        'rapport_mensuel_pdf': ('get', {}, {'region': donnees['region']}),
+        'kpi_data': ('get', {}, {'mois': 12, 'ventilation': 'region'}),
+        'recherche_rapide': ('get', {}, {'q': 'mba'}),
+        'televersement_creer': ('post', {}, {'nom': 'releve.pdf', 'taille': 1024}),
+        'televersement_detail': ('get', {'pk': donnees['televersement']}, {}),
+        'export_metriques': ('get', {}, {}),
+        'api-v1:api-root': ('get', {}, {}),
+        'api-v1:employeur-list': ('get', {}, {}),
+        'api-v1:employeur-detail': ('get', {'pk': donnees['employeur']}, {}),
+        'api-v1:assure-list': ('get', {}, {'fields': 'id,numero_assure,nom,prenom'}),
+        'api-v1:assure-detail': ('get', {'pk': donnees['assure']}, {}),
+        'api-v1:declaration-list': ('get', {}, {}),
+        'api-v1:declaration-detail': ('get', {'pk': donnees['declaration']}, {}),
+        'api-v1:lignedeclaration-list': ('get', {}, {'declaration': donnees['declaration']}),
+        'api-v1:lignedeclaration-detail': ('get', {'pk': donnees['ligne']}, {}),
+        'api-v1:paiement-list': ('get', {}, {}),
+        'api-v1:paiement-detail': ('get', {'pk': donnees['paiement']}, {}),
+        'api_synchro': ('get', {}, {'taille': 500}),
+        # Autour du centre de la région Centre (voir generation.REGIONS)
+        'api-v1:employeur-proches': ('get', {}, {'position': '3.87,11.52', 'rayon': 20}),
+        'api-v1:employeur-cadre': ('get', {}, {'bbox': '10.9,3.2,12.2,4.5', 'arrieres': 1}),
+        'api_tournee': ('get', {}, {'agent': donnees['visites'][0], 'date': donnees['visites'][1], 'jours': 7}),
+    }
+
+
+class Chrono:
+    """Enveloppe d'exécution SQL : compte et chronomètre chaque requête."""
+
+    def __init__(self):
+        self.requetes = 0
+        self.secondes = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        debut = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.requetes += 1
+            self.secondes += time.perf_counter() - debut
+
+
+def _noms_urls(motifs=urls.urlpatterns, espace=''):
+    noms = set()
+    for motif in motifs:
+        if isinstance(motif, URLResolver):
+            noms |= _noms_urls(motif.url_patterns, f'{espace}{motif.namespace}:' if motif.namespace else espace)
+        elif motif.name:
+            noms.add(espace + motif.name)
+    return noms
+
+
+def _lire(chemin):
+    if not chemin.exists():
+        return {}
+    with open(chemin, encoding='utf-8') as f:
+        return json.load(f)
+
+
+@tag('benchmark')
+@override_settings(DOCUMENTS_DOSSIER=Path(tempfile.gettempdir()) / 'sgc_benchmark_documents')
+class BenchmarkVuesTests(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        from django.conf import settings
+        shutil.rmtree(settings.DOCUMENTS_DOSSIER, ignore_errors=True)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        generation.generer(employeurs=200 * ECHELLE, assures=2000 * ECHELLE, mois=6, lignes=5, graine=1)
+        cls.utilisateur = CustomUser.objects.get(username='gen_admin01')
+        cls.donnees = {
+            'employeur': Employeur.objects.filter(statut='valide').order_by('pk').values_list('pk', flat=True).first(),
+            'declaration': Declaration.objects.exclude(statut='valide').order_by('pk').values_list('pk', flat=True).first(),
+            'assure': Assure.objects.order_by('pk').values_list('pk', flat=True).first(),
+            'ligne': LigneDeclaration.objects.order_by('pk').values_list('pk', flat=True).first(),
+            'paiement': Paiement.objects.order_by('pk').values_list('pk', flat=True).first(),
+            'action': ActionRecouvrement.objects.order_by('pk').values_list('pk', flat=True).first(),
+            'region': Region.objects.order_by('pk').values_list('pk', flat=True).first(),
+            # Premier employeur pouvant recevoir une attestation de régularité (ou à défaut un refus)
+            'en_regle': next(
+                ((e, f"{p:%Y-%m}") for e, p in Declaration.objects.filter(statut='valide', employeur__statut='valide')
+                 .exclude(employeur__arriere__montant_du__gt=0).order_by('pk').values_list('employeur_id', 'periode')[:1]),
+                (Employeur.objects.order_by('pk').values_list('pk', flat=True).first(), ''),
+            ),
+            'paiement_confirme': next(
+                (p, f"{d:%Y-%m}") for p, d in Paiement.objects.filter(statut='confirme').order_by('pk')
+                .values_list('pk', 'declaration__periode')[:1]
+            ),
+            # Agent et premier jour d'une semaine de visites planifiées
+            'visites': next(
+                (a, f"{timezone.localdate(d):%Y-%m-%d}") for a, d in ActionRecouvrement.objects
+                .filter(type_action='visite', statut='planifiee').order_by('pk')
+                .values_list('agent_id', 'date_planification')[:1]
+            ),
+            'televersement': Televersement.objects.create(utilisateur=cls.utilisateur, nom='scan.pdf', taille=10).pk,
+        }
+
+    def setUp(self):
+        self.client.force_login(self.utilisateur)
+
+    def _appeler(self, methode, url, parametres):
+        reponse = getattr(self.client, methode)(url, parametres)
+        self.assertLess(reponse.status_code, 400, f"{url} : HTTP {reponse.status_code}")
+        if reponse.streaming:
+            # Corps produit à la lecture : on le consomme sans le garder
+            for _ in reponse.streaming_content:
+                pass
+        return reponse
+
+    def mesurer(self, methode, url, parametres):
+        self._appeler(methode, url, parametres)  # Échauffement (gabarits, caches)
+        durees, chronos = [], []
+        for _ in range(REPETITIONS):
+            chrono = Chrono()
+            with connection.execute_wrapper(chrono):
+                debut = time.perf_counter()
+                self._appeler(methode, url, parametres)
+                durees.append((time.perf_counter() - debut) * 1000)
+            chronos.append(chrono)
+
+        tracemalloc.start()
+        try:
+            self._appeler(methode, url, parametres)
+            _, pic = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return {
+            'requetes': max(c.requetes for c in chronos),
+            'sql_ms': round(statistics.median(c.secondes for c in chronos) * 1000, 1),
+            'duree_ms': round(statistics.median(durees), 1),
+            'memoire_ko': round(pic / 1024),
+        }
+
+    def test_toutes_les_urls_sont_mesurees(self):
+        manquantes = _noms_urls() - scenarios(self.donnees).keys() - IGNOREES.keys()
+        self.assertFalse(manquantes, f"URL sans scénario de benchmark : {sorted(manquantes)}")
+
+    def test_budgets_et_regressions(self):
+        budgets = _lire(BUDGETS)
+        reference = _lire(REFERENCE)
+        comparer = COMPARER and not ENREGISTRER and reference.get('echelle') == ECHELLE
+        mesures, erreurs = {}, []
+
+        for nom, (methode, kwargs, parametres) in sorted(scenarios(self.donnees).items()):
+            mesure = mesures[nom] = self.mesurer(methode, reverse(nom, kwargs=kwargs), parametres)
+            budget = budgets.get(nom, {}).get('requetes')
+            if budget is None:
+                erreurs.append(f"{nom} : aucun budget de requêtes dans {BUDGETS.name}")
+            elif mesure['requetes'] > budget:
+                erreurs.append(f"{nom} : {mesure['requetes']} requêtes SQL pour un budget de {budget}")
+            precedente = reference.get('vues', {}).get(nom)
+            if comparer and precedente:
+                for cle, marge in MARGES.items():
+                    limite = precedente[cle] * (1 + SEUIL) + marge
+                    if mesure[cle] > limite:
+                        erreurs.append(f"{nom} : {cle} = {mesure[cle]} au lieu de {precedente[cle]} (limite {limite:.0f})")
+
+        logger.info('\n'.join(
+            [f"{'vue':<30} {'requêtes':>9} {'SQL ms':>8} {'durée ms':>9} {'mémoire Ko':>11}"]
+            + [f"{nom:<30} {m['requetes']:>9} {m['sql_ms']:>8} {m['duree_ms']:>9} {m['memoire_ko']:>11}"
+               for nom, m in mesures.items()]
+        ))
+
+        if ENREGISTRER:
+            DOSSIER.mkdir(exist_ok=True)
+            with open(REFERENCE, 'w', encoding='utf-8') as f:
+                json.dump({'echelle': ECHELLE, 'vues': mesures}, f, indent=2, ensure_ascii=False)
+                f.write('\n')
+        if erreurs:
+            self.fail('\n'.join(erreurs))
+
+
+# --- Tests de comportement ---------------------------------------------------------
+# Jeux minimaux construits à la main : rapides, indépendants des benchmarks.
+
+def creer_jeu(employeurs=2, assures=2):
+    """Un administrateur, deux régions, des employeurs validés avec leurs assurés."""
+    admin = CustomUser.objects.create_user('admin_test', password='x', role='admin')
+    secteur = SecteurActivite.objects.create(code='COM', nom='Commerce')
+    regions = [Region.objects.create(nom='Centre', code='C'), Region.objects.create(nom='Nord', code='N')]
+    crees = []
+    for i in range(employeurs):
+        employeur = Employeur.objects.create(
+            raison_sociale=f'Employeur {i}', nif=f'NIF{i}', rccm=f'RCCM{i}', secteur_activite=secteur,
+            region=regions[i % 2], adresse='-', contact_nom='-', contact_email='contact@exemple.org',
+            contact_telephone='-', agent=admin, statut='valide',
+        )
+        for j in range(assures):
+            Assure.objects.create(
+                numero_assure=f'ASS-{i}-{j}', nom=f'Nom{i}', prenom=f'Prenom{j}', date_naissance=date(1990, 1, 1 + j),
+                lieu_naissance='-', numero_cni=f'CNI-{i}-{j}', adresse='-', telephone='-', type_assure='salarie',
+                employeur=employeur,
+            )
+        crees.append(employeur)
+    return admin, regions, crees
+
+
+class ListesTests(TestCase):
+
+    def setUp(self):
+        self.admin, _, (self.centre, self.nord) = creer_jeu(assures=0)
+        self.client.force_login(self.admin)
+        # Dates ex aequo : l'ordre repose sur le départage par pk
+        instants = [timezone.now() - timedelta(hours=h) for h in (1, 1, 1, 2, 2, 2, 2, 3, 5)]
+        for i, instant in enumerate(instants):
+            declaration = Declaration.objects.create(
+                employeur=(self.centre, self.nord)[i % 2], periode=date(2026, 1 + i, 1), created_by=self.admin,
+                statut='soumis' if i != 4 else 'brouillon',
+            )
+            Declaration.objects.filter(pk=declaration.pk).update(created_at=instant)
+        self.attendu = list(
+            Declaration.objects.filter(statut='soumis').order_by('-created_at', '-pk').values_list('pk', flat=True)
+        )
+
+    def page(self, **parametres):
+        reponse = self.client.get(reverse('declaration_list'), {'statut': 'soumis', 'par_page': 3, **parametres})
+        self.assertEqual(reponse.status_code, 200)
+        return reponse.context['declarations']
+
+    def test_pages_sans_doublon_ni_trou(self):
+        pages, page = [], self.page()
+        self.assertFalse(page.has_previous)
+        while True:
+            pages.append([d.pk for d in page])
+            if not page.has_next:
+                break
+            page = self.page(apres=page.curseur_suivant)
+        self.assertEqual([len(p) for p in pages], [3, 3, 2])
+        self.assertEqual(sum(pages, []), self.attendu)
+
+        # Retour en arrière depuis la dernière page : mêmes pages, dans l'ordre
+        retour = []
+        while page.has_previous:
+            page = self.page(avant=page.curseur_precedent)
+            retour.insert(0, [d.pk for d in page])
+        self.assertEqual(retour, pages[:-1])
+
+    def test_curseur_illisible_et_filtre_mois(self):
+        self.assertEqual([d.pk for d in self.page(apres='???')], self.attendu[:3])
+        declaration = Declaration.objects.get(periode=date(2026, 3, 1))
+        self.assertEqual([d.pk for d in self.page(periode='2026-03')], [declaration.pk])
+        self.assertEqual(len(self.page(periode='2026-13', par_page=50)), len(self.attendu))
+
+
+class KpiMensuelTests(TestCase):
+    """L'instantané KpiMensuel reste égal à un recalcul complet après chaque écriture."""
+
+    def setUp(self):
+        self.admin, _, (self.centre, self.nord) = creer_jeu(assures=2)
+        self.valideur = CustomUser.objects.create_user('valideur', password='x', role='validation')
+        self.janvier = date(2026, 1, 1)
+
+    def declarer(self, employeur, statut, montant):
+        declaration = Declaration.objects.create(
+            employeur=employeur, periode=self.janvier, created_by=self.admin, statut=statut,
+            date_soumission=timezone.now(),
+        )
+        for assure in employeur.salaries.all():
+            LigneDeclaration.objects.create(
+                declaration=declaration, assure=assure, salaire_declare=100000,
+                cotisation_salariale=montant / 4, cotisation_patronale=montant / 4,
+            )
+        recalculer_total(declaration)
+        return declaration
+
+    def verifier(self, declarees, encaissees):
+        self.assertEqual(kpi.verifier(), [])
+        totaux = kpi.synthese(self.janvier)
+        self.assertEqual((totaux['cotisations_declarees'], totaux['cotisations_encaissees']), (declarees, encaissees))
+
+    def test_instantane_a_jour(self):
+        self.verifier(0, 0)
+
+        # save() : signaux
+        declaration = self.declarer(self.centre, 'soumis', Decimal('1000'))
+        declaration.statut = 'valide'
+        declaration.save()
+        self.verifier(Decimal('1000'), 0)
+
+        # Import en masse : bulk_create puis UPDATE du total
+        contenu = 'numero_assure,salaire_declare,cotisation_salariale,cotisation_patronale\nASS-0-0,100000,300,900\n'
+        importer_lignes_declaration(declaration, SimpleUploadedFile('paie.csv', contenu.encode()), 'paie.csv')
+        self.verifier(Decimal('1200'), 0)
+
+        # Décisions de la file de validation : update()
+        soumise = self.declarer(self.nord, 'soumis', Decimal('800'))
+        dossier = Employeur.objects.create(
+            raison_sociale='Dossier', nif='NIFD', rccm='RCCMD', secteur_activite=self.nord.secteur_activite,
+            region=self.nord.region, adresse='-', contact_nom='-', contact_email='d@exemple.org',
+            contact_telephone='-', agent=self.admin, statut='dossier_soumis',
+        )
+        for nom, ids in (('declarations', [soumise.pk]), ('employeurs', [dossier.pk])):
+            validation.reserver(self.valideur, nom)
+            self.assertEqual(validation.decider(self.valideur, nom, ids, 'valide'), 1)
+        self.verifier(Decimal('2000'), 0)
+
+        # Lot de l'API : bulk_create
+        self.client.force_login(self.valideur)
+        reponse = self.client.post(reverse('api-v1:paiement-lot'), [{
+            'declaration': soumise.pk, 'montant': '500', 'mode_paiement': 'mobile', 'date_paiement': '2026-02-10',
+            'statut': 'confirme',
+        }], content_type='application/json')
+        self.assertEqual(reponse.status_code, 201)
+        self.verifier(Decimal('2000'), Decimal('500'))
+
+        # Rapprochement : bulk_create et update
+        releve = f'date,montant,reference\n12/02/2026,1200,DEC{declaration.pk:06d}\n'
+        resultat = rapprocher_releve(SimpleUploadedFile('releve.csv', releve.encode()), 'releve.csv', self.admin)
+        self.assertEqual(resultat.crees, 1)
+        self.verifier(Decimal('2000'), Decimal('1700'))
+
+
+class KpiDataTests(TestCase):
+
+    def setUp(self):
+        self.admin, self.regions, (self.centre, self.nord) = creer_jeu(assures=0)
+        self.client.force_login(self.admin)
+        self.mois = kpi.mois_de(timezone.now())
+        declaration = Declaration.objects.create(
+            employeur=self.centre, periode=self.mois, created_by=self.admin, statut='valide',
+            montant_total_cotisations=Decimal('1000'),
+        )
+        self.paiement = Paiement.objects.create(
+            declaration=declaration, montant=Decimal('250'), mode_paiement='virement', date_paiement=self.mois,
+            statut='confirme', enregistre_par=self.admin,
+        )
+
+    def test_series_et_ventilation(self):
+        reponse = self.client.get(reverse('kpi_data'), {'mois': 3, 'ventilation': 'region'})
+        donnees = reponse.json()
+        self.assertEqual(len(donnees['kpi_extension']['labels']), 3)
+        self.assertEqual(donnees['kpi_extension']['labels'][-1], self.mois.strftime('%m/%Y'))
+        self.assertEqual(donnees['kpi_extension']['employeurs'][-1], 2)
+        self.assertEqual(donnees['kpi_conformite']['taux'][-1], 50.0)
+        recouvrement = donnees['kpi_recouvrement']
+        self.assertEqual((recouvrement['declarees'][-1], recouvrement['encaissees'][-1], recouvrement['taux'][-1]),
+                         (1000.0, 250.0, 25.0))
+        self.assertEqual(recouvrement['declarees'][:-1], [0.0, 0.0])
+
+        series = {s['nom']: s for s in donnees['ventilation']['series']}
+        self.assertEqual(set(series), {'Centre', 'Nord'})
+        self.assertEqual((series['Centre']['taux_conformite'][-1], series['Nord']['taux_conformite'][-1]), (100.0, 0))
+        self.assertEqual(series['Centre']['cotisations_encaissees'][-1], 250.0)
+        self.assertEqual(series['Nord']['employeurs_actifs'][-1], 1)
+
+    def test_validation_par_etag(self):
+        premiere = self.client.get(reverse('kpi_data'))
+        etag = premiere.headers['ETag']
+        self.assertIn('Last-Modified', premiere.headers)
+        self.assertEqual(self.client.get(reverse('kpi_data'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Autres paramètres : autre réponse
+        self.assertEqual(self.client.get(reverse('kpi_data'), {'mois': 2}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        self.paiement.montant = Decimal('400')
+        self.paiement.save()
+        apres = self.client.get(reverse('kpi_data'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(apres.status_code, 200)
+        self.assertNotEqual(apres.headers['ETag'], etag)
+        self.assertEqual(apres.json()['kpi_recouvrement']['encaissees'][-1], 400.0)
+
+
+class ImportLignesTests(TestCase):
+
+    def setUp(self):
+        self.admin, _, (self.employeur, _) = creer_jeu(assures=3)
+        self.declaration = Declaration.objects.create(
+            employeur=self.employeur, periode=date(2026, 1, 1), created_by=self.admin,
+        )
+
+    def test_ligne_courte_ne_fait_pas_recalculer_les_cotisations_fournies(self):
+        contenu = (
+            'numero_assure,salaire_declare,cotisation_salariale,cotisation_patronale\n'
+            'ASS-0-0,100000,4200,8400\n'
+            'ASS-0-1,100000,4200,8400\n'
+            'ASS-0-2,200000\n'
+        )
+        resultat = importer_lignes_declaration(
+            self.declaration, SimpleUploadedFile('paie.csv', contenu.encode()), 'paie.csv',
+        )
+        self.assertEqual(resultat.lignes_importees, 2)
+        self.assertEqual(resultat.lignes_rejetees, 1)
+        self.assertEqual(
+            set(self.declaration.lignes.values_list('cotisation_salariale', 'cotisation_patronale')),
+            {(Decimal('4200'), Decimal('8400'))},
+        )
+        self.assertEqual(resultat.montant_total, Decimal('25200'))
+
+
+class ExportsTests(TestCase):
+    """Les exports CSV et XLSX en flux se relisent avec core.imports."""
+
+    def setUp(self):
+        self.admin, _, (self.employeur, _) = creer_jeu(assures=3)
+        self.client.force_login(self.admin)
+        declaration = Declaration.objects.create(
+            employeur=self.employeur, periode=date(2026, 1, 1), created_by=self.admin,
+        )
+        self.paiement = Paiement.objects.create(
+            declaration=declaration, montant=Decimal('1234567.50'), mode_paiement='virement',
+            date_paiement=date(2026, 2, 28), enregistre_par=self.admin,
+        )
+
+    def exporter(self, nom_url, format_='csv'):
+        reponse = self.client.get(reverse(nom_url), {'format': format_})
+        self.assertEqual(reponse.status_code, 200)
+        self.assertTrue(reponse.streaming)
+        contenu = b''.join(reponse.streaming_content)
+        return list(lire_tableau(SimpleUploadedFile(f'export.{format_}', contenu), f'export.{format_}'))
+
+    def test_csv_assures_relu_par_les_imports(self):
+        lignes = [valeurs for _, valeurs in self.exporter('assure_export')]
+        attendu = Assure.objects.order_by('-date_affiliation', '-pk')
+        self.assertEqual([lire_texte(v['n_assure']) for v in lignes], [a.numero_assure for a in attendu])
+        self.assertEqual([lire_date(v['date_naissance']) for v in lignes], [a.date_naissance for a in attendu])
+        self.assertEqual({v['actif'] for v in lignes}, {'oui'})
+
+    def test_montants_et_dates_identiques_en_csv_et_xlsx(self):
+        for format_ in ('csv', 'xlsx'):
+            with self.subTest(format=format_):
+                ((_, ligne),) = self.exporter('paiement_export', format_)
+                self.assertEqual(lire_texte(ligne['reference']), self.paiement.reference)
+                self.assertEqual(lire_montant(ligne['montant']), Decimal('1234567.50'))
+                self.assertEqual(lire_date(ligne['date_paiement']), date(2026, 2, 28))
+                self.assertEqual(lire_texte(ligne['periode']), '01/2026')
+
+
+class CotisationsTests(TestCase):
+    """Barème fait à la main ; montants attendus calculés au centime, demi supérieur."""
+
+    def setUp(self):
+        self.admin, _, (self.commerce, self.agriculture) = creer_jeu(assures=2)
+        self.agriculture.secteur_activite = SecteurActivite.objects.create(code='AGR', nom='Agriculture')
+        self.agriculture.save()
+
+        def bareme(code, taux_salarial, taux_patronal, debut, fin=None, plafond=None, secteur=None):
+            BaremeCotisation.objects.create(
+                code=code, libelle=code, taux_salarial=Decimal(taux_salarial), taux_patronal=Decimal(taux_patronal),
+                plafond=plafond, secteur_activite=secteur, date_debut=debut, date_fin=fin,
+            )
+
+        plafond = Decimal('750000.00')
+        bareme('RET', '4.200', '4.200', date(2025, 1, 1), date(2025, 12, 31), plafond)
+        bareme('RET', '4.500', '5.000', date(2026, 1, 1), plafond=plafond)
+        bareme('AT', '0', '1.750', date(2020, 1, 1))
+        bareme('AT', '0', '5.000', date(2020, 1, 1), secteur=self.agriculture.secteur_activite)
+
+    def calculer(self, periode, salaires, employeur=None):
+        secteur = (employeur or self.commerce).secteur_activite_id
+        centimes = [cotisations._centimes(Decimal(s)) for s in salaires]
+        salariale, patronale = cotisations.calculer(
+            centimes, [secteur] * len(centimes), cotisations.baremes_applicables(periode, [secteur]),
+        )
+        return [(Decimal(int(s)).scaleb(-2), Decimal(int(p)).scaleb(-2)) for s, p in zip(salariale, patronale)]
+
+    def test_plafond_et_arrondi(self):
+        # RET 4,5 % / 5 % plafonné à 750 000 ; AT patronal 1,75 % sans plafond
+        self.assertEqual(
+            self.calculer(date(2026, 1, 1), ['750000.00', '749999.99', '750000.01', '1000000.00', '1.00', '0.30']),
+            [
+                (Decimal('33750.00'), Decimal('50625.00')),
+                (Decimal('33750.00'), Decimal('50625.00')),   # 33 749,99955 et 50 624,999325
+                (Decimal('33750.00'), Decimal('50625.00')),   # AT : 13 125,000175 au-delà du plafond
+                (Decimal('33750.00'), Decimal('55000.00')),
+                (Decimal('0.05'), Decimal('0.07')),           # 0,045 : demi supérieur
+                (Decimal('0.01'), Decimal('0.02')),           # 0,015 + 0,00525 arrondis une seule fois
+            ],
+        )
+
+    def test_version_en_vigueur_et_secteur(self):
+        self.assertEqual(self.calculer(date(2025, 12, 1), ['1000000']), [(Decimal('31500.00'), Decimal('49000.00'))])
+        self.assertEqual(self.calculer(date(2026, 1, 1), ['1000000'], self.agriculture),
+                         [(Decimal('33750.00'), Decimal('87500.00'))])
+        # Avant toute version de RET : seul AT s'applique
+        self.assertEqual(self.calculer(date(2024, 12, 1), ['1000000']), [(Decimal('0.00'), Decimal('17500.00'))])
+
+    def test_recalcul_des_declarations(self):
+        declarations = []
+        for employeur in (self.commerce, self.agriculture):
+            declaration = Declaration.objects.create(employeur=employeur, periode=date(2026, 1, 1), created_by=self.admin)
+            for assure, salaire in zip(employeur.salaries.order_by('pk'), ('749999.99', '1000000.00')):
+                LigneDeclaration.objects.create(
+                    declaration=declaration, assure=assure, salaire_declare=Decimal(salaire),
+                    cotisation_salariale=0, cotisation_patronale=0,
+                )
+            declarations.append(declaration)
+
+        self.assertEqual(cotisations.recalculer(Declaration.objects.filter(pk__in=[d.pk for d in declarations])), 4)
+        commerce, agriculture = declarations
+        self.assertEqual(
+            list(commerce.lignes.order_by('pk').values_list('cotisation_salariale', 'cotisation_patronale')),
+            [(Decimal('33750.00'), Decimal('50625.00')), (Decimal('33750.00'), Decimal('55000.00'))],
+        )
+        # RET 37 499,9995 + AT à 5 % 37 499,9995
+        self.assertEqual(
+            list(agriculture.lignes.order_by('pk').values_list('cotisation_salariale', 'cotisation_patronale')),
+            [(Decimal('33750.00'), Decimal('75000.00')), (Decimal('33750.00'), Decimal('87500.00'))],
+        )
+        commerce.refresh_from_db()
+        agriculture.refresh_from_db()
+        self.assertEqual(commerce.montant_total_cotisations, Decimal('173125.00'))
+        self.assertEqual(agriculture.montant_total_cotisations, Decimal('230000.00'))
+
+
+class RechercheTests(TestCase):
+
+    def setUp(self):
+        self.admin, _, (self.centre, self.nord) = creer_jeu(assures=2)
+        self.client.force_login(self.admin)
+        Employeur.objects.filter(pk=self.centre.pk).update(raison_sociale='Société Générale du Bâtiment')
+        Employeur.objects.filter(pk=self.nord.pk).update(raison_sociale='Générale Agricole')
+
+    def libelles(self, texte, **parametres):
+        reponse = self.client.get(reverse('recherche_rapide'), {'q': texte, 'type': 'employeurs', **parametres})
+        return [e['libelle'] for e in reponse.json()['employeurs']]
+
+    def test_prefixes_sans_accents_tous_les_mots(self):
+        # Écritures par update() : suivies par les déclencheurs de l'index
+        self.assertEqual(self.libelles('soc gen'), ['Société Générale du Bâtiment'])
+        self.assertEqual(set(self.libelles('GENERALE')), {'Société Générale du Bâtiment', 'Générale Agricole'})
+        self.assertEqual(len(self.libelles('gene', limite=1)), 1)
+        self.assertEqual(self.libelles('batiment agricole'), [])
+        self.assertEqual(self.libelles('NIF1'), ['Générale Agricole'])
+        # Opérateurs FTS5 cités, trop court : rien
+        self.assertEqual(self.libelles('"gen" OR'), [])
+        self.assertEqual(self.libelles('g'), [])
+
+    def test_index_suit_les_modifications(self):
+        Employeur.objects.filter(pk=self.nord.pk).update(raison_sociale='Coopérative du Nord')
+        self.assertEqual(self.libelles('agricole'), [])
+        self.assertEqual(self.libelles('cooperative'), ['Coopérative du Nord'])
+        self.nord.delete()
+        self.assertEqual(self.libelles('cooperative'), [])
+
+        assures = recherche.chercher(Assure, 'prenom1 nom0')
+        self.assertEqual([a.numero_assure for a in assures], ['ASS-0-1'])
+
+
+MEDIA_TESTS = Path(tempfile.gettempdir()) / 'sgc_tests_media'
+
+
+@override_settings(MEDIA_ROOT=MEDIA_TESTS, TELEVERSEMENT_DOSSIER=MEDIA_TESTS / 'televersements')
+class PreuvePaiementTests(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_TESTS, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.admin, _, (employeur, _) = creer_jeu(assures=0)
+        self.declaration = Declaration.objects.create(
+            employeur=employeur, periode=date(2026, 1, 1), created_by=self.admin,
+        )
+        self.client.force_login(self.admin)
+        self.envoi = Televersement.objects.get(
+            pk=self.client.post(reverse('televersement_creer'), {'nom': 'recu.pdf', 'taille': 5}).json()['id'],
+        )
+        self.client.generic(
+            'PATCH', reverse('televersement_detail', args=[self.envoi.pk]), b'%PDF-',
+            content_type='application/octet-stream', HTTP_UPLOAD_OFFSET='0',
+        )
+
+    def enregistrer(self):
+        return self.client.post(reverse('paiement_create'), {
+            'declaration': self.declaration.pk, 'montant': '10', 'mode_paiement': 'cheque',
+            'date_paiement': '2026-02-01', 'statut': 'initie', 'enregistre_par': self.admin.pk,
+            'preuve_televersement': self.envoi.pk,
+        })
+
+    def test_envoi_conserve_si_le_paiement_echoue(self):
+        partiel = televersements.chemin_partiel(self.envoi)
+        with mock.patch.object(Paiement, 'save', side_effect=DatabaseError), self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(DatabaseError):
+                self.enregistrer()
+        self.envoi.refresh_from_db()
+        self.assertEqual(self.envoi.statut, 'termine')
+        self.assertTrue(os.path.exists(partiel))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertRedirects(self.enregistrer(), reverse('paiement_list'))
+        self.envoi.refresh_from_db()
+        self.assertEqual(self.envoi.statut, 'attache')
+        self.assertFalse(os.path.exists(partiel))
+        self.assertEqual(Paiement.objects.get().preuve_paiement.read(), b'%PDF-')
+
+    def test_envoi_conserve_si_la_modification_de_l_employeur_echoue(self):
+        employeur = self.declaration.employeur
+        # Un agent ne modifie pas un employeur qu'il a lui-même saisi
+        employeur.agent = CustomUser.objects.create_user('agent_saisie', password='x', role='agent')
+        employeur.save()
+        donnees = {
+            champ: getattr(employeur, champ) for champ in (
+                'numero_immatriculation', 'raison_sociale', 'nif', 'rccm', 'adresse', 'contact_nom', 'contact_email',
+                'contact_telephone', 'statut',
+            )
+        } | {
+            'secteur_activite': employeur.secteur_activite_id, 'region': employeur.region_id,
+            'televersements': str(self.envoi.pk),
+        }
+        url = reverse('employeur_update', args=[employeur.pk])
+        partiel = televersements.chemin_partiel(self.envoi)
+        with mock.patch.object(PieceJustificative, 'save', side_effect=DatabaseError), \
+                self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(DatabaseError):
+                self.client.post(url, donnees)
+        self.envoi.refresh_from_db()
+        self.assertEqual(self.envoi.statut, 'termine')
+        self.assertTrue(os.path.exists(partiel))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertRedirects(self.client.post(url, donnees), reverse('employeur_detail', args=[employeur.pk]))
+        self.envoi.refresh_from_db()
+        self.assertEqual(self.envoi.statut, 'attache')
+        self.assertEqual(employeur.pieces_justificatives.get().fichier.read(), b'%PDF-')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_TESTS)
+class StockageDedupeTests(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_TESTS, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.admin, _, (self.employeur, _) = creer_jeu(assures=0)
+        self.declaration = Declaration.objects.create(
+            employeur=self.employeur, periode=date(2026, 1, 1), created_by=self.admin,
+        )
+
+    def piece(self, contenu, nom='statuts.pdf'):
+        return PieceJustificative.objects.create(
+            employeur=self.employeur, nom=nom, fichier=SimpleUploadedFile(nom, contenu),
+        )
+
+    def test_contenus_identiques_partages(self):
+        premiere, seconde = self.piece(b'%PDF-statuts'), self.piece(b'%PDF-statuts', 'copie.PDF')
+        paiement = Paiement.objects.create(
+            declaration=self.declaration, montant=Decimal('10'), mode_paiement='cheque', date_paiement=date(2026, 2, 1),
+            enregistre_par=self.admin, preuve_paiement=SimpleUploadedFile('recu.pdf', b'%PDF-statuts'),
+        )
+        autre = self.piece(b'%PDF-rccm')
+        blob = Blob.objects.get(empreinte=hashlib.sha256(b'%PDF-statuts').hexdigest())
+        self.assertEqual(Blob.objects.count(), 2)
+        self.assertEqual(blob.references, 3)
+        self.assertEqual({premiere.fichier.name, seconde.fichier.name, paiement.preuve_paiement.name}, {blob.chemin})
+        self.assertNotEqual(autre.fichier.name, blob.chemin)
+        chemin = premiere.fichier.path
+
+        premiere.delete()
+        paiement.preuve_paiement = SimpleUploadedFile('recu.pdf', b'%PDF-recu')
+        paiement.save()
+        blob.refresh_from_db()
+        self.assertEqual(blob.references, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            seconde.delete()
+        self.assertFalse(Blob.objects.filter(pk=blob.pk).exists())
+        self.assertFalse(os.path.exists(chemin))
+        self.assertEqual(autre.fichier.read(), b'%PDF-rccm')
+
+    def test_fichiers_existants_et_recomptage(self):
+        # Fichiers d'avant la déduplication, enregistrés sous leur propre nom
+        anciens = []
+        for nom in ('pieces_justificatives/2024/01/a.pdf', 'pieces_justificatives/2024/02/b.pdf'):
+            chemin = MEDIA_TESTS / nom
+            chemin.parent.mkdir(parents=True, exist_ok=True)
+            chemin.write_bytes(b'%PDF-ancien')
+            piece = self.piece(b'provisoire')
+            PieceJustificative.objects.filter(pk=piece.pk).update(fichier=nom)
+            anciens.append(chemin)
+        stockage.recompter()  # Libère le contenu provisoire
+        bilan = stockage.dedupliquer()
+        self.assertEqual((bilan.fichiers, bilan.lignes, bilan.nouveaux), (2, 2, 1))
+        self.assertEqual(bilan.octets_economises, len(b'%PDF-ancien'))
+        self.assertFalse(any(c.exists() for c in anciens))
+        blob = Blob.objects.get()
+        self.assertEqual(blob.references, 2)
+        self.assertEqual(set(PieceJustificative.objects.values_list('fichier', flat=True)), {blob.chemin})
+
+        Blob.objects.update(references=7)
+        self.assertEqual(stockage.recompter(), (1, 0))
+        blob.refresh_from_db()
+        self.assertEqual(blob.references, 2)
+
+
+class MetriquesTests(TestCase):
+
+    def setUp(self):
+        self.admin, _, _ = creer_jeu(assures=0)
+        self.client.force_login(self.admin)
+        metriques.registre.vider()
+        self.addCleanup(metriques.registre.vider)
+
+    def valeurs(self, **entetes):
+        reponse = self.client.get(reverse('export_metriques'), **entetes)
+        self.assertEqual(reponse.status_code, 200)
+        self.assertTrue(reponse['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return dict(
+            ligne.rsplit(' ', 1) for ligne in reponse.content.decode().splitlines() if not ligne.startswith('#')
+        )
+
+    def test_compteurs_par_vue(self):
+        requetes = []
+
+        def compter(execute, sql, params, many, context):
+            requetes.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(compter):
+            self.client.get(reverse('employeur_list'))
+        self.client.get(reverse('employeur_list'), {'statut': 'valide'})
+        self.client.get('/inexistante/')
+
+        valeurs = self.valeurs()
+        self.assertEqual(valeurs['sgc_http_requetes_total{vue="employeur_list",methode="GET",statut="200"}'], '2')
+        self.assertEqual(valeurs['sgc_http_requetes_total{vue="<non résolue>",methode="GET",statut="404"}'], '1')
+        self.assertEqual(valeurs['sgc_http_duree_secondes_count{vue="employeur_list"}'], '2')
+        self.assertEqual(valeurs['sgc_http_duree_secondes_bucket{vue="employeur_list",le="+Inf"}'], '2')
+        # Deux requêtes identiques au filtre près : même nombre de requêtes SQL
+        self.assertEqual(valeurs['sgc_sql_requetes_par_requete_sum{vue="employeur_list"}'],
+                         repr(float(2 * len(requetes))))
+        self.assertGreater(float(valeurs['sgc_gabarits_secondes_total{vue="employeur_list"}']), 0)
+        self.assertNotIn('sgc_http_requetes_lentes_total{vue="employeur_list"}', valeurs)
+
+    @override_settings(METRIQUES_SEUIL_LENT=0)
+    def test_requete_lente_journalisee(self):
+        with self.assertLogs('core.metriques', 'WARNING') as journal:
+            self.client.get(reverse('employeur_list'))
+        self.assertIn('Requête lente GET /employeurs/', journal.output[0])
+        self.assertIn('SELECT', journal.output[0])
+        self.assertEqual(self.valeurs()['sgc_http_requetes_lentes_total{vue="employeur_list"}'], '1')
+
+    @override_settings(METRIQUES_JETON='secret', METRIQUES_IPS=[])
+    def test_acces_restreint(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('export_metriques')).status_code, 403)
+        self.assertEqual(
+            self.client.get(reverse('export_metriques'), HTTP_AUTHORIZATION='Bearer autre').status_code, 403,
+        )
+        self.valeurs(HTTP_AUTHORIZATION='Bearer secret')
+
+
+@override_settings(DOCUMENTS_DOSSIER=MEDIA_TESTS / 'documents')
+class DocumentsTests(TestCase):
+    """Un PDF n'est rendu qu'une fois par jeu de données ; une donnée modifiée donne un nouveau rendu."""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_TESTS, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.admin, _, (self.employeur, _) = creer_jeu(assures=0)
+        self.declaration = Declaration.objects.create(
+            employeur=self.employeur, periode=date(2026, 1, 1), created_by=self.admin, statut='valide',
+            montant_total_cotisations=Decimal('500'),
+        )
+        self.paiement = Paiement.objects.create(
+            declaration=self.declaration, montant=Decimal('500'), mode_paiement='virement',
+            date_paiement=date(2026, 2, 10), statut='confirme', enregistre_par=self.admin,
+        )
+
+    def test_quittance_rendue_une_fois_puis_servie_du_cache(self):
+        (quittance,) = documents.quittances(Paiement.objects.all())
+        self.assertFalse(quittance.en_cache())
+        self.assertEqual(documents.generer([quittance, quittance]), 1)
+        self.assertEqual(documents.generer(documents.quittances(Paiement.objects.all())), 0)
+        with open(quittance.chemin, 'rb') as fichier:
+            rendu = fichier.read()
+        self.assertTrue(rendu.startswith(b'%PDF'))
+
+        self.client.force_login(self.admin)
+        reponse = self.client.get(reverse('paiement_quittance', args=[self.paiement.pk]))
+        self.assertEqual(b''.join(reponse.streaming_content), rendu)
+
+        # Montant corrigé : autre empreinte, nouveau rendu
+        Paiement.objects.filter(pk=self.paiement.pk).update(montant=Decimal('450'))
+        (corrigee,) = documents.quittances(Paiement.objects.all())
+        self.assertNotEqual(corrigee.empreinte, quittance.empreinte)
+        self.assertEqual(documents.generer([corrigee]), 1)
+
+    def test_attestation_refusee_a_un_employeur_en_arriere(self):
+        periode = self.declaration.periode
+        (attestation,) = documents.attestations(periode)
+        self.assertEqual(attestation.donnees['numero_immatriculation'], self.employeur.numero_immatriculation)
+
+        Declaration.objects.create(
+            employeur=self.employeur, periode=date(2026, 2, 1), created_by=self.admin, statut='valide',
+            montant_total_cotisations=Decimal('300'),
+        )
+        self.assertEqual(documents.attestations(periode), [])
+
+
+class FragmentsTests(TestCase):
+    """Une ligne de liste en cache n'est jamais resservie après une écriture qu'elle affiche."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.admin, _, (self.employeur, _) = creer_jeu(assures=1)
+        self.client.force_login(self.admin)
+        self.declaration = Declaration.objects.create(
+            employeur=self.employeur, periode=date(2026, 1, 1), created_by=self.admin,
+        )
+
+    def liste(self):
+        reponse = self.client.get(reverse('declaration_list'))
+        self.assertEqual(reponse.status_code, 200)
+        return reponse.content.decode()
+
+    def test_objet_lie_enregistre_perime_la_ligne(self):
+        self.assertIn('Employeur 0', self.liste())
+        self.employeur.raison_sociale = 'Société renommée'
+        self.employeur.save()
+        contenu = self.liste()
+        self.assertIn('Société renommée', contenu)
+        self.assertNotIn('Employeur 0', contenu)
+
+    def test_mise_a_jour_en_masse_perime_la_ligne(self):
+        self.assertNotIn('12600.00', self.liste())
+        LigneDeclaration.objects.create(
+            declaration=self.declaration, assure=self.employeur.salaries.get(), salaire_declare=Decimal('100000'),
+            cotisation_salariale=Decimal('4200'), cotisation_patronale=Decimal('8400'),
+        )
+        recalculer_total(self.declaration)  # update() : aucun signal, seule la version change
+        self.assertIn('12600.00', self.liste())
+
+    def test_connexion_ne_perime_rien(self):
+        avant = fragments.generations(CustomUser)
+        self.client.force_login(self.admin)
+        self.assertEqual(fragments.generations(CustomUser), avant)
+        self.admin.first_name = 'Awa'
+        self.admin.save()
+        self.assertNotEqual(fragments.generations(CustomUser), avant)
+
+
+class GeoTests(TestCase):
+    """Recherche par rayon (geohash + distance exacte) et ordre des tournées."""
+
+    def setUp(self):
+        self.admin, _, self.employeurs = creer_jeu(employeurs=6, assures=0)
+
+    def placer(self, *positions):
+        for employeur, (latitude, longitude) in zip(self.employeurs, positions):
+            employeur.latitude, employeur.longitude = latitude, longitude
+            employeur.save()
+
+    def test_rayon_exclut_les_points_hors_du_cercle(self):
+        centre = (12.37, -1.52)
+        diagonale = 0.035 / math.cos(math.radians(centre[0]))
+        self.placer(
+            (Decimal('12.379'), Decimal('-1.52')),  # ~1 km
+            (Decimal('12.414'), Decimal('-1.52')),  # ~4,9 km
+            (Decimal('12.405'), Decimal(f'{-1.52 + diagonale:.6f}')),  # dans le carré circonscrit, ~5,5 km
+            (Decimal('12.47'), Decimal('-1.52')),  # ~11 km
+        )
+        trouves = geo.dans_rayon(Employeur.objects.all(), *centre, 5)
+        self.assertEqual([e for e, _ in trouves], self.employeurs[:2])
+        self.assertTrue(all(distance <= 5 for _, distance in trouves))
+        self.assertEqual(
+            {e.pk for e, _ in trouves},
+            {e.pk for e in Employeur.objects.exclude(latitude=None)
+             if geo.distance_km(*centre, e.latitude, e.longitude) <= 5},
+        )
+
+    def test_rayon_a_cheval_sur_plusieurs_cellules(self):
+        # Autour de (0, 0), les quatre voisins n'ont aucun préfixe de geohash en commun
+        self.placer(*((Decimal(a), Decimal(b)) for a in ('0.01', '-0.01') for b in ('0.01', '-0.01')))
+        self.assertEqual(len({e.geohash[0] for e in self.employeurs[:4]}), 4)
+        trouves = geo.dans_rayon(Employeur.objects.all(), 0.0, 0.0, 2)
+        self.assertEqual({e.pk for e, _ in trouves}, {e.pk for e in self.employeurs[:4]})
+
+        self.client.force_login(self.admin)
+        reponse = self.client.get(reverse('api-v1:employeur-proches'), {'position': '0.0,0.0', 'rayon': '2'})
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(len(reponse.json()['resultats']), 4)
+        reponse = self.client.get(reverse('api-v1:employeur-proches'), {'position': '0.0,0.0', 'rayon': '1'})
+        self.assertEqual(reponse.json()['resultats'], [])
+
+    def test_tournee_suit_la_route_la_plus_courte(self):
+        points = [(12.0, -1.5), (12.3, -1.5), (12.1, -1.5), (12.2, -1.5)]
+        self.assertEqual(geo.ordonner(points, depart=(11.9, -1.5)), [0, 2, 3, 1])
+        self.assertEqual(geo.ordonner(points), [0, 2, 3, 1])
+
+
+class CampagnesTests(TestCase):
+    """Une campagne relancée ne crée pas de doublon ; d'un mois à l'autre, l'action monte d'un cran."""
+
+    def setUp(self):
+        self.admin, _, self.employeurs = creer_jeu(employeurs=3, assures=0)
+        Employeur.objects.update(date_validation=timezone.make_aware(datetime(2025, 6, 1)))
+        self.janvier, self.fevrier = date(2026, 1, 1), date(2026, 2, 1)
+        self.debut = timezone.make_aware(datetime(2026, 2, 2, 9))
+
+    def actions(self, periode):
+        return sorted(
+            ActionRecouvrement.objects.filter(campagne=periode).values_list('employeur_id', 'type_action')
+        )
+
+    def test_campagne_relancee_sans_doublon(self):
+        self.assertEqual(campagnes.lancer(self.janvier, self.debut), {'relance': 3})
+        self.assertEqual(campagnes.lancer(self.janvier, self.debut), {})
+        # Deux exécutions concurrentes préparées avant toute insertion : la contrainte écarte la seconde
+        concurrente = campagnes.preparer(self.fevrier, self.debut)
+        campagnes.lancer(self.fevrier, self.debut)
+        ActionRecouvrement.objects.bulk_create(concurrente, ignore_conflicts=True)
+        self.assertEqual(ActionRecouvrement.objects.count(), 6)
+        self.assertEqual(len(set(self.actions(self.fevrier))), 3)
+
+    def test_escalade_et_employeur_en_regle(self):
+        campagnes.lancer(self.janvier, self.debut)
+        en_regle = self.employeurs[0]
+        Declaration.objects.create(
+            employeur=en_regle, periode=self.fevrier, created_by=self.admin, statut='valide',
+        )
+        self.assertEqual(campagnes.lancer(self.fevrier, self.debut), {'mise_demeure': 2})
+        self.assertEqual(
+            self.actions(self.fevrier), [(e.pk, 'mise_demeure') for e in self.employeurs[1:]],
+        )
+
+
+class ApiPerimetreTests(TestCase):
+
+    def setUp(self):
+        self.admin, self.regions, (self.centre, self.nord) = creer_jeu(assures=0)
+        self.agent = CustomUser.objects.create_user('agent_nord', password='x', role='agent', region=self.regions[1])
+        self.client.force_login(self.agent)
+        self.employeur = {
+            'raison_sociale': 'Nouveau', 'nif': 'NIF9', 'rccm': 'RCCM9', 'secteur_activite': self.nord.secteur_activite_id,
+            'region': self.regions[1].pk, 'adresse': '-', 'contact_nom': '-', 'contact_email': 'x@exemple.org',
+            'contact_telephone': '-',
+        }
+
+    def test_liste_restreinte_au_perimetre(self):
+        reponse = self.client.get(reverse('api-v1:employeur-list'))
+        self.assertEqual([e['id'] for e in reponse.json()['results']], [self.nord.pk])
+        reponse = self.client.patch(
+            reverse('api-v1:employeur-lot'), [{'id': self.centre.pk, 'adresse': 'ailleurs'}], content_type='application/json',
+        )
+        self.assertEqual(reponse.status_code, 400)
+        self.assertEqual(reponse.json()['erreurs'][0]['erreurs'], {'id': ["Identifiant absent ou inconnu."]})
+
+    def test_validation_reservee_a_la_file(self):
+        reponse = self.client.post(
+            reverse('api-v1:employeur-list'), {**self.employeur, 'statut': 'valide'}, content_type='application/json',
+        )
+        self.assertEqual(reponse.status_code, 400)
+        self.assertIn('statut', reponse.json())
+        reponse = self.client.post(
+            reverse('api-v1:employeur-lot'), [{**self.employeur, 'statut': 'valide', 'motif_rejet': 'x'}],
+            content_type='application/json',
+        )
+        self.assertEqual(reponse.status_code, 400)
+        self.assertFalse(Employeur.objects.filter(nif='NIF9').exists())
+        # Un dossier validé ne peut pas non plus être renvoyé en prospection
+        reponse = self.client.patch(
+            reverse('api-v1:employeur-detail', args=[self.nord.pk]), {'statut': 'prospecte'}, content_type='application/json',
+        )
+        self.assertEqual(reponse.status_code, 400)
+
+        reponse = self.client.post(
+            reverse('api-v1:employeur-list'), {**self.employeur, 'statut': 'dossier_soumis'}, content_type='application/json',
+        )
+        self.assertEqual(reponse.status_code, 201)
+        self.assertIsNone(reponse.json()['numero_immatriculation'])
+
+    def test_confirmation_de_paiement_reservee_aux_validateurs(self):
+        declaration = Declaration.objects.create(employeur=self.nord, periode=date(2026, 1, 1), created_by=self.admin)
+        paiement = Paiement.objects.create(
+            reference='PAY-T', declaration=declaration, montant=10, mode_paiement='cheque',
+            date_paiement=date(2026, 2, 1), enregistre_par=self.admin,
+        )
+        url = reverse('api-v1:paiement-detail', args=[paiement.pk])
+        self.assertEqual(self.client.patch(url, {'statut': 'confirme'}, content_type='application/json').status_code, 400)
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.patch(url, {'statut': 'confirme'}, content_type='application/json').status_code, 200)
+
+
+class RoutageTests(TestCase):
+    """Lectures de reporting sur l'alias `lecture`, hors transaction ; écritures toujours sur la base principale."""
+
+    def setUp(self):
+        self.routeur = routage.RouteurBases()
+        # TestCase ouvre une transaction : on simule une requête hors transaction
+        hors_transaction = mock.patch.object(connections[routage.PRINCIPALE], 'in_atomic_block', False)
+        hors_transaction.start()
+        self.addCleanup(hors_transaction.stop)
+
+    def test_lectures_routees_dans_le_bloc_seulement(self):
+        self.assertIsNone(self.routeur.db_for_read(Declaration))
+        with routage.lecture_seule():
+            self.assertEqual(self.routeur.db_for_read(Declaration), routage.LECTURE)
+            self.assertEqual(self.routeur.db_for_write(Declaration), routage.PRINCIPALE)
+            with mock.patch.object(connections[routage.PRINCIPALE], 'in_atomic_block', True):
+                # Les écritures non validées de la transaction doivent rester visibles
+                self.assertIsNone(self.routeur.db_for_read(Declaration))
+        self.assertIsNone(self.routeur.db_for_read(Declaration))
+
+    def test_flux_d_une_vue_de_reporting_lu_sur_l_alias_lecture(self):
+        def morceaux():
+            for _ in range(2):
+                yield str(self.routeur.db_for_read(Declaration))
+
+        @routage.reporting
+        def vue(request):
+            return StreamingHttpResponse(morceaux())
+
+        reponse = vue(None)
+        # Les morceaux sont produits après le retour de la vue, hors du bloc du décorateur
+        self.assertIsNone(self.routeur.db_for_read(Declaration))
+        self.assertEqual(b''.join(reponse.streaming_content), b'lecturelecture')
+
+
+class ProfilAsgiTests(TestCase):
+
+    def setUp(self):
+        self.admin, _, _ = creer_jeu(assures=1)
+
+    def test_variantes_asynchrones_seulement_sous_le_profil_asgi(self):
+        self.assertFalse(iscoroutinefunction(resolve(reverse('kpi_data')).func))
+        self.client.force_login(self.admin)
+        attendu = self.client.get(reverse('kpi_data'), {'ventilation': 'region'}).json()
+
+        with override_settings(ROOT_URLCONF='cotisation_system.urls_asgi'):
+            self.assertTrue(iscoroutinefunction(resolve(reverse('kpi_data')).func))
+            client = AsyncClient()
+            client.force_login(self.admin)
+            reponse = async_to_sync(client.get)(reverse('kpi_data'), {'ventilation': 'region'})
+            self.assertEqual(reponse.json(), attendu)
+            self.assertEqual(async_to_sync(client.get)(reverse('dashboard')).status_code, 200)
+
+
+class DoublonsApiTests(TestCase):
+
+    def test_lot_cree_par_l_api_est_compare(self):
+        admin, _, (employeur, _) = creer_jeu(assures=0)
+        self.client.force_login(admin)
+        fiche = {
+            'nom': 'Mbarga', 'prenom': 'Jean', 'date_naissance': '1985-03-12', 'lieu_naissance': '-', 'adresse': '-',
+            'telephone': '699 12 34 56', 'type_assure': 'salarie', 'employeur': employeur.pk,
+        }
+        reponse = self.client.post(reverse('api-v1:assure-lot'), [
+            {**fiche, 'numero_cni': 'CNI-A'},
+            {**fiche, 'nom': 'Mbarg', 'numero_cni': 'CNI-B'},
+        ], content_type='application/json')
+        self.assertEqual(reponse.status_code, 201, reponse.content)
+        ids = sorted(c['id'] for c in reponse.json()['crees'])
+
+        paires, _ = doublons.rechercher(processus=1)
+        self.assertIn(tuple(ids), paires)
+
+
+class FileValidationTests(TestCase):
+
+    def setUp(self):
+        self.admin, _, self.employeurs = creer_jeu(assures=0)
+        self.v1 = CustomUser.objects.create_user('valideur1', password='x', role='validation')
+        self.v2 = CustomUser.objects.create_user('valideur2', password='x', role='validation')
+        self.maintenant = timezone.now()
+        self.declarations = [
+            Declaration.objects.create(
+                employeur=self.employeurs[i % 2], periode=date(2026, 1 + i // 2, 1), created_by=self.admin,
+                statut='soumis', date_soumission=self.maintenant - timedelta(days=10 - i),
+            )
+            for i in range(5)
+        ]
+
+    def lot(self, agent, maintenant=None):
+        return set(validation.FILES['declarations'].reserves(agent, maintenant or self.maintenant).values_list('pk', flat=True))
+
+    def test_lots_disjoints_et_bail_expire(self):
+        self.assertEqual(validation.reserver(self.v1, 'declarations', taille=3, maintenant=self.maintenant), 3)
+        self.assertEqual(validation.reserver(self.v2, 'declarations', taille=3, maintenant=self.maintenant), 2)
+        # Les plus anciennes d'abord, jamais le même élément à deux agents
+        self.assertEqual(self.lot(self.v1), {d.pk for d in self.declarations[:3]})
+        self.assertEqual(self.lot(self.v2), {d.pk for d in self.declarations[3:]})
+        # Réserver à nouveau prolonge le bail sans prendre plus
+        self.assertEqual(validation.reserver(self.v1, 'declarations', taille=3, maintenant=self.maintenant), 3)
+
+        # Lot abandonné : il retourne dans la file à l'expiration du bail
+        plus_tard = self.maintenant + validation.DUREE_BAIL + timedelta(minutes=1)
+        self.assertEqual(validation.reserver(self.v2, 'declarations', taille=5, maintenant=plus_tard), 5)
+        self.assertEqual(self.lot(self.v1, plus_tard), set())
+
+    def test_reservation_concurrente_ne_vole_pas_un_element(self):
+        # Un autre agent réserve entre la lecture des candidats et l'UPDATE
+        libres = validation.File.libres
+        appels = []
+
+        def libres_concurrents(file, agent, maintenant):
+            appels.append(agent)
+            if len(appels) == 2:
+                Declaration.objects.filter(pk=self.declarations[0].pk).update(
+                    reserve_par=self.v2, bail_expire=maintenant + validation.DUREE_BAIL,
+                )
+            return libres(file, agent, maintenant)
+
+        with mock.patch.object(validation.File, 'libres', libres_concurrents):
+            self.assertEqual(validation.reserver(self.v1, 'declarations', taille=2, maintenant=self.maintenant), 1)
+        self.assertEqual(self.lot(self.v1), {self.declarations[1].pk})
+
+    def test_candidats_lus_sans_attendre_les_verrous(self):
+        # PostgreSQL : SELECT ... FOR UPDATE SKIP LOCKED
+        with mock.patch.object(connection.features, 'has_select_for_update_skip_locked', True), \
+                mock.patch('django.db.models.QuerySet.select_for_update', autospec=True,
+                           side_effect=lambda queryset, **options: queryset) as verrou:
+            validation.reserver(self.v1, 'declarations', taille=2, maintenant=self.maintenant)
+        verrou.assert_called_once_with(mock.ANY, skip_locked=True)
+
+    def test_elements_saisis_par_l_agent_exclus(self):
+        self.assertEqual(validation.reserver(self.admin, 'declarations', maintenant=self.maintenant), 0)
+
+    def test_decisions(self):
+        validation.reserver(self.v1, 'declarations', taille=3, maintenant=self.maintenant)
+        ids = [d.pk for d in self.declarations]
+        with self.assertRaises(validation.ErreurValidation):
+            validation.decider(self.v1, 'declarations', ids[:1], 'rejete', motif='  ')
+        with self.assertRaises(validation.ErreurValidation):
+            validation.decider(self.v1, 'declarations', ids[:1], 'archive')
+
+        # Seuls les éléments du lot de l'agent sont traités
+        self.assertEqual(validation.decider(self.v1, 'declarations', ids, 'rejete', motif=' Pièces illisibles '), 3)
+        rejetees = Declaration.objects.filter(statut='rejete')
+        self.assertEqual(set(rejetees.values_list('pk', flat=True)), set(ids[:3]))
+        self.assertEqual(set(rejetees.values_list('motif_rejet', 'validated_by', 'reserve_par')),
+                         {('Pièces illisibles', self.v1.pk, None)})
+        self.assertEqual(validation.decider(self.v2, 'declarations', ids[3:], 'valide'), 0)
+
+    def test_validation_des_employeurs_numerote(self):
+        dossiers = [
+            Employeur.objects.create(
+                raison_sociale=f'Dossier {i}', nif=f'NIFD{i}', rccm=f'RCCMD{i}',
+                secteur_activite=self.employeurs[0].secteur_activite, region=self.employeurs[0].region,
+                adresse='-', contact_nom='-', contact_email='d@exemple.org', contact_telephone='-',
+                agent=self.admin, statut='dossier_soumis',
+            )
+            for i in range(3)
+        ]
+        self.assertEqual(validation.reserver(self.v1, 'employeurs', maintenant=self.maintenant), 3)
+        ids = [e.pk for e in dossiers]
+        self.assertEqual(validation.decider(self.v1, 'employeurs', ids[:2], 'valide', maintenant=self.maintenant), 2)
+        valides = Employeur.objects.filter(pk__in=ids[:2])
+        numeros = sorted(valides.values_list('numero_immatriculation', flat=True))
+        self.assertEqual(len(set(numeros)), 2)
+        self.assertTrue(all(n.startswith('EMP') for n in numeros))
+        self.assertEqual(set(valides.values_list('statut', 'validated_by', 'date_validation')),
+                         {('valide', self.v1.pk, self.maintenant)})
+        self.assertEqual(validation.decider(self.v1, 'employeurs', ids[2:], 'rejete', motif='RCCM absent'), 1)
+        rejete = Employeur.objects.get(pk=ids[2])
+        self.assertEqual((rejete.statut, rejete.motif_rejet, rejete.numero_immatriculation), ('rejete', 'RCCM absent', None))
+
+
+class SynchroTests(TestCase):
+
+    def setUp(self):
+        self.admin, self.regions, (self.centre, self.nord) = creer_jeu(assures=2)
+        self.agent = CustomUser.objects.create_user('agent_nord', password='x', role='agent', region=self.regions[1])
+
+    def tout(self, jeton=None, taille=synchro.TAILLE_PAR_DEFAUT):
+        # Rappelle jusqu'à `complet` ; renvoie (lignes par ressource, suppressions, jeton final)
+        lignes, suppressions, appels = {}, {}, 0
+        while True:
+            reponse = synchro.changements(self.agent, jeton, taille=taille)
+            appels += 1
+            for nom, lot in reponse['ressources'].items():
+                lignes.setdefault(nom, []).extend(dict(zip(lot['colonnes'], ligne)) for ligne in lot['lignes'])
+            for nom, ids in reponse['suppressions'].items():
+                suppressions.setdefault(nom, []).extend(ids)
+            jeton = reponse['jeton']
+            if reponse['complet']:
+                return lignes, suppressions, jeton, appels
+
+    def test_premiere_synchronisation_par_lots_dans_le_perimetre(self):
+        lignes, suppressions, jeton, appels = self.tout(taille=1)
+        self.assertEqual([e['id'] for e in lignes['employeurs']], [self.nord.pk])
+        self.assertEqual({a['employeur'] for a in lignes['assures']}, {self.nord.pk})
+        self.assertEqual(len(lignes['assures']), 2)
+        self.assertEqual(suppressions, {})
+        self.assertEqual(appels, 4)
+        self.assertEqual(jeton, str(sequences.version_courante()))
+
+    def test_jeton_differentiel_et_pierres_tombales(self):
+        _, _, jeton, _ = self.tout()
+        self.assertEqual(self.tout(jeton)[0], {})
+
+        self.nord.adresse = 'Garoua'
+        self.nord.save()
+        assure = self.nord.salaries.first()
+        assure_id = assure.pk
+        assure.delete()
+        self.centre.adresse = 'Yaoundé'  # Hors périmètre : pas renvoyé
+        self.centre.save()
+        lignes, suppressions, _, _ = self.tout(jeton)
+        self.assertEqual([(e['id'], e['adresse']) for e in lignes['employeurs']], [(self.nord.pk, 'Garoua')])
+        self.assertEqual(suppressions, {'assures': [assure_id]})
+
+    def test_jeton_invalide(self):
+        for jeton in ('abc', '-3', '1.2.3', '1.2.99.0.0'):
+            with self.assertRaises(synchro.ErreurJeton):
+                synchro.changements(self.agent, jeton)
+
+    def test_conflits(self):
+        version = self.nord.version
+        self.nord.adresse = 'Modifiée au bureau'
+        self.nord.save()
+        assure = self.nord.salaries.first()
+        assure_id, assure_version = assure.pk, assure.version
+        assure.delete()
+
+        resultat = synchro.appliquer(self.agent, [
+            {'ressource': 'employeurs', 'id': self.nord.pk, 'version': version, 'cle': 'a', 'donnees': {'adresse': 'Terrain'}},
+            {'ressource': 'assures', 'id': assure_id, 'version': assure_version, 'cle': 'b', 'donnees': {'adresse': 'x'}},
+            {'ressource': 'employeurs', 'id': self.centre.pk, 'version': self.centre.version, 'donnees': {'adresse': 'x'}},
+            {'ressource': 'employeurs', 'id': self.nord.pk, 'version': self.nord.version, 'cle': 'c',
+             'donnees': {'contact_nom': 'Nouveau contact'}},
+        ])
+        self.assertEqual([(c['cle'], c['motif']) for c in resultat['conflits']], [('a', 'modifie'), ('b', 'supprime')])
+        self.assertEqual(resultat['conflits'][0]['serveur']['adresse'], 'Modifiée au bureau')
+        self.assertEqual(resultat['erreurs'][0]['erreurs'], {'id': ["Identifiant inconnu ou hors périmètre."]})
+        self.assertEqual([a['cle'] for a in resultat['appliquees']], ['c'])
+        self.nord.refresh_from_db()
+        self.assertEqual((self.nord.adresse, self.nord.contact_nom), ('Modifiée au bureau', 'Nouveau contact'))
+        self.assertEqual(resultat['appliquees'][0]['version'], self.nord.version)
+
+
+class ClotureExerciceTests(TestCase):
+
+    def setUp(self):
+        cache.delete(archives.CLE_CACHE)
+        self.addCleanup(cache.delete, archives.CLE_CACHE)
+        self.admin, _, (self.a, self.b) = creer_jeu(assures=2)
+
+        def declaration(employeur, mois, statut, montant, payes=(), en_attente=()):
+            d = Declaration.objects.create(
+                employeur=employeur, periode=date(2024, mois, 1), created_by=self.admin, statut=statut,
+                montant_total_cotisations=montant,
+            )
+            for assure in employeur.salaries.all():
+                LigneDeclaration.objects.create(
+                    declaration=d, assure=assure, salaire_declare=100000,
+                    cotisation_salariale=montant / 4, cotisation_patronale=montant / 4,
+                )
+            for statut_paiement, montants in (('confirme', payes), ('initie', en_attente)):
+                for m in montants:
+                    Paiement.objects.create(
+                        declaration=d, montant=m, mode_paiement='virement', date_paiement=date(2024, mois, 20),
+                        statut=statut_paiement, enregistre_par=self.admin,
+                    )
+            return d
+
+        # Archivables : soldées ou rejetées
+        declaration(self.a, 1, 'valide', Decimal('1000'), payes=[Decimal('600'), Decimal('400')])
+        declaration(self.a, 2, 'valide', Decimal('500'), payes=[Decimal('500')])
+        declaration(self.a, 3, 'rejete', Decimal('300'))
+        declaration(self.b, 1, 'valide', Decimal('800'), payes=[Decimal('800')])
+        # Restent actives : impayée, paiement en attente, brouillon
+        self.impayee = declaration(self.b, 2, 'valide', Decimal('700'), payes=[Decimal('200')])
+        declaration(self.b, 3, 'valide', Decimal('100'), payes=[Decimal('100')], en_attente=[Decimal('50')])
+        declaration(self.b, 4, 'brouillon', Decimal('0'))
+
+    def bilan(self, employeur):
+        return BilanAnnuelEmployeur.objects.filter(employeur=employeur, annee=2024).values(
+            'nb_declarations', 'nb_lignes', 'montant_declare', 'nb_paiements', 'montant_paye',
+        ).get()
+
+    def test_reprise_apres_interruption_et_bilans(self):
+        deplacer = archives._deplacer
+        paquets = []
+
+        def interrompre(exercice, ids):
+            paquets.append(ids)
+            if len(paquets) == 3:
+                raise DatabaseError("coupure")
+            return deplacer(exercice, ids)
+
+        with mock.patch.object(archives, '_deplacer', interrompre), self.assertRaises(DatabaseError):
+            archives.cloturer(2024, self.admin, taille=1)
+        # Deux paquets validés, le troisième annulé en entier ; l'exercice est déjà clos
+        self.assertEqual(DeclarationArchive.objects.count(), 2)
+        self.assertTrue(archives.est_close(date(2024, 6, 1)))
+
+        compte = archives.cloturer(2024, self.admin, taille=1)
+        self.assertEqual((compte['declarations'], compte['ouvertes']), (2, 3))
+        self.assertEqual(DeclarationArchive.objects.count(), 4)
+        self.assertEqual(LigneDeclarationArchive.objects.count(), 8)
+        self.assertEqual(PaiementArchive.objects.count(), 4)
+        exercice = ExerciceClos.objects.get(annee=2024)
+        self.assertEqual((exercice.declarations_archivees, exercice.paiements_archives), (4, 4))
+        self.assertEqual(Suppression.objects.filter(ressource='declarations').count(), 4)
+
+        self.assertEqual(self.bilan(self.a), {
+            'nb_declarations': 3, 'nb_lignes': 6, 'montant_declare': Decimal('1500'),
+            'nb_paiements': 3, 'montant_paye': Decimal('1500'),
+        })
+        self.assertEqual(self.bilan(self.b), {
+            'nb_declarations': 1, 'nb_lignes': 2, 'montant_declare': Decimal('800'),
+            'nb_paiements': 1, 'montant_paye': Decimal('800'),
+        })
+
+        # Soldée depuis : relancer la clôture l'archive et cumule le bilan
+        Paiement.objects.create(
+            declaration=self.impayee, montant=Decimal('500'), mode_paiement='virement', date_paiement=date(2025, 1, 5),
+            statut='confirme', enregistre_par=self.admin,
+        )
+        self.assertEqual(archives.cloturer(2024, self.admin)['declarations'], 1)
+        self.assertEqual(self.bilan(self.b), {
+            'nb_declarations': 2, 'nb_lignes': 4, 'montant_declare': Decimal('1500'),
+            'nb_paiements': 3, 'montant_paye': Decimal('1500'),
+        })
+
+
+class SequencesTests(TestCase):
+
+    def test_blocs_disjoints_apres_les_numeros_existants(self):
+        creer_jeu(employeurs=1, assures=0)
+        existant = sequences.formater('ASS', '202601', 41)
+        Assure.objects.create(
+            numero_assure=existant, nom='N', prenom='P', date_naissance=date(1990, 1, 1), lieu_naissance='-',
+            numero_cni='CNI-X', adresse='-', telephone='-', type_assure='salarie',
+        )
+        self.assertEqual(sequences.allouer('ASS', 3, '202601'), range(42, 45))
+        self.assertEqual(sequences.allouer('ASS', 2, '202601'), range(45, 47))
+        self.assertEqual(sequences.numeros('ASS', 1, '202602'), ['ASS202602000001'])
+
+    def test_compteur_cree_par_un_autre_ecrivain(self):
+        # Deux premiers usages simultanés d'un mois : l'autre écrivain crée le
+        # compteur juste après notre UPDATE ; notre INSERT échoue sur l'unicité
+        # et on incrémente le sien
+        update = QuerySet.update
+
+        def concurrent(queryset, **valeurs):
+            if queryset.model is Compteur and not Compteur.objects.exists():
+                Compteur.objects.create(prefixe='TST', mois='202601', valeur=5)
+                return 0
+            return update(queryset, **valeurs)
+
+        with mock.patch.object(QuerySet, 'update', concurrent):
+            obtenus = sequences.allouer('TST', 3, '202601')
+        self.assertEqual(obtenus, range(6, 9))
+        self.assertEqual(Compteur.objects.get(prefixe='TST', mois='202601').valeur, 8)
+
+
+class ArrieresTests(TestCase):
+    """ArriereEmployeur reste égal à un recalcul après les écritures en masse."""
+
+    def setUp(self):
+        self.admin, _, (self.centre, self.nord) = creer_jeu(assures=0)
+        self.valideur = CustomUser.objects.create_user('valideur', password='x', role='validation')
+        self.declarations = [
+            Declaration.objects.create(
+                employeur=employeur, periode=periode, created_by=self.admin, statut='soumis',
+                date_soumission=timezone.now(), montant_total_cotisations=montant,
+            )
+            for employeur, periode, montant in (
+                (self.centre, date(2026, 1, 1), Decimal('1000')),
+                (self.centre, date(2026, 2, 1), Decimal('600')),
+                (self.nord, date(2026, 1, 1), Decimal('900')),
+            )
+        ]
+
+    def dus(self):
+        self.assertEqual(arrieres.verifier(), [])
+        return dict(ArriereEmployeur.objects.values_list('employeur_id', 'montant_du'))
+
+    def test_decisions_et_rapprochement(self):
+        self.assertEqual(self.dus(), {})
+
+        validation.reserver(self.valideur, 'declarations')
+        ids = [d.pk for d in self.declarations]
+        self.assertEqual(validation.decider(self.valideur, 'declarations', ids, 'valide'), 3)
+        self.assertEqual(self.dus(), {self.centre.pk: Decimal('1600'), self.nord.pk: Decimal('900')})
+        self.assertEqual(
+            ArriereEmployeur.objects.values_list('plus_ancienne_periode', 'nb_periodes_impayees').get(employeur=self.centre),
+            (date(2026, 1, 1), 2),
+        )
+
+        # Confirmation d'un paiement en attente (update) et paiement créé (bulk_create)
+        en_attente = Paiement.objects.create(
+            declaration=self.declarations[0], montant=Decimal('1000'), mode_paiement='virement',
+            date_paiement=date(2026, 2, 3), enregistre_par=self.admin,
+        )
+        self.assertEqual(self.dus(), {self.centre.pk: Decimal('1600'), self.nord.pk: Decimal('900')})
+        releve = (
+            'date,montant,reference\n'
+            f'04/02/2026,1000,{en_attente.reference}\n'
+            f'05/02/2026,400,DEC{self.declarations[2].pk:06d}\n'
+        )
+        resultat = rapprocher_releve(SimpleUploadedFile('releve.csv', releve.encode()), 'releve.csv', self.admin)
+        self.assertEqual((resultat.confirmes, resultat.crees), (1, 1))
+        self.assertEqual(self.dus(), {self.centre.pk: Decimal('600'), self.nord.pk: Decimal('500')})
+        self.assertEqual(
+            ArriereEmployeur.objects.values_list('plus_ancienne_periode', 'nb_periodes_impayees').get(employeur=self.centre),
+            (date(2026, 2, 1), 1),
+        )
+
+
+class RapprochementTests(TestCase):
+
+    def setUp(self):
+        self.admin, _, (self.a, self.b) = creer_jeu(assures=0)
+        self.ouverte = Declaration.objects.create(
+            employeur=self.a, periode=date(2026, 1, 1), created_by=self.admin, statut='valide',
+            montant_total_cotisations=Decimal('25200'),
+        )
+        self.autre = Declaration.objects.create(
+            employeur=self.b, periode=date(2026, 1, 1), created_by=self.admin, statut='valide',
+            montant_total_cotisations=Decimal('9000'),
+        )
+        self.en_attente = Paiement.objects.create(
+            reference='PAY202602000001', declaration=self.autre, montant=Decimal('4000'), mode_paiement='virement',
+            date_paiement=date(2026, 2, 3), enregistre_par=self.admin,
+        )
+
+    def rapprocher(self, simulation=False):
+        releve = (
+            'date;montant;reference;libelle;nif\n'
+            '04/02/2026;4000;PAY202602000001;Virement;\n'                       # Paiement cité : confirmé
+            f'05/02/2026;5000;;Cotisations DEC{self.autre.pk:06d};\n'          # Déclaration citée : créé
+            '06/02/2026;25 200,00;;Cotisations janvier;NIF0\n'                  # Employeur par NIF, reste dû égal
+            '07/02/2026;1000;;Cotisations;NIF0\n'                               # Plus de déclaration ouverte
+            '08/02/2026;4000;PAY202602000001;Doublon;\n'                        # Déjà rapproché
+            '09/02/2026;300;;Inconnu;\n'
+            '31/02/2026;300;;Date invalide;\n'
+            f'10/02/2026;9000;;DEC{self.autre.pk};\n'                         # Déjà soldée par les lignes précédentes
+        )
+        return rapprocher_releve(
+            SimpleUploadedFile('releve.csv', releve.encode()), 'releve.csv', self.admin, simulation=simulation,
+        )
+
+    def test_simulation_sans_ecriture(self):
+        resultat = self.rapprocher(simulation=True)
+        self.assertEqual((resultat.confirmes, resultat.crees), (1, 2))
+        self.assertEqual(Paiement.objects.count(), 1)
+        self.assertEqual(Paiement.objects.get().statut, 'initie')
+
+    def test_rapprochement(self):
+        resultat = self.rapprocher()
+        self.assertEqual(resultat.lignes_lues, 8)
+        self.assertEqual((resultat.confirmes, resultat.crees, resultat.deja_rapproches), (1, 2, 1))
+        self.assertEqual([n for n, _ in resultat.non_rapprochees], [5, 7, 8])
+        self.assertEqual(resultat.ambigues, [(9, f'DEC{self.autre.pk:06d} : reste dû 0.00')])
+        self.assertEqual(resultat.montant_rapproche, Decimal('34200'))
+
+        self.en_attente.refresh_from_db()
+        self.assertEqual(self.en_attente.statut, 'confirme')
+        crees = Paiement.objects.exclude(pk=self.en_attente.pk)
+        self.assertEqual(
+            set(crees.values_list('declaration', 'montant', 'statut')),
+            {(self.autre.pk, Decimal('5000'), 'confirme'), (self.ouverte.pk, Decimal('25200'), 'confirme')},
+        )
+        self.assertTrue(all(r.startswith('PAY') for r in crees.values_list('reference', flat=True)))
+        # Relevé rejoué : rien de plus
+        again = self.rapprocher()
+        self.assertEqual((again.crees, again.confirmes), (0, 0))
+        self.assertEqual(Paiement.objects.count(), 3)
+
+    def test_reference_horodatee_anterieure_aux_compteurs(self):
+        # PAY + AAAAMMJJHHMMSS : ses 12 premiers chiffres sont aussi une référence
+        # du nouveau format, qui ne doit pas être confirmée à sa place
+        ancienne = Paiement.objects.create(
+            reference='PAY20250904122605', declaration=self.ouverte, montant=Decimal('3000'),
+            mode_paiement='virement', date_paiement=date(2025, 9, 4), enregistre_par=self.admin,
+        )
+        homonyme = Paiement.objects.create(
+            reference='PAY202509041226', declaration=self.autre, montant=Decimal('3000'),
+            mode_paiement='virement', date_paiement=date(2025, 9, 4), enregistre_par=self.admin,
+        )
+        releve = '\n'.join(['date;montant;reference', '05/09/2025;3000;PAY20250904122605', '05/09/2025;3000;PAY2025090412260'])
+        resultat = rapprocher_releve(
+            SimpleUploadedFile('releve.csv', releve.encode()), 'releve.csv', self.admin,
+        )
+        self.assertEqual((resultat.confirmes, len(resultat.non_rapprochees)), (1, 1))
+        ancienne.refresh_from_db()
+        homonyme.refresh_from_db()
+        self.assertEqual((ancienne.statut, homonyme.statut), ('confirme', 'initie'))
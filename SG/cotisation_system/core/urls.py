@@ -7,9 +7,10 @@ from django.conf.urls.static import static
 
 
 # core/urls.py
-from django.urls import path
+from django.urls import include, path
 from django.contrib.auth import views as auth_views
-from . import views
+from rest_framework.authtoken.views import obtain_auth_token
+from . import api, views
 
 urlpatterns = [
     path('dashboard/', views.dashboard, name='dashboard'),
@@ -21,24 +22,52 @@ urlpatterns = [
     path('employeurs/nouveau/', views.employeur_create, name='employeur_create'),
     path('employeurs/<int:pk>/', views.employeur_detail, name='employeur_detail'),
     path('employeurs/<int:pk>/modifier/', views.employeur_update, name='employeur_update'),
+    path('employeurs/<int:pk>/attestation/', views.employeur_attestation, name='employeur_attestation'),
+    path('validation/', views.validation_file, name='validation_file'),
     
     # Assurés
     path('assures/', views.assure_list, name='assure_list'),
     path('assures/nouveau/', views.assure_create, name='assure_create'),
+    path('assures/export/', views.assure_export, name='assure_export'),
     
     # Déclarations
     path('declarations/', views.declaration_list, name='declaration_list'),
     path('declarations/nouvelle/', views.declaration_create, name='declaration_create'),
+    path('declarations/<int:pk>/importer/', views.declaration_import, name='declaration_import'),
+    path('declarations/export/', views.declaration_export, name='declaration_export'),
     
     # Paiements
     path('paiements/', views.paiement_list, name='paiement_list'),
     path('paiements/nouveau/', views.paiement_create, name='paiement_create'),
+    path('paiements/rapprochement/', views.paiement_rapprochement, name='paiement_rapprochement'),
+    path('paiements/export/', views.paiement_export, name='paiement_export'),
+    path('paiements/<int:pk>/quittance/', views.paiement_quittance, name='paiement_quittance'),
+    path('paiements/quittances/', views.quittances_zip, name='quittances_zip'),
+
+    # Recouvrement
+    path('recouvrement/', views.action_recouvrement_list, name='action_recouvrement_list'),
+    path('recouvrement/arrieres/', views.employeurs_arrieres, name='employeurs_arrieres'),
+    path('recouvrement/nouvelle/', views.action_recouvrement_create, name='action_recouvrement_create'),
+    path('recouvrement/<int:pk>/', views.action_recouvrement_detail, name='action_recouvrement_detail'),
+    path('recouvrement/<int:pk>/modifier/', views.action_recouvrement_update, name='action_recouvrement_update'),
     
     # Tableaux de bord
     path('dashboard/', views.dashboard, name='dashboard'),
     path('rapports/', views.rapports, name='rapports'),
+    path('rapports/mensuel/', views.rapport_mensuel_pdf, name='rapport_mensuel_pdf'),
     
     # API pour les données
     path('api/kpi-data/', views.kpi_data, name='kpi_data'),
-    
- 
+    path('api/recherche/', views.recherche_rapide, name='recherche_rapide'),
+    path('api/televersements/', views.televersement_creer, name='televersement_creer'),
+    path('api/televersements/<uuid:pk>/', views.televersement_detail, name='televersement_detail'),
+
+    # API REST des tablettes (core/api.py)
+    path('api/v1/', include((api.routeur.urls, 'api'), namespace='api-v1')),
+    path('api/v1/jeton/', obtain_auth_token, name='api_jeton'),
+    path('api/v1/synchro/', api.synchroniser, name='api_synchro'),
+    path('api/v1/tournee/', api.tournee, name='api_tournee'),
+
+    # Supervision
+    path('metrics', views.export_metriques, name='export_metriques'),
+]
@@ -0,0 +1,151 @@
+# core/validation.py
+# File de travail des agents de validation : dossiers d'employeurs
+# (dossier_soumis, en_cours) et déclarations soumises.
+#
+# Chaque agent réserve un lot d'éléments, les plus anciens d'abord, pour
+# DUREE_BAIL : deux agents ne reçoivent jamais le même dossier, et un lot
+# abandonné retourne dans la file à l'expiration du bail (reserve_par,
+# bail_expire). Réserver à nouveau complète le lot et prolonge le bail.
+#
+# Sur les bases qui le permettent (PostgreSQL), les candidats sont lus par
+# SELECT ... FOR UPDATE SKIP LOCKED : deux réservations simultanées se
+# partagent les lignes sans s'attendre. SQLite n'a pas de verrou de ligne,
+# mais ses transactions prennent le verrou d'écriture dès BEGIN
+# (transaction_mode IMMEDIATE, voir settings) : les réservations passent
+# l'une après l'autre et chacune voit les baux de la précédente. Dans les
+# deux cas l'UPDATE de réservation répète la condition « libre ».
+#
+# decider() approuve ou rejette jusqu'à DECISIONS_MAX éléments réservés en une
+# transaction : un UPDATE, matricules alloués en bloc (core.sequences), puis
+# KPI, arriérés et version de synchronisation comme pour les autres écritures
+# en masse.
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import arrieres, kpi, synchro
+from .models import Declaration, Employeur
+from .sequences import nouvelle_version, numeros
+
+DUREE_BAIL = timedelta(minutes=30)
+TAILLE_LOT = 25
+DECISIONS_MAX = 500
+DECISIONS = ('valide', 'rejete')
+
+
+class ErreurValidation(ValueError):
+    """Décision de validation refusée."""
+
+
+class File:
+    """Éléments à valider d'un modèle : statuts en attente, ordre de service, saisie et périmètre."""
+
+    def __init__(self, nom, modele, statuts, ordre, auteur, employeur):
+        self.nom = nom
+        self.modele = modele
+        self.statuts = statuts
+        self.ordre = ordre
+        self.auteur = auteur
+        self.employeur = employeur
+
+    def en_attente(self, agent):
+        """Éléments à valider dans le périmètre de l'agent, hors ceux qu'il a lui-même saisis."""
+        lignes = self.modele.objects.filter(statut__in=self.statuts).exclude(**{self.auteur: agent})
+        employeurs = synchro.employeurs_visibles(agent)
+        if employeurs is not None:
+            lignes = lignes.filter(**{f'{self.employeur}__in': employeurs.values('pk')})
+        return lignes
+
+    def libres(self, agent, maintenant):
+        return self.en_attente(agent).filter(Q(reserve_par=None) | Q(bail_expire__lte=maintenant))
+
+    def reserves(self, agent, maintenant=None):
+        """Lot de l'agent : éléments encore en attente dont il tient le bail."""
+        return self.en_attente(agent).filter(reserve_par=agent, bail_expire__gt=maintenant or timezone.now())
+
+    def rafraichir(self, lignes):
+        # Les update() ne déclenchent pas les signaux
+        if self.modele is Employeur:
+            kpi.recalculer_cellules(
+                {(kpi.mois_de(d), r) for d, r in lignes.values_list('date_creation', 'region_id')},
+                kpi.METRIQUES_PAR_MODELE[Employeur],
+            )
+        else:
+            kpi.recalculer_declarations(lignes)
+            arrieres.recalculer_declarations(lignes)
+
+
+FILES = {
+    f.nom: f for f in (
+        File('employeurs', Employeur, ('dossier_soumis', 'en_cours'), 'date_creation', 'agent', 'pk'),
+        File('declarations', Declaration, ('soumis',), 'date_soumission', 'created_by', 'employeur'),
+    )
+}
+
+
+def reserver(agent, nom, taille=TAILLE_LOT, maintenant=None):
+    """Complète à `taille` le lot de l'agent et prolonge son bail ; renvoie la taille du lot."""
+    file = FILES[nom]
+    maintenant = maintenant or timezone.now()
+    expire = maintenant + DUREE_BAIL
+    with transaction.atomic():
+        lot = file.reserves(agent, maintenant).update(bail_expire=expire)
+        manque = taille - lot
+        if manque > 0:
+            candidats = file.libres(agent, maintenant).order_by(file.ordre, 'pk')
+            if connection.features.has_select_for_update_skip_locked:
+                candidats = candidats.select_for_update(skip_locked=True)
+            ids = list(candidats.values_list('pk', flat=True)[:manque])
+            lot += file.libres(agent, maintenant).filter(pk__in=ids).update(reserve_par=agent, bail_expire=expire)
+    return lot
+
+
+def liberer(agent, nom, ids=None):
+    """Rend à la file des éléments du lot de l'agent (tout le lot par défaut)."""
+    lignes = FILES[nom].modele.objects.filter(reserve_par=agent)
+    if ids is not None:
+        lignes = lignes.filter(pk__in=ids)
+    return lignes.update(reserve_par=None, bail_expire=None)
+
+
+def decider(agent, nom, ids, decision, motif='', maintenant=None):
+    """Approuve (`decision` 'valide') ou rejette ('rejete') des éléments du lot de l'agent.
+
+    Les éléments dont le bail a expiré ou qui ont quitté la file sont
+    ignorés ; renvoie le nombre d'éléments traités.
+    """
+    file = FILES[nom]
+    if decision not in DECISIONS:
+        raise ErreurValidation(f"Décision inconnue : {decision!r}.")
+    motif = motif.strip()
+    if decision == 'rejete' and not motif:
+        raise ErreurValidation("Le motif de rejet est obligatoire.")
+    if len(ids) > DECISIONS_MAX:
+        raise ErreurValidation(f"{DECISIONS_MAX} éléments au plus par décision.")
+    maintenant = maintenant or timezone.now()
+    with transaction.atomic():
+        lignes = file.reserves(agent, maintenant).filter(pk__in=ids)
+        if connection.features.has_select_for_update:
+            lignes = lignes.select_for_update()
+        ids = list(lignes.values_list('pk', flat=True))
+        if not ids:
+            return 0
+        traites = file.modele.objects.filter(pk__in=ids)
+        traites.update(
+            statut=decision, validated_by=agent, date_validation=maintenant,
+            motif_rejet=motif if decision == 'rejete' else '', reserve_par=None, bail_expire=None,
+            version=nouvelle_version(),
+        )
+        if file.modele is Employeur and decision == 'valide':
+            sans_numero = list(
+                traites.filter(Q(numero_immatriculation=None) | Q(numero_immatriculation=''))
+                .order_by('pk').values_list('pk', flat=True)
+            )
+            Employeur.objects.bulk_update(
+                [Employeur(pk=pk, numero_immatriculation=n) for pk, n in zip(sans_numero, numeros('EMP', len(sans_numero)))],
+                ['numero_immatriculation'], batch_size=500,
+            )
+        file.rafraichir(traites)
+    return len(ids)
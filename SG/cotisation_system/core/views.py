@@ -1,18 +1,36 @@
 # core/views.py (ajouter cette fonction)
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
+from django.conf import settings
 from django.http import JsonResponse
+from django.db import transaction
 from django.db.models import Sum, Count, Q, F
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from datetime import datetime, timedelta
 from .models import *
 from .forms import *
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from django.db.models.functions import TruncMonth
+from urllib.parse import urlencode
+import hashlib
+from functools import partial
+from asgiref.sync import sync_to_async
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
 
 from calendar import month_name
 from django.utils.timezone import now
+from .listing import Filtre, bornes_mois, filtrer, paginer
+from . import (
+    archives, arrieres, concurrence, documents, exports, fragments, kpi, metriques, recherche, televersements, validation,
+)
+from .imports import ErreurFichier, importer_lignes_declaration
+from .rapprochement import rapprocher_releve
+from .routage import reporting
+from .televersements import ErreurTeleversement
 
 def is_admin(user):
     return user.role == 'admin'
@@ -20,6 +38,90 @@ def is_admin(user):
 def is_superviseur(user):
     return user.role == 'superviseur'
 
+# Filtres serveur des pages de liste (paramètres GET : statut, region, periode=AAAA-MM)
+FILTRES_EMPLOYEUR = [
+    Filtre('statut', 'statut'),
+    Filtre('region', 'region_id'),
+    Filtre('periode', 'date_creation', mois=True),
+]
+FILTRES_ASSURE = [
+    Filtre('statut', 'est_actif', booleen=True),
+    Filtre('region', 'employeur__region_id'),
+    Filtre('periode', 'date_affiliation', mois=True),
+]
+FILTRES_DECLARATION = [
+    Filtre('statut', 'statut'),
+    Filtre('region', 'employeur__region_id'),
+    Filtre('periode', 'periode', mois=True),
+]
+FILTRES_PAIEMENT = [
+    Filtre('statut', 'statut'),
+    Filtre('region', 'declaration__employeur__region_id'),
+    Filtre('periode', 'declaration__periode', mois=True),
+]
+FILTRES_ACTION = [
+    Filtre('statut', 'statut'),
+    Filtre('type', 'type_action'),
+    Filtre('region', 'employeur__region_id'),
+    Filtre('periode', 'date_planification', mois=True),
+]
+FILTRES_ARRIERE = [
+    Filtre('region', 'employeur__region_id'),
+    Filtre('secteur', 'employeur__secteur_activite_id'),
+    Filtre('anciennete', arrieres.filtre_tranche),
+]
+# Tri de la page des arriérés : (clé de pagination, ordre croissant)
+TRIS_ARRIERE = {
+    'montant': ('montant_du', False),
+    'anciennete': ('plus_ancienne_periode', True),
+}
+
+# Exports CSV / XLSX des listes (core/exports.py), réservés à l'encadrement
+ROLES_EXPORT = ['admin', 'superviseur', 'validation']
+
+def _exporter(request, queryset, cle, filtres, colonnes, nom, liste):
+    if request.user.role not in ROLES_EXPORT:
+        messages.error(request, "Vous n'avez pas la permission d'exporter cette liste.")
+        return redirect(liste)
+    # Mêmes filtres et même ordre que la page de liste
+    queryset, _ = filtrer(request, queryset, filtres)
+    return exports.reponse_export(queryset.order_by(f'-{cle}', '-pk'), colonnes, nom, request.GET.get('format'))
+
+def _historique(request):
+    # ?historique=1 : la liste lit aussi les exercices clos (core.archives)
+    return request.GET.get('historique') == '1'
+
+def _mois_demande(request, param, defaut):
+    # 'AAAA-MM' de l'URL (premier jour du mois), sinon `defaut`
+    bornes = bornes_mois(request.GET.get(param, ''))
+    return bornes[0] if bornes else defaut
+
+def _mois_precedent():
+    return (timezone.localdate().replace(day=1) - timedelta(days=1)).replace(day=1)
+
+def _reponse_pdf(document):
+    documents.generer([document])
+    return FileResponse(open(document.chemin, 'rb'), content_type='application/pdf', filename=document.nom)
+
+def _reponse_zip(liste, nom):
+    documents.generer(liste)
+    reponse = StreamingHttpResponse(documents.flux_zip(liste), content_type='application/zip')
+    reponse['Content-Disposition'] = f'attachment; filename="{nom}"'
+    return reponse
+
+def contexte_liste(page, filtres, statuts, dependances=()):
+    # Contexte commun aux listes paginées (filtres + curseurs). `dependances` :
+    # modèles liés affichés dans les lignes mises en cache (core.fragments)
+    return {
+        'page': page,
+        'filtres': filtres,
+        'filtres_qs': urlencode(filtres),
+        'statuts': statuts,
+        'regions': Region.objects.only('nom').order_by('nom'),
+        'generation': fragments.generations(*dependances),
+        'duree_lignes': settings.FRAGMENTS_DUREE,
+    }
+
 @login_required
 def employeur_update(request, pk):
     employeur = get_object_or_404(Employeur, pk=pk)
@@ -32,18 +134,22 @@ def employeur_update(request, pk):
     
     if request.method == 'POST':
         form = EmployeurForm(request.POST, request.FILES, instance=employeur)
-        if form.is_valid():
-            employeur = form.save()
-            
-            # Gérer les pièces justificatives
-            pieces = request.FILES.getlist('pieces_justificatives')
-            for piece in pieces:
-                PieceJustificative.objects.create(
-                    employeur=employeur,
-                    nom=piece.name,
-                    fichier=piece
-                )
-            
+        envois = _televersements_formulaire(request, form, 'televersements') if form.is_valid() else None
+        if envois is not None:
+            # Envois consommés seulement si tout est enregistré
+            with transaction.atomic():
+                employeur = form.save()
+
+                # Gérer les pièces justificatives
+                pieces = request.FILES.getlist('pieces_justificatives')
+                for piece in pieces:
+                    PieceJustificative.objects.create(
+                        employeur=employeur,
+                        nom=piece.name,
+                        fichier=piece
+                    )
+                _attacher_pieces(employeur, envois)
+
             messages.success(request, 'Employeur modifié avec succès!')
             return redirect('employeur_detail', pk=employeur.pk)
     else:
@@ -57,29 +163,54 @@ def employeur_update(request, pk):
 
 @login_required
 def employeur_list(request):
-    employeurs = Employeur.objects.all().order_by('-date_creation')
-    return render(request, 'employeur_list.html', {'employeurs': employeurs})
+    employeurs = Employeur.objects.select_related('secteur_activite').only(
+        'numero_immatriculation', 'raison_sociale', 'nif', 'rccm', 'statut', 'date_creation', 'version',
+        'secteur_activite__code', 'secteur_activite__nom',
+    )
+    page, filtres = paginer(request, employeurs, 'date_creation', FILTRES_EMPLOYEUR)
+    context = contexte_liste(page, filtres, Employeur.STATUT_CHOICES, (SecteurActivite,))
+    context['employeurs'] = page
+    return render(request, 'employeur_list.html', context)
+
+def _televersements_formulaire(request, form, champ):
+    # Envois par morceaux cités dans le formulaire ; None (avec erreur sur le champ) si invalides
+    try:
+        return televersements.recuperer(form.cleaned_data.get(champ, '').split(','), request.user)
+    except ErreurTeleversement as exc:
+        form.add_error(None, str(exc))
+        return None
+
+def _attacher_pieces(employeur, envois):
+    for envoi in envois:
+        piece = PieceJustificative(employeur=employeur, nom=envoi.nom[:100])
+        televersements.attacher(envoi, piece.fichier)
+        piece.save()
 
 @login_required
 def employeur_create(request):
     if request.method == 'POST':
         form = EmployeurForm(request.POST, request.FILES)
         if form.is_valid():
-            employeur = form.save(commit=False)
-            employeur.agent = request.user
-            employeur.save()
-            
-            # Gérer les pièces justificatives
-            pieces = request.FILES.getlist('pieces_justificatives')
-            for piece in pieces:
-                PieceJustificative.objects.create(
-                    employeur=employeur,
-                    nom=piece.name,
-                    fichier=piece
-                )
-            
-            messages.success(request, 'Employeur créé avec succès!')
-            return redirect('employeur_list')
+            envois = _televersements_formulaire(request, form, 'televersements')
+            if envois is not None:
+                # Envois consommés seulement si tout est enregistré
+                with transaction.atomic():
+                    employeur = form.save(commit=False)
+                    employeur.agent = request.user
+                    employeur.save()
+
+                    # Gérer les pièces justificatives
+                    pieces = request.FILES.getlist('pieces_justificatives')
+                    for piece in pieces:
+                        PieceJustificative.objects.create(
+                            employeur=employeur,
+                            nom=piece.name,
+                            fichier=piece
+                        )
+                    _attacher_pieces(employeur, envois)
+
+                messages.success(request, 'Employeur créé avec succès!')
+                return redirect('employeur_list')
     else:
         form = EmployeurForm()
     return render(request, 'employeur_form.html', {'form': form})
@@ -93,10 +224,87 @@ def employeur_detail(request, pk):
         'pieces': pieces
     })
 
+@login_required
+@require_GET
+def employeur_attestation(request, pk):
+    employeur = get_object_or_404(Employeur, pk=pk)
+    # Par défaut : dernière période déclarée et validée
+    derniere = employeur.declarations.filter(statut='valide').order_by('-periode').values_list('periode', flat=True).first()
+    periode = _mois_demande(request, 'periode', derniere)
+    trouvees = documents.attestations(periode, Employeur.objects.filter(pk=pk)) if periode else []
+    if not trouvees:
+        messages.error(request, "Cet employeur n'est pas en règle : aucune attestation de régularité ne peut être délivrée.")
+        return redirect('employeur_detail', pk=pk)
+    return _reponse_pdf(trouvees[0])
+
+ROLES_VALIDATION = CustomUser.ROLES_VALIDATION
+
+@login_required
+def validation_file(request):
+    # File de validation (core/validation.py) : lot réservé par l'agent, décisions en masse
+    if request.user.role not in ROLES_VALIDATION:
+        messages.error(request, "Vous n'avez pas la permission de valider des dossiers.")
+        return redirect('dashboard')
+
+    if request.method == 'POST':
+        nom = request.POST.get('file')
+        action = request.POST.get('action')
+        if nom not in validation.FILES:
+            messages.error(request, "File de validation inconnue.")
+        elif action == 'reserver':
+            lot = validation.reserver(request.user, nom)
+            messages.info(request, f"{lot} élément(s) réservé(s) pour {validation.DUREE_BAIL.seconds // 60} minutes.")
+        elif action == 'liberer':
+            rendus = validation.liberer(request.user, nom)
+            messages.info(request, f"{rendus} élément(s) rendu(s) à la file.")
+        elif action in validation.DECISIONS:
+            ids = [int(pk) for pk in request.POST.getlist('ids') if pk.isdigit()]
+            try:
+                traites = validation.decider(request.user, nom, ids, action, request.POST.get('motif', ''))
+            except validation.ErreurValidation as exc:
+                messages.error(request, str(exc))
+            else:
+                verbe = 'validé(s)' if action == 'valide' else 'rejeté(s)'
+                messages.success(request, f"{traites} élément(s) {verbe}.")
+                if traites < len(ids):
+                    messages.warning(
+                        request, f"{len(ids) - traites} élément(s) ignoré(s) : bail expiré ou déjà traité(s).",
+                    )
+        return redirect('validation_file')
+
+    maintenant = timezone.now()
+    files = validation.FILES
+    context = {
+        'employeurs': files['employeurs'].reserves(request.user, maintenant).select_related('region').only(
+            'raison_sociale', 'nif', 'rccm', 'statut', 'date_creation', 'bail_expire', 'region__nom',
+        ).order_by('date_creation', 'pk'),
+        'declarations': files['declarations'].reserves(request.user, maintenant).select_related('employeur').only(
+            'periode', 'montant_total_cotisations', 'date_soumission', 'bail_expire', 'employeur__raison_sociale',
+        ).order_by('date_soumission', 'pk'),
+        'libres': {nom: file.libres(request.user, maintenant).count() for nom, file in files.items()},
+        'taille_lot': validation.TAILLE_LOT,
+    }
+    return render(request, 'validation_file.html', context)
+
 @login_required
 def assure_list(request):
-    assures = Assure.objects.all().order_by('-date_affiliation')
-    return render(request, 'assure_list.html', {'assures': assures})
+    assures = Assure.objects.select_related('employeur').only(
+        'numero_assure', 'nom', 'prenom', 'type_assure', 'telephone', 'date_affiliation', 'est_actif', 'version',
+        'employeur__numero_immatriculation', 'employeur__raison_sociale',
+    )
+    page, filtres = paginer(request, assures, 'date_affiliation', FILTRES_ASSURE)
+    context = contexte_liste(page, filtres, (('1', 'Actif'), ('0', 'Inactif')), (Employeur,))
+    context['assures'] = page
+    return render(request, 'assure_list.html', context)
+
+@login_required
+@require_GET
+@reporting
+def assure_export(request):
+    return _exporter(
+        request, Assure.objects.all(), 'date_affiliation', FILTRES_ASSURE,
+        exports.COLONNES_ASSURE, 'assures', 'assure_list',
+    )
 
 @login_required
 def assure_create(request):
@@ -112,8 +320,32 @@ def assure_create(request):
 
 @login_required
 def declaration_list(request):
-    declarations = Declaration.objects.all().order_by('-created_at')
-    return render(request, 'declaration_list.html', {'declarations': declarations})
+    champs = [
+        'periode', 'montant_total_cotisations', 'statut', 'date_soumission', 'created_at', 'version',
+        'employeur__raison_sociale', 'created_by__first_name', 'created_by__last_name',
+    ]
+    historique = _historique(request)
+    modele = DeclarationHistorique if historique else Declaration
+    declarations = modele.objects.select_related('employeur', 'created_by').only(
+        *champs, *(['archivee'] if historique else []),
+    )
+    page, filtres = paginer(request, declarations, 'created_at', FILTRES_DECLARATION)
+    if historique:
+        filtres['historique'] = '1'
+    context = contexte_liste(page, filtres, Declaration.STATUT_CHOICES, (Employeur, CustomUser))
+    context['declarations'] = page
+    context['avec_historique'] = True
+    return render(request, 'declaration_list.html', context)
+
+@login_required
+@require_GET
+@reporting
+def declaration_export(request):
+    modele = DeclarationHistorique if _historique(request) else Declaration
+    return _exporter(
+        request, modele.objects.all(), 'created_at', FILTRES_DECLARATION,
+        exports.COLONNES_DECLARATION, 'declarations', 'declaration_list',
+    )
 
 @login_required
 def declaration_create(request):
@@ -129,117 +361,589 @@ def declaration_create(request):
         form = DeclarationForm()
     return render(request, 'declaration_form.html', {'form': form})
 
+ERREURS_AFFICHEES = 200
+
+@login_required
+def declaration_import(request, pk):
+    declaration = get_object_or_404(Declaration.objects.select_related('employeur'), pk=pk)
+    if declaration.statut == 'valide':
+        messages.error(request, "Une déclaration validée ne peut plus être modifiée.")
+        return redirect('declaration_list')
+
+    resultat = None
+    if request.method == 'POST':
+        form = ImportLignesForm(request.POST, request.FILES)
+        if form.is_valid():
+            fichier = form.cleaned_data['fichier']
+            try:
+                resultat = importer_lignes_declaration(
+                    declaration, fichier, fichier.name, remplacer=form.cleaned_data['remplacer'],
+                )
+            except ErreurFichier as exc:
+                form.add_error('fichier', str(exc))
+            else:
+                messages.success(
+                    request,
+                    f"{resultat.lignes_importees} ligne(s) importée(s), {resultat.lignes_rejetees} rejetée(s).",
+                )
+    else:
+        form = ImportLignesForm()
+
+    erreurs = resultat.erreurs if resultat else []
+    return render(request, 'declaration_import.html', {
+        'form': form,
+        'declaration': declaration,
+        'resultat': resultat,
+        'erreurs': erreurs[:ERREURS_AFFICHEES],
+        'erreurs_masquees': max(len(erreurs) - ERREURS_AFFICHEES, 0),
+    })
+
 @login_required
 def paiement_list(request):
-    paiements = Paiement.objects.all().order_by('-date_reception')
-    return render(request, 'paiement_list.html', {'paiements': paiements})
+    champs = [
+        'reference', 'montant', 'mode_paiement', 'date_paiement', 'date_reception', 'statut', 'preuve_paiement',
+        'version', 'declaration__periode', 'declaration__employeur__raison_sociale',
+    ]
+    historique = _historique(request)
+    modele = PaiementHistorique if historique else Paiement
+    paiements = modele.objects.select_related('declaration__employeur').only(
+        *champs, *(['archivee'] if historique else []),
+    )
+    page, filtres = paginer(request, paiements, 'date_reception', FILTRES_PAIEMENT)
+    if historique:
+        filtres['historique'] = '1'
+    context = contexte_liste(page, filtres, Paiement.STATUT_PAIEMENT_CHOICES, (Declaration, Employeur))
+    context['paiements'] = page
+    context['avec_historique'] = True
+    return render(request, 'paiement_list.html', context)
+
+@login_required
+@require_GET
+@reporting
+def paiement_export(request):
+    modele = PaiementHistorique if _historique(request) else Paiement
+    return _exporter(
+        request, modele.objects.all(), 'date_reception', FILTRES_PAIEMENT,
+        exports.COLONNES_PAIEMENT, 'paiements', 'paiement_list',
+    )
+
+@login_required
+@require_GET
+def paiement_quittance(request, pk):
+    modele = PaiementHistorique if _historique(request) else Paiement
+    paiement = get_object_or_404(modele, pk=pk)
+    if paiement.statut != 'confirme':
+        messages.error(request, "La quittance n'est délivrée que pour un paiement confirmé.")
+        return redirect('paiement_list')
+    return _reponse_pdf(documents.quittances(modele.objects.filter(pk=pk))[0])
+
+@login_required
+@require_GET
+def quittances_zip(request):
+    # Toutes les quittances d'une période de déclaration, dans une archive ZIP
+    if request.user.role not in ROLES_EXPORT:
+        messages.error(request, "Vous n'avez pas la permission de télécharger les quittances.")
+        return redirect('paiement_list')
+    periode = _mois_demande(request, 'periode', _mois_precedent())
+    # Période d'un exercice clos : ses paiements sont (en partie) archivés
+    modele = PaiementHistorique if archives.est_close(periode) else Paiement
+    paiements = modele.objects.filter(declaration__periode=periode)
+    region = request.GET.get('region', '')
+    if region.isdigit():
+        paiements = paiements.filter(declaration__employeur__region_id=region)
+    liste = documents.quittances(paiements)
+    if not liste:
+        messages.info(request, f"Aucun paiement confirmé pour la période {periode:%m/%Y}.")
+        return redirect('paiement_list')
+    return _reponse_zip(liste, f"quittances_{periode:%Y%m}.zip")
 
 @login_required
 def paiement_create(request):
     if request.method == 'POST':
         form = PaiementForm(request.POST, request.FILES)
-        if form.is_valid():
-            paiement = form.save(commit=False)
-            paiement.enregistre_par = request.user
-            paiement.reference = f"PAY{timezone.now().strftime('%Y%m%d%H%M%S')}"
-            paiement.save()
+        envois = _televersements_formulaire(request, form, 'preuve_televersement') if form.is_valid() else None
+        if envois is not None:
+            # Envoi consommé seulement si le paiement est enregistré
+            with transaction.atomic():
+                paiement = form.save(commit=False)
+                paiement.enregistre_par = request.user
+                if envois:
+                    televersements.attacher(envois[0], paiement.preuve_paiement)
+                paiement.save()
             messages.success(request, 'Paiement enregistré avec succès!')
             return redirect('paiement_list')
     else:
         form = PaiementForm()
     return render(request, 'paiement_form.html', {'form': form})
 
-# @login_required
-def dashboard(request):
-    # Calcul des KPI
+@login_required
+def paiement_rapprochement(request):
+    if request.user.role not in ['admin', 'superviseur', 'validation']:
+        messages.error(request, "Vous n'avez pas la permission de rapprocher des relevés.")
+        return redirect('paiement_list')
+
+    resultat = None
+    if request.method == 'POST':
+        form = RapprochementForm(request.POST, request.FILES)
+        if form.is_valid():
+            fichier = form.cleaned_data['fichier']
+            try:
+                resultat = rapprocher_releve(
+                    fichier, fichier.name, request.user,
+                    mode_defaut=form.cleaned_data['mode_defaut'],
+                    tolerance_montant=form.cleaned_data['tolerance_montant'],
+                    tolerance_jours=form.cleaned_data['tolerance_jours'],
+                    simulation=form.cleaned_data['simulation'],
+                )
+            except ErreurFichier as exc:
+                form.add_error('fichier', str(exc))
+            else:
+                prefixe = "Simulation : " if form.cleaned_data['simulation'] else ""
+                messages.success(
+                    request,
+                    f"{prefixe}{resultat.rapproches} ligne(s) rapprochée(s), {len(resultat.ambigues)} ambiguë(s), "
+                    f"{len(resultat.non_rapprochees)} non rapprochée(s).",
+                )
+    else:
+        form = RapprochementForm()
+
+    ambigues = resultat.ambigues if resultat else []
+    non_rapprochees = resultat.non_rapprochees if resultat else []
+    return render(request, 'paiement_rapprochement.html', {
+        'form': form,
+        'resultat': resultat,
+        'ambigues': ambigues[:ERREURS_AFFICHEES],
+        'ambigues_masquees': max(len(ambigues) - ERREURS_AFFICHEES, 0),
+        'non_rapprochees': non_rapprochees[:ERREURS_AFFICHEES],
+        'non_rapprochees_masquees': max(len(non_rapprochees) - ERREURS_AFFICHEES, 0),
+    })
+
+@login_required
+def action_recouvrement_list(request):
+    actions = ActionRecouvrement.objects.select_related('employeur', 'agent').only(
+        'type_action', 'statut', 'date_planification', 'montant_recouvre', 'created_at',
+        'employeur__raison_sociale', 'agent__first_name', 'agent__last_name',
+    )
+    page, filtres = paginer(request, actions, 'created_at', FILTRES_ACTION)
+    context = contexte_liste(page, filtres, ActionRecouvrement.STATUT_CHOICES)
+    context.update({
+        'actions': page,
+        'statut_filter': filtres.get('statut', ''),
+        'type_filter': filtres.get('type', ''),
+    })
+    return render(request, 'action_recouvrement_list.html', context)
+
+@login_required
+def employeurs_arrieres(request):
+    # Lecture de la table ArriereEmployeur maintenue par core.arrieres :
+    # une requête par page, plus une pour les totaux filtrés.
+    tri = request.GET.get('tri')
+    if tri not in TRIS_ARRIERE:
+        tri = 'montant'
+    cle, croissant = TRIS_ARRIERE[tri]
+    soldes = ArriereEmployeur.objects.select_related('employeur__secteur_activite').only(
+        'montant_du', 'montant_declare', 'montant_paye', 'plus_ancienne_periode', 'nb_periodes_impayees',
+        'employeur__raison_sociale', 'employeur__nif', 'employeur__rccm', 'employeur__contact_telephone',
+        'employeur__contact_email', 'employeur__secteur_activite__code', 'employeur__secteur_activite__nom',
+    )
+    page, filtres = paginer(request, soldes, cle, FILTRES_ARRIERE, croissant)
+
+    totaux = soldes
+    for filtre in FILTRES_ARRIERE:
+        if filtre.param in filtres:
+            totaux = filtre.appliquer(totaux, filtres[filtre.param])
+    totaux = totaux.aggregate(nombre=Count('pk'), montant=Sum('montant_du'))
+
+    if tri != 'montant':
+        filtres['tri'] = tri
+    context = contexte_liste(page, filtres, ())
+    context.update({
+        'employeurs_arrieres': page,
+        'total_employeurs': totaux['nombre'],
+        'total_du': totaux['montant'] or 0,
+        'secteurs': SecteurActivite.objects.only('nom').order_by('nom'),
+        'tranches': [(code, libelle) for code, libelle, _, _ in arrieres.TRANCHES],
+        'tri': tri,
+    })
+    return render(request, 'employeurs_arrieres.html', context)
+
+@login_required
+def action_recouvrement_create(request):
+    if request.method == 'POST':
+        form = ActionRecouvrementForm(request.POST)
+        if form.is_valid():
+            action = form.save(commit=False)
+            action.agent = request.user
+            action.save()
+            messages.success(request, 'Action de recouvrement créée avec succès!')
+            return redirect('action_recouvrement_detail', pk=action.pk)
+    else:
+        form = ActionRecouvrementForm(initial={'employeur': request.GET.get('employeur')})
+    return render(request, 'action_recouvrement_form.html', {'form': form})
+
+@login_required
+def action_recouvrement_detail(request, pk):
+    action = get_object_or_404(ActionRecouvrement.objects.select_related('employeur__secteur_activite', 'agent'), pk=pk)
+    return render(request, 'action_recouvrement_detail.html', {'action': action})
+
+@login_required
+def action_recouvrement_update(request, pk):
+    action = get_object_or_404(ActionRecouvrement.objects.select_related('employeur'), pk=pk)
+    if request.method == 'POST':
+        form = ActionRecouvrementUpdateForm(request.POST, instance=action)
+        if form.is_valid():
+            form.save()
+            messages.success(request, 'Action de recouvrement mise à jour!')
+            return redirect('action_recouvrement_detail', pk=action.pk)
+    else:
+        form = ActionRecouvrementUpdateForm(instance=action)
+    return render(request, 'action_recouvrement_update.html', {'form': form, 'action': action})
+
+def _taches_dashboard():
+    # Requêtes indépendantes du tableau de bord : {nom: (fonction, valeur par défaut)}
     today = timezone.now().date()
-    month_start = today.replace(day=1)
-    
-    # KPI d'extension
-    nouveaux_employeurs = Employeur.objects.filter(
-        date_creation__date__gte=month_start,
-        statut='valide'
-    ).count()
-    
-    nouveaux_assures = Assure.objects.filter(
-        date_affiliation__date__gte=month_start
-    ).count()
-    
-    # KPI de conformité
-    employeurs_actifs = Employeur.objects.filter(statut='valide').count()
-    employeurs_ayant_declare = Declaration.objects.filter(
-        periode__month=today.month,
-        periode__year=today.year,
-        statut='valide'
-    ).values('employeur').distinct().count()
-    
-    taux_conformite = (employeurs_ayant_declare / employeurs_actifs * 100) if employeurs_actifs > 0 else 0
-    
-    # KPI de recouvrement
-    cotisations_declarees = Declaration.objects.filter(
-        periode__month=today.month,
-        periode__year=today.year,
-        statut='valide'
-    ).aggregate(total=Sum('montant_total_cotisations'))['total'] or 0
-    
-    cotisations_encaissees = Paiement.objects.filter(
-        declaration__periode__month=today.month,
-        declaration__periode__year=today.year,
-        statut='confirme'
-    ).aggregate(total=Sum('montant'))['total'] or 0
-    
-    taux_recouvrement = (cotisations_encaissees / cotisations_declarees * 100) if cotisations_declarees > 0 else 0
-    
-    # Derniers employeurs
-    derniers_employeurs = Employeur.objects.filter(statut='valide').order_by('-date_creation')[:5]
-    
-    # Derniers paiements
-    derniers_paiements = Paiement.objects.filter(statut='confirme').order_by('-date_reception')[:5]
-    
-    
-    
-    context = {
-        'nouveaux_employeurs': nouveaux_employeurs,
-        'nouveaux_assures': nouveaux_assures,
-        'taux_conformite': round(taux_conformite, 2),
-        'taux_recouvrement': round(taux_recouvrement, 2),
-        'cotisations_encaissees': cotisations_encaissees,
-        'derniers_employeurs': derniers_employeurs,
-        'derniers_paiements': derniers_paiements,
+    return {
+        'totaux': (partial(kpi.synthese, today.replace(day=1)), None),
+        # Derniers employeurs
+        'derniers_employeurs': (lambda: list(Employeur.objects.filter(statut='valide').only(
+            'raison_sociale', 'numero_immatriculation', 'statut', 'date_creation',
+        ).order_by('-date_creation', '-id')[:5]), []),
+        # Derniers paiements
+        'derniers_paiements': (lambda: list(Paiement.objects.filter(statut='confirme').select_related(
+            'declaration__employeur',
+        ).only(
+            'montant', 'mode_paiement', 'date_paiement', 'date_reception', 'declaration__employeur__raison_sociale',
+        ).order_by('-date_reception', '-id')[:5]), []),
+    }
 
+def _contexte_dashboard(resultats):
+    context = {
+        'derniers_employeurs': resultats['derniers_employeurs'],
+        'derniers_paiements': resultats['derniers_paiements'],
+        'partiel': bool(resultats.manquants),
+        # Cartes affichées « — » si les totaux manquent
+        **dict.fromkeys(('nouveaux_employeurs', 'nouveaux_assures', 'taux_conformite', 'taux_recouvrement',
+                         'cotisations_encaissees')),
     }
-    # Vérification avec print()
-    print("=== DEBUG DASHBOARD ===")
-    print("Cotisations encaissées :", cotisations_encaissees)
-    print("Taux de conformité :", taux_conformite)
-    print("Taux de recouvrement :", taux_recouvrement)
-    print("=======================")
+    totaux = resultats['totaux']
+    if totaux is not None:
+        # KPI de conformité
+        employeurs_actifs = totaux['employeurs_actifs']
+        employeurs_ayant_declare = totaux['employeurs_ayant_declare']
+        taux_conformite = (employeurs_ayant_declare / employeurs_actifs * 100) if employeurs_actifs > 0 else 0
 
-    
-    return render(request, 'dashboard.html', context)
+        # KPI de recouvrement
+        cotisations_declarees = totaux['cotisations_declarees']
+        cotisations_encaissees = totaux['cotisations_encaissees']
+        taux_recouvrement = (cotisations_encaissees / cotisations_declarees * 100) if cotisations_declarees > 0 else 0
+
+        context.update({
+            'nouveaux_employeurs': totaux['nouveaux_employeurs'],
+            'nouveaux_assures': totaux['nouveaux_assures'],
+            'taux_conformite': round(taux_conformite, 2),
+            'taux_recouvrement': round(taux_recouvrement, 2),
+            'cotisations_encaissees': cotisations_encaissees,
+        })
+    return context
+
+@login_required
+@reporting
+def dashboard(request):
+    # Les KPI sont lus dans la table KpiMensuel (voir core/kpi.py) au lieu
+    # d'agréger les tables sources à chaque affichage. Sous WSGI, les
+    # requêtes s'exécutent l'une après l'autre sur la connexion (persistante)
+    # de la requête ; voir dashboard_async pour le profil ASGI.
+    resultats = concurrence.executer_en_serie(_taches_dashboard())
+    return render(request, 'dashboard.html', _contexte_dashboard(resultats))
 
+@login_required
+@reporting
+async def dashboard_async(request):
+    # Variante du profil ASGI (cotisation_system/urls_asgi.py) : les requêtes
+    # indépendantes s'exécutent en parallèle (core/concurrence.py) ; une
+    # requête trop lente laisse sa carte vide au lieu de retarder la page.
+    resultats = await concurrence.executer(_taches_dashboard())
+    # Rendu synchrone : le gabarit lit request.user, à résoudre avec
+    # l'utilisateur déjà chargé par login_required (request.auser) plutôt
+    # que de le recharger
+    request.user = await request.auser()
+    return await sync_to_async(render)(request, 'dashboard.html', _contexte_dashboard(resultats))
+
+def pourcentage(numerateur, denominateur):
+    return round(numerateur / denominateur * 100, 1) if denominateur else 0
 
-# @login_required
+@login_required
 # @user_passes_test(is_admin)
+@reporting
 def rapports(request):
-    return render(request, 'rapports.html')
+    mois = timezone.now().date().replace(day=1)
+    totaux = kpi.synthese(mois)
 
-# @login_required
-def kpi_data(request):
-    # Données pour les graphiques (exemple simplifié)
-    data = {
-        'kpi_extension': {
-            'labels': ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun'],
-            'employeurs': [12, 19, 8, 15, 22, 18],
-            'assures': [45, 52, 38, 61, 75, 68]
-        },
-        'kpi_conformite': {
-            'labels': ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun'],
-            'taux': [78, 82, 75, 88, 85, 90]
-        }
+    # Croissance de la couverture : nouveaux assurés du mois rapportés au stock antérieur
+    assures_avant = KpiMensuel.objects.filter(mois__lt=mois).aggregate(total=Sum('nouveaux_assures'))['total'] or 0
+
+    regions = (
+        KpiMensuel.objects.filter(region__isnull=False)
+        .values('region__nom')
+        .annotate(
+            employeurs=Sum('nouveaux_employeurs'),
+            assures=Sum('nouveaux_assures'),
+            declarants=Sum('employeurs_ayant_declare', filter=Q(mois=mois)),
+            cotisations=Sum('cotisations_encaissees', filter=Q(mois=mois)),
+        )
+        .order_by('region__nom')
+    )
+    performance_regions = [
+        dict(ligne, taux_conformite=pourcentage(ligne['declarants'] or 0, ligne['employeurs']))
+        for ligne in regions
+    ]
+
+    context = {
+        'mois': mois,
+        'croissance_extension': pourcentage(totaux['nouveaux_assures'], assures_avant),
+        'taux_conformite': pourcentage(totaux['employeurs_ayant_declare'], totaux['employeurs_actifs']),
+        'taux_recouvrement': pourcentage(totaux['cotisations_encaissees'], totaux['cotisations_declarees']),
+        'performance_regions': performance_regions,
+        'regions': Region.objects.only('nom').order_by('nom'),
+        'mois_precedent': _mois_precedent(),
+    }
+    return render(request, 'rapports.html', context)
+
+@login_required
+@require_GET
+@reporting
+def rapport_mensuel_pdf(request):
+    # Rapport mensuel d'une région (PDF), ou de toutes les régions (ZIP)
+    if request.user.role not in ROLES_EXPORT:
+        messages.error(request, "Vous n'avez pas la permission de télécharger les rapports.")
+        return redirect('rapports')
+    mois = _mois_demande(request, 'mois', timezone.localdate().replace(day=1))
+    region = request.GET.get('region', '')
+    if region.isdigit():
+        return _reponse_pdf(documents.rapports(mois, [get_object_or_404(Region, pk=region)])[0])
+    return _reponse_zip(documents.rapports(mois), f"rapports_{mois:%Y%m}.zip")
+
+KPI_MOIS_DEFAUT = 6
+KPI_MOIS_MAX = 36
+
+def _kpi_derniere_modification(request, *args, **kwargs):
+    # Partagé par les fonctions ETag et Last-Modified : une seule requête par appel
+    if not hasattr(request, '_kpi_derniere_modification'):
+        request._kpi_derniere_modification = kpi.derniere_modification()
+    return request._kpi_derniere_modification
+
+def _kpi_etag(request, *args, **kwargs):
+    derniere = _kpi_derniere_modification(request)
+    # Le mois courant et les paramètres font partie de la réponse
+    cle = f"{derniere.isoformat() if derniere else '-'}|{timezone.now():%Y-%m}|{request.GET.urlencode()}"
+    return hashlib.sha1(cle.encode()).hexdigest()
+
+def _serie_json(serie):
+    return {
+        'employeurs': serie['nouveaux_employeurs'],
+        'assures': serie['nouveaux_assures'],
+        'employeurs_actifs': serie['employeurs_actifs'],
+        'employeurs_ayant_declare': serie['employeurs_ayant_declare'],
+        'taux_conformite': serie['taux_conformite'],
+        'cotisations_declarees': [float(v) for v in serie['cotisations_declarees']],
+        'cotisations_encaissees': [float(v) for v in serie['cotisations_encaissees']],
+        'taux_recouvrement': serie['taux_recouvrement'],
     }
+
+def _kpi_taches(request):
+    # Séries demandées : {nom: (fonction, valeur par défaut)} et axe de ventilation
+    try:
+        nb_mois = min(max(int(request.GET.get('mois', KPI_MOIS_DEFAUT)), 1), KPI_MOIS_MAX)
+    except ValueError:
+        nb_mois = KPI_MOIS_DEFAUT
+    ventilation = request.GET.get('ventilation')
+    if ventilation not in kpi.AXES:
+        ventilation = None
+
+    taches = {'total': (partial(kpi.series, nb_mois), None)}
+    if ventilation:
+        modele = Region if ventilation == 'region' else SecteurActivite
+        taches['ventilation'] = (partial(kpi.series, nb_mois, ventilation), None)
+        taches['noms'] = (lambda: dict(modele.objects.values_list('pk', 'nom')), {})
+    return taches, ventilation
+
+def _kpi_reponse(request, resultats, ventilation):
+    data = {}
+    if resultats['total'] is not None:
+        total = resultats['total'][None]
+        labels = [m.strftime('%m/%Y') for m in total['mois']]
+        data.update({
+            'kpi_extension': {
+                'labels': labels,
+                'employeurs': total['nouveaux_employeurs'],
+                'assures': total['nouveaux_assures'],
+            },
+            'kpi_conformite': {
+                'labels': labels,
+                'taux': total['taux_conformite'],
+            },
+            'kpi_recouvrement': {
+                'labels': labels,
+                'declarees': [float(v) for v in total['cotisations_declarees']],
+                'encaissees': [float(v) for v in total['cotisations_encaissees']],
+                'taux': total['taux_recouvrement'],
+            },
+        })
+
+    if ventilation and resultats['ventilation'] is not None:
+        noms = resultats['noms']
+        series = resultats['ventilation']
+        data['ventilation'] = {
+            'axe': ventilation,
+            'labels': [m.strftime('%m/%Y') for m in next(iter(series.values()))['mois']] if series else [],
+            'series': [
+                dict(id=cle, nom=noms.get(cle, 'Non renseigné'), **_serie_json(serie))
+                for cle, serie in sorted(series.items(), key=lambda i: noms.get(i[0], ''))
+            ],
+        }
+
+    if resultats.manquants:
+        data['partiel'] = resultats.manquants
+        return JsonResponse(data)
+    reponse = JsonResponse(data)
+    reponse.headers['ETag'] = quote_etag(_kpi_etag(request))
+    derniere = _kpi_derniere_modification(request)
+    if derniere:
+        reponse.headers['Last-Modified'] = http_date(int(derniere.timestamp()))
+    return reponse
+
+def _kpi_non_modifie(request):
+    derniere = _kpi_derniere_modification(request)
+    etag = quote_etag(_kpi_etag(request))
+    return get_conditional_response(request, etag=etag, last_modified=derniere and int(derniere.timestamp()))
+
+@login_required
+@reporting
+def kpi_data(request):
+    # Séries mensuelles réelles, calculées par agrégats groupés par mois
+    # (une requête par table source, quel que soit le nombre de mois), sur
+    # la connexion de la requête ; voir kpi_data_async pour le profil ASGI.
+    reponse = _kpi_non_modifie(request)
+    if reponse is not None:
+        return reponse
+    taches, ventilation = _kpi_taches(request)
+    return _kpi_reponse(request, concurrence.executer_en_serie(taches), ventilation)
+
+@login_required
+@reporting
+async def kpi_data_async(request):
+    # Variante du profil ASGI (cotisation_system/urls_asgi.py) : la série
+    # totale et la ventilation sont calculées en parallèle
+    # (core/concurrence.py) ; si l'une n'aboutit pas à temps, la réponse
+    # liste les séries manquantes dans `partiel` et n'est pas mise en cache.
+    reponse = await sync_to_async(_kpi_non_modifie)(request)
+    if reponse is not None:
+        return reponse
+    taches, ventilation = _kpi_taches(request)
+    return _kpi_reponse(request, await concurrence.executer(taches), ventilation)
+
+@login_required
+def recherche_rapide(request):
+    # Saisie semi-automatique : ?q=texte&type=employeurs|assures&limite=10
+    texte = request.GET.get('q', '')
+    try:
+        limite = min(max(int(request.GET.get('limite', recherche.LIMITE)), 1), recherche.LIMITE_MAX)
+    except ValueError:
+        limite = recherche.LIMITE
+    types = request.GET.get('type') or 'employeurs,assures'
+
+    data = {'q': texte}
+    if 'employeurs' in types:
+        employeurs = recherche.chercher(
+            Employeur, texte, limite,
+            Employeur.objects.only('raison_sociale', 'numero_immatriculation', 'nif', 'statut'),
+        )
+        data['employeurs'] = [{
+            'id': e.pk,
+            'libelle': e.raison_sociale,
+            'numero': e.numero_immatriculation or '',
+            'nif': e.nif,
+            'statut': e.get_statut_display(),
+            'url': reverse('employeur_detail', args=[e.pk]),
+        } for e in employeurs]
+    if 'assures' in types:
+        assures = recherche.chercher(
+            Assure, texte, limite,
+            Assure.objects.select_related('employeur').only(
+                'nom', 'prenom', 'numero_assure', 'numero_cni', 'employeur__raison_sociale',
+            ),
+        )
+        data['assures'] = [{
+            'id': a.pk,
+            'libelle': f"{a.nom} {a.prenom}",
+            'numero': a.numero_assure,
+            'numero_cni': a.numero_cni,
+            'employeur': a.employeur.raison_sociale if a.employeur else '',
+            'url': reverse('employeur_detail', args=[a.employeur_id]) if a.employeur_id else '',
+        } for a in assures]
     return JsonResponse(data)
 
+def _televersement_json(televersement):
+    return {
+        'id': str(televersement.pk),
+        'nom': televersement.nom,
+        'taille': televersement.taille,
+        'recu': televersement.recu,
+        'statut': televersement.statut,
+        'sha256': televersement.sha256,
+    }
+
+def _erreur_televersement(exc):
+    return JsonResponse({'erreur': str(exc), 'recu': exc.recu}, status=exc.statut)
+
+@login_required
+@require_POST
+def televersement_creer(request):
+    # Ouvre un envoi par morceaux : nom, taille (octets) et sha256 facultatif
+    try:
+        taille = int(request.POST.get('taille', ''))
+    except ValueError:
+        return JsonResponse({'erreur': "Taille invalide."}, status=400)
+    try:
+        televersement = televersements.creer(
+            request.user, request.POST.get('nom', ''), taille, request.POST.get('sha256', ''),
+        )
+    except ErreurTeleversement as exc:
+        return _erreur_televersement(exc)
+    return JsonResponse(_televersement_json(televersement), status=201)
 
+@login_required
+@require_http_methods(['GET', 'PATCH', 'DELETE'])
+def televersement_detail(request, pk):
+    # GET : état et offset de reprise ; PATCH : morceau brut à l'offset
+    # Upload-Offset (empreinte facultative Upload-Checksum) ; DELETE : abandon
+    televersement = get_object_or_404(Televersement, pk=pk, utilisateur=request.user)
+    if request.method == 'DELETE':
+        televersements.supprimer(televersement)
+        return HttpResponse(status=204)
+    if request.method == 'PATCH':
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+            longueur = int(request.headers.get('Content-Length', ''))
+        except ValueError:
+            return JsonResponse({'erreur': "En-têtes Upload-Offset et Content-Length requis."}, status=400)
+        try:
+            televersements.ecrire_morceau(
+                televersement, offset, request, longueur, request.headers.get('Upload-Checksum', ''),
+            )
+        except ErreurTeleversement as exc:
+            return _erreur_televersement(exc)
+    return JsonResponse(_televersement_json(televersement))
 
+def _metriques_autorisees(request):
+    jeton = settings.METRIQUES_JETON
+    if jeton and request.headers.get('Authorization') == f'Bearer {jeton}':
+        return True
+    return request.META.get('REMOTE_ADDR') in settings.METRIQUES_IPS or request.user.is_superuser
 
+@require_GET
+def export_metriques(request):
+    # Exposition Prometheus (voir core/metriques.py), sans session : jeton ou IP autorisée
+    if not _metriques_autorisees(request):
+        return HttpResponse(status=403)
+    return HttpResponse(metriques.registre.exporter(), content_type='text/plain; version=0.0.4; charset=utf-8')
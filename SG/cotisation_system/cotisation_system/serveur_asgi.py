@@ -0,0 +1,48 @@
+"""
+Profil de déploiement ASGI (uvicorn) du système de gestion des cotisations.
+
+    pip install uvicorn
+    python -m cotisation_system.serveur_asgi
+
+Ce profil monte les variantes asynchrones du tableau de bord et des KPI
+(SGC_VUES_ASYNC=1, cotisation_system/urls_asgi.py), qui calculent leurs
+agrégats en parallèle (core/concurrence.py) ; les autres vues, synchrones,
+passent par le pool de threads de asgiref. `python manage.py comparer_asgi`
+mesure l'écart de latence avec le chemin WSGI.
+
+Variables d'environnement :
+    SGC_ASGI_HOTE         adresse d'écoute (0.0.0.0)
+    SGC_ASGI_PORT         port (8000)
+    SGC_ASGI_WORKERS      processus, chacun avec sa boucle asyncio (un par cœur)
+    SGC_ASGI_CONCURRENCE  requêtes simultanées par processus au-delà desquelles
+                          uvicorn répond 503 (200)
+    SGC_ASGI_KEEPALIVE    durée de maintien des connexions HTTP inactives, en s (5)
+
+Les connexions persistantes (CONN_MAX_AGE) ne conviennent pas sous ASGI :
+chaque requête s'exécute dans un thread différent et garderait sa propre
+connexion ouverte. Ce profil les désactive ; en PostgreSQL, le pool de
+connexions (DATABASES) prend le relais.
+"""
+import os
+
+
+def main():
+    import uvicorn
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cotisation_system.settings')
+    os.environ.setdefault('SGC_DB_CONNEXIONS_DUREE', '0')
+    os.environ.setdefault('SGC_VUES_ASYNC', '1')
+    uvicorn.run(
+        'cotisation_system.asgi:application',
+        host=os.environ.get('SGC_ASGI_HOTE', '0.0.0.0'),
+        port=int(os.environ.get('SGC_ASGI_PORT', 8000)),
+        workers=int(os.environ.get('SGC_ASGI_WORKERS', os.cpu_count() or 1)),
+        limit_concurrency=int(os.environ.get('SGC_ASGI_CONCURRENCE', 200)),
+        timeout_keep_alive=int(os.environ.get('SGC_ASGI_KEEPALIVE', 5)),
+        lifespan='off',      # Django ne gère pas le protocole lifespan
+        access_log=False,    # Les requêtes sont déjà mesurées par core.metriques
+    )
+
+
+if __name__ == '__main__':
+    main()
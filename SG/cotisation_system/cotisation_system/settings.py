@@ -41,13 +41,33 @@ INSTALLED_APPS = [
     'crispy_forms',
     'crispy_bootstrap5',
     'django.contrib.humanize',
-    
+    'rest_framework',
+    'rest_framework.authtoken',
+    'django_crontab',
 ]
 
+# Tâches planifiées (django-crontab) : `python manage.py crontab add` les installe
+CRONJOBS = [
+    # Campagne de recouvrement du mois écoulé (core/campagnes.py). Idempotente :
+    # chaque exécution ne traite que les employeurs devenus défaillants depuis.
+    (os.environ.get('SGC_CAMPAGNE_CRON', '30 2 * * *'), 'django.core.management.call_command', ['campagne_recouvrement']),
+]
+CRONTAB_LOCK_JOBS = True  # Pas d'exécutions concurrentes d'une même tâche
+
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
+# API REST des tablettes (core/api.py) : session pour le navigateur, jeton pour les tablettes
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.TokenAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticated'],
+}
+
 MIDDLEWARE = [
+    'core.metriques.MetriquesMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,14 +77,23 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'cotisation_system.urls'
+# Profil ASGI (cotisation_system/serveur_asgi.py) : variantes asynchrones du
+# tableau de bord et des KPI
+VUES_ASYNC = os.environ.get('SGC_VUES_ASYNC') == '1'
+ROOT_URLCONF = 'cotisation_system.urls_asgi' if VUES_ASYNC else 'cotisation_system.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.metriques.GabaritsChronometres',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Gabarits compilés une seule fois par processus (rechargés par l'autoreload en développement)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
@@ -75,17 +104,71 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'cotisation_system.wsgi.application'
+ASGI_APPLICATION = 'cotisation_system.asgi.application'  # Profil uvicorn : cotisation_system/serveur_asgi.py
 
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# SGC_DB=sqlite (défaut) ou postgresql. L'alias `lecture` sert les vues de
+# reporting (core/routage.py) ; les écritures vont toujours à `default`.
+SGC_DB = os.environ.get('SGC_DB', 'sqlite')
+CONNEXIONS_DUREE = int(os.environ.get('SGC_DB_CONNEXIONS_DUREE', 600))  # secondes ; 0 : une connexion par requête
+
+if SGC_DB == 'postgresql':
+    def _postgresql(hote):
+        return {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('SGC_DB_NOM', 'sgc'),
+            'USER': os.environ.get('SGC_DB_UTILISATEUR', 'sgc'),
+            'PASSWORD': os.environ.get('SGC_DB_MOT_DE_PASSE', ''),
+            'HOST': hote,
+            'PORT': os.environ.get('SGC_DB_PORT', '5432'),
+            # Pool de connexions par processus (psycopg[pool]) ; incompatible avec CONN_MAX_AGE
+            'OPTIONS': {'pool': {'min_size': 2, 'max_size': int(os.environ.get('SGC_DB_POOL', 10)), 'timeout': 10}},
+            'CONN_MAX_AGE': 0,
+        }
+
+    DATABASES = {
+        'default': _postgresql(os.environ.get('SGC_DB_HOTE', 'localhost')),
+        # Réplique en lecture ; à défaut, la base principale par une connexion distincte
+        'lecture': _postgresql(os.environ.get('SGC_DB_REPLIQUE_HOTE') or os.environ.get('SGC_DB_HOTE', 'localhost')),
     }
-}
+else:
+    # Journal WAL : les lectures ne bloquent plus l'écriture (ni l'inverse).
+    # synchronous=NORMAL suffit en WAL (pas de corruption, au pire la dernière
+    # transaction perdue sur coupure de courant). busy_timeout : attendre un
+    # verrou plutôt que d'échouer en « database is locked ».
+    PRAGMAS = (
+        'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; PRAGMA busy_timeout=20000; '
+        'PRAGMA cache_size=-65536; PRAGMA mmap_size=268435456; PRAGMA temp_store=MEMORY'
+    )
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                'init_command': PRAGMAS,
+                # Verrou d'écriture pris dès BEGIN : pas d'échec immédiat
+                # lors du passage d'une lecture à une écriture dans une transaction
+                'transaction_mode': 'IMMEDIATE',
+            },
+            'CONN_MAX_AGE': CONNEXIONS_DUREE,
+        },
+        'lecture': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {'init_command': PRAGMAS + '; PRAGMA query_only=ON'},
+            'CONN_MAX_AGE': CONNEXIONS_DUREE,
+        },
+    }
+
+for _base in DATABASES.values():
+    _base['CONN_HEALTH_CHECKS'] = True
+DATABASES['lecture']['TEST'] = {'MIRROR': 'default'}
+DATABASE_ROUTERS = ['core.routage.RouteurBases']
+# Délai de chaque agrégat des vues asynchrones (core/concurrence.py), en secondes
+CONCURRENCE_DELAI = float(os.environ.get('SGC_CONCURRENCE_DELAI', 5))
 
 AUTH_USER_MODEL = 'core.CustomUser'
 # Password validation
@@ -135,4 +218,64 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGIN_URL = 'login'
-LOGOUT_REDIRECT_URL = 'login'
\ No newline at end of file
+LOGOUT_REDIRECT_URL = 'login'
+
+# Envois par morceaux (core/televersements.py)
+TELEVERSEMENT_DOSSIER = MEDIA_ROOT / 'televersements'
+TELEVERSEMENT_TAILLE_MAX = 50 * 1024 * 1024
+TELEVERSEMENT_MORCEAU_MAX = 8 * 1024 * 1024
+
+# Cache (lignes des listes en cache, core/fragments.py). SGC_CACHE :
+#   memoire : un cache par processus (défaut, développement ou processus unique)
+#   fichier : partagé par les processus d'une même machine
+#   redis   : serveur compatible Redis (Redis, Valkey, KeyDB... en local), paquet `redis` requis
+# Après modification d'un gabarit de ligne, incrémenter VERSION (ou vider le cache).
+SGC_CACHE = os.environ.get('SGC_CACHE', 'memoire')
+CACHES = {
+    'default': {
+        'memoire': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'sgc',
+            'OPTIONS': {'MAX_ENTRIES': 20000},
+        },
+        'fichier': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('SGC_CACHE_DOSSIER', BASE_DIR / 'cache'),
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        },
+        'redis': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('SGC_REDIS_URL', 'redis://127.0.0.1:6379/1'),
+        },
+    }[SGC_CACHE] | {'KEY_PREFIX': 'sgc', 'VERSION': 1},
+}
+FRAGMENTS_DUREE = int(os.environ.get('SGC_FRAGMENTS_DUREE', 24 * 3600))  # secondes ; 0 : pas de cache des lignes
+
+# Documents PDF (core/documents.py) : cache disque adressé par empreinte des données
+DOCUMENTS_DOSSIER = MEDIA_ROOT / 'documents'
+DOCUMENTS_PROCESSUS = int(os.environ.get('SGC_DOCUMENTS_PROCESSUS', '0')) or None  # None : un par cœur
+
+# Métriques Prometheus (core/metriques.py), exposées sur /metrics
+METRIQUES_SEUIL_LENT = 1.0  # secondes : au-delà, la requête est journalisée
+METRIQUES_SQL_JOURNALISEES = 10  # requêtes SQL les plus lentes reprises dans le journal
+METRIQUES_IPS = ['127.0.0.1', '::1']
+METRIQUES_JETON = os.environ.get('SGC_METRIQUES_JETON', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'requetes_lentes': {
+            'class': 'logging.FileHandler',
+            'filename': BASE_DIR / 'requetes_lentes.log',
+            'encoding': 'utf-8',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'core.metriques': {
+            'handlers': ['requetes_lentes'],
+            'level': 'WARNING',
+        },
+    },
+}
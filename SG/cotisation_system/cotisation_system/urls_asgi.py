@@ -0,0 +1,17 @@
+"""
+URL du profil ASGI (cotisation_system/serveur_asgi.py).
+
+Les mêmes URL que cotisation_system/urls.py, mais le tableau de bord et les
+KPI sont servis par leurs variantes asynchrones, qui calculent leurs agrégats
+en parallèle (core/concurrence.py). Sous WSGI, ces variantes n'apportent rien
+et ouvriraient une connexion par agrégat : elles ne sont montées qu'ici.
+"""
+from django.urls import include, path
+
+from core import views
+
+urlpatterns = [
+    path('dashboard/', views.dashboard_async, name='dashboard'),
+    path('api/kpi-data/', views.kpi_data_async, name='kpi_data'),
+    path('', include('cotisation_system.urls')),
+]